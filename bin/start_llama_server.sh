@@ -44,7 +44,12 @@ while [[ $# -gt 0 ]]; do
                 echo "Error: --server-arg requires KEY and VALUE"
                 exit 1
             fi
-            SERVER_ARGS+=("--$2" "$3")
+            # An empty VALUE passes KEY as a flag (e.g., --server-arg embedding "")
+            if [[ -z "$3" ]]; then
+                SERVER_ARGS+=("--$2")
+            else
+                SERVER_ARGS+=("--$2" "$3")
+            fi
             shift 3
             ;;
         -h|--help)
@@ -57,6 +62,7 @@ while [[ $# -gt 0 ]]; do
             echo "  --port PORT                Port to bind to (default: 8000)"
             echo "  --server-arg KEY VALUE     Additional llama-server argument (can be repeated)"
             echo "                             Example: --server-arg ctx-size 8192"
+            echo "                             An empty VALUE passes a flag: --server-arg embedding \"\""
             echo "  -h, --help                 Show this help message"
             echo ""
             echo "To see all available llama-server options, run:"
@@ -110,9 +116,15 @@ echo "  Port:   $PORT"
 # Display additional server arguments if any
 if [ ${#SERVER_ARGS[@]} -gt 0 ]; then
     echo "  Additional args:"
-    for ((i=0; i<${#SERVER_ARGS[@]}; i+=2)); do
-        echo "    ${SERVER_ARGS[i]} ${SERVER_ARGS[i+1]}"
+    for arg in "${SERVER_ARGS[@]}"; do
+        if [[ "$arg" == --* ]]; then
+            [ -n "$line" ] && echo "    $line"
+            line="$arg"
+        else
+            line="$line $arg"
+        fi
     done
+    echo "    $line"
 fi
 
 echo ""
@@ -9,8 +9,22 @@ Features:
 - Single file or directory batch processing
 - Manual embedding model selection (age-small-en-v1.5, age-code-v1, etc.)
 - Configurable chunk size with overlap
-- FAISS index creation and persistence
-- Metadata preservation for filtering and citation
+- FAISS index creation and persistence (exact IndexFlatIP or approximate
+  IndexIVFFlat / IndexHNSWFlat / IndexIVFPQ)
+- Recall@k vs latency report against the exact index
+- Compact vector storage (--storage float16, or binary sign bits rescored
+  exactly against float16 vectors), with a memory saved / recall kept report
+- Sharded stores (--shards) searched in parallel across CPU cores
+- Optional BM25 keyword index (--bm25) for hybrid search on exact identifiers
+- Incremental updates (--update): only new or changed source files are embedded
+- Multi-threaded embedding (--threads) and multi-process encoding (--workers)
+- Faster CPU embedding backends (--backend onnx/openvino, --quantize int8),
+  checked against the fp32 model for parity and throughput
+- Embedding on a shared llama-server started with --embedding
+  (--backend llama-server --embedding-server NAME)
+- Metadata preservation for filtering and citation (with an offset table
+  for on-demand row reads, a source/tag/date filter index and a chunk
+  adjacency index for neighbour-chunk expansion)
 - Progress tracking and verbose output
 - Automatic GPU detection for faster embedding
 
@@ -25,6 +39,32 @@ Usage:
     ./Create_VectorStore.py -i document.jsonl -o vectorstore --model jinaai/jina-embeddings-v2-base-code \
         --chunk-size 512 --overlap 50
 
+    # Add, re-embed or remove changed source files in an existing store
+    ./Create_VectorStore.py -i data/ -o vectorstore --model sentence-transformers/all-MiniLM-L6-v2 --update
+
+    # Also build a BM25 keyword index (search_mode "hybrid" in the registry)
+    ./Create_VectorStore.py -i data/ -o vectorstore --model sentence-transformers/all-MiniLM-L6-v2 --bm25
+
+    # Embed with int8-quantized ONNX Runtime (parity vs fp32 is reported)
+    ./Create_VectorStore.py -i data/ -o vectorstore --model sentence-transformers/all-MiniLM-L6-v2 \
+        --backend onnx --quantize int8
+
+    # Embed on the llama-server named "embeddings" in configs/config.json (started with --embedding)
+    ./Create_VectorStore.py -i data/ -o vectorstore --model nomic-embed-text-v1.5 \
+        --backend llama-server --embedding-server embeddings
+
+    # Approximate index for large stores, with a recall@k vs latency report
+    ./Create_VectorStore.py -i data/ -o vectorstore --model sentence-transformers/all-MiniLM-L6-v2 \
+        --index-type IndexHNSWFlat --recall-report
+
+    # Half-precision vectors (half the memory); --storage binary keeps 1 bit per dimension
+    ./Create_VectorStore.py -i data/ -o vectorstore --model sentence-transformers/all-MiniLM-L6-v2 \
+        --storage float16
+
+    # Split a large store into 8 shards that are searched in parallel
+    ./Create_VectorStore.py -i data/ -o vectorstore --model sentence-transformers/all-MiniLM-L6-v2 \
+        --index-type IndexHNSWFlat --shards 8
+
     # Verbose output
     ./Create_VectorStore.py -i data/ -o vectorstore --model sentence-transformers/all-MiniLM-L6-v2 -v
 
@@ -44,12 +84,8 @@ import numpy as np
 # Fix for Python 3.13+ multiprocessing issues on macOS
 # Disable tokenizer parallelism to prevent segmentation faults
 os.environ['TOKENIZERS_PARALLELISM'] = 'false'
-# Disable OpenMP threading which can cause issues on macOS
-os.environ['OMP_NUM_THREADS'] = '1'
-os.environ['MKL_NUM_THREADS'] = '1'
-os.environ['OPENBLAS_NUM_THREADS'] = '1'
-os.environ['VECLIB_MAXIMUM_THREADS'] = '1'
-os.environ['NUMEXPR_NUM_THREADS'] = '1'
+# Embedding thread counts are set with --threads when the model loads
+# (one thread on macOS by default, where OpenMP threading can crash)
 
 # Import dependencies with helpful error messages
 try:
@@ -59,12 +95,11 @@ except ImportError:
     print("Install: pip install faiss-cpu", file=sys.stderr)
     sys.exit(1)
 
+# Not needed with --backend llama-server (checked in load_embedding_model)
 try:
     from sentence_transformers import SentenceTransformer
 except ImportError:
-    print("Error: sentence-transformers is required.", file=sys.stderr)
-    print("Install: pip install sentence-transformers", file=sys.stderr)
-    sys.exit(1)
+    SentenceTransformer = None
 
 try:
     from tqdm import tqdm
@@ -73,13 +108,18 @@ except ImportError:
     print("Install: pip install tqdm", file=sys.stderr)
     sys.exit(1)
 
-# Set PyTorch to single-threaded mode (must be done after import)
-try:
-    import torch
-    torch.set_num_threads(1)
-    torch.set_num_interop_threads(1)
-except ImportError:
-    pass  # torch not yet imported
+# Index construction is shared with the retriever (llf.vector_index)
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+from llf import embedding_backend
+from llf.chunk_adjacency import write_adjacency
+from llf.lexical_index import BM25_FILENAME, BM25Index
+from llf.metadata_filter import write_filter_index
+from llf.vector_index import (
+    DEFAULT_STORAGE, INDEX_TYPES, STORAGE_TYPES, ShardedIndex, build_index, build_sharded_index,
+    format_recall_report, format_storage_report, index_files, recall_report, storage_report, write_index
+)
+from llf.vector_store_update import MANIFEST_FILENAME, build_manifest, load_manifest, update_vector_store
 
 # Set up logging
 logging.basicConfig(
@@ -268,11 +308,15 @@ def prepare_chunks(records: List[Dict[str, Any]], chunk_size: Optional[int] = No
         for chunk_idx, chunk in enumerate(chunks):
             text_chunks.append(chunk)
 
-            # Copy record metadata and add chunk info
+            # Copy record metadata and add chunk info. 'text' holds the chunk
+            # itself: it is what the retriever puts in the prompt.
             metadata = record.copy()
+            metadata['text'] = chunk
             metadata['_chunk_index'] = chunk_idx
             metadata['_total_chunks'] = len(chunks)
             metadata['_chunk_char_count'] = len(chunk)
+            if len(chunks) > 1:
+                metadata['_chunk_overlap'] = overlap
 
             metadata_list.append(metadata)
 
@@ -282,7 +326,9 @@ def prepare_chunks(records: List[Dict[str, Any]], chunk_size: Optional[int] = No
     return text_chunks, metadata_list
 
 
-def load_embedding_model(model_name: str, cache_dir: Optional[str] = None, verbose: bool = False) -> SentenceTransformer:
+def load_embedding_model(model_name: str, cache_dir: Optional[str] = None, verbose: bool = False,
+                         backend: Optional[str] = None, quantization: Optional[str] = None,
+                         threads: Optional[int] = None, server: Optional[str] = None) -> SentenceTransformer:
     """
     Load a Sentence Transformer embedding model.
 
@@ -290,13 +336,30 @@ def load_embedding_model(model_name: str, cache_dir: Optional[str] = None, verbo
         model_name: Model name or path (e.g., 'age-small-en-v1.5')
         cache_dir: Directory to cache downloaded models (default: local app directory)
         verbose: Print detailed progress information
+        backend: Embedding backend (torch, onnx, openvino, llama-server; default: torch)
+        quantization: Weight quantization ('int8' for onnx; default: full precision)
+        threads: PyTorch intra-op threads (default: all CPU cores, 1 on macOS)
+        server: Embedding server name or URL (llama-server backend)
 
     Returns:
-        Loaded SentenceTransformer model
+        Loaded SentenceTransformer model (a client of the server for llama-server)
     """
     if verbose:
         logger.info(f"Loading embedding model: {model_name}")
 
+    # The server holds the model: nothing to download or load here
+    if backend == embedding_backend.SERVER_BACKEND:
+        model = embedding_backend.load_embedding_model(model_name, backend=backend, server=server)
+        if verbose:
+            logger.info(f"Embedding on {model.base_url} "
+                        f"(embedding dimension: {model.get_sentence_embedding_dimension()})")
+        return model
+
+    if SentenceTransformer is None:
+        print("Error: sentence-transformers is required.", file=sys.stderr)
+        print("Install: pip install sentence-transformers (or embed with --backend llama-server)", file=sys.stderr)
+        sys.exit(1)
+
     # Default cache directory: data_stores/embedding_models relative to this script
     if cache_dir is None:
         script_dir = Path(__file__).parent.parent  # Go up to data_stores/
@@ -309,14 +372,20 @@ def load_embedding_model(model_name: str, cache_dir: Optional[str] = None, verbo
         logger.info(f"Using model cache directory: {cache_dir}")
 
     try:
-        # Determine device (GPU if available, else CPU)
+        # Determine device (GPU if available, else CPU); onnx and openvino run on the CPU
         import torch
-        device = 'cuda' if torch.cuda.is_available() else 'cpu'
+        device = 'cuda' if torch.cuda.is_available() and (backend or 'torch') == 'torch' else 'cpu'
+
+        intra_op_threads, inter_op_threads, _ = embedding_backend.resolve_thread_counts({'intra_op_threads': threads})
+        embedding_backend.apply_thread_settings(intra_op_threads, inter_op_threads)
 
         if verbose:
-            logger.info(f"Using device: {device}")
+            logger.info(f"Using device: {device} (backend: {backend or 'torch'}"
+                        + (f", {quantization})" if quantization else ")")
+                        + f", {intra_op_threads} thread(s)")
 
-        model = SentenceTransformer(model_name, device=device, cache_folder=cache_dir)
+        model = embedding_backend.load_embedding_model(model_name, cache_folder=cache_dir, backend=backend,
+                                                       quantization=quantization, device=device)
 
         if verbose:
             logger.info(f"Model loaded successfully (embedding dimension: {model.get_sentence_embedding_dimension()})")
@@ -330,7 +399,7 @@ def load_embedding_model(model_name: str, cache_dir: Optional[str] = None, verbo
 
 
 def create_embeddings(model: SentenceTransformer, text_chunks: List[str],
-                     batch_size: int = 32, verbose: bool = False) -> np.ndarray:
+                     batch_size: int = 32, verbose: bool = False, workers: int = 1) -> np.ndarray:
     """
     Create embeddings for text chunks using the model.
 
@@ -339,6 +408,7 @@ def create_embeddings(model: SentenceTransformer, text_chunks: List[str],
         text_chunks: List of text strings to embed
         batch_size: Number of texts to process at once
         verbose: Print detailed progress information
+        workers: CPU processes encoding in parallel (PyTorch backend; default: 1, in-process)
 
     Returns:
         NumPy array of embeddings (shape: [num_chunks, embedding_dim])
@@ -347,6 +417,9 @@ def create_embeddings(model: SentenceTransformer, text_chunks: List[str],
         logger.info(f"Creating embeddings for {len(text_chunks)} chunks (batch_size={batch_size})")
 
     try:
+        if workers > 1 and str(model.device) == 'cpu' and len(text_chunks) > batch_size:
+            return create_embeddings_multi_process(model, text_chunks, batch_size, workers, verbose)
+
         # Encode with progress bar
         # Use single-process encoding to avoid segmentation faults on Python 3.13+/macOS
         embeddings = model.encode(
@@ -368,51 +441,128 @@ def create_embeddings(model: SentenceTransformer, text_chunks: List[str],
         raise
 
 
-def build_faiss_index(embeddings: np.ndarray, verbose: bool = False) -> faiss.Index:
+def create_embeddings_multi_process(model: SentenceTransformer, text_chunks: List[str],
+                                    batch_size: int, workers: int, verbose: bool = False) -> np.ndarray:
     """
-    Build a FAISS index from embeddings.
+    Create embeddings with a pool of CPU worker processes.
 
-    Uses IndexFlatIP for exact cosine similarity search (normalized vectors).
+    Each worker gets an equal share of the CPU cores as its thread count,
+    so the pool does not oversubscribe the machine.
 
     Args:
-        embeddings: NumPy array of embeddings
+        model: Loaded SentenceTransformer model (PyTorch backend)
+        text_chunks: List of text strings to embed
+        batch_size: Number of texts each worker encodes at once
+        workers: Number of worker processes
         verbose: Print detailed progress information
 
     Returns:
-        FAISS index
+        NumPy array of embeddings (shape: [num_chunks, embedding_dim])
     """
+    threads_per_worker, _, _ = embedding_backend.resolve_thread_counts({'workers': workers})
     if verbose:
-        logger.info("Building FAISS index")
+        logger.info(f"Encoding with {workers} worker processes ({threads_per_worker} thread(s) each)")
+
+    # Spawned workers read their thread count from the environment when torch starts
+    previous = os.environ.get('OMP_NUM_THREADS')
+    os.environ['OMP_NUM_THREADS'] = str(threads_per_worker)
+    try:
+        pool = model.start_multi_process_pool(target_devices=['cpu'] * workers)
+    finally:
+        if previous is None:
+            os.environ.pop('OMP_NUM_THREADS', None)
+        else:
+            os.environ['OMP_NUM_THREADS'] = previous
 
-    embedding_dim = embeddings.shape[1]
+    try:
+        embeddings = model.encode_multi_process(text_chunks, pool, batch_size=batch_size,
+                                                normalize_embeddings=True)
+    finally:
+        model.stop_multi_process_pool(pool)
 
-    # Use IndexFlatIP for exact inner product search (cosine similarity with normalized vectors)
-    index = faiss.IndexFlatIP(embedding_dim)
+    if verbose:
+        logger.info(f"Created embeddings with shape: {embeddings.shape}")
+    return embeddings
 
-    # Add embeddings to index
-    index.add(embeddings)
 
+def build_faiss_index(embeddings: np.ndarray, index_type: str = 'IndexFlatIP',
+                      index_options: Optional[Dict[str, Any]] = None,
+                      shards: int = 1, verbose: bool = False) -> Tuple[faiss.Index, Dict[str, Any]]:
+    """
+    Build a FAISS index from embeddings.
+
+    IndexFlatIP gives exact cosine similarity search (normalized vectors);
+    the IVF and HNSW types trade a little recall for much faster search on
+    large stores. IVF types are trained on a random sample of the embeddings.
+    Vector ids are the metadata row numbers, so the store can later be
+    updated with --update. With shards > 1 the vectors are split across
+    that many indexes (id % shards), each built the same way.
+
+    Args:
+        embeddings: NumPy array of embeddings
+        index_type: FAISS index type (see llf.vector_index.INDEX_TYPES)
+        index_options: Build parameters (nlist, hnsw_m, pq_m, pq_bits, train_size, storage)
+        shards: Number of shards
+        verbose: Print detailed progress information
+
+    Returns:
+        Tuple of (FAISS index, index parameters for config.json)
+    """
     if verbose:
-        logger.info(f"FAISS index built successfully ({index.ntotal} vectors)")
+        logger.info(f"Building FAISS index ({index_type})")
 
-    return index
+    ids = np.arange(len(embeddings), dtype=np.int64)
+    if shards > 1:
+        index, index_params = build_sharded_index(embeddings, shards, ids=ids, index_type=index_type,
+                                                  **(index_options or {}))
+    else:
+        index, index_params = build_index(embeddings, index_type, ids=ids, **(index_options or {}))
+
+    if verbose:
+        logger.info(f"FAISS index built successfully ({index.ntotal} vectors, params: {index_params})")
+
+    return index, index_params
 
 
 def save_vector_store(index: faiss.Index, metadata: List[Dict[str, Any]],
-                     output_dir: str, model_name: str, verbose: bool = False) -> None:
+                     output_dir: str, model_name: str, index_type: str = 'IndexFlatIP',
+                     index_params: Optional[Dict[str, Any]] = None,
+                     manifest: Optional[Dict[str, Any]] = None, backend: Optional[str] = None,
+                     quantization: Optional[str] = None, parity: Optional[Dict[str, Any]] = None,
+                     storage: str = DEFAULT_STORAGE, storage_stats: Optional[Dict[str, Any]] = None,
+                     server: Optional[str] = None, verbose: bool = False) -> None:
     """
     Save FAISS index and metadata to disk.
 
     Creates:
     - <output_dir>/index.faiss - FAISS index file
+    - <output_dir>/vectors.f16.npy - float16 vectors for rescoring (binary storage)
+    - <output_dir>/index.NNN.faiss, index.shards.json - Shards and shard list
+      (sharded stores, instead of index.faiss)
     - <output_dir>/metadata.jsonl - Metadata for each vector
+    - <output_dir>/metadata.offsets.npy - Byte range of each metadata line
+      (lets the retriever read only the rows a query needs)
+    - <output_dir>/metadata.filters.npz - Chunk ids per source file and tag,
+      and chunk dates (metadata-filtered searches)
+    - <output_dir>/metadata.adjacency.npy - Previous and next chunk of each
+      chunk in its record (neighbour-chunk expansion)
     - <output_dir>/config.json - Vector store configuration
+    - <output_dir>/manifest.json - Source hashes and vector ids for --update
 
     Args:
         index: FAISS index
         metadata: List of metadata dictionaries (one per vector)
         output_dir: Output directory path
         model_name: Embedding model name
+        index_type: FAISS index type that was built
+        index_params: Build parameters and default query knobs (nlist, nprobe, M, efSearch, ...)
+        manifest: Manifest from build_manifest (enables --update later)
+        backend: Embedding backend the vectors were made with (default: torch)
+        quantization: Weight quantization of the embedding model (None = full precision)
+        parity: Report from embedding_backend.compare_backends (non-default backends)
+        storage: Vector storage the index was built with (see llf.vector_index.STORAGE_TYPES)
+        storage_stats: Report from llf.vector_index.storage_report (compact storage)
+        server: Embedding server name or URL (llama-server backend)
         verbose: Print detailed progress information
     """
     output_path = Path(output_dir)
@@ -423,36 +573,147 @@ def save_vector_store(index: faiss.Index, metadata: List[Dict[str, Any]],
 
     # Save FAISS index
     index_file = output_path / 'index.faiss'
-    faiss.write_index(index, str(index_file))
+    write_index(index, index_file)
     if verbose:
-        logger.info(f"Saved FAISS index: {index_file}")
+        logger.info(f"Saved FAISS index: {', '.join(str(path) for path in index_files(index, index_file))}")
 
-    # Save metadata
+    # Save metadata, recording where each line starts and ends
     metadata_file = output_path / 'metadata.jsonl'
-    with open(metadata_file, 'w', encoding='utf-8') as f:
-        for meta in metadata:
-            f.write(json.dumps(meta, ensure_ascii=False) + '\n')
+    offsets = np.empty((len(metadata) + 1, 2), dtype=np.uint64)
+    position = 0
+    with open(metadata_file, 'wb') as f:
+        for i, meta in enumerate(metadata, 1):
+            line = (json.dumps(meta, ensure_ascii=False) + '\n').encode('utf-8')
+            f.write(line)
+            offsets[i] = (position, position + len(line))
+            position += len(line)
     if verbose:
         logger.info(f"Saved metadata: {metadata_file} ({len(metadata)} records)")
 
+    # Save offset table (header row: file size, record count); written after
+    # metadata.jsonl so its mtime marks it as current
+    offsets[0] = (position, len(metadata))
+    offsets_file = output_path / 'metadata.offsets.npy'
+    np.save(offsets_file, offsets)
+    if verbose:
+        logger.info(f"Saved metadata offsets: {offsets_file}")
+
+    # Save filter index (also written after metadata.jsonl)
+    filters_file = write_filter_index(metadata_file, metadata)
+    if verbose:
+        logger.info(f"Saved metadata filter index: {filters_file}")
+
+    # Save chunk adjacency from the positions prepare_chunks recorded (also written after metadata.jsonl)
+    adjacency_file = write_adjacency(metadata_file, metadata)
+    if verbose:
+        logger.info(f"Saved chunk adjacency index: {adjacency_file}")
+
     # Save configuration
     config = {
         'embedding_model': model_name,
-        'index_type': 'IndexFlatIP',
+        'embedding_backend': backend or embedding_backend.DEFAULT_BACKEND,
+        'embedding_quantization': quantization,
+        'index_type': index_type,
+        'index_params': index_params or {},
+        'storage': storage,
+        'shards': len(index.shards) if isinstance(index, ShardedIndex) else 1,
         'num_vectors': index.ntotal,
         'embedding_dimension': index.d,
         'metadata_records': len(metadata)
     }
+    if server is not None:
+        config['embedding_server'] = server
+    if parity is not None:
+        config['embedding_parity'] = parity
+    if storage_stats is not None:
+        config['storage_report'] = storage_stats
     config_file = output_path / 'config.json'
     with open(config_file, 'w', encoding='utf-8') as f:
         json.dump(config, f, indent=2, ensure_ascii=False)
     if verbose:
         logger.info(f"Saved configuration: {config_file}")
 
+    # Save manifest
+    if manifest is not None:
+        manifest_file = output_path / MANIFEST_FILENAME
+        with open(manifest_file, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2, ensure_ascii=False)
+        if verbose:
+            logger.info(f"Saved manifest: {manifest_file}")
+
     logger.info(f"\n✅ Vector store created successfully!")
     logger.info(f"   Location: {output_path}")
     logger.info(f"   Vectors: {index.ntotal}")
     logger.info(f"   Model: {model_name}")
+    if config['embedding_backend'] != embedding_backend.DEFAULT_BACKEND or quantization:
+        logger.info(f"   Backend: {config['embedding_backend']}" + (f" ({quantization})" if quantization else "")
+                    + (f" on {server}" if server else ""))
+
+
+def run_update(args: argparse.Namespace, records: List[Dict[str, Any]]) -> None:
+    """
+    Update an existing vector store in place (--update).
+
+    Chunking settings recorded in the store's manifest take precedence over
+    --chunk-size/--overlap, and the store's embedding backend over
+    --backend/--quantize, so old and new chunks stay comparable. The
+    embedding model is only loaded if something needs embedding.
+
+    Args:
+        args: Parsed command line arguments
+        records: All current JSONL records
+    """
+    store_dir = Path(args.output)
+    config_file = store_dir / 'config.json'
+    if not config_file.exists():
+        raise FileNotFoundError(f"No vector store to update at {store_dir} (run without --update to create one)")
+
+    with open(config_file, 'r', encoding='utf-8') as f:
+        store_config = json.load(f)
+    store_model = store_config.get('embedding_model')
+    if store_model != args.model:
+        raise ValueError(f"--model {args.model} does not match the store's embedding model {store_model}")
+
+    # New vectors must come from the same model variant as the stored ones
+    backend = store_config.get('embedding_backend', embedding_backend.DEFAULT_BACKEND)
+    quantization = store_config.get('embedding_quantization')
+    if (args.backend, args.quantize) not in ((None, None), (backend, quantization)):
+        logger.warning(f"Using the store's embedding backend: {backend}"
+                       + (f" ({quantization})" if quantization else ""))
+    # The same model may be served at another address now
+    server = args.embedding_server or store_config.get('embedding_server')
+
+    chunk_size, overlap = args.chunk_size, args.overlap
+    manifest = load_manifest(store_dir)
+    settings = (manifest or {}).get('settings', {})
+    if settings and (settings.get('chunk_size'), settings.get('overlap')) != (chunk_size, overlap):
+        chunk_size, overlap = settings.get('chunk_size'), settings.get('overlap', 0)
+        logger.warning(f"Using the store's chunking settings: chunk size {chunk_size}, overlap {overlap}")
+
+    model = None
+
+    def embed_texts(texts: List[str]) -> np.ndarray:
+        nonlocal model
+        if model is None:
+            model = load_embedding_model(args.model, cache_dir=args.cache_dir, verbose=args.verbose,
+                                         backend=backend, quantization=quantization, threads=args.threads,
+                                         server=server)
+        return create_embeddings(model, texts, batch_size=args.batch_size, verbose=args.verbose,
+                                 workers=args.workers if backend == 'torch' else 1)
+
+    summary = update_vector_store(
+        store_dir,
+        records,
+        chunk_records=lambda new_records: prepare_chunks(new_records, chunk_size=chunk_size,
+                                                         overlap=overlap, verbose=args.verbose),
+        embed_texts=embed_texts
+    )
+
+    logger.info(f"\n✅ Vector store updated: {store_dir}")
+    logger.info(f"   Sources added: {len(summary['added'])}, changed: {len(summary['changed'])}, "
+                f"removed: {len(summary['removed'])}, unchanged: {summary['unchanged']}")
+    logger.info(f"   Vectors added: {summary['vectors_added']}, removed: {summary['vectors_removed']}, "
+                f"total: {summary['num_vectors']}")
 
 
 def main():
@@ -535,6 +796,46 @@ For more models: https://huggingface.co/models?library=sentence-transformers
         help='Number of overlapping characters between chunks (default: 0)'
     )
 
+    parser.add_argument(
+        '--backend',
+        choices=embedding_backend.EMBEDDING_BACKENDS,
+        default=None,
+        help='Embedding backend: torch (fp32 PyTorch), onnx (ONNX Runtime), openvino, or llama-server '
+             '(a llama-server started with --embedding, see --embedding-server); recorded in '
+             'config.json and used for queries too (default: torch). onnx and openvino are checked '
+             'against fp32 for parity and throughput'
+    )
+
+    parser.add_argument(
+        '--embedding-server',
+        default=None,
+        metavar='NAME|URL',
+        help='llama-server that embeds for --backend llama-server: a local_llm_servers name from '
+             'configs/config.json or a URL; recorded in config.json for queries'
+    )
+
+    parser.add_argument(
+        '--quantize',
+        choices=['int8'],
+        default=None,
+        help='Dynamically quantize the embedding model weights (onnx backend only)'
+    )
+
+    parser.add_argument(
+        '--threads',
+        type=int,
+        default=None,
+        help='Threads per embedding operation (default: all CPU cores; 1 on macOS). '
+             'With --workers, each worker process uses an equal share of the cores instead'
+    )
+
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=1,
+        help='Worker processes encoding chunks in parallel on the CPU, torch backend only (default: 1)'
+    )
+
     parser.add_argument(
         '--batch-size',
         type=int,
@@ -542,6 +843,91 @@ For more models: https://huggingface.co/models?library=sentence-transformers
         help='Batch size for embedding generation (default: 32)'
     )
 
+    parser.add_argument(
+        '--index-type',
+        choices=INDEX_TYPES,
+        default='IndexFlatIP',
+        help='FAISS index type (default: IndexFlatIP, exact search)'
+    )
+
+    parser.add_argument(
+        '--nlist',
+        type=int,
+        default=None,
+        help='IVF clusters for IndexIVFFlat/IndexIVFPQ (default: about 4 * sqrt(vectors))'
+    )
+
+    parser.add_argument(
+        '--hnsw-m',
+        type=int,
+        default=32,
+        help='Links per node for IndexHNSWFlat (default: 32)'
+    )
+
+    parser.add_argument(
+        '--pq-m',
+        type=int,
+        default=None,
+        help='PQ sub-vectors for IndexIVFPQ; must divide the embedding dimension (default: dimension / 8)'
+    )
+
+    parser.add_argument(
+        '--pq-bits',
+        type=int,
+        default=8,
+        help='Bits per PQ code for IndexIVFPQ (default: 8)'
+    )
+
+    parser.add_argument(
+        '--train-size',
+        type=int,
+        default=None,
+        help='Random training sample size for IVF index types (default: 39 vectors per centroid)'
+    )
+
+    parser.add_argument(
+        '--storage',
+        choices=STORAGE_TYPES,
+        default=DEFAULT_STORAGE,
+        help='Vector storage: float32, float16 (half the memory) or binary (1 bit per dimension, '
+             'IndexFlatIP only, candidates rescored exactly against float16 vectors) (default: float32)'
+    )
+
+    parser.add_argument(
+        '--shards',
+        type=int,
+        default=1,
+        help='Split the index into this many shards (index.NNN.faiss), searched in parallel; '
+             'for stores too large for one index (default: 1)'
+    )
+
+    parser.add_argument(
+        '--bm25',
+        action='store_true',
+        help='Also build a BM25 keyword index (bm25.npz) for hybrid search; '
+             'kept up to date by --update'
+    )
+
+    parser.add_argument(
+        '--update',
+        action='store_true',
+        help='Update an existing store in --output: embed only new or changed source files and '
+             'remove vectors of deleted ones (pass the full set of JSONL files as --input)'
+    )
+
+    parser.add_argument(
+        '--recall-report',
+        action='store_true',
+        help='Measure recall@k and latency against exact search and save recall_report.json'
+    )
+
+    parser.add_argument(
+        '--recall-k',
+        type=int,
+        default=5,
+        help='k for --recall-report and the --storage report (default: 5, the default top_k_results)'
+    )
+
     parser.add_argument(
         '--cache-dir',
         default=None,
@@ -573,6 +959,35 @@ For more models: https://huggingface.co/models?library=sentence-transformers
         print("Error: --batch-size must be positive", file=sys.stderr)
         sys.exit(1)
 
+    if args.workers <= 0:
+        print("Error: --workers must be positive", file=sys.stderr)
+        sys.exit(1)
+
+    for option in ('nlist', 'pq_m', 'train_size', 'threads', 'shards'):
+        value = getattr(args, option)
+        if value is not None and value <= 0:
+            print(f"Error: --{option.replace('_', '-')} must be positive", file=sys.stderr)
+            sys.exit(1)
+
+    if not 1 <= args.pq_bits <= 16:
+        print("Error: --pq-bits must be between 1 and 16", file=sys.stderr)
+        sys.exit(1)
+
+    if args.shards > 1 and args.storage == 'binary':
+        print("Error: --storage binary cannot be combined with --shards", file=sys.stderr)
+        sys.exit(1)
+
+    if args.backend == embedding_backend.SERVER_BACKEND and not args.embedding_server and not args.update:
+        print("Error: --backend llama-server needs --embedding-server", file=sys.stderr)
+        sys.exit(1)
+
+    if args.quantize and not args.update:
+        try:
+            embedding_backend.validate_backend(args.backend, args.quantize)
+        except ValueError as e:
+            print(f"Error: {e} (use --backend onnx)", file=sys.stderr)
+            sys.exit(1)
+
     try:
         # Load JSONL records
         records = load_jsonl_files(args.input, verbose=args.verbose)
@@ -581,6 +996,10 @@ For more models: https://huggingface.co/models?library=sentence-transformers
             print("Error: No records loaded from input", file=sys.stderr)
             sys.exit(1)
 
+        if args.update:
+            run_update(args, records)
+            return
+
         # Prepare text chunks and metadata
         text_chunks, metadata = prepare_chunks(
             records,
@@ -594,18 +1013,56 @@ For more models: https://huggingface.co/models?library=sentence-transformers
             sys.exit(1)
 
         # Load embedding model
-        model = load_embedding_model(args.model, cache_dir=args.cache_dir, verbose=args.verbose)
+        server = args.embedding_server if args.backend == embedding_backend.SERVER_BACKEND else None
+        model = load_embedding_model(args.model, cache_dir=args.cache_dir, verbose=args.verbose,
+                                     backend=args.backend, quantization=args.quantize, threads=args.threads,
+                                     server=server)
 
         # Create embeddings
         embeddings = create_embeddings(
             model,
             text_chunks,
             batch_size=args.batch_size,
-            verbose=args.verbose
+            verbose=args.verbose,
+            workers=args.workers if (args.backend or 'torch') == 'torch' else 1
         )
 
+        # Compare a faster backend against the fp32 model on a sample of chunks (a llama-server
+        # model is a GGUF conversion, often under another name, so it is not compared)
+        parity = None
+        if (args.backend or embedding_backend.DEFAULT_BACKEND) not in (embedding_backend.DEFAULT_BACKEND,
+                                                                      embedding_backend.SERVER_BACKEND) \
+                or args.quantize:
+            reference_model = load_embedding_model(args.model, cache_dir=args.cache_dir, verbose=args.verbose,
+                                                   threads=args.threads)
+            parity = embedding_backend.compare_backends(reference_model, model, text_chunks,
+                                                        batch_size=args.batch_size)
+            del reference_model
+            label = args.backend + (f" {args.quantize}" if args.quantize else "")
+            logger.info(f"\n{embedding_backend.format_parity_report(parity, label)}")
+
         # Build FAISS index
-        index = build_faiss_index(embeddings, verbose=args.verbose)
+        index_options = {
+            'nlist': args.nlist,
+            'hnsw_m': args.hnsw_m,
+            'pq_m': args.pq_m,
+            'pq_bits': args.pq_bits,
+            'train_size': args.train_size,
+            'storage': args.storage,
+        }
+        index, index_params = build_faiss_index(
+            embeddings,
+            index_type=args.index_type,
+            index_options=index_options,
+            shards=args.shards,
+            verbose=args.verbose
+        )
+
+        # Memory saved and recall kept by compact storage
+        storage_stats = None
+        if args.storage != DEFAULT_STORAGE:
+            storage_stats = storage_report(index, embeddings, args.storage, k=args.recall_k)
+            logger.info(f"\n{format_storage_report(storage_stats)}")
 
         # Save vector store
         save_vector_store(
@@ -613,9 +1070,35 @@ For more models: https://huggingface.co/models?library=sentence-transformers
             metadata,
             args.output,
             args.model,
+            index_type=args.index_type,
+            index_params=index_params,
+            manifest=build_manifest(records, metadata, {'chunk_size': args.chunk_size, 'overlap': args.overlap}),
+            backend=args.backend,
+            quantization=args.quantize,
+            parity=parity,
+            storage=args.storage,
+            storage_stats=storage_stats,
+            server=server,
             verbose=args.verbose
         )
 
+        # Keyword index over the same chunks, addressed by the same ids
+        if args.bm25:
+            bm25_file = Path(args.output) / BM25_FILENAME
+            BM25Index.build(text_chunks).save(bm25_file)
+            logger.info(f"Saved BM25 keyword index: {bm25_file}")
+
+        # Compare against exact search
+        if args.recall_report:
+            report = recall_report(index, embeddings, k=args.recall_k)
+            report_file = Path(args.output) / 'recall_report.json'
+            with open(report_file, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2)
+            logger.info(f"\n{format_recall_report(report)}")
+            logger.info(f"Saved recall report: {report_file}")
+            if report['knob']:
+                logger.info(f"Tune '{report['knob']}' per store in data_store_registry.json")
+
         # Print next steps
         logger.info(f"\n\nPerform the following task:\n \
 - Move the '{args.output}' directory to 'data_stores/vector_stores'\n \
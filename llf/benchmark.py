@@ -0,0 +1,247 @@
+"""
+Offline benchmark suite for Local LLM Framework.
+
+This module measures LLF's own overhead separately from model speed by running
+the real code paths against the mock llama-server in llf.mock_llm_server:
+- chat:            LLMRuntime.chat (non-streaming, raw messages)
+- chat_stream:     LLMRuntime.chat (streaming, raw messages)
+- build_messages:  PromptConfig.build_messages (RAG, memory, prompt assembly)
+- tool_loop:       LLMRuntime.chat tool-calling loop (mock requests tool calls)
+- gui_stream:      LLMFrameworkGUI.chat_respond generator (requires gradio)
+
+For every iteration the time the mock server spent on its requests is
+subtracted from client wall time, leaving LLF overhead. The result is a plain
+dict (see run_benchmarks) that can be written as JSON for regression tracking.
+"""
+
+import copy
+import json
+import platform
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from .config import Config
+from .logging_config import get_logger
+from .mock_llm_server import MockLLMServer, MockServerSettings
+from .prompt_config import PromptConfig
+
+logger = get_logger(__name__)
+
+
+# Report schema version (bump when keys change)
+REPORT_VERSION = 1
+
+# Available scenarios, in execution order
+SCENARIOS = ['chat', 'chat_stream', 'build_messages', 'tool_loop', 'gui_stream']
+
+# Message used by every scenario
+BENCH_PROMPT = "Summarize the benefits of running language models locally in two sentences."
+
+# Tool rounds used by the tool_loop scenario when the settings do not request any
+DEFAULT_TOOL_ROUNDS = 2
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a list of numbers."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, int(round(pct / 100.0 * len(ordered))))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def _summarize(samples_seconds: List[float]) -> Dict[str, float]:
+    """Summarize timing samples (seconds) as milliseconds."""
+    ms = [s * 1000.0 for s in samples_seconds]
+    if not ms:
+        return {'mean': 0.0, 'p50': 0.0, 'p95': 0.0, 'min': 0.0, 'max': 0.0}
+    return {
+        'mean': round(sum(ms) / len(ms), 3),
+        'p50': round(_percentile(ms, 50), 3),
+        'p95': round(_percentile(ms, 95), 3),
+        'min': round(min(ms), 3),
+        'max': round(max(ms), 3),
+    }
+
+
+def _time_scenario(fn: Callable[[], Any], iterations: int, server: MockLLMServer) -> Dict[str, Any]:
+    """
+    Time a scenario function.
+
+    Args:
+        fn: Zero-argument callable running one iteration.
+        iterations: Number of timed iterations (one untimed warm-up runs first).
+        server: Mock server whose request time is subtracted from wall time.
+
+    Returns:
+        Scenario result dict.
+    """
+    fn()  # Warm-up (lazy imports, client creation, caches)
+
+    wall, server_time, overhead = [], [], []
+    requests = 0
+    for _ in range(iterations):
+        server.reset_stats()
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        stats = server.stats()
+        wall.append(elapsed)
+        server_time.append(stats['server_seconds'])
+        overhead.append(max(0.0, elapsed - stats['server_seconds']))
+        requests += stats['total_requests']
+
+    return {
+        'status': 'ok',
+        'iterations': iterations,
+        'wall_ms': _summarize(wall),
+        'server_ms': _summarize(server_time),
+        'overhead_ms': _summarize(overhead),
+        'requests_per_iteration': round(requests / iterations, 2) if iterations else 0,
+    }
+
+
+def _bench_config(base_config: Optional[Config], server: MockLLMServer) -> Config:
+    """Copy a configuration and point it at the mock server."""
+    config = copy.copy(base_config) if base_config is not None else Config()
+    config.inference_params = dict(config.inference_params)
+    config.api_base_url = server.api_base_url
+    config.api_key = "EMPTY"
+    config.server_host = server.host
+    config.server_port = server.port
+    config.default_local_server = None
+    return config
+
+
+def run_benchmarks(
+    iterations: int = 20,
+    settings: Optional[MockServerSettings] = None,
+    scenarios: Optional[List[str]] = None,
+    config: Optional[Config] = None,
+    prompt_config: Optional[PromptConfig] = None,
+) -> Dict[str, Any]:
+    """
+    Run the benchmark suite against a mock llama-server.
+
+    Args:
+        iterations: Timed iterations per scenario.
+        settings: Mock server behaviour (latency, decode rate, reply size).
+        scenarios: Scenario names to run (default: all of SCENARIOS).
+        config: Base configuration (inference params are kept; endpoint is replaced).
+        prompt_config: Prompt configuration for build_messages and GUI scenarios.
+
+    Returns:
+        Report dict with environment info and per-scenario timing summaries.
+
+    Raises:
+        ValueError: If an unknown scenario is requested or iterations < 1.
+    """
+    if iterations < 1:
+        raise ValueError("iterations must be at least 1")
+
+    selected = list(scenarios) if scenarios else list(SCENARIOS)
+    unknown = [name for name in selected if name not in SCENARIOS]
+    if unknown:
+        raise ValueError(f"Unknown benchmark scenario(s): {', '.join(unknown)}. Valid: {', '.join(SCENARIOS)}")
+
+    settings = settings or MockServerSettings()
+    if prompt_config is None:
+        prompt_config = PromptConfig()
+
+    from . import __version__
+    from .llm_runtime import LLMRuntime
+    from .model_manager import ModelManager
+
+    report: Dict[str, Any] = {
+        'report_version': REPORT_VERSION,
+        'llf_version': __version__,
+        'created': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'iterations': iterations,
+        'mock_server': {
+            'latency_ms': settings.latency_ms,
+            'tokens_per_second': settings.tokens_per_second,
+            'response_tokens': settings.response_tokens,
+            'tool_rounds': settings.tool_rounds or DEFAULT_TOOL_ROUNDS,
+        },
+        'scenarios': {},
+    }
+
+    messages = [{'role': 'user', 'content': BENCH_PROMPT}]
+
+    with MockLLMServer(settings) as server:
+        bench_config = _bench_config(config, server)
+        runtime = LLMRuntime(bench_config, ModelManager(bench_config))
+
+        def chat():
+            runtime.chat(list(messages), stream=False, use_prompt_config=False)
+
+        def chat_stream():
+            for _ in runtime.chat(list(messages), stream=True, use_prompt_config=False):
+                pass
+
+        def build_messages():
+            prompt_config.build_messages(BENCH_PROMPT, conversation_history=None)
+
+        tool_rounds = settings.tool_rounds or DEFAULT_TOOL_ROUNDS
+
+        def tool_loop():
+            runtime.chat(list(messages), stream=False, use_prompt_config=False,
+                         max_tool_iterations=tool_rounds + 1)
+
+        gui_holder: Dict[str, Any] = {}
+
+        def gui_stream():
+            gui = gui_holder.get('gui')
+            if gui is None:
+                from .gui import LLMFrameworkGUI
+                gui = LLMFrameworkGUI(config=bench_config, prompt_config=prompt_config)
+                gui.tts_enabled_state = False  # Never speak benchmark replies
+                gui_holder['gui'] = gui
+            for _ in gui.chat_respond(BENCH_PROMPT, []):
+                pass
+
+        scenario_fns = {
+            'chat': chat,
+            'chat_stream': chat_stream,
+            'build_messages': build_messages,
+            'tool_loop': tool_loop,
+            'gui_stream': gui_stream,
+        }
+
+        for name in selected:
+            logger.info(f"Running benchmark scenario: {name}")
+            original_rounds = server.settings.tool_rounds
+            server.settings.tool_rounds = tool_rounds if name == 'tool_loop' else 0
+            try:
+                report['scenarios'][name] = _time_scenario(scenario_fns[name], iterations, server)
+            except ImportError as e:
+                report['scenarios'][name] = {'status': 'skipped', 'reason': str(e)}
+            except Exception as e:
+                logger.error(f"Benchmark scenario '{name}' failed: {e}")
+                report['scenarios'][name] = {'status': 'error', 'error': str(e)}
+            finally:
+                server.settings.tool_rounds = original_rounds
+
+    return report
+
+
+def save_report(report: Dict[str, Any], output_path: Path) -> Path:
+    """
+    Write a benchmark report as JSON.
+
+    Args:
+        report: Report returned by run_benchmarks().
+        output_path: Destination file.
+
+    Returns:
+        Path to the written file.
+    """
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    return output_path
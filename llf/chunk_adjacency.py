@@ -0,0 +1,200 @@
+"""
+Chunk adjacency index for neighbour-chunk expansion.
+
+A hit that lands mid-section gives the model a fragment without the text
+around it. With the previous and next chunk of every chunk recorded, the
+retriever can widen a strong hit into a passage (see the context_packing
+"neighbor_chunks" setting) by reading metadata rows, without another vector
+search.
+
+ChunkAdjacency is a sidecar of metadata.jsonl (metadata.adjacency.npy): one
+(previous id, next id) pair per row, -1 where the chunk starts or ends its
+record. It is built from the position prepare_chunks records for every
+chunk (source JSONL file, source file, chunk index and chunk count of the
+record). Create_VectorStore.py writes it and --update extends it; a store
+without a current sidecar gets one on its first expansion.
+
+Design: prepare_chunks emits the chunks of a record one after another, so
+a record's chunks always have consecutive vector ids, and --update
+re-embeds changed sources whole. Two rows are linked when they are
+consecutive, share the record position fields and their chunk indexes
+follow each other; a lookup is then a single array read.
+"""
+
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+# Sidecar file written next to metadata.jsonl
+ADJACENCY_FILENAME = 'metadata.adjacency.npy'
+
+# No neighbour in this direction
+NO_NEIGHBOR = -1
+
+
+def adjacency_path_for(metadata_path: Path) -> Path:
+    """Get the adjacency sidecar path for a metadata.jsonl file."""
+    return Path(metadata_path).with_name(ADJACENCY_FILENAME)
+
+
+def _position(row: Dict[str, Any]) -> Optional[Tuple[Any, Any, Any, int]]:
+    """Get a row's record fields and chunk index (None for rows without a chunk position)."""
+    chunk_index = row.get('_chunk_index')
+    if not isinstance(chunk_index, int):
+        return None
+    return row.get('_source_jsonl'), row.get('source_file'), row.get('_total_chunks'), chunk_index
+
+
+class ChunkAdjacency:
+    """
+    Previous and next chunk of every metadata row.
+
+    links[i] holds the vector ids of the chunks before and after row i in
+    its record, NO_NEIGHBOR where there is none.
+    """
+
+    def __init__(self, links: np.ndarray):
+        self.links = links
+
+    def __len__(self) -> int:
+        return len(self.links)
+
+    @classmethod
+    def build(cls, rows: Iterable[Dict[str, Any]]) -> 'ChunkAdjacency':
+        """
+        Build the index from metadata rows.
+
+        Args:
+            rows: Metadata dicts in row (vector id) order
+
+        Returns:
+            ChunkAdjacency
+        """
+        return cls(np.zeros((0, 2), dtype=np.int64)).extend(rows)
+
+    def extend(self, rows: Iterable[Dict[str, Any]]) -> 'ChunkAdjacency':
+        """
+        Add rows after the last indexed row (metadata.jsonl only grows).
+
+        New rows are records of their own (--update embeds whole sources),
+        so they are only linked to each other.
+
+        Args:
+            rows: Metadata dicts of the new rows, in row order
+
+        Returns:
+            New ChunkAdjacency covering the old and new rows
+        """
+        first_id = len(self.links)
+        links = []
+        previous = None
+        for row_id, row in enumerate(rows, first_id):
+            position = _position(row)
+            links.append([NO_NEIGHBOR, NO_NEIGHBOR])
+            if (position is not None and previous is not None
+                    and position[:3] == previous[:3] and position[3] == previous[3] + 1):
+                links[-1][0] = row_id - 1
+                links[-2][1] = row_id
+            previous = position
+
+        new_links = np.array(links, dtype=np.int64).reshape(-1, 2)
+        return ChunkAdjacency(np.concatenate([np.asarray(self.links), new_links]))
+
+    def neighbor(self, row_id: int, step: int) -> Optional[int]:
+        """
+        Get the chunk before or after a chunk of the same record.
+
+        Args:
+            row_id: Vector id of the chunk
+            step: -1 for the previous chunk, 1 for the next one
+
+        Returns:
+            Vector id of the neighbour, or None at the start/end of the record
+        """
+        if not 0 <= row_id < len(self.links):
+            return None
+        neighbor = int(self.links[row_id, 0 if step < 0 else 1])
+        return None if neighbor == NO_NEIGHBOR else neighbor
+
+    def save(self, path: Path) -> None:
+        """
+        Save the index to a .npy file.
+
+        Args:
+            path: Destination file
+        """
+        with open(path, 'wb') as f:
+            np.save(f, np.asarray(self.links, dtype=np.int64))
+
+    @classmethod
+    def load(cls, path: Path) -> 'ChunkAdjacency':
+        """
+        Load an index saved by save() (memory-mapped, rows are read on demand).
+
+        Args:
+            path: Path to metadata.adjacency.npy
+
+        Returns:
+            ChunkAdjacency
+        """
+        links = np.load(path, mmap_mode='r')
+        if links.ndim != 2 or links.shape[1] != 2:
+            raise ValueError(f"Expected (rows, 2) links, got shape {links.shape}")
+        return cls(links)
+
+
+def write_adjacency(metadata_path: Path, rows: Iterable[Dict[str, Any]]) -> Path:
+    """
+    Build and write the adjacency sidecar for a metadata.jsonl file.
+
+    Args:
+        metadata_path: Path to metadata.jsonl
+        rows: Its metadata dicts, in row order
+
+    Returns:
+        Path of the written sidecar
+    """
+    path = adjacency_path_for(metadata_path)
+    tmp_path = path.with_name(path.name + '.tmp')
+    ChunkAdjacency.build(rows).save(tmp_path)
+    tmp_path.replace(path)
+    return path
+
+
+def load_adjacency(metadata_path: Path, metadata: Sequence[Dict[str, Any]],
+                   save: bool = True) -> ChunkAdjacency:
+    """
+    Load the adjacency sidecar, rebuilding it if it is missing or stale.
+
+    Args:
+        metadata_path: Path to metadata.jsonl
+        metadata: Its rows (MetadataIndex), used when the sidecar has to be rebuilt
+        save: Write a rebuilt sidecar so the next load is instant
+            (skipped if the directory is read-only)
+
+    Returns:
+        ChunkAdjacency covering every metadata row
+    """
+    path = adjacency_path_for(metadata_path)
+    try:
+        if path.exists() and path.stat().st_mtime >= Path(metadata_path).stat().st_mtime:
+            adjacency = ChunkAdjacency.load(path)
+            if len(adjacency) == len(metadata):
+                return adjacency
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable adjacency index {path}: {e}")
+
+    logger.info(f"Building chunk adjacency index for {metadata_path}")
+    adjacency = ChunkAdjacency.build(metadata)
+    if save:
+        try:
+            adjacency.save(path)
+        except OSError as e:
+            logger.warning(f"Could not save chunk adjacency index: {e}")
+    return adjacency
@@ -45,6 +45,7 @@ import signal
 from datetime import datetime, UTC
 import json
 import shutil
+import uuid
 
 from rich.console import Console
 from rich.panel import Panel
@@ -89,7 +90,7 @@ class CLI:
     Provides interactive prompt loop and command handling.
     """
 
-    def __init__(self, config: Config, prompt_config: Optional[PromptConfig] = None, auto_start_server: bool = False, no_server_start: bool = False, save_history: bool = True, imported_session: Optional[Dict[str, Any]] = None):
+    def __init__(self, config: Config, prompt_config: Optional[PromptConfig] = None, auto_start_server: bool = False, no_server_start: bool = False, save_history: bool = True, imported_session: Optional[Dict[str, Any]] = None, rag_filters: Optional[Dict[str, Any]] = None):
         """
         Initialize CLI.
 
@@ -100,6 +101,7 @@ class CLI:
             no_server_start: Do not start server if not running (exit with error).
             save_history: Save chat conversations to history (default: True).
             imported_session: Optional session data to import and continue.
+            rag_filters: Optional metadata filters restricting RAG retrieval (--rag-filter).
         """
         self.config = config
         self.prompt_config = prompt_config
@@ -111,6 +113,9 @@ class CLI:
         self.started_server = False  # Track if this instance started the server
         self.save_history = save_history
         self.imported_session = imported_session
+        self.rag_filters = rag_filters
+        # Conversation identifier used to pin requests to a llama-server slot
+        self.session_id = uuid.uuid4().hex
 
         # Initialize chat history manager
         from llf.chat_history import ChatHistory
@@ -309,6 +314,49 @@ If STT fails, the system will automatically fall back to keyboard input.
             f"- Top P: {self.config.inference_params['top_p']}",
         ])
 
+        # Prefix cache reuse (only when slot affinity is active)
+        slot_stats = self.runtime.get_slot_stats()
+        if isinstance(slot_stats, dict):
+            info_lines.extend([
+                f"\n**Slot Affinity:**",
+                f"- Slots: {slot_stats['num_slots']} ({slot_stats['sessions']} sessions)",
+                f"- Prefix Cache Hit Rate: {slot_stats['cache_hit_rate']:.1%}",
+                f"- Busy Fallbacks: {slot_stats['busy_fallbacks']}",
+            ])
+
+        # Tool routing savings (only once tools have been routed this session)
+        router_stats = self.runtime.tool_router.stats() if hasattr(self.runtime, 'tool_router') else None
+        if isinstance(router_stats, dict) and router_stats['requests']:
+            info_lines.extend([
+                f"\n**Tool Routing:**",
+                f"- Tools Offered: {router_stats['tools_offered']} of {router_stats['tools_available']} over {router_stats['requests']} requests",
+                f"- Estimated Tokens Saved: {router_stats['tokens_saved']}",
+                f"- Routing Misses (all tools re-offered): {router_stats['misses']}",
+                f"- Unoffered Tool Calls: {router_stats['unoffered_calls']}",
+            ])
+
+        # RAG warm-up time (only when a warm-up was started)
+        preload_status = self.prompt_config.get_rag_preload_status() if self.prompt_config else None
+        if isinstance(preload_status, dict) and preload_status['state'] != 'idle':
+            if preload_status['state'] == 'running':
+                info_lines.append(f"\n**RAG Warm-up:** Running")
+            else:
+                info_lines.extend([
+                    f"\n**RAG Warm-up:**",
+                    f"- Stores Loaded: {preload_status['stores']} in {preload_status['seconds']:.2f}s",
+                ])
+                if preload_status['failed']:
+                    info_lines.append(f"- Failed: {', '.join(preload_status['failed'])}")
+
+        # Knowledge base searches (only once messages have been answered)
+        retrieval_stats = self.prompt_config.get_retrieval_stats() if self.prompt_config else None
+        if isinstance(retrieval_stats, dict) and retrieval_stats['messages']:
+            info_lines.extend([
+                f"\n**Knowledge Base Retrieval:** {retrieval_stats['mode']}",
+                f"- Messages Searched: {retrieval_stats['searched']} of {retrieval_stats['messages']}",
+                f"- Searches Skipped: {retrieval_stats['skipped']}",
+            ])
+
         info_text = "\n".join(info_lines)
         console.print(Panel(info_text, title="System Information", border_style="cyan"))
 
@@ -436,6 +484,13 @@ If STT fails, the system will automatically fall back to keyboard input.
             if self.imported_session.get('metadata', {}).get('model'):
                 console.print(f"[dim]Previous model: {self.imported_session['metadata']['model']}[/dim]")
             console.print(f"[dim]Current model: {self.config.model_name}[/dim]")
+
+            # Restore the saved KV cache so the first turn only prefills the new message
+            history_session_id = self.imported_session.get('session_id')
+            if history_session_id:
+                restored = self.runtime.restore_session_snapshot(self.session_id, history_session_id)
+                if restored:
+                    console.print(f"[dim]Restored KV cache snapshot ({restored} tokens)[/dim]")
             console.print()
         else:
             conversation_history = []
@@ -501,6 +556,10 @@ If STT fails, the system will automatically fall back to keyboard input.
                     console.clear()
                     self.print_welcome()
                     conversation_history = []  # Clear conversation history
+                    # Start a new session so the old slot can be reused by others
+                    if self.runtime.slot_affinity:
+                        self.runtime.slot_affinity.forget(self.session_id)
+                    self.session_id = uuid.uuid4().hex
                     continue
 
                 # Print separator line
@@ -538,7 +597,7 @@ If STT fails, the system will automatically fall back to keyboard input.
                         import threading
 
                         # Pass 1: Streaming response for user (no tools)
-                        stream = self.runtime.chat(conversation_history, stream=True, use_prompt_config=False)
+                        stream = self.runtime.chat(conversation_history, stream=True, use_prompt_config=False, session_id=self.session_id)
 
                         # Collect response chunks for history
                         response_chunks = []
@@ -554,7 +613,8 @@ If STT fails, the system will automatically fall back to keyboard input.
                         def execute_with_tools():
                             try:
                                 # Run the same request with tools enabled
-                                self.runtime.chat(conversation_history, stream=False)
+                                self.runtime.chat(conversation_history, stream=False, session_id=self.session_id,
+                                                  rag_filters=self.rag_filters)
                             except Exception as e:
                                 logger.warning(f"Background tool execution failed: {e}")
 
@@ -564,12 +624,14 @@ If STT fails, the system will automatically fall back to keyboard input.
 
                     elif tools_available:
                         # Single-pass mode with tools (no streaming, accurate)
-                        response = self.runtime.chat(conversation_history, stream=False)
+                        response = self.runtime.chat(conversation_history, stream=False, session_id=self.session_id,
+                                                  rag_filters=self.rag_filters)
                         console.print(response, markup=False)
                         response_chunks = [response]
                     else:
                         # Streaming mode (no tools available)
-                        stream = self.runtime.chat(conversation_history, stream=True)
+                        stream = self.runtime.chat(conversation_history, stream=True, session_id=self.session_id,
+                                                   rag_filters=self.rag_filters)
 
                         # Collect response chunks for history
                         response_chunks = []
@@ -636,6 +698,10 @@ If STT fails, the system will automatically fall back to keyboard input.
                 # Save to history
                 filepath = self.chat_history.save_session(conversation_history, metadata)
                 console.print(f"[dim]Conversation saved to: {filepath.name}[/dim]")
+
+                # Save the conversation's KV cache for instant resume (if slot-save-path is configured)
+                if self.runtime.save_session_snapshot(self.session_id, filepath.stem, self.chat_history.history_dir):
+                    console.print("[dim]KV cache snapshot saved for fast resume[/dim]")
             except Exception as e:
                 logger.warning(f"Failed to save chat history: {e}")
 
@@ -673,7 +739,7 @@ If STT fails, the system will automatically fall back to keyboard input.
             messages = [{'role': 'user', 'content': question}]
 
             # Generate response (non-streaming for CLI mode)
-            response = self.runtime.chat(messages, stream=False)
+            response = self.runtime.chat(messages, stream=False, rag_filters=self.rag_filters)
 
             # Print response
             console.print(response)
@@ -713,6 +779,10 @@ If STT fails, the system will automatically fall back to keyboard input.
             Exit code (0 for success, non-zero for errors).
         """
         try:
+            # Warm up RAG stores while the server starts (opt-in in the data store registry)
+            if self.prompt_config:
+                self.prompt_config.start_rag_preload()
+
             # CLI mode: single question and exit
             if cli_question:
                 return self.cli_question(cli_question)
@@ -1641,6 +1711,16 @@ def chat_history_cleanup_command(config: Config, args) -> int:
     else:
         console.print(f"\n[green]✓ Cleaned up {deleted_count} sessions[/green]")
 
+        # Remove KV cache snapshots that belonged to deleted sessions
+        snapshot_dir = config.get_slot_save_path()
+        if isinstance(snapshot_dir, Path) and snapshot_dir.exists():
+            from llf.kv_snapshots import KVSnapshotStore
+            store = KVSnapshotStore(snapshot_dir, max_total_bytes=config.kv_snapshot_max_bytes,
+                                    max_age_days=config.kv_snapshot_max_age_days)
+            removed = store.collect_garbage(history_dir=history_dir)
+            if removed:
+                console.print(f"[dim]Removed {len(removed)} KV cache snapshots[/dim]")
+
     return 0
 
 
@@ -1781,6 +1861,142 @@ def chat_export_command(config: Config, args) -> int:
         return 1
 
 
+def bench_command(config: Config, prompt_config: Optional[PromptConfig], args) -> int:
+    """
+    Run the offline benchmark suite against a mock llama-server.
+
+    Args:
+        config: Configuration instance.
+        prompt_config: Prompt configuration used by build_messages and GUI scenarios.
+        args: Parsed command-line arguments.
+
+    Returns:
+        Exit code.
+    """
+    from rich.table import Table
+    from llf.benchmark import run_benchmarks, save_report
+    from llf.mock_llm_server import MockServerSettings
+
+    # run_benchmarks treats 0 as "not set" (the mock server default), so it is rejected here
+    if args.tool_rounds < 1:
+        console.print("[red]Error:[/red] --tool-rounds must be at least 1")
+        return 1
+
+    settings = MockServerSettings(
+        latency_ms=args.latency_ms,
+        tokens_per_second=args.tokens_per_second,
+        response_tokens=args.response_tokens,
+        tool_rounds=args.tool_rounds,
+    )
+
+    try:
+        console.print(f"[cyan]Running LLF benchmarks ({args.iterations} iterations per scenario)...[/cyan]")
+        report = run_benchmarks(
+            iterations=args.iterations,
+            settings=settings,
+            scenarios=args.scenario,
+            config=config,
+            prompt_config=prompt_config,
+        )
+    except ValueError as e:
+        console.print(f"[red]Error:[/red] {e}")
+        return 1
+
+    table = Table(show_header=True, header_style="bold cyan")
+    table.add_column("SCENARIO", style="green")
+    table.add_column("STATUS")
+    table.add_column("WALL p50 (ms)", justify="right")
+    table.add_column("OVERHEAD p50 (ms)", justify="right")
+    table.add_column("OVERHEAD p95 (ms)", justify="right")
+    table.add_column("REQUESTS", justify="right")
+
+    failed = False
+    for name, result in report['scenarios'].items():
+        status = result.get('status')
+        if status == 'ok':
+            table.add_row(
+                name,
+                "[green]ok[/green]",
+                f"{result['wall_ms']['p50']:.2f}",
+                f"{result['overhead_ms']['p50']:.2f}",
+                f"{result['overhead_ms']['p95']:.2f}",
+                f"{result['requests_per_iteration']:g}",
+            )
+        else:
+            failed = failed or status == 'error'
+            detail = result.get('reason') or result.get('error', '')
+            table.add_row(name, f"[yellow]{status}[/yellow]", "-", "-", "-", f"[dim]{detail}[/dim]")
+
+    console.print(table)
+
+    if args.output:
+        output_path = save_report(report, args.output)
+        console.print(f"[green]✓ Benchmark report saved to: {output_path}[/green]")
+
+    return 1 if failed else 0
+
+
+def datastore_bench_command(args, registry_path: Path) -> int:
+    """
+    Benchmark retrieval of data stores on a labelled query set.
+
+    Args:
+        args: Parsed command-line arguments (datastore_name, queries, sweep, output).
+        registry_path: Path to data_store_registry.json.
+
+    Returns:
+        Exit code.
+    """
+    from rich.table import Table
+    from llf.benchmark import save_report
+    from llf.retrieval_bench import load_queries, parse_sweep, run_retrieval_bench
+
+    if not args.datastore_name or not args.queries:
+        console.print("[red]Error:[/red] Data store name and --queries required for bench command")
+        console.print("[dim]Usage: llf datastore bench DATA_STORE_NAME[,NAME...] --queries FILE.jsonl "
+                      "[--sweep KEY=V1,V2 ...][/dim]")
+        return 1
+
+    store_names = [name.strip() for name in args.datastore_name.split(',') if name.strip()]
+    try:
+        queries = load_queries(args.queries)
+        sweep = parse_sweep(args.sweep or [])
+        console.print(f"[cyan]Benchmarking {len(store_names)} data store(s) on {len(queries)} queries...[/cyan]")
+        report = run_retrieval_bench(store_names, queries, sweep=sweep, registry_path=registry_path)
+    except (OSError, ValueError) as e:
+        console.print(f"[red]Error:[/red] {e}")
+        return 1
+
+    for name, result in report['stores'].items():
+        memory = result['memory_bytes']
+        console.print(f"\n[bold]{name}[/bold] ({result['num_vectors']} vectors, {result['index_type']})")
+        console.print(f"Load time: {result['load_seconds']:.2f}s   "
+                      f"Memory: {f'{memory / 1024 ** 2:.1f} MB' if memory is not None else 'n/a'}   "
+                      f"Disk: {result['disk_bytes'] / 1024 ** 2:.1f} MB")
+
+        table = Table(show_header=True, header_style="bold cyan")
+        table.add_column("SETTINGS", style="green")
+        table.add_column("RECALL@K", justify="right")
+        table.add_column("MRR", justify="right")
+        table.add_column("p50 (ms)", justify="right")
+        table.add_column("p95 (ms)", justify="right")
+        for configuration in result['configurations']:
+            table.add_row(
+                ", ".join(f"{key}={value}" for key, value in configuration['settings'].items()),
+                f"{configuration['recall']:.3f}",
+                f"{configuration['mrr']:.3f}",
+                f"{configuration['p50_ms']:.2f}",
+                f"{configuration['p95_ms']:.2f}",
+            )
+        console.print(table)
+
+    if args.output:
+        output_path = save_report(report, args.output)
+        console.print(f"[green]✓ Benchmark report saved to: {output_path}[/green]")
+
+    return 0
+
+
 def main():
     """Main entry point for CLI application."""
     parser = argparse.ArgumentParser(
@@ -1881,6 +2097,7 @@ Examples:
   llf datastore detach DATA_STORE_NAME    Detach data store
   llf datastore detach all                Detach all data stores
   llf datastore info DATA_STORE_NAME      Show data store information
+  llf datastore bench NAME --queries FILE Benchmark retrieval (recall@k, MRR, latency)
 
   # Memory management
   llf memory list                         List all memory instances
@@ -1945,6 +2162,12 @@ Examples:
   llf dev create-tool                         Create a new tool with interactive wizard
   llf dev validate-tool TOOL_NAME             Validate tool structure and configuration
 
+  # Benchmarks (offline, against a mock llama-server)
+  llf bench                                   Measure LLF overhead for all scenarios
+  llf bench --scenario chat --scenario tool_loop   Run selected scenarios only
+  llf bench --latency-ms 200 --tokens-per-second 20   Simulate a slow model
+  llf bench --output bench.json               Save a machine-readable report
+
   # Global Configuration Flags (use with any command)
   llf --log-level DEBUG chat                           Enable debug logging for chat
   llf --log-level DEBUG --log-file debug.log chat      Log chat session to file
@@ -2025,6 +2248,10 @@ Examples:
   llf chat --cli "What is 2+2?"                Ask a single question and exit
   cat file.txt | llf chat --cli "Summarize this"  Pipe data to LLM with question
 
+  # Restrict knowledge base retrieval (repeat --rag-filter to combine)
+  llf chat --rag-filter source_file=manual.pdf
+  llf chat --cli "How do I reset it?" --rag-filter tags=api --rag-filter date_from=2024-01-01
+
   # Resume and import conversations
   llf chat --continue-session SESSION_ID       Continue from a saved session ID
   llf chat --import-session path/to/chat.json  Import external session (JSON/MD/TXT)
@@ -2100,6 +2327,13 @@ Examples:
         metavar='QUESTION',
         help='Non-interactive mode: ask a single question and exit (for scripting)'
     )
+    chat_parser.add_argument(
+        '--rag-filter',
+        metavar='KEY=VALUE',
+        action='append',
+        help='Only retrieve knowledge base chunks matching a metadata filter: source_file, tags, '
+             'date_from or date_to (YYYY-MM-DD); comma-separate alternatives, repeat to combine keys'
+    )
 
     # Chat subcommands for history and export management
     chat_subparsers = chat_parser.add_subparsers(
@@ -2545,6 +2779,10 @@ actions:
   detach DATA_STORE_NAME    Detach data store
   detach all                Detach all data stores
   info DATA_STORE_NAME      Show data store information
+  bench DATA_STORE_NAME[,NAME...] --queries FILE [--sweep KEY=V1,V2 ...] [--output FILE]
+                            Benchmark retrieval: recall@k, MRR, p50/p95 latency, load time
+                            and memory per configuration (sweep keys: top_k_results,
+                            similarity_threshold, search_mode, nprobe, efSearch, rescore_factor)
         ''',
         formatter_class=argparse.RawDescriptionHelpFormatter
     )
@@ -2563,6 +2801,24 @@ actions:
         action='store_true',
         help='List only attached data stores (use with list action)'
     )
+    datastore_parser.add_argument(
+        '--queries',
+        type=Path,
+        metavar='FILE',
+        help='JSONL file of queries with expected_ids/expected_sources (use with bench action)'
+    )
+    datastore_parser.add_argument(
+        '--sweep',
+        action='append',
+        metavar='KEY=V1,V2',
+        help='Registry setting values to compare, repeatable (use with bench action)'
+    )
+    datastore_parser.add_argument(
+        '--output',
+        type=Path,
+        metavar='FILE',
+        help='Write the JSON benchmark report to FILE (use with bench action)'
+    )
 
     # Module command
     module_parser = subparsers.add_parser(
@@ -2868,6 +3124,61 @@ Examples:
         help=argparse.SUPPRESS  # Tool name for validate-tool action
     )
 
+    bench_parser = subparsers.add_parser(
+        'bench',
+        help='Benchmark LLF Overhead',
+        description='Measure LLF overhead (chat, streaming, prompt building, tool loop, GUI streaming) '
+                    'against a local mock llama-server, separately from model speed.',
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    bench_parser.add_argument(
+        '--iterations',
+        type=int,
+        default=20,
+        metavar='N',
+        help='Timed iterations per scenario (default: 20)'
+    )
+    bench_parser.add_argument(
+        '--scenario',
+        action='append',
+        choices=['chat', 'chat_stream', 'build_messages', 'tool_loop', 'gui_stream'],
+        help='Scenario to run (repeatable, default: all)'
+    )
+    bench_parser.add_argument(
+        '--latency-ms',
+        type=float,
+        default=0.0,
+        metavar='MS',
+        help='Simulated prefill latency of the mock server (default: 0)'
+    )
+    bench_parser.add_argument(
+        '--tokens-per-second',
+        type=float,
+        default=0.0,
+        metavar='RATE',
+        help='Simulated decode rate of the mock server, 0 = unlimited (default: 0)'
+    )
+    bench_parser.add_argument(
+        '--response-tokens',
+        type=int,
+        default=32,
+        metavar='N',
+        help='Tokens in each mock reply (default: 32)'
+    )
+    bench_parser.add_argument(
+        '--tool-rounds',
+        type=int,
+        default=2,
+        metavar='N',
+        help='Tool calls requested per turn in the tool_loop scenario (default: 2)'
+    )
+    bench_parser.add_argument(
+        '--output',
+        type=Path,
+        metavar='FILE',
+        help='Write the JSON report to FILE'
+    )
+
     # Parse arguments
     args = parser.parse_args()
 
@@ -3407,6 +3718,18 @@ finally:
                 console.print(f"Embedding Model: {embedding_model}")
                 console.print(f"Number of Vectors: {num_vectors}")
 
+                # Vector storage and sharding recorded by Create_VectorStore.py (--storage, --shards)
+                store_config_file = Path(vector_store_path) / 'config.json'
+                if store_config_file.exists():
+                    with open(store_config_file, 'r') as f:
+                        store_config = json.load(f)
+                    console.print(f"Storage: {store_config.get('storage', 'float32')}")
+                    if store_config.get('shards', 1) > 1:
+                        console.print(f"Shards: {store_config['shards']}")
+                    if store_config.get('storage_report'):
+                        from .vector_index import format_storage_report
+                        console.print(f"[dim]{format_storage_report(store_config['storage_report'])}[/dim]")
+
             except FileNotFoundError:
                 console.print(f"[red]Error:[/red] Data store registry not found at {datastore_registry_path}")
                 return 1
@@ -3463,6 +3786,8 @@ finally:
                 embedding_dimension = config.get('embedding_dimension')
                 num_vectors = config.get('num_vectors', 0)
                 index_type = config.get('index_type', 'IndexFlatIP')
+                # Stores built with --bm25 default to hybrid (keyword + semantic) search
+                search_mode = 'hybrid' if (datastore_dir / 'bm25.npz').exists() else 'semantic'
 
                 if not embedding_model or not embedding_dimension:
                     console.print(f"[red]Error:[/red] Invalid config.json - missing embedding_model or embedding_dimension")
@@ -3512,7 +3837,7 @@ finally:
                     "metadata": {
                         "source_type": "general",
                         "content_description": "general documentation",
-                        "search_mode": "semantic"
+                        "search_mode": search_mode
                     }
                 }
 
@@ -3724,9 +4049,12 @@ finally:
                 console.print(f"[red]Error:[/red] Failed to delete data store: {e}")
                 return 1
 
+        elif action == 'bench':
+            return datastore_bench_command(args, datastore_registry_path)
+
         else:
             console.print(f"[red]Error:[/red] Unknown action '{action}'")
-            console.print("[dim]Available actions: list, attach, detach, info, import, export, delete[/dim]")
+            console.print("[dim]Available actions: list, attach, detach, info, import, export, delete, bench[/dim]")
             return 1
 
         return 0
@@ -5324,6 +5652,9 @@ Contains the memory data files
             console.print("\nValid actions: create-tool, validate-tool")
             return 1
 
+    elif args.command == 'bench':
+        return bench_command(config, prompt_config, args)
+
     elif args.command == 'chat' or args.command is None:
         # Check if this is a chat subcommand (history or export)
         chat_action = getattr(args, 'chat_action', None)
@@ -5367,6 +5698,18 @@ Contains the memory data files
         # Get CLI question if provided
         cli_question = getattr(args, 'cli', None)
 
+        # Metadata filters for RAG retrieval
+        rag_filters = None
+        rag_filter_expressions = getattr(args, 'rag_filter', None)
+        if isinstance(rag_filter_expressions, list) and rag_filter_expressions:
+            from llf.metadata_filter import describe_filters, parse_filter_expressions
+            try:
+                rag_filters = parse_filter_expressions(rag_filter_expressions)
+            except ValueError as e:
+                console.print(f"[red]Invalid --rag-filter: {e}[/red]")
+                return 1
+            console.print(f"[dim]Knowledge base filter: {describe_filters(rag_filters)}[/dim]")
+
         # Handle session continuation and import
         imported_session = None
         continue_session_id = getattr(args, 'continue_session', None)
@@ -5412,7 +5755,7 @@ Contains the memory data files
                     return 1
 
         # Default to chat
-        cli = CLI(config, prompt_config=prompt_config, auto_start_server=auto_start, no_server_start=no_start, save_history=save_history, imported_session=imported_session)
+        cli = CLI(config, prompt_config=prompt_config, auto_start_server=auto_start, no_server_start=no_start, save_history=save_history, imported_session=imported_session, rag_filters=rag_filters)
         return cli.run(cli_question=cli_question)
     else:
         parser.print_help()
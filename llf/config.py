@@ -13,6 +13,8 @@ from typing import Dict, Any, Optional, List
 from dataclasses import dataclass, field
 import json
 
+from .kv_snapshots import DEFAULT_MAX_AGE_DAYS, DEFAULT_MAX_TOTAL_BYTES
+
 
 @dataclass
 class ServerConfig:
@@ -107,6 +109,11 @@ class Config:
         self.server_params = {}  # Additional llama-server parameters (optional)
         self._has_local_server_section = False  # Track if local_llm_servers was in config file
         self.tool_execution_mode = self.DEFAULT_TOOL_EXECUTION_MODE  # Tool execution mode
+        self.turn_timeout: Optional[float] = None  # Time budget (seconds) for one chat turn
+        self.tool_routing: bool = False  # Send only tools relevant to each message (opt-in)
+        # KV cache snapshot garbage collection (slot-save-path)
+        self.kv_snapshot_max_bytes: int = DEFAULT_MAX_TOTAL_BYTES
+        self.kv_snapshot_max_age_days: Optional[int] = DEFAULT_MAX_AGE_DAYS
 
         # Multi-server support
         self.servers: Dict[str, ServerConfig] = {}  # Dictionary of server configurations by name
@@ -256,6 +263,18 @@ class Config:
                             f"Invalid tool_execution_mode '{mode}'. "
                             f"Must be one of: {', '.join(self.VALID_TOOL_EXECUTION_MODES)}"
                         )
+                # Per-turn time budget covering RAG, tool calls and generation (optional)
+                if endpoint_config.get('turn_timeout') is not None:
+                    turn_timeout = endpoint_config['turn_timeout']
+                    if not isinstance(turn_timeout, (int, float)) or turn_timeout <= 0:
+                        raise ValueError(f"Invalid turn_timeout '{turn_timeout}'. Must be a positive number of seconds")
+                    self.turn_timeout = float(turn_timeout)
+                # Tool routing - attach only the tools relevant to each message
+                if 'tool_routing' in endpoint_config:
+                    tool_routing = endpoint_config['tool_routing']
+                    if not isinstance(tool_routing, bool):
+                        raise ValueError(f"Invalid tool_routing '{tool_routing}'. Must be true or false")
+                    self.tool_routing = tool_routing
             else:
                 # Fallback to flat structure for backward compatibility with older config files
                 self.api_base_url = config_data.get('api_base_url', self.api_base_url)
@@ -289,6 +308,25 @@ class Config:
             if 'inference_params' in config_data:
                 self.inference_params = config_data['inference_params'].copy()
 
+            # ===== KV Cache Snapshots =====
+            # Limits for the snapshots saved in slot-save-path (oldest removed first)
+            if 'kv_snapshots' in config_data:
+                snapshot_config = config_data['kv_snapshots']
+                if not isinstance(snapshot_config, dict):
+                    raise ValueError("Invalid kv_snapshots. Must be an object")
+                if 'max_size_gb' in snapshot_config:
+                    max_size_gb = snapshot_config['max_size_gb']
+                    if isinstance(max_size_gb, bool) or not isinstance(max_size_gb, (int, float)) or max_size_gb <= 0:
+                        raise ValueError(f"Invalid kv_snapshots.max_size_gb '{max_size_gb}'. Must be a positive number")
+                    self.kv_snapshot_max_bytes = int(max_size_gb * 1024 ** 3)
+                if 'max_age_days' in snapshot_config:
+                    max_age_days = snapshot_config['max_age_days']
+                    if max_age_days is not None and (isinstance(max_age_days, bool)
+                                                     or not isinstance(max_age_days, int) or max_age_days < 1):
+                        raise ValueError(f"Invalid kv_snapshots.max_age_days '{max_age_days}'. "
+                                         f"Must be a positive integer or null")
+                    self.kv_snapshot_max_age_days = max_age_days
+
             # ===== Logging Configuration =====
             self.log_level = config_data.get('log_level', self.log_level)
 
@@ -312,6 +350,26 @@ class Config:
         """
         return f"http://{self.server_host}:{self.server_port}"
 
+    def get_slot_save_path(self, server_params: Optional[Dict[str, Any]] = None) -> Optional[Path]:
+        """
+        Get the directory llama-server saves slot KV caches to.
+
+        Read from 'slot-save-path' in server_params. Relative paths are
+        resolved against the project root.
+
+        Args:
+            server_params: Server parameters to read. If None, uses the active server's.
+
+        Returns:
+            Absolute path, or None if slot saving is not configured.
+        """
+        params = self.server_params if server_params is None else server_params
+        value = params.get('slot-save-path') if isinstance(params, dict) else None
+        if not value:
+            return None
+        path = Path(value).expanduser()
+        return path if path.is_absolute() else self.PROJECT_ROOT / path
+
     def get_openai_api_base(self) -> str:
         """
         Get the OpenAI-compatible API base URL.
@@ -554,12 +612,22 @@ class Config:
         }
         if self.default_local_server:
             endpoint_dict['default_local_server'] = self.default_local_server
+        if self.turn_timeout:
+            endpoint_dict['turn_timeout'] = self.turn_timeout
+        if self.tool_routing:
+            endpoint_dict['tool_routing'] = True
         config_dict['llm_endpoint'] = endpoint_dict
 
         # Other configuration
         config_dict['model_dir'] = str(self.model_dir)
         config_dict['cache_dir'] = str(self.cache_dir)
         config_dict['inference_params'] = self.inference_params
+        if (self.kv_snapshot_max_bytes, self.kv_snapshot_max_age_days) != (DEFAULT_MAX_TOTAL_BYTES,
+                                                                           DEFAULT_MAX_AGE_DAYS):
+            config_dict['kv_snapshots'] = {
+                'max_size_gb': self.kv_snapshot_max_bytes / 1024 ** 3,
+                'max_age_days': self.kv_snapshot_max_age_days,
+            }
         config_dict['log_level'] = self.log_level
 
         return config_dict
@@ -0,0 +1,384 @@
+"""
+Token-budgeted packing of retrieved chunks into RAG context.
+
+Chunks built with an overlap often come back as near-duplicate neighbours,
+and cutting the formatted context at a character limit drops the end of a
+chunk mid-sentence. pack_context instead builds the context from whole
+chunks:
+
+- Maximal marginal relevance (MMR) orders the candidates, trading rank
+  against similarity to the chunks already chosen, and drops chunks that
+  are near-duplicates of one already chosen
+- Adjacent chunks of the same record (consecutive vector ids and chunk
+  indexes) are merged into one passage with their overlap removed, so the
+  shared text and the source header are sent once
+- Passages are added while the estimated token count fits the budget; one
+  that does not fit is skipped so a shorter, lower-ranked one can still be
+  used. Only when not even the best chunk fits is it cut, at a paragraph or
+  sentence boundary
+- With neighbour expansion, the packed passages are then widened by the
+  chunks before and after them in their record (one chunk per side and
+  round, best passage first) while the budget allows
+
+get_context_window reads the model's per-request context size from the
+llama-server parameters, so the budget can follow the model actually loaded.
+
+Design: Relevance is the candidate's position in the list it is given
+(already ranked by similarity, rank fusion or a reranker), because the raw
+scores of different stores and retrievers are not comparable. Similarity is
+the Jaccard overlap of the chunks' BM25 terms, so no embedding has to be
+kept or recomputed. Tokens are estimated at about 4 characters per token,
+as for tool schemas; no tokenizer is loaded for it.
+"""
+
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .lexical_index import tokenize
+from .logging_config import get_logger
+from .slot_affinity import get_slot_count
+
+logger = get_logger(__name__)
+
+
+# Default packing configuration (registry "context_packing" section)
+DEFAULT_PACKING_CONFIG = {
+    "mmr_lambda": 0.7,
+    "duplicate_threshold": 0.9,
+    "context_share": 0.5,
+    "merge_adjacent": True,
+    "neighbor_chunks": 0
+}
+
+# Rough characters per token for budgeting (matches tool schema estimates)
+CHARS_PER_TOKEN = 4
+
+# server_params keys that set the llama-server context size
+CTX_SIZE_PARAM_KEYS = ('ctx-size', 'c', '-c', '--ctx-size')
+
+# Shortest suffix/prefix match treated as chunk overlap when the overlap is not recorded
+MIN_OVERLAP_CHARS = 20
+MAX_OVERLAP_CHARS = 4000
+
+TRUNCATION_MARKER = "[Context truncated due to length limit]"
+
+# Gets the chunk before (step -1) or after (step 1) a result in its record, or None
+NeighborLookup = Callable[[Dict[str, Any], int], Optional[Dict[str, Any]]]
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Approximate the number of tokens in text (about 4 characters per token).
+
+    Args:
+        text: Text to measure
+
+    Returns:
+        Estimated token count
+    """
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def get_context_window(server_params: Optional[Dict[str, Any]], max_tokens: Optional[int] = None) -> Optional[int]:
+    """
+    Get the prompt tokens available per request from the llama-server parameters.
+
+    llama-server splits its context between its slots, and the reply has to
+    fit in the same window as the prompt.
+
+    Args:
+        server_params: Server parameters from the local_llm_servers config
+        max_tokens: Tokens reserved for the reply (None = nothing reserved)
+
+    Returns:
+        Prompt tokens per request, or None if the context size is not configured
+    """
+    if not isinstance(server_params, dict):
+        return None
+
+    for key in CTX_SIZE_PARAM_KEYS:
+        if key in server_params:
+            try:
+                ctx_size = int(server_params[key])
+            except (TypeError, ValueError):
+                logger.warning(f"Ignoring invalid context size in server_params: {key}={server_params[key]!r}")
+                return None
+            break
+    else:
+        return None
+
+    # 0 means "use the model's trained context", which is not known here
+    if ctx_size <= 0:
+        return None
+
+    window = ctx_size // max(1, get_slot_count(server_params))
+    if isinstance(max_tokens, int) and max_tokens > 0:
+        window -= max_tokens
+    return max(0, window)
+
+
+def is_adjacent(first: Dict[str, Any], second: Dict[str, Any]) -> bool:
+    """
+    Check whether second is the chunk that directly follows first in its record.
+
+    Args:
+        first: Result dict
+        second: Result dict
+
+    Returns:
+        True if both come from the same store and source with consecutive
+        vector ids and chunk indexes
+    """
+    if None in (first.get('id'), second.get('id'), first.get('chunk_index'), second.get('chunk_index')):
+        return False
+    return (second['id'] == first['id'] + 1
+            and second['chunk_index'] == first['chunk_index'] + 1
+            and first.get('store_name') == second.get('store_name')
+            and first.get('source_file') == second.get('source_file'))
+
+
+def merge_text(first: str, second: str, overlap: Optional[int] = None) -> str:
+    """
+    Join two consecutive chunks, keeping their shared text once.
+
+    Args:
+        first: Earlier chunk
+        second: Following chunk
+        overlap: Characters the chunks were built to share (None = find the overlap)
+
+    Returns:
+        Merged text
+    """
+    if overlap and overlap <= min(len(first), len(second)) and first.endswith(second[:overlap]):
+        return first + second[overlap:]
+
+    for size in range(min(len(first), len(second), MAX_OVERLAP_CHARS), MIN_OVERLAP_CHARS - 1, -1):
+        if first.endswith(second[:size]):
+            return first + second[size:]
+    return f"{first.rstrip()}\n{second.lstrip()}"
+
+
+def truncate_text(text: str, max_chars: int) -> str:
+    """
+    Cut text to at most max_chars, preferring a paragraph or sentence boundary.
+
+    Args:
+        text: Text to cut
+        max_chars: Maximum length
+
+    Returns:
+        Cut text (text itself if it already fits)
+    """
+    if len(text) <= max_chars:
+        return text
+
+    head = text[:max_chars]
+    for boundary in ("\n\n", "\n", ". ", "? ", "! "):
+        position = head.rfind(boundary)
+        # Only cut at a boundary that keeps most of the allowed text
+        if position >= max_chars // 2:
+            return head[:position + 1].rstrip()
+    return head
+
+
+def _similarity(first: frozenset, second: frozenset) -> float:
+    """Jaccard overlap of two term sets."""
+    if not first or not second:
+        return 0.0
+    return len(first & second) / len(first | second)
+
+
+def mmr_order(candidates: Sequence[Dict[str, Any]], mmr_lambda: float = DEFAULT_PACKING_CONFIG['mmr_lambda'],
+              duplicate_threshold: float = DEFAULT_PACKING_CONFIG['duplicate_threshold']) -> Iterator[int]:
+    """
+    Order candidates by maximal marginal relevance.
+
+    Each step picks the candidate with the best
+    mmr_lambda * relevance - (1 - mmr_lambda) * (similarity to the picked ones).
+    Adjacent chunks are not compared with each other: their shared text is
+    removed when they are merged rather than counted against them.
+
+    Args:
+        candidates: Result dicts with a 'text' key, best first
+        mmr_lambda: 1.0 keeps the ranking; lower values favour diversity
+        duplicate_threshold: Candidates at least this similar to a picked one are dropped
+
+    Yields:
+        Candidate positions, in packing order
+    """
+    count = len(candidates)
+    terms = [frozenset(tokenize(candidate.get('text', ''))) for candidate in candidates]
+    max_similarity = [0.0] * count
+    remaining = list(range(count))
+
+    while remaining:
+        best = max(remaining, key=lambda i: mmr_lambda * (count - i) / count - (1.0 - mmr_lambda) * max_similarity[i])
+        remaining.remove(best)
+        yield best
+
+        kept = []
+        for i in remaining:
+            if not (is_adjacent(candidates[best], candidates[i]) or is_adjacent(candidates[i], candidates[best])):
+                max_similarity[i] = max(max_similarity[i], _similarity(terms[best], terms[i]))
+            if max_similarity[i] >= duplicate_threshold:
+                logger.debug(f"Dropping near-duplicate chunk at rank {i + 1} (similarity {max_similarity[i]:.2f})")
+            else:
+                kept.append(i)
+        remaining = kept
+
+
+def _merge_block(block: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Combine a run of adjacent chunks (in record order) into one result dict."""
+    if len(block) == 1:
+        return block[0]
+
+    merged = dict(max(block, key=lambda result: result.get('score', 0.0)))
+    text = block[0].get('text', '')
+    for result in block[1:]:
+        text = merge_text(text, result.get('text', ''), result.get('chunk_overlap'))
+    merged['text'] = text
+    merged['score'] = max(result.get('score', 0.0) for result in block)
+
+    # Keyword-only when no chunk of the passage matched semantically
+    matches = [result.get('match') for result in block]
+    if merged.get('match') == 'keyword' and any(match != 'keyword' for match in matches):
+        merged['match'] = next(match for match in matches if match != 'keyword')
+    return merged
+
+
+def _join_adjacent(blocks: List[List[Dict[str, Any]]]) -> None:
+    """Join passages whose chunks follow each other (a chunk filled the gap between them)."""
+    for i in range(len(blocks) - 1, 0, -1):
+        for j in range(len(blocks)):
+            if j != i and is_adjacent(blocks[j][-1], blocks[i][0]):
+                blocks[j].extend(blocks.pop(i))
+                break
+
+
+def _expand_blocks(blocks: List[List[Dict[str, Any]]], neighbors: NeighborLookup, rounds: int,
+                   fits: Callable[[List[List[Dict[str, Any]]]], bool],
+                   merge_adjacent: bool) -> Tuple[List[List[Dict[str, Any]]], int]:
+    """
+    Widen passages by the chunks around them while they fit.
+
+    Args:
+        blocks: Runs of adjacent chunks, in packing order
+        neighbors: Gets the chunk before (-1) or after (1) a chunk, or None
+        rounds: Chunks to add on each side of a passage at most
+        fits: Whether a list of blocks fits the budget
+        merge_adjacent: Join passages that meet after a round
+
+    Returns:
+        Tuple of (blocks, number of chunks added)
+    """
+    used = {(result.get('store_name'), result.get('id')) for block in blocks for result in block}
+    added = 0
+    for _ in range(rounds):
+        grown = False
+        for i in range(len(blocks)):
+            for step in (-1, 1):
+                neighbor = neighbors(blocks[i][0] if step < 0 else blocks[i][-1], step)
+                if neighbor is None or (neighbor.get('store_name'), neighbor.get('id')) in used:
+                    continue
+                trial = [list(block) for block in blocks]
+                if step < 0:
+                    trial[i].insert(0, neighbor)
+                else:
+                    trial[i].append(neighbor)
+                if fits(trial):
+                    blocks = trial
+                    used.add((neighbor.get('store_name'), neighbor.get('id')))
+                    added += 1
+                    grown = True
+        if not grown:
+            break
+        if merge_adjacent:
+            _join_adjacent(blocks)
+    return blocks, added
+
+
+def pack_context(candidates: Sequence[Dict[str, Any]], budget_tokens: int,
+                 format_context: Callable[[List[Dict[str, Any]]], str],
+                 max_results: Optional[int] = None,
+                 mmr_lambda: float = DEFAULT_PACKING_CONFIG['mmr_lambda'],
+                 duplicate_threshold: float = DEFAULT_PACKING_CONFIG['duplicate_threshold'],
+                 merge_adjacent: bool = DEFAULT_PACKING_CONFIG['merge_adjacent'],
+                 neighbors: Optional[NeighborLookup] = None,
+                 neighbor_chunks: int = DEFAULT_PACKING_CONFIG['neighbor_chunks']) -> List[Dict[str, Any]]:
+    """
+    Select and merge chunks into passages that fit a token budget.
+
+    Args:
+        candidates: Result dicts with a 'text' key, best first
+        budget_tokens: Maximum estimated tokens of the formatted context
+        format_context: Formats a list of passages the way they are sent to the model
+        max_results: Maximum number of chunks to use (None = no limit)
+        mmr_lambda: Relevance/diversity trade-off (see mmr_order)
+        duplicate_threshold: Similarity at which a chunk counts as a duplicate
+        merge_adjacent: Merge consecutive chunks of the same record
+        neighbors: Gets the chunk before (-1) or after (1) a chunk in its record,
+                   or None; needed for neighbour expansion
+        neighbor_chunks: Chunks to add on each side of a passage when the budget
+                         allows (0 = no expansion); they do not count against max_results
+
+    Returns:
+        Passages (result dicts), in packing order
+    """
+    candidates = [candidate for candidate in candidates if candidate.get('text', '').strip()]
+    if not candidates or budget_tokens <= 0:
+        return []
+
+    blocks: List[List[Dict[str, Any]]] = []
+    packed = skipped = 0
+
+    def fits(trial_blocks):
+        return estimate_tokens(format_context([_merge_block(block) for block in trial_blocks])) <= budget_tokens
+
+    for position in mmr_order(candidates, mmr_lambda, duplicate_threshold):
+        if max_results is not None and packed >= max_results:
+            break
+        candidate = candidates[position]
+
+        trial = [list(block) for block in blocks]
+        for block in trial if merge_adjacent else []:
+            if is_adjacent(block[-1], candidate):
+                block.append(candidate)
+                break
+            if is_adjacent(candidate, block[0]):
+                block.insert(0, candidate)
+                break
+        else:
+            trial.append([candidate])
+
+        # A chunk that fills the gap between two passages joins them
+        if merge_adjacent:
+            _join_adjacent(trial)
+
+        if fits(trial):
+            blocks = trial
+            packed += 1
+        else:
+            skipped += 1
+
+    if not blocks:
+        # Not even one chunk fits: send the best one, cut to the budget
+        best = dict(candidates[0])
+        # Formatting a one-character chunk measures the source header
+        header_chars = len(format_context([dict(best, text='.')])) - 1
+        max_chars = budget_tokens * CHARS_PER_TOKEN - header_chars - len(TRUNCATION_MARKER) - 2
+        if max_chars <= 0:
+            logger.info(f"Context budget of {budget_tokens} tokens is too small for any chunk")
+            return []
+        best['text'] = f"{truncate_text(best['text'].strip(), max_chars)}\n\n{TRUNCATION_MARKER}"
+        logger.info(f"Best chunk exceeds the {budget_tokens} token context budget, truncated it")
+        return [best]
+
+    expanded = 0
+    if neighbors is not None and neighbor_chunks > 0:
+        blocks, expanded = _expand_blocks(blocks, neighbors, neighbor_chunks, fits, merge_adjacent)
+
+    passages = [_merge_block(block) for block in blocks]
+    logger.info(f"Packed {packed} chunk(s) into {len(passages)} passage(s), "
+                f"~{estimate_tokens(format_context(passages))}/{budget_tokens} tokens"
+                + (f", {expanded} neighbour chunk(s) added" if expanded else "")
+                + (f", {skipped} chunk(s) did not fit" if skipped else ""))
+    return passages
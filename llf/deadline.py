@@ -0,0 +1,101 @@
+"""
+Per-turn deadline for Local LLM Framework.
+
+One user turn can run RAG retrieval, several LLM calls in the tool loop, and
+tool executions with their own timeouts. A Deadline carries the remaining
+time budget for the whole turn through PromptConfig.build_messages,
+LLMRuntime.chat and LLMRuntime._execute_tool so each step can shrink its own
+timeouts (and max_tokens) to fit, and stop early with the best partial answer
+once the budget is spent.
+
+Design: A deadline of None (no budget) behaves exactly like the code did
+before deadlines existed, so callers can pass it around unconditionally.
+"""
+
+import math
+import time
+from typing import Callable, Optional
+
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+class Deadline:
+    """Time budget for one user turn."""
+
+    def __init__(self, budget_seconds: Optional[float] = None, clock: Callable[[], float] = time.monotonic):
+        """
+        Start a deadline.
+
+        Args:
+            budget_seconds: Total seconds allowed for the turn (None for no limit).
+            clock: Monotonic clock function (injectable for tests).
+
+        Raises:
+            ValueError: If budget_seconds is not positive.
+        """
+        if budget_seconds is not None and budget_seconds <= 0:
+            raise ValueError("budget_seconds must be positive")
+
+        self.budget_seconds = budget_seconds
+        self._clock = clock
+        self._start = clock()
+
+    @property
+    def has_budget(self) -> bool:
+        """True if this deadline limits the turn."""
+        return self.budget_seconds is not None
+
+    def elapsed(self) -> float:
+        """Seconds since the turn started."""
+        return self._clock() - self._start
+
+    def remaining(self) -> float:
+        """Seconds left in the budget (math.inf when unlimited, never negative)."""
+        if self.budget_seconds is None:
+            return math.inf
+        return max(0.0, self.budget_seconds - self.elapsed())
+
+    def expired(self) -> bool:
+        """True once the budget is spent."""
+        return self.remaining() <= 0.0
+
+    def clamp_timeout(self, timeout: float, minimum: float = 1.0) -> float:
+        """
+        Shrink a timeout so it ends before the deadline.
+
+        Args:
+            timeout: Requested timeout in seconds.
+            minimum: Lower bound, so an almost-expired turn still gets a usable timeout.
+
+        Returns:
+            min(timeout, remaining), but at least minimum.
+        """
+        return max(minimum, min(timeout, self.remaining()))
+
+    def clamp_max_tokens(self, max_tokens: Optional[int], tokens_per_second: Optional[float],
+                         minimum: int = 16) -> Optional[int]:
+        """
+        Shrink max_tokens so generation can finish before the deadline.
+
+        Args:
+            max_tokens: Configured max_tokens (None means the server default).
+            tokens_per_second: Observed decode rate, or None if not known yet.
+            minimum: Lower bound, so the model can still produce a short answer.
+
+        Returns:
+            Adjusted max_tokens (unchanged when there is no budget or no rate yet).
+        """
+        if not self.has_budget or not tokens_per_second or tokens_per_second <= 0:
+            return max_tokens
+
+        affordable = max(minimum, int(self.remaining() * tokens_per_second))
+        if max_tokens is None:
+            return affordable
+        return min(max_tokens, affordable)
+
+    def __repr__(self) -> str:
+        if not self.has_budget:
+            return "Deadline(unlimited)"
+        return f"Deadline(budget={self.budget_seconds}s, remaining={self.remaining():.2f}s)"
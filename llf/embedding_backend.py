@@ -0,0 +1,383 @@
+"""
+Embedding model backends for CPU encoding.
+
+Everything runs on the CPU, and a full-precision PyTorch SentenceTransformer
+is the slowest way to run the same embedding model there. Stores can
+instead be built and queried with:
+
+- onnx: ONNX Runtime, optionally with dynamic int8 quantization of the
+  weights (quantization "int8"), usually the fastest on x86 and ARM CPUs
+- openvino: OpenVINO, fast on Intel CPUs
+- llama-server: a local llama-server started with --embedding encodes for
+  every process, so no process loads the model itself (see
+  server_embedding; the server is named by embedding_server)
+
+The backend a store was built with is recorded in its config.json
+(embedding_backend, embedding_quantization) and used for query encoding
+too, so query and stored vectors come from the same model variant.
+
+compare_backends checks a variant against the fp32 PyTorch model on a
+sample of texts: the cosine similarity between the two embeddings of each
+text (1.0 = identical) and the texts encoded per second by each.
+
+Thread counts are a policy rather than a side effect of importing: PyTorch
+intra-op and inter-op threads are set by apply_thread_settings when a
+model is loaded, sized from the CPU count and the number of embedding
+workers (registry "embedding_threads" section, Create_VectorStore.py
+--threads/--workers).
+
+Design: All in-process backends are loaded through sentence-transformers (>= 3.2,
+with the onnx or openvino extra), so encode() and the rest of the code stay
+the same. The int8 model is exported once into the model cache directory
+and reused from there; the quantization config follows the CPU's
+instruction set. ONNX Runtime and OpenVINO size their own thread pools to
+the physical cores; the worker count still bounds how many encodes run at
+once. macOS keeps one intra-op thread by default, as before, because
+multi-threaded encoding there has crashed with Python 3.13+.
+"""
+
+import os
+import platform
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .logging_config import get_logger
+
+try:
+    from sentence_transformers import SentenceTransformer
+except ImportError:
+    SentenceTransformer = None
+
+try:
+    import torch
+except ImportError:
+    torch = None
+
+logger = get_logger(__name__)
+
+
+# Backends accepted in config.json / the registry (torch = PyTorch fp32)
+EMBEDDING_BACKENDS = ('torch', 'onnx', 'openvino', 'llama-server')
+DEFAULT_BACKEND = 'torch'
+
+# Backend that encodes on a llama-server instead of in this process
+SERVER_BACKEND = 'llama-server'
+
+# Quantizations per backend (None = full precision)
+QUANTIZATIONS = {
+    'torch': (None,),
+    'onnx': (None, 'int8'),
+    'openvino': (None,),
+    'llama-server': (None,)  # Set by the GGUF file the server loads
+}
+
+# File name suffix of the exported int8 ONNX model (onnx/model_qint8.onnx)
+INT8_FILE_SUFFIX = 'qint8'
+
+# Texts compared against fp32 when a store is built with another backend
+PARITY_SAMPLE_SIZE = 64
+
+# Mean cosine similarity to fp32 below which a variant is reported as degraded
+MIN_PARITY_COSINE = 0.98
+
+# Default embedding threading (registry "embedding_threads" section)
+DEFAULT_THREADING_CONFIG = {
+    "intra_op_threads": None,
+    "inter_op_threads": 1,
+    "workers": 1
+}
+
+# PyTorch thread counts last applied (inter-op threads can only be set once per process)
+_applied_threads: Dict[str, Optional[int]] = {'intra_op_threads': None, 'inter_op_threads': None}
+_threads_lock = threading.Lock()
+
+
+def model_key(model_name: str, backend: Optional[str] = None, quantization: Optional[str] = None,
+              server: Optional[str] = None) -> str:
+    """
+    Get the cache key of a model variant.
+
+    Args:
+        model_name: HuggingFace model identifier or local path
+        backend: Embedding backend (None = torch)
+        quantization: Weight quantization (None = full precision)
+        server: Embedding server name or URL (llama-server backend)
+
+    Returns:
+        model_name for the default backend, otherwise model_name@backend[-quantization]
+        (model_name@llama-server:server for the server backend)
+    """
+    backend = backend or DEFAULT_BACKEND
+    if backend == DEFAULT_BACKEND and quantization is None:
+        return model_name
+    if backend == SERVER_BACKEND:
+        return f"{model_name}@{backend}:{server}"
+    return f"{model_name}@{backend}" + (f"-{quantization}" if quantization else "")
+
+
+def validate_backend(backend: Optional[str], quantization: Optional[str] = None) -> str:
+    """
+    Check a backend and quantization combination.
+
+    Args:
+        backend: Embedding backend (None = torch)
+        quantization: Weight quantization (None = full precision)
+
+    Returns:
+        Backend name
+
+    Raises:
+        ValueError: If the backend or its quantization is not supported
+    """
+    backend = backend or DEFAULT_BACKEND
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{backend}' (expected one of: {', '.join(EMBEDDING_BACKENDS)})")
+    if quantization not in QUANTIZATIONS[backend]:
+        raise ValueError(f"Quantization '{quantization}' is not supported by the {backend} backend")
+    return backend
+
+
+def resolve_thread_counts(config: Optional[Dict[str, Any]] = None) -> Tuple[int, int, int]:
+    """
+    Turn a threading config into thread counts.
+
+    Args:
+        config: Dict with intra_op_threads (None = CPU cores / workers, 1 on
+            macOS), inter_op_threads and workers; missing keys use
+            DEFAULT_THREADING_CONFIG
+
+    Returns:
+        Tuple of (intra_op_threads, inter_op_threads, workers), each at least 1
+    """
+    config = dict(DEFAULT_THREADING_CONFIG, **(config or {}))
+    workers = max(1, int(config['workers'] or 1))
+
+    intra = config['intra_op_threads']
+    if not intra:
+        intra = 1 if sys.platform == 'darwin' else max(1, (os.cpu_count() or 1) // workers)
+    inter = config['inter_op_threads'] or 1
+    return max(1, int(intra)), max(1, int(inter)), workers
+
+
+def apply_thread_settings(intra_op_threads: int, inter_op_threads: Optional[int] = None) -> Dict[str, Optional[int]]:
+    """
+    Set the PyTorch thread counts for embedding.
+
+    The intra-op count is per OpenMP thread, so thread pools that encode
+    call this from each worker (see the initializer of the retriever's
+    embedding pool). The inter-op count can only be set once per process,
+    before any inter-op work; a later change is logged and ignored.
+
+    Args:
+        intra_op_threads: Threads used inside one operation (matrix multiply, ...)
+        inter_op_threads: Threads running independent operations (None = leave unchanged)
+
+    Returns:
+        Thread counts in effect
+    """
+    if torch is None:
+        return dict(_applied_threads)
+
+    with _threads_lock:
+        torch.set_num_threads(intra_op_threads)
+        _applied_threads['intra_op_threads'] = intra_op_threads
+
+        if inter_op_threads is not None and inter_op_threads != _applied_threads['inter_op_threads']:
+            try:
+                torch.set_num_interop_threads(inter_op_threads)
+                _applied_threads['inter_op_threads'] = inter_op_threads
+            except RuntimeError as e:
+                # Raised once PyTorch has started its inter-op pool
+                logger.debug(f"Inter-op threads already set for this process, keeping them: {e}")
+        return dict(_applied_threads)
+
+
+def detect_quantization_config() -> str:
+    """
+    Pick the ONNX Runtime dynamic quantization config for this CPU.
+
+    Returns:
+        'avx512_vnni', 'avx512', 'avx2' or 'arm64'
+    """
+    if platform.machine().lower() in ('arm64', 'aarch64'):
+        return 'arm64'
+
+    flags = set()
+    try:
+        with open('/proc/cpuinfo', 'r') as f:
+            for line in f:
+                if line.startswith('flags'):
+                    flags = set(line.split(':', 1)[1].split())
+                    break
+    except OSError:
+        pass
+
+    if 'avx512_vnni' in flags:
+        return 'avx512_vnni'
+    if 'avx512f' in flags:
+        return 'avx512'
+    return 'avx2'
+
+
+def _export_int8_onnx(model_name: str, export_dir: Path, cache_folder: Optional[str]) -> None:
+    """Export model_name to ONNX and quantize it to int8 into export_dir."""
+    from sentence_transformers import export_dynamic_quantized_onnx_model
+
+    config_name = detect_quantization_config()
+    logger.info(f"Exporting int8 ONNX model for {model_name} ({config_name}) to {export_dir}")
+    model = SentenceTransformer(model_name, device='cpu', cache_folder=cache_folder, backend='onnx')
+    model.save(str(export_dir))
+    export_dynamic_quantized_onnx_model(model, config_name, str(export_dir), file_suffix=INT8_FILE_SUFFIX)
+
+
+def load_embedding_model(model_name: str, cache_folder: Optional[str] = None,
+                         backend: Optional[str] = None, quantization: Optional[str] = None,
+                         device: Optional[str] = None, server: Optional[str] = None):
+    """
+    Load a SentenceTransformer on the given backend.
+
+    Args:
+        model_name: HuggingFace model identifier or local path
+        cache_folder: Directory to cache downloaded (and exported) models
+        backend: Embedding backend (None = torch)
+        quantization: Weight quantization (None = full precision)
+        device: Device for the torch backend (None = sentence-transformers default);
+            onnx and openvino always run on the CPU
+        server: Embedding server name or URL (llama-server backend)
+
+    Returns:
+        Loaded SentenceTransformer model (a LlamaServerEmbedder for llama-server)
+
+    Raises:
+        ImportError: If sentence-transformers (or the backend's extra) is missing
+        ValueError: If the backend or its quantization is not supported, or the
+            embedding server is unknown
+    """
+    backend = validate_backend(backend, quantization)
+    if backend == SERVER_BACKEND:
+        from .server_embedding import LlamaServerEmbedder, resolve_server_url
+        return LlamaServerEmbedder(resolve_server_url(server), model_name)
+
+    if SentenceTransformer is None:
+        raise ImportError("sentence-transformers is required. Install: pip install sentence-transformers")
+
+    if backend == 'torch':
+        return SentenceTransformer(model_name, device=device, cache_folder=cache_folder)
+
+    try:
+        if quantization == 'int8':
+            export_dir = Path(cache_folder or '.') / f"{model_name.replace('/', '__')}-onnx-{INT8_FILE_SUFFIX}"
+            file_name = f"onnx/model_{INT8_FILE_SUFFIX}.onnx"
+            if not (export_dir / file_name).exists():
+                _export_int8_onnx(model_name, export_dir, cache_folder)
+            return SentenceTransformer(str(export_dir), device='cpu', backend='onnx',
+                                       model_kwargs={'file_name': file_name})
+
+        return SentenceTransformer(model_name, device='cpu', cache_folder=cache_folder, backend=backend)
+    except (TypeError, ImportError) as e:
+        # The backend argument needs sentence-transformers >= 3.2; the runtimes come with its extras
+        raise ImportError(
+            f"The {backend} embedding backend needs sentence-transformers >= 3.2 with its {backend} extra. "
+            f"Install: pip install 'sentence-transformers[{backend}]' ({e})"
+        ) from e
+
+
+def encode_texts(model, texts: Sequence[str], batch_size: int = 32) -> np.ndarray:
+    """
+    Encode texts into normalized embeddings.
+
+    Args:
+        model: Loaded SentenceTransformer model
+        texts: Texts to encode
+        batch_size: Texts per model call
+
+    Returns:
+        float32 array of shape (len(texts), dimension)
+    """
+    embeddings = model.encode(
+        list(texts),
+        batch_size=batch_size,
+        convert_to_numpy=True,
+        normalize_embeddings=True,
+        show_progress_bar=False
+    )
+    return np.asarray(embeddings, dtype=np.float32)
+
+
+def compare_backends(reference_model, model, texts: Sequence[str], batch_size: int = 32,
+                     sample_size: int = PARITY_SAMPLE_SIZE) -> Dict[str, Any]:
+    """
+    Compare a model variant against the fp32 reference on a sample of texts.
+
+    Args:
+        reference_model: fp32 PyTorch model
+        model: Model variant to check (other backend or quantization)
+        texts: Texts to sample from (evenly spaced)
+        batch_size: Texts per model call
+        sample_size: Maximum number of texts to encode
+
+    Returns:
+        Dict with samples, mean_cosine, min_cosine, reference_texts_per_second,
+        texts_per_second, speedup and degraded (mean_cosine below MIN_PARITY_COSINE)
+    """
+    texts = list(texts)
+    if len(texts) > sample_size:
+        step = len(texts) / sample_size
+        texts = [texts[int(i * step)] for i in range(sample_size)]
+    if not texts:
+        raise ValueError("No texts to compare backends on")
+
+    # Warm up both models so the timings measure encoding, not first-call setup
+    encode_texts(reference_model, texts[:1])
+    encode_texts(model, texts[:1])
+
+    started = time.perf_counter()
+    reference = encode_texts(reference_model, texts, batch_size)
+    reference_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    candidate = encode_texts(model, texts, batch_size)
+    seconds = time.perf_counter() - started
+
+    if reference.shape != candidate.shape:
+        raise ValueError(f"Embedding shapes differ: fp32 {reference.shape}, variant {candidate.shape}")
+
+    # Both are normalized, so the row-wise dot product is the cosine similarity
+    cosines = np.sum(reference * candidate, axis=1)
+    report = {
+        'samples': len(texts),
+        'mean_cosine': round(float(np.mean(cosines)), 5),
+        'min_cosine': round(float(np.min(cosines)), 5),
+        'reference_texts_per_second': round(len(texts) / max(reference_seconds, 1e-9), 1),
+        'texts_per_second': round(len(texts) / max(seconds, 1e-9), 1),
+    }
+    report['speedup'] = round(report['texts_per_second'] / max(report['reference_texts_per_second'], 1e-9), 2)
+    report['degraded'] = report['mean_cosine'] < MIN_PARITY_COSINE
+    return report
+
+
+def format_parity_report(report: Dict[str, Any], label: str = 'variant') -> str:
+    """
+    Format a compare_backends report as text.
+
+    Args:
+        report: Report from compare_backends
+        label: Name of the compared variant
+
+    Returns:
+        Multi-line summary
+    """
+    lines: List[str] = [
+        f"Embedding parity of {label} vs fp32 ({report['samples']} texts):",
+        f"  cosine similarity: mean {report['mean_cosine']:.4f}, min {report['min_cosine']:.4f}",
+        f"  throughput: {report['texts_per_second']:.1f} texts/s "
+        f"(fp32 {report['reference_texts_per_second']:.1f} texts/s, {report['speedup']:.2f}x)"
+    ]
+    if report.get('degraded'):
+        lines.append(f"  WARNING: mean cosine below {MIN_PARITY_COSINE}; search results may differ from fp32")
+    return "\n".join(lines)
@@ -280,13 +280,17 @@ class LLMFrameworkGUI:
 
     # ===== Chat Tab Functions =====
 
-    def chat_respond(self, message: str, history: List[dict]):
+    def chat_respond(self, message: str, history: List[dict], rag_filter: str = "", request: gr.Request = None):
         """
         Process chat message and stream response.
 
         Args:
             message: User's message
             history: Chat history as list of message dicts with 'role' and 'content'
+            rag_filter: Optional knowledge base filter, KEY=VALUE pairs separated by ';'
+                        (e.g. "source_file=manual.pdf; tags=api")
+            request: Gradio request (injected by Gradio); its session hash pins the
+                     conversation to a llama-server slot
 
         Yields:
             Tuple of (empty string to clear input, updated history with streaming content)
@@ -295,6 +299,10 @@ class LLMFrameworkGUI:
             yield "", history
             return
 
+        # Browser session identifier for slot affinity (None outside Gradio events)
+        session_id = getattr(request, 'session_hash', None) if request is not None else None
+        chat_kwargs = {'session_id': session_id} if isinstance(session_id, str) else {}
+
         try:
             # Build conversation history for LLM
             messages = []
@@ -305,6 +313,16 @@ class LLMFrameworkGUI:
             messages.append({"role": "user", "content": message})
             history = history + [{"role": "user", "content": message}]
 
+            # Restrict RAG retrieval to chunks matching the metadata filter
+            if rag_filter and rag_filter.strip():
+                from llf.metadata_filter import parse_filter_expressions
+                try:
+                    rag_filters = parse_filter_expressions(rag_filter.replace('\n', ';').split(';'))
+                except ValueError as e:
+                    raise ValueError(f"Invalid knowledge base filter: {e}")
+                if rag_filters:
+                    chat_kwargs['rag_filters'] = rag_filters
+
             # Check if tools are available
             tools_available = False
             if self.prompt_config:
@@ -328,7 +346,7 @@ class LLMFrameworkGUI:
                 import threading
 
                 # Pass 1: Streaming response for user (no tools)
-                for chunk in self.runtime.chat(messages, stream=True, use_prompt_config=False):
+                for chunk in self.runtime.chat(messages, stream=True, use_prompt_config=False, **chat_kwargs):
                     response_text += chunk
                     # Update history with partial response
                     current_history = history + [{"role": "assistant", "content": response_text}]
@@ -339,7 +357,7 @@ class LLMFrameworkGUI:
                 def execute_with_tools():
                     try:
                         # Run the same request with tools enabled
-                        self.runtime.chat(messages, stream=False)
+                        self.runtime.chat(messages, stream=False, **chat_kwargs)
                     except Exception as e:
                         logger.warning(f"Background tool execution failed: {e}")
 
@@ -349,14 +367,14 @@ class LLMFrameworkGUI:
 
             elif tools_available:
                 # Single-pass mode with tools (no streaming, accurate)
-                response_text = self.runtime.chat(messages, stream=False)
+                response_text = self.runtime.chat(messages, stream=False, **chat_kwargs)
                 # Update history with complete response
                 current_history = history + [{"role": "assistant", "content": response_text}]
                 yield "", current_history
 
             else:
                 # Streaming mode (no tools available)
-                for chunk in self.runtime.chat(messages, stream=True):
+                for chunk in self.runtime.chat(messages, stream=True, **chat_kwargs):
                     response_text += chunk
                     # Update history with partial response
                     current_history = history + [{"role": "assistant", "content": response_text}]
@@ -1973,6 +1991,16 @@ class LLMFrameworkGUI:
                                 # Add reload modules button
                                 reload_modules_btn = gr.Button("🔄 Reload Modules", size="sm", variant="secondary")
 
+                        # Metadata filter for knowledge base retrieval (empty = search everything)
+                        rag_filter = gr.Textbox(
+                            label="Knowledge base filter",
+                            placeholder="e.g. source_file=manual.pdf; tags=api; date_from=2024-01-01",
+                            value="",
+                            lines=1,
+                            max_lines=1,
+                            info="Only retrieve chunks matching these KEY=VALUE filters (source_file, tags, date_from, date_to)"
+                        )
+
                         # Module reload status message
                         reload_status = gr.Textbox(
                             label="Module Status",
@@ -1995,7 +2023,7 @@ class LLMFrameworkGUI:
     
                         # Chat interactions
                         # Submit button always works
-                        submit_event = submit.click(self.chat_respond, [msg, chatbot], [msg, chatbot])
+                        submit_event = submit.click(self.chat_respond, [msg, chatbot, rag_filter], [msg, chatbot])
 
                         # Add browser TTS for share mode
                         if self.is_share_mode and self.tts:
@@ -2079,11 +2107,11 @@ class LLMFrameworkGUI:
                         # When disabled, we want multiline input (Enter creates newline)
                         # Problem: Gradio's .submit() always intercepts Enter and clears the textbox
                         # Solution: Check checkbox, and if disabled, restore the message + add newline
-                        def handle_enter_key(message, history, enter_enabled):
+                        def handle_enter_key(message, history, enter_enabled, filter_text, request: gr.Request = None):
                             """Handle Enter key press based on checkbox state."""
                             if enter_enabled:
                                 # Submit: process the message
-                                for update in self.chat_respond(message, history):
+                                for update in self.chat_respond(message, history, filter_text, request):
                                     yield update
                             else:
                                 # Don't submit: restore message with newline added
@@ -2092,7 +2120,7 @@ class LLMFrameworkGUI:
 
                         enter_event = msg.submit(
                             handle_enter_key,
-                            inputs=[msg, chatbot, submit_on_enter],
+                            inputs=[msg, chatbot, submit_on_enter, rag_filter],
                             outputs=[msg, chatbot]
                         )
 
@@ -2925,6 +2953,9 @@ class LLMFrameworkGUI:
             inbrowser: Automatically open in browser (default: True)
             **kwargs: Additional arguments to pass to Gradio launch()
         """
+        # Warm up RAG stores while the interface starts (opt-in in the data store registry)
+        self.prompt_config.start_rag_preload()
+
         interface = self.create_interface()
         interface.launch(
             server_name=server_name,
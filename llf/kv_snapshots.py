@@ -0,0 +1,178 @@
+"""
+KV cache snapshot storage for Local LLM Framework.
+
+llama-server can save a slot's KV cache to disk and restore it later
+(POST /slots/{id}?action=save|restore, enabled with --slot-save-path). LLF
+uses this to resume a saved chat session without re-prefilling its whole
+history: the snapshot is written when the session is saved and restored when
+the session is continued.
+
+Snapshots are named after their chat history file (chat_<session_id>.kv) and
+live in the server's slot-save-path directory. This module only manages those
+files (lookup, garbage collection, size cap); the HTTP calls are made by
+LLMRuntime.
+
+Design: Snapshots are a cache. Deleting any of them is always safe - the next
+turn simply re-prefills the conversation.
+"""
+
+import time
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+# File extension for snapshot files
+SNAPSHOT_SUFFIX = ".kv"
+
+# Default limits for garbage collection (config.json "kv_snapshots" overrides them)
+DEFAULT_MAX_TOTAL_BYTES = 4 * 1024 ** 3  # 4 GB across all snapshots
+DEFAULT_MAX_AGE_DAYS = 30
+
+
+def snapshot_name(session_id: str) -> str:
+    """
+    Get the snapshot filename for a chat session.
+
+    Args:
+        session_id: Chat history session ID (e.g., '20250101_120000_000000')
+                    or history filename (e.g., 'chat_20250101_120000_000000.json').
+
+    Returns:
+        Snapshot filename (e.g., 'chat_20250101_120000_000000.kv').
+    """
+    name = Path(session_id).stem
+    if not name.startswith("chat_"):
+        name = f"chat_{name}"
+    return f"{name}{SNAPSHOT_SUFFIX}"
+
+
+class KVSnapshotStore:
+    """Manages KV cache snapshot files in llama-server's slot-save-path."""
+
+    def __init__(
+        self,
+        snapshot_dir: Path,
+        max_total_bytes: int = DEFAULT_MAX_TOTAL_BYTES,
+        max_age_days: Optional[int] = DEFAULT_MAX_AGE_DAYS,
+    ):
+        """
+        Initialize snapshot store.
+
+        Args:
+            snapshot_dir: Directory llama-server saves slots to (--slot-save-path).
+            max_total_bytes: Size cap for all snapshots; oldest are removed first.
+            max_age_days: Remove snapshots not used for this many days (None to disable).
+        """
+        self.snapshot_dir = Path(snapshot_dir)
+        self.snapshot_dir.mkdir(parents=True, exist_ok=True)
+        self.max_total_bytes = max_total_bytes
+        self.max_age_days = max_age_days
+
+    def path_for(self, session_id: str) -> Path:
+        """
+        Get the snapshot path for a chat session.
+
+        Args:
+            session_id: Chat history session ID or filename.
+
+        Returns:
+            Path to the snapshot file (may not exist).
+        """
+        return self.snapshot_dir / snapshot_name(session_id)
+
+    def exists(self, session_id: str) -> bool:
+        """
+        Check whether a session has a snapshot.
+
+        Args:
+            session_id: Chat history session ID or filename.
+
+        Returns:
+            True if a snapshot file exists.
+        """
+        return self.path_for(session_id).is_file()
+
+    def touch(self, session_id: str) -> None:
+        """
+        Mark a snapshot as recently used (protects it from age/size eviction).
+
+        Args:
+            session_id: Chat history session ID or filename.
+        """
+        path = self.path_for(session_id)
+        if path.is_file():
+            path.touch()
+
+    def list_snapshots(self) -> List[Path]:
+        """
+        List snapshot files, least recently used first.
+
+        Returns:
+            List of snapshot paths sorted by modification time.
+        """
+        snapshots = [p for p in self.snapshot_dir.glob(f"chat_*{SNAPSHOT_SUFFIX}") if p.is_file()]
+        return sorted(snapshots, key=lambda p: p.stat().st_mtime)
+
+    def get_total_size(self) -> int:
+        """
+        Get total size of all snapshots in bytes.
+
+        Returns:
+            Total size in bytes.
+        """
+        return sum(p.stat().st_size for p in self.list_snapshots())
+
+    def collect_garbage(self, history_dir: Optional[Path] = None, keep: Iterable[str] = ()) -> List[Path]:
+        """
+        Remove orphaned, expired, and excess snapshots.
+
+        Removal order:
+        1. Snapshots whose chat history file no longer exists in history_dir
+        2. Snapshots not used for max_age_days
+        3. Least recently used snapshots until the total is under max_total_bytes
+
+        Args:
+            history_dir: Chat history directory used to detect orphans (None to skip).
+            keep: Session IDs whose snapshots must not be removed.
+
+        Returns:
+            List of removed snapshot paths.
+        """
+        keep_names = {snapshot_name(s) for s in keep}
+        removed = []
+
+        def remove(path: Path, reason: str) -> None:
+            try:
+                path.unlink()
+                removed.append(path)
+                logger.debug(f"Removed KV snapshot {path.name} ({reason})")
+            except OSError as e:
+                logger.warning(f"Could not remove KV snapshot {path.name}: {e}")
+
+        cutoff = time.time() - self.max_age_days * 86400 if self.max_age_days else None
+        remaining = []
+        for path in self.list_snapshots():
+            if path.name in keep_names:
+                remaining.append(path)
+            elif history_dir is not None and not (Path(history_dir) / f"{path.stem}.json").exists():
+                remove(path, "chat history deleted")
+            elif cutoff is not None and path.stat().st_mtime < cutoff:
+                remove(path, "expired")
+            else:
+                remaining.append(path)
+
+        total = sum(p.stat().st_size for p in remaining)
+        for path in remaining:
+            if total <= self.max_total_bytes:
+                break
+            if path.name in keep_names:
+                continue
+            size = path.stat().st_size
+            remove(path, "size cap")
+            total -= size
+
+        return removed
@@ -0,0 +1,323 @@
+"""
+BM25 keyword index for vector stores.
+
+Dense embeddings are poor at exact identifiers: an error code, a function
+name or a SKU pasted into a question rarely lands next to the chunk that
+contains it. BM25Index is an inverted index over the same chunks as
+index.faiss, stored as bm25.npz next to it and addressed by the same ids
+(metadata row numbers), so its hits resolve through metadata.jsonl like
+FAISS hits do.
+
+Tokens are lowercased words; compound identifiers (ERR-1042, os.path.join,
+SKU_77-A) are indexed both whole and split into their parts, so the exact
+identifier scores highest and the parts still match.
+
+reciprocal_rank_fusion merges the keyword and dense rankings without having
+to compare BM25 and cosine scores.
+
+Design: Posting lists are stored as flat numpy arrays (CSR layout: a sorted
+term array and per-term offsets into doc_ids/term_freqs) so a store loads
+without building Python objects per term and a query is a few vectorized
+array operations per query term.
+"""
+
+import math
+import re
+from array import array
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+# Sidecar file written next to index.faiss
+BM25_FILENAME = 'bm25.npz'
+
+# Standard BM25 parameters
+DEFAULT_K1 = 1.2
+DEFAULT_B = 0.75
+
+# Rank constant for reciprocal rank fusion (from the original RRF paper)
+DEFAULT_RRF_K = 60
+
+# Longer tokens are truncated (keeps the term array narrow)
+MAX_TOKEN_LENGTH = 64
+
+# A word, optionally joined to more words by identifier punctuation
+_TOKEN_RE = re.compile(r"\w+(?:[.\-:/#]\w+)*")
+_PART_RE = re.compile(r"[^\W_]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into BM25 terms.
+
+    Args:
+        text: Chunk or query text
+
+    Returns:
+        Lowercased terms; compound identifiers yield the whole identifier
+        followed by its parts
+    """
+    tokens = []
+    for match in _TOKEN_RE.finditer(text.lower()):
+        token = match.group()
+        tokens.append(token[:MAX_TOKEN_LENGTH])
+        if not token.isalnum():
+            tokens.extend(part[:MAX_TOKEN_LENGTH] for part in _PART_RE.findall(token))
+    return tokens
+
+
+def term_counts(text: str) -> Counter:
+    """
+    Count the terms tokenize would return for text.
+
+    Used when building the index; every word run is found by one regex pass,
+    so only the distinct compound identifiers are handled in Python.
+
+    Args:
+        text: Chunk text
+
+    Returns:
+        Counter of terms
+    """
+    text = text.lower()
+    counts = Counter(_PART_RE.findall(text))
+    for token, count in Counter(_TOKEN_RE.findall(text)).items():
+        if not token.isalnum():
+            counts[token] += count
+
+    if counts and max(map(len, counts)) > MAX_TOKEN_LENGTH:
+        for term in [term for term in counts if len(term) > MAX_TOKEN_LENGTH]:
+            counts[term[:MAX_TOKEN_LENGTH]] += counts.pop(term)
+    return counts
+
+
+class BM25Index:
+    """
+    Okapi BM25 over a vector store's chunks.
+
+    Documents are addressed by id (the FAISS vector id); ids need not be
+    contiguous. doc_lengths is indexed by id, with 0 for ids that are not
+    indexed.
+    """
+
+    def __init__(self, terms: np.ndarray, term_offsets: np.ndarray, doc_ids: np.ndarray,
+                 term_freqs: np.ndarray, doc_lengths: np.ndarray,
+                 k1: float = DEFAULT_K1, b: float = DEFAULT_B):
+        self.terms = terms
+        self.term_offsets = term_offsets
+        self.doc_ids = doc_ids
+        self.term_freqs = term_freqs
+        self.doc_lengths = doc_lengths
+        self.k1 = float(k1)
+        self.b = float(b)
+
+        indexed = doc_lengths > 0
+        self.num_docs = int(indexed.sum())
+        self.avg_doc_length = float(doc_lengths[indexed].mean()) if self.num_docs else 0.0
+
+    def __len__(self) -> int:
+        return self.num_docs
+
+    @classmethod
+    def build(cls, texts: Sequence[str], ids: Optional[Iterable[int]] = None,
+              k1: float = DEFAULT_K1, b: float = DEFAULT_B) -> 'BM25Index':
+        """
+        Build an index from chunk texts.
+
+        Args:
+            texts: Chunk texts
+            ids: Id of each text (default: 0..len(texts)-1)
+            k1: Term frequency saturation
+            b: Document length normalization
+
+        Returns:
+            BM25Index
+        """
+        ids = list(range(len(texts))) if ids is None else [int(i) for i in ids]
+        if len(ids) != len(texts):
+            raise ValueError(f"Got {len(ids)} ids for {len(texts)} texts")
+
+        terms, term_ids, doc_ids, term_freqs, doc_lengths = cls._postings(texts, ids, max(ids, default=-1) + 1)
+        return cls._from_postings(terms, term_ids, doc_ids, term_freqs, doc_lengths, k1, b)
+
+    def update(self, remove_ids: Iterable[int], texts: Sequence[str], ids: Sequence[int]) -> 'BM25Index':
+        """
+        Remove documents and add new ones.
+
+        Args:
+            remove_ids: Ids to drop
+            texts: New chunk texts
+            ids: Ids of the new texts (must not be indexed already)
+
+        Returns:
+            A new BM25Index; this one is left unchanged
+        """
+        ids = [int(i) for i in ids]
+        size = max(len(self.doc_lengths), max(ids, default=-1) + 1)
+        new_terms, new_term_ids, new_docs, new_freqs, doc_lengths = self._postings(texts, ids, size)
+
+        remove_ids = np.fromiter(remove_ids, dtype=np.int64)
+        old_lengths = self.doc_lengths.copy()
+        old_lengths[remove_ids[remove_ids < len(old_lengths)]] = 0
+        doc_lengths[:len(old_lengths)] += old_lengths
+
+        # Old postings of surviving documents, in the merged vocabulary
+        old_term_ids = np.repeat(np.arange(len(self.terms)), np.diff(self.term_offsets))
+        keep = ~np.isin(self.doc_ids, remove_ids)
+        terms = np.union1d(self.terms, new_terms)
+        return self._from_postings(
+            terms,
+            np.concatenate([np.searchsorted(terms, self.terms)[old_term_ids[keep]],
+                            np.searchsorted(terms, new_terms)[new_term_ids]]),
+            np.concatenate([self.doc_ids[keep], new_docs]),
+            np.concatenate([self.term_freqs[keep], new_freqs]),
+            doc_lengths, self.k1, self.b
+        )
+
+    @staticmethod
+    def _postings(texts: Sequence[str], ids: Sequence[int], size: int):
+        """
+        Tokenize texts into flat postings.
+
+        Returns:
+            Tuple of (terms, term id, doc id and frequency of each posting, doc lengths)
+        """
+        vocabulary: Dict[str, int] = {}
+        term_ids = array('q')
+        doc_ids = array('q')
+        term_freqs = array('f')
+        doc_lengths = np.zeros(size, dtype=np.float32)
+
+        for doc_id, text in zip(ids, texts):
+            counts = term_counts(text or '')
+            doc_lengths[doc_id] = sum(counts.values())
+            term_ids.extend(vocabulary.setdefault(term, len(vocabulary)) for term in counts)
+            doc_ids.extend([doc_id] * len(counts))
+            term_freqs.extend(counts.values())
+
+        terms = np.array(list(vocabulary), dtype=str) if vocabulary else np.zeros(0, dtype=str)
+        return (terms, np.frombuffer(term_ids, dtype=np.int64), np.frombuffer(doc_ids, dtype=np.int64),
+                np.frombuffer(term_freqs, dtype=np.float32), doc_lengths)
+
+    @classmethod
+    def _from_postings(cls, terms: np.ndarray, term_ids: np.ndarray, doc_ids: np.ndarray,
+                       term_freqs: np.ndarray, doc_lengths: np.ndarray, k1: float, b: float) -> 'BM25Index':
+        """Sort flat postings into the CSR layout, dropping terms without postings."""
+        used = np.bincount(term_ids, minlength=len(terms)) > 0
+        terms = terms[used]
+        term_ids = (np.cumsum(used) - 1)[term_ids]
+
+        # Vocabulary order, then document order within each posting list
+        term_order = np.argsort(terms, kind='stable')
+        term_rank = np.empty(len(terms), dtype=np.int64)
+        term_rank[term_order] = np.arange(len(terms))
+        keys = term_rank[term_ids]
+        order = np.lexsort((doc_ids, keys))
+
+        term_offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(keys, minlength=len(terms)), out=term_offsets[1:])
+
+        return cls(terms[term_order], term_offsets, doc_ids[order].astype(np.int64),
+                   term_freqs[order].astype(np.float32), doc_lengths.astype(np.float32), k1, b)
+
+    def save(self, path: Path) -> None:
+        """
+        Write the index as an uncompressed .npz file.
+
+        Args:
+            path: Destination file (bm25.npz, or a temporary name)
+        """
+        with open(path, 'wb') as f:
+            np.savez(f, terms=self.terms, term_offsets=self.term_offsets, doc_ids=self.doc_ids,
+                     term_freqs=self.term_freqs, doc_lengths=self.doc_lengths,
+                     params=np.array([self.k1, self.b], dtype=np.float64))
+
+    @classmethod
+    def load(cls, path: Path) -> 'BM25Index':
+        """
+        Read an index written by save.
+
+        Args:
+            path: bm25.npz file
+
+        Returns:
+            BM25Index
+        """
+        with np.load(path, allow_pickle=False) as data:
+            k1, b = data['params'].tolist()
+            return cls(data['terms'], data['term_offsets'], data['doc_ids'],
+                       data['term_freqs'], data['doc_lengths'], k1, b)
+
+    def search(self, query: str, k: int, allowed: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Score documents against a query.
+
+        Args:
+            query: Query text
+            k: Number of results
+            allowed: Boolean mask of eligible ids (metadata filters); None = all
+
+        Returns:
+            Tuple of (scores, ids), best first; only documents containing at
+            least one query term are returned
+        """
+        scores = None
+        for term in set(tokenize(query)):
+            position = int(np.searchsorted(self.terms, term))
+            if position >= len(self.terms) or self.terms[position] != term:
+                continue
+
+            start, end = self.term_offsets[position], self.term_offsets[position + 1]
+            docs = self.doc_ids[start:end]
+            freqs = self.term_freqs[start:end]
+
+            idf = math.log(1.0 + (self.num_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            norm = self.k1 * (1.0 - self.b + self.b * self.doc_lengths[docs] / self.avg_doc_length)
+            if scores is None:
+                scores = np.zeros(len(self.doc_lengths), dtype=np.float32)
+            scores[docs] += idf * freqs * (self.k1 + 1.0) / (freqs + norm)
+
+        if scores is None:
+            return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.int64)
+
+        if allowed is not None:
+            eligible = np.zeros(len(scores), dtype=bool)
+            shared = min(len(scores), len(allowed))
+            eligible[:shared] = allowed[:shared]
+            scores[~eligible] = 0.0
+
+        matched = np.flatnonzero(scores)
+        if len(matched) > k:
+            matched = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        order = np.argsort(-scores[matched], kind='stable')
+        return scores[matched][order], matched[order].astype(np.int64)
+
+
+def reciprocal_rank_fusion(rankings: Iterable[Sequence[int]], k: int = DEFAULT_RRF_K) -> List[Tuple[int, float]]:
+    """
+    Merge rankings by reciprocal rank fusion.
+
+    Each id scores sum(1 / (k + rank)) over the rankings it appears in
+    (rank starting at 1), so ids ranked well by several retrievers rise to
+    the top without comparing their raw scores.
+
+    Args:
+        rankings: Ranked id lists, best first
+        k: Rank constant; larger values flatten the difference between ranks
+
+    Returns:
+        List of (id, fused score), best first
+    """
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, 1):
+            doc_id = int(doc_id)
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
@@ -10,21 +10,32 @@ Future: Can be extended to support different backends, streaming, and batch proc
 import subprocess
 import time
 import signal
+import weakref
 import psutil
 from pathlib import Path
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Any, Tuple
 import requests
 
-from openai import OpenAI
+from openai import OpenAI, BadRequestError, APITimeoutError
 
 from .logging_config import get_logger
 from .config import Config
 from .model_manager import ModelManager
 from .prompt_config import PromptConfig
+from .slot_affinity import SlotAffinity, get_slot_count
+from .context_packer import get_context_window
+from .kv_snapshots import KVSnapshotStore
+from .deadline import Deadline
+from .rag_tools import RAG_TOOL_NAMES, execute_rag_tool
+from .tool_router import ToolRouter, admits_missing_capability, tool_name as get_tool_name
 
 logger = get_logger(__name__)
 
 
+# Reply used when a turn's deadline expires before the model produced any text
+DEADLINE_EXCEEDED_MESSAGE = "I ran out of time before I could finish this request. Please try again or ask a narrower question."
+
+
 class LLMRuntime:
     """
     Manages llama-server lifecycle and provides inference interface.
@@ -54,6 +65,12 @@ class LLMRuntime:
         # Default server attributes (for backward compatibility with single-server APIs)
         self.server_process: Optional[subprocess.Popen] = None
         self.client: Optional[OpenAI] = None
+        # Conversation-to-slot affinity (created on demand when --parallel is configured)
+        self.slot_affinity: Optional[SlotAffinity] = None
+        # Observed decode rate (tokens/second), used to fit max_tokens into a turn deadline
+        self.decode_rate: Optional[float] = None
+        # Per-message tool subset selection
+        self.tool_router = ToolRouter()
 
         # Initialize tools manager and cache enabled states
         from llf.tools_manager import ToolsManager
@@ -87,7 +104,11 @@ class LLMRuntime:
         # These are passed through to llama-server via the wrapper script
         if self.config.server_params:
             for key, value in self.config.server_params.items():
-                cmd.extend(["--server-arg", key, str(value)])
+                if key == 'slot-save-path':
+                    # Resolve relative to project root so LLF and the server agree on the location
+                    value = self.config.get_slot_save_path()
+                # true = flag without a value (e.g., "embedding": true); the wrapper drops the empty value
+                cmd.extend(["--server-arg", key, '' if value is True else str(value)])
 
         return cmd
 
@@ -430,6 +451,214 @@ class LLMRuntime:
 
         return openai_params
 
+    # ===== Slot Affinity =====
+
+    def _get_slot_affinity(self) -> Optional[SlotAffinity]:
+        """
+        Get slot affinity tracking for the active local server.
+
+        Returns:
+            SlotAffinity instance, or None when using an external API or when
+            neither the server's slot count ('parallel') nor 'slot-save-path'
+            is configured in server_params.
+        """
+        if self.config.is_using_external_api():
+            return None
+
+        server_params = getattr(self.config, 'server_params', None)
+        num_slots = get_slot_count(server_params if isinstance(server_params, dict) else None)
+        if num_slots < 1 and isinstance(server_params, dict) and server_params.get('slot-save-path'):
+            # Snapshots need to know which slot a session used; slot 0 always exists
+            num_slots = 1
+        if num_slots < 1:
+            return None
+
+        # Recreate when the active server (and its slot count) changes
+        if self.slot_affinity is None or self.slot_affinity.num_slots != num_slots:
+            self.slot_affinity = SlotAffinity(num_slots)
+            logger.debug(f"Slot affinity enabled for {num_slots} llama-server slots")
+        return self.slot_affinity
+
+    def get_slot_stats(self) -> Optional[Dict[str, Any]]:
+        """
+        Get slot affinity and prefix cache statistics.
+
+        Returns:
+            Statistics dict (see SlotAffinity.stats), or None if slot affinity is not active.
+        """
+        if self.slot_affinity is None:
+            return None
+        return self.slot_affinity.stats()
+
+    def _create_chat_completion(self, openai_params: dict, session_id: Optional[str]) -> Tuple[Any, Optional[int]]:
+        """
+        Send a chat completion request, pinned to the session's slot when possible.
+
+        The slot is sent as llama-server's 'id_slot' (with 'cache_prompt') in
+        extra_body. If the server rejects the pinned request, it is retried
+        once without a slot so the server can pick any free one.
+
+        Args:
+            openai_params: Parameters from _build_api_params().
+            session_id: Conversation identifier, or None to skip slot pinning.
+
+        Returns:
+            Tuple of (response, slot). The caller must release the slot via
+            _release_slot() once the response has been consumed.
+        """
+        affinity = self._get_slot_affinity() if session_id else None
+        slot = affinity.acquire(session_id) if affinity else None
+
+        params = openai_params
+        if affinity:
+            params = dict(openai_params)
+            extra_body = dict(openai_params.get('extra_body') or {})
+            extra_body['cache_prompt'] = True
+            if slot is not None:
+                extra_body['id_slot'] = slot
+            params['extra_body'] = extra_body
+
+        # A deadline-bound request (explicit timeout) must not be retried past the deadline
+        client = self.client.with_options(max_retries=0) if 'timeout' in params else self.client
+
+        try:
+            return client.chat.completions.create(**params), slot
+        except BadRequestError as e:
+            if slot is None:
+                raise
+            logger.warning(f"Request pinned to slot {slot} rejected ({e}), retrying on any slot")
+            affinity.release(slot)
+            affinity.record_fallback()
+            del params['extra_body']['id_slot']
+            return client.chat.completions.create(**params), None
+        except Exception:
+            if affinity:
+                affinity.release(slot)
+            raise
+
+    def _release_slot(self, slot: Optional[int], response: Any = None) -> None:
+        """
+        Release a pinned slot and record the response's prompt cache timings.
+
+        Args:
+            slot: Slot returned by _create_chat_completion().
+            response: Response or final stream chunk carrying llama-server 'timings'.
+        """
+        if self.slot_affinity is None:
+            return
+        extra = getattr(response, 'model_extra', None)
+        if isinstance(extra, dict) and isinstance(extra.get('timings'), dict):
+            self.slot_affinity.record_timings(extra['timings'])
+        self.slot_affinity.release(slot)
+
+    # ===== KV Cache Snapshots =====
+
+    def get_snapshot_store(self) -> Optional[KVSnapshotStore]:
+        """
+        Get the KV snapshot store for the active local server.
+
+        Returns:
+            KVSnapshotStore, or None when using an external API or when
+            'slot-save-path' is not configured in server_params.
+        """
+        if self.config.is_using_external_api():
+            return None
+        snapshot_dir = self.config.get_slot_save_path()
+        if snapshot_dir is None:
+            return None
+        return KVSnapshotStore(snapshot_dir, max_total_bytes=self.config.kv_snapshot_max_bytes,
+                               max_age_days=self.config.kv_snapshot_max_age_days)
+
+    def _slot_action(self, slot: int, action: str, filename: str) -> Dict[str, Any]:
+        """
+        Call llama-server's slot save/restore endpoint.
+
+        Args:
+            slot: Slot id.
+            action: 'save' or 'restore'.
+            filename: Snapshot filename inside the server's slot-save-path.
+
+        Returns:
+            Parsed JSON response.
+
+        Raises:
+            requests.RequestException: If the request fails or the server returns an error.
+        """
+        response = requests.post(
+            f"{self.config.get_server_url()}/slots/{slot}",
+            params={'action': action},
+            json={'filename': filename},
+            timeout=300,
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def save_session_snapshot(self, session_id: str, history_session_id: str, history_dir: Optional[Path] = None) -> Optional[Path]:
+        """
+        Save the KV cache of a conversation's slot next to its chat history.
+
+        Args:
+            session_id: Conversation identifier used with chat().
+            history_session_id: Chat history session ID the snapshot belongs to.
+            history_dir: Chat history directory, used to garbage-collect
+                         snapshots of deleted sessions.
+
+        Returns:
+            Path to the snapshot, or None if snapshots are not configured or the
+            conversation has no slot.
+        """
+        store = self.get_snapshot_store()
+        affinity = self._get_slot_affinity() if store else None
+        slot = affinity.get_slot(session_id) if affinity else None
+        if slot is None:
+            return None
+
+        path = store.path_for(history_session_id)
+        try:
+            result = self._slot_action(slot, 'save', path.name)
+            logger.info(f"Saved KV cache of slot {slot} to {path.name} ({result.get('n_saved', '?')} tokens)")
+        except (requests.RequestException, ValueError) as e:
+            logger.warning(f"Failed to save KV cache snapshot: {e}")
+            return None
+
+        store.collect_garbage(history_dir=history_dir, keep=[history_session_id])
+        return path
+
+    def restore_session_snapshot(self, session_id: str, history_session_id: str) -> Optional[int]:
+        """
+        Restore a saved chat session's KV cache into the conversation's slot.
+
+        Args:
+            session_id: Conversation identifier that will be used with chat().
+            history_session_id: Chat history session ID whose snapshot to restore.
+
+        Returns:
+            Number of restored tokens, or None if there is no snapshot or the
+            restore failed (the next turn then re-prefills as usual).
+        """
+        store = self.get_snapshot_store()
+        if store is None or not store.exists(history_session_id):
+            return None
+
+        affinity = self._get_slot_affinity()
+        slot = affinity.acquire(session_id) if affinity else None
+        if slot is None:
+            return None
+
+        path = store.path_for(history_session_id)
+        try:
+            result = self._slot_action(slot, 'restore', path.name)
+        except (requests.RequestException, ValueError) as e:
+            logger.warning(f"Failed to restore KV cache snapshot {path.name}: {e}")
+            return None
+        finally:
+            affinity.release(slot)
+
+        store.touch(history_session_id)
+        restored = int(result.get('n_restored', 0) or 0)
+        logger.info(f"Restored {restored} tokens from {path.name} into slot {slot}")
+        return restored
+
     def generate(
         self,
         prompt: str,
@@ -483,6 +712,9 @@ class LLMRuntime:
         stream: bool = False,
         use_prompt_config: bool = True,
         max_tool_iterations: int = 10,
+        session_id: Optional[str] = None,
+        deadline: Optional[Deadline] = None,
+        rag_filters: Optional[Dict[str, Any]] = None,
         **kwargs
     ):
         """
@@ -498,6 +730,15 @@ class LLMRuntime:
             use_prompt_config: If True and prompt_config is set, apply prompt formatting to messages.
                               Set to False to send raw messages without prompt config processing.
             max_tool_iterations: Maximum number of tool calling iterations to prevent infinite loops.
+            session_id: Optional conversation identifier. When the local llama-server has
+                       multiple slots configured, requests for the same session are pinned
+                       to the same slot so its cached prompt prefix is reused.
+            deadline: Optional time budget for the whole turn (RAG, tool calls and
+                     generation). Defaults to config.turn_timeout when set. When it
+                     expires, the best partial answer so far is returned.
+            rag_filters: Optional metadata filters (source_file, tags, date_from, date_to)
+                        restricting RAG retrieval, including knowledge base tool calls,
+                        to matching chunks.
             **kwargs: Additional parameters (same as generate()).
 
         Returns:
@@ -509,9 +750,15 @@ class LLMRuntime:
         """
         self._ensure_server_ready()
 
+        # ===== Turn Deadline =====
+        turn_timeout = getattr(self.config, 'turn_timeout', None)
+        if deadline is None and isinstance(turn_timeout, (int, float)) and turn_timeout > 0:
+            deadline = Deadline(turn_timeout)
+
         # ===== Prompt Configuration Processing =====
         # Apply prompt config to format/enhance messages if configured
         processed_messages = messages
+        retrieval_tool = False
         if use_prompt_config and self.prompt_config:
             # Check if this is a simple user message that needs full prompt config treatment
             # (single message or last message is from user)
@@ -520,21 +767,47 @@ class LLMRuntime:
                 user_message = messages[-1]['content']
                 conversation_history = messages[:-1] if len(messages) > 1 else None
 
+                # RAG context is packed into the prompt room left by the local server's
+                # per-slot context (unknown for external APIs)
+                context_tokens = None
+                if not self.config.is_using_external_api():
+                    max_tokens = kwargs.get('max_tokens', self.config.inference_params.get('max_tokens'))
+                    context_tokens = get_context_window(self.config.server_params, max_tokens)
+
+                # With registry "retrieval_mode": "tool" the model searches the knowledge base
+                # when it needs to; streamed turns run no tools, so they keep always-on retrieval
+                retrieval_tool = not stream and self.prompt_config.uses_retrieval_tool() is True
+
                 # Build complete message list with prompt config
                 processed_messages = self.prompt_config.build_messages(
                     user_message=user_message,
-                    conversation_history=conversation_history
+                    conversation_history=conversation_history,
+                    deadline=deadline,
+                    context_tokens=context_tokens,
+                    retrieval_tool=retrieval_tool,
+                    rag_filters=rag_filters
                 )
             # else: messages are already in full format, use as-is
 
         # ===== Tool Calling Setup =====
-        # Get all available tools (memory + llm_invokable)
+        # Get all available tools (memory + knowledge base + llm_invokable)
         tools = None
         memory_manager = None
+        offered_tool_names = None
+        dropped_tools = None
+        knowledge_base_searched = False
         if use_prompt_config and self.prompt_config:
-            tools = self.prompt_config.get_all_tools()
+            tools = self.prompt_config.get_all_tools(retrieval_tool=retrieval_tool)
             memory_manager = self.prompt_config.get_memory_manager()
 
+            # Only send the tool schemas relevant to this message (saves prefill tokens)
+            if tools and getattr(self.config, 'tool_routing', False) is True:
+                all_tools = tools
+                tools = self.tool_router.select(messages, tools)
+                offered_tool_names = {get_tool_name(t) for t in tools or []}
+                # Offered once more if the model says it lacks a capability (a routing miss)
+                dropped_tools = [t for t in all_tools if get_tool_name(t) not in offered_tool_names] or None
+
         # Build API parameters
         api_params = {'messages': processed_messages, 'stream': stream}
         if tools:
@@ -549,26 +822,78 @@ class LLMRuntime:
             # ===== Tool Calling Loop =====
             # Handle multi-turn tool calling (LLM → tool execution → LLM)
             current_messages = processed_messages.copy()
+            turn_start = len(current_messages)
             iteration = 0
 
+            # Configured generation limit, shrunk per call to fit the deadline
+            max_tokens_key = 'max_completion_tokens' if 'max_completion_tokens' in openai_params else 'max_tokens'
+            configured_max_tokens = openai_params.get(max_tokens_key)
+
             while iteration < max_tool_iterations:
                 iteration += 1
 
                 # Update messages in params
                 openai_params['messages'] = current_messages
 
+                # Fit this call into the remaining turn budget
+                if deadline is not None and deadline.has_budget:
+                    if deadline.expired():
+                        logger.warning(f"Turn deadline expired after {iteration - 1} LLM calls, returning partial answer")
+                        return self._partial_answer(current_messages, turn_start)
+                    openai_params['timeout'] = deadline.remaining()
+                    max_tokens = deadline.clamp_max_tokens(configured_max_tokens, self.decode_rate)
+                    if max_tokens is not None:
+                        openai_params[max_tokens_key] = max_tokens
+
                 # Call LLM
-                response = self.client.chat.completions.create(**openai_params)
+                call_start = time.monotonic()
+                try:
+                    response, slot = self._create_chat_completion(openai_params, session_id)
+                except APITimeoutError:
+                    if deadline is None or not deadline.has_budget:
+                        raise
+                    logger.warning("LLM call timed out at the turn deadline, returning partial answer")
+                    return self._partial_answer(current_messages, turn_start)
 
                 # Handle streaming separately (no tool calling in streaming mode)
                 if stream:
                     if iteration > 1:
                         logger.warning("Tool calling not supported in streaming mode, returning after first iteration")
+                    released = []
+
+                    def release(chunk=None):
+                        # Once, whether the stream finishes or is dropped
+                        if not released:
+                            released.append(True)
+                            self._release_slot(slot, chunk)
+
                     def stream_generator():
-                        for chunk in response:
-                            if chunk.choices[0].delta.content:
-                                yield chunk.choices[0].delta.content
-                    return stream_generator()
+                        last_chunk = None
+                        try:
+                            for chunk in response:
+                                last_chunk = chunk
+                                if chunk.choices[0].delta.content:
+                                    yield chunk.choices[0].delta.content
+                                if deadline is not None and deadline.expired():
+                                    # Stop generating; what was streamed is the partial answer
+                                    logger.warning("Turn deadline expired during streaming, stopping generation")
+                                    response.close()
+                                    break
+                        except APITimeoutError:
+                            if deadline is None or not deadline.has_budget:
+                                raise
+                            logger.warning("Stream timed out at the turn deadline")
+                        finally:
+                            # llama-server reports timings on the final chunk
+                            release(last_chunk)
+
+                    generator = stream_generator()
+                    # A stream dropped before it is iterated never runs its finally block
+                    weakref.finalize(generator, release)
+                    return generator
+
+                self._release_slot(slot, response)
+                self._record_decode_rate(response, time.monotonic() - call_start)
 
                 # Non-streaming: check for tool calls
                 message = response.choices[0].message
@@ -597,6 +922,13 @@ class LLMRuntime:
                 # If no tool calls, we're done
                 if not message.tool_calls:
                     response_text = message.content or ""
+                    if dropped_tools and admits_missing_capability(response_text):
+                        # Routing miss: repeat the call with every tool (once per turn)
+                        self.tool_router.record_miss(get_tool_name(t) for t in dropped_tools)
+                        openai_params['tools'] = list(openai_params.get('tools') or []) + dropped_tools
+                        openai_params['tool_choice'] = 'auto'
+                        dropped_tools = None
+                        continue
                     logger.debug(f"Generated {len(response_text)} characters (no tool calls)")
                     return response_text
 
@@ -625,6 +957,8 @@ class LLMRuntime:
                     import json
 
                     tool_name = tool_call.function.name
+                    if offered_tool_names is not None and tool_name not in offered_tool_names:
+                        self.tool_router.record_unoffered_call(tool_name)
 
                     try:
                         arguments = json.loads(tool_call.function.arguments)
@@ -633,9 +967,12 @@ class LLMRuntime:
                         arguments = {}
 
                     logger.debug(f"Executing tool: {tool_name} with args: {arguments}")
+                    if tool_name in RAG_TOOL_NAMES:
+                        knowledge_base_searched = True
 
                     # Dispatch tool execution based on tool type
-                    tool_result = self._execute_tool(tool_name, arguments, memory_manager)
+                    tool_result = self._execute_tool(tool_name, arguments, memory_manager, deadline=deadline,
+                                                     rag_filters=rag_filters)
 
                     # Add tool result to conversation
                     current_messages.append({
@@ -655,22 +992,70 @@ class LLMRuntime:
             logger.error(f"Chat generation failed: {e}")
             raise RuntimeError(f"Failed to generate chat completion: {e}") from e
 
-    def _execute_tool(self, tool_name: str, arguments: dict, memory_manager) -> dict:
+        finally:
+            # Counts the messages the model answered without searching the knowledge base
+            if retrieval_tool:
+                self.prompt_config.record_retrieval(knowledge_base_searched)
+
+    def _partial_answer(self, current_messages: List[Dict[str, Any]], turn_start: int) -> str:
+        """
+        Best answer available when a turn's deadline expires.
+
+        Args:
+            current_messages: Messages of the tool loop so far.
+            turn_start: Index of the first message added during this turn.
+
+        Returns:
+            The latest assistant text produced during the turn, or a fallback message.
+        """
+        for msg in reversed(current_messages[turn_start:]):
+            if msg.get('role') == 'assistant' and msg.get('content'):
+                return msg['content']
+        return DEADLINE_EXCEEDED_MESSAGE
+
+    def _record_decode_rate(self, response: Any, elapsed: float) -> None:
+        """
+        Update the observed decode rate from a completed response.
+
+        Args:
+            response: Non-streaming chat completion response.
+            elapsed: Seconds the request took (prefill included, so the rate is conservative).
+        """
+        usage = getattr(response, 'usage', None)
+        completion_tokens = getattr(usage, 'completion_tokens', None)
+        if not isinstance(completion_tokens, int) or completion_tokens <= 0 or elapsed <= 0:
+            return
+        rate = completion_tokens / elapsed
+        # Exponential moving average smooths out short replies
+        self.decode_rate = rate if self.decode_rate is None else 0.7 * self.decode_rate + 0.3 * rate
+
+    def _execute_tool(self, tool_name: str, arguments: dict, memory_manager, deadline: Optional[Deadline] = None,
+                      rag_filters: Optional[Dict[str, Any]] = None) -> dict:
         """
         Execute a tool call by dispatching to the appropriate handler.
 
         This method routes tool calls to either:
         - Memory tools (handled by memory_tools module)
+        - Knowledge base tools (handled by rag_tools module)
         - LLM-invokable tools (loaded from tools registry)
 
         Args:
             tool_name: Name of the tool to execute
             arguments: Tool arguments as dictionary
             memory_manager: Memory manager instance (for memory tools)
+            deadline: Optional turn deadline. Tools are skipped once it has expired,
+                      a 'timeout' argument is shrunk to the remaining budget, and
+                      the call is abandoned if it runs past the deadline.
+            rag_filters: Session metadata filters for knowledge base searches; they
+                        override filters of the same key chosen by the model.
 
         Returns:
             Tool execution result as dictionary
         """
+        if deadline is not None and deadline.expired():
+            logger.warning(f"Turn deadline expired, not executing tool: {tool_name}")
+            return {"success": False, "error": "Time budget for this turn is exhausted; tool was not executed"}
+
         # Try memory tools first
         from llf.memory_tools import MEMORY_TOOL_NAMES, execute_memory_tool
 
@@ -681,6 +1066,15 @@ class LLMRuntime:
                 logger.error(f"Memory manager not available for tool: {tool_name}")
                 return {"success": False, "error": "Memory manager not available"}
 
+        if tool_name in RAG_TOOL_NAMES:
+            rag_retriever = self.prompt_config.get_rag_retriever() if self.prompt_config else None
+            if rag_retriever:
+                timeout = deadline.remaining() if deadline is not None and deadline.has_budget else None
+                return execute_rag_tool(tool_name, arguments, rag_retriever, timeout=timeout, filters=rag_filters)
+            else:
+                logger.error(f"RAG retriever not available for tool: {tool_name}")
+                return {"success": False, "error": "Knowledge base not available"}
+
         # Try llm_invokable tools from registry
         try:
             from llf.tools_manager import ToolsManager
@@ -690,6 +1084,8 @@ class LLMRuntime:
             module = tools_manager.load_tool_module(tool_name)
             if module and hasattr(module, 'execute'):
                 logger.debug(f"Executing llm_invokable tool: {tool_name}")
+                if deadline is not None and deadline.has_budget:
+                    return self._execute_with_deadline(module, tool_name, arguments, deadline)
                 return module.execute(arguments)
             else:
                 logger.error(f"Tool '{tool_name}' not found or missing execute() function")
@@ -699,6 +1095,47 @@ class LLMRuntime:
             logger.error(f"Error executing tool '{tool_name}': {e}")
             return {"success": False, "error": str(e)}
 
+    def _execute_with_deadline(self, module, tool_name: str, arguments: dict, deadline: Deadline) -> dict:
+        """
+        Run an llm_invokable tool within the remaining turn budget.
+
+        Args:
+            module: Loaded tool module with an execute() function.
+            tool_name: Name of the tool (for logging).
+            arguments: Tool arguments as dictionary.
+            deadline: Turn deadline with a budget.
+
+        Returns:
+            Tool result, or an error result if the tool did not finish in time.
+        """
+        # Shrink the tool's own timeout (e.g., command_exec) to the remaining budget
+        properties = (getattr(module, 'TOOL_DEFINITION', None) or {}).get('function', {}).get('parameters', {}).get('properties', {})
+        if 'timeout' in properties:
+            requested = arguments.get('timeout', properties['timeout'].get('default'))
+            budget = int(deadline.clamp_timeout(requested if isinstance(requested, (int, float)) else deadline.remaining()))
+            arguments = {**arguments, 'timeout': budget}
+
+        import threading
+        result: Dict[str, Any] = {}
+
+        def run():
+            try:
+                result['value'] = module.execute(arguments)
+            except Exception as e:
+                result['error'] = e
+
+        # Tools cannot be interrupted, so one that overruns is left to finish in the background
+        worker = threading.Thread(target=run, name=f"tool-{tool_name}", daemon=True)
+        worker.start()
+        worker.join(deadline.remaining() + 1.0)
+
+        if worker.is_alive():
+            logger.warning(f"Tool '{tool_name}' did not finish before the turn deadline")
+            return {"success": False, "error": f"Tool '{tool_name}' did not finish within the time budget for this turn"}
+        if 'error' in result:
+            raise result['error']
+        return result['value']
+
     def list_models(self) -> list:
         """
         List available models from the LLM endpoint.
@@ -875,7 +1312,9 @@ class LLMRuntime:
         # Add server parameters
         if server_config.server_params:
             for key, value in server_config.server_params.items():
-                cmd.extend(["--server-arg", key, str(value)])
+                if key == 'slot-save-path':
+                    value = self.config.get_slot_save_path(server_config.server_params)
+                cmd.extend(["--server-arg", key, '' if value is True else str(value)])
 
         logger.info(f"Starting server '{server_name}' on {server_config.server_host}:{server_config.server_port}")
         logger.debug(f"Command: {' '.join(cmd)}")
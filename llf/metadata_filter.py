@@ -0,0 +1,379 @@
+"""
+Metadata filters for vector store searches.
+
+Restricting an answer to one manual or source file used to mean searching
+the whole index and dropping the results from other files, which wastes
+the top-k. A filter is compiled into the set of eligible vector ids instead,
+so the FAISS search (and the BM25 search of hybrid stores) only returns
+eligible chunks.
+
+Filters (all optional; a chunk must match every given key, and any of the
+values given for a key):
+
+- source_file: source file names, matched case-insensitively against a
+  chunk's source_file, its source JSONL file and its web domain; shell
+  wildcards are allowed ("manual*.pdf")
+- tags: tags, matched case-insensitively against a chunk's tags
+- date_from / date_to: inclusive YYYY-MM-DD bounds on a chunk's date,
+  created or modified field; chunks without a date do not match
+
+MetadataFilterIndex is a sidecar of metadata.jsonl (metadata.filters.npz):
+for each source and tag the sorted ids of its chunks, and one day number
+per chunk. Create_VectorStore.py writes it and --update extends it; a
+store without a current sidecar gets one on its first filtered query.
+
+Design: Vector ids are metadata row numbers, so a filter resolves to a
+boolean mask over the rows with a few numpy operations, without decoding
+any metadata at query time.
+"""
+
+import fnmatch
+import re
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+# Sidecar file written next to metadata.jsonl
+FILTERS_FILENAME = 'metadata.filters.npz'
+
+# Filter keys and the metadata fields they look at
+FILTER_KEYS = ('source_file', 'tags', 'date_from', 'date_to')
+SOURCE_FIELDS = ('source_file', '_source_jsonl', 'domain')
+TAG_FIELDS = ('tags',)
+DATE_FIELDS = ('date', 'created', 'modified')
+
+# YYYY-MM-DD, YYYYMMDD or PDF-style D:YYYYMMDD... at the start of a date value
+_DATE = re.compile(r'^(?:D:)?(\d{4})-?(\d{2})-?(\d{2})')
+
+
+def filters_path_for(metadata_path: Path) -> Path:
+    """Get the filter sidecar path for a metadata.jsonl file."""
+    return Path(metadata_path).with_name(FILTERS_FILENAME)
+
+
+def parse_date(value: Any) -> int:
+    """
+    Convert a date value to a day number (YYYYMMDD).
+
+    Args:
+        value: Date string such as "2024-03-01", "2024-03-01T10:00:00" or "D:20240301"
+
+    Returns:
+        Day number, or 0 if value is not a recognizable date
+    """
+    match = _DATE.match(str(value).strip()) if value else None
+    return int(''.join(match.groups())) if match else 0
+
+
+def _as_list(value: Any) -> List[str]:
+    """Turn a single value, comma-separated string or list into a list of strings."""
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [part.strip() for part in value.split(',') if part.strip()]
+    if isinstance(value, (list, tuple, set)):
+        return [str(part).strip() for part in value if str(part).strip()]
+    return [str(value)]
+
+
+def normalize_filters(filters: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    Validate filters and bring them into canonical form.
+
+    Args:
+        filters: Filter dict (see module docstring); values may be strings,
+                comma-separated strings or lists
+
+    Returns:
+        Dict with lowercased source_file/tags lists and date_from/date_to day
+        numbers, without empty keys; None if nothing is filtered
+
+    Raises:
+        ValueError: On unknown keys or unparseable dates
+    """
+    if not filters:
+        return None
+
+    unknown = set(filters) - set(FILTER_KEYS)
+    if unknown:
+        raise ValueError(f"Unknown filter(s): {', '.join(sorted(unknown))} "
+                         f"(expected {', '.join(FILTER_KEYS)})")
+
+    normalized: Dict[str, Any] = {}
+    for key in ('source_file', 'tags'):
+        values = sorted({value.lower() for value in _as_list(filters.get(key))})
+        if values:
+            normalized[key] = values
+    for key in ('date_from', 'date_to'):
+        value = filters.get(key)
+        if value in (None, ''):
+            continue
+        day = parse_date(value)
+        if not day:
+            raise ValueError(f"Invalid {key} '{value}' (expected YYYY-MM-DD)")
+        normalized[key] = day
+
+    return normalized or None
+
+
+def parse_filter_expressions(expressions: Iterable[str]) -> Optional[Dict[str, Any]]:
+    """
+    Parse KEY=VALUE filter expressions (command line, GUI).
+
+    Repeated source_file and tags keys add values; values may also be
+    comma-separated. "source" and "tag" are accepted for source_file and tags.
+
+    Args:
+        expressions: Strings such as "source_file=manual.pdf" or "tags=api,auth"
+
+    Returns:
+        Canonical filters from normalize_filters, or None if there are none
+
+    Raises:
+        ValueError: On malformed expressions, unknown keys or invalid dates
+    """
+    aliases = {'source': 'source_file', 'tag': 'tags'}
+    filters: Dict[str, Any] = {}
+    for expression in expressions:
+        if not expression or not expression.strip():
+            continue
+        key, separator, value = expression.partition('=')
+        if not separator:
+            raise ValueError(f"Invalid filter '{expression}' (expected KEY=VALUE)")
+        key = aliases.get(key.strip(), key.strip())
+        if key in ('source_file', 'tags'):
+            filters.setdefault(key, []).extend(_as_list(value))
+        else:
+            filters[key] = value.strip()
+    return normalize_filters(filters)
+
+
+def describe_filters(filters: Optional[Dict[str, Any]]) -> str:
+    """
+    Format canonical filters for display.
+
+    Args:
+        filters: Canonical filters from normalize_filters
+
+    Returns:
+        Text such as "source_file=manual.pdf; date_from=2024-01-01"
+    """
+    parts = []
+    for key, value in (filters or {}).items():
+        if key in ('date_from', 'date_to'):
+            value = f"{value // 10000:04d}-{value // 100 % 100:02d}-{value % 100:02d}"
+        elif isinstance(value, list):
+            value = ','.join(value)
+        parts.append(f"{key}={value}")
+    return '; '.join(parts)
+
+
+class MetadataFilterIndex:
+    """
+    Chunk ids per source and tag, and a day number per chunk.
+
+    Sources and tags are stored as sorted, lowercased value arrays with the
+    ids of each value in one concatenated array (value i owns
+    ids[offsets[i]:offsets[i + 1]]).
+    """
+
+    def __init__(self, sources: np.ndarray, source_offsets: np.ndarray, source_ids: np.ndarray,
+                 tags: np.ndarray, tag_offsets: np.ndarray, tag_ids: np.ndarray, dates: np.ndarray):
+        self.sources = sources
+        self.source_offsets = source_offsets
+        self.source_ids = source_ids
+        self.tags = tags
+        self.tag_offsets = tag_offsets
+        self.tag_ids = tag_ids
+        self.dates = dates
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    @staticmethod
+    def _row_values(row: Dict[str, Any], fields: Sequence[str]) -> List[str]:
+        values = []
+        for field in fields:
+            values.extend(value.lower() for value in _as_list(row.get(field)))
+        return values
+
+    @staticmethod
+    def _row_date(row: Dict[str, Any]) -> int:
+        for field in DATE_FIELDS:
+            day = parse_date(row.get(field))
+            if day:
+                return day
+        return 0
+
+    @classmethod
+    def build(cls, rows: Iterable[Dict[str, Any]]) -> 'MetadataFilterIndex':
+        """
+        Build the index from metadata rows.
+
+        Args:
+            rows: Metadata dicts in row (vector id) order
+
+        Returns:
+            MetadataFilterIndex
+        """
+        return cls._empty().extend(rows)
+
+    @classmethod
+    def _empty(cls) -> 'MetadataFilterIndex':
+        no_ids = np.zeros(0, dtype=np.int64)
+        no_values = np.zeros(0, dtype=np.str_)
+        return cls(no_values, np.zeros(1, dtype=np.int64), no_ids,
+                   no_values, np.zeros(1, dtype=np.int64), no_ids, np.zeros(0, dtype=np.int32))
+
+    @staticmethod
+    def _postings(values: np.ndarray, offsets: np.ndarray, ids: np.ndarray) -> Dict[str, List[int]]:
+        return {str(value): ids[offsets[i]:offsets[i + 1]].tolist() for i, value in enumerate(values)}
+
+    @staticmethod
+    def _pack(postings: Dict[str, List[int]]):
+        values = sorted(postings)
+        offsets = np.zeros(len(values) + 1, dtype=np.int64)
+        if values:
+            offsets[1:] = np.cumsum([len(postings[value]) for value in values])
+        ids = np.array([row_id for value in values for row_id in postings[value]], dtype=np.int64)
+        return np.array(values, dtype=np.str_), offsets, ids
+
+    def extend(self, rows: Iterable[Dict[str, Any]]) -> 'MetadataFilterIndex':
+        """
+        Add rows after the last indexed row (metadata.jsonl only grows).
+
+        Args:
+            rows: Metadata dicts of the new rows, in row order
+
+        Returns:
+            New MetadataFilterIndex covering the old and new rows
+        """
+        sources = self._postings(self.sources, self.source_offsets, self.source_ids)
+        tags = self._postings(self.tags, self.tag_offsets, self.tag_ids)
+        dates = []
+
+        row_id = len(self.dates)
+        for row in rows:
+            for value in set(self._row_values(row, SOURCE_FIELDS)):
+                sources.setdefault(value, []).append(row_id)
+            for value in set(self._row_values(row, TAG_FIELDS)):
+                tags.setdefault(value, []).append(row_id)
+            dates.append(self._row_date(row))
+            row_id += 1
+
+        return MetadataFilterIndex(*self._pack(sources), *self._pack(tags),
+                                   np.concatenate([self.dates, np.array(dates, dtype=np.int32)]))
+
+    def save(self, path: Path) -> None:
+        """
+        Save the index to a .npz file.
+
+        Args:
+            path: Destination file
+        """
+        with open(path, 'wb') as f:
+            np.savez(f, sources=self.sources, source_offsets=self.source_offsets, source_ids=self.source_ids,
+                     tags=self.tags, tag_offsets=self.tag_offsets, tag_ids=self.tag_ids, dates=self.dates)
+
+    @classmethod
+    def load(cls, path: Path) -> 'MetadataFilterIndex':
+        """
+        Load an index saved by save().
+
+        Args:
+            path: Path to metadata.filters.npz
+
+        Returns:
+            MetadataFilterIndex
+        """
+        with np.load(path) as data:
+            return cls(data['sources'], data['source_offsets'], data['source_ids'],
+                       data['tags'], data['tag_offsets'], data['tag_ids'], data['dates'])
+
+    def _value_mask(self, patterns: List[str], values: np.ndarray, offsets: np.ndarray,
+                    ids: np.ndarray) -> np.ndarray:
+        mask = np.zeros(len(self.dates), dtype=bool)
+        for i, value in enumerate(values):
+            if any(fnmatch.fnmatchcase(str(value), pattern) for pattern in patterns):
+                mask[ids[offsets[i]:offsets[i + 1]]] = True
+        return mask
+
+    def select(self, filters: Dict[str, Any]) -> np.ndarray:
+        """
+        Resolve canonical filters to the eligible rows.
+
+        Args:
+            filters: Canonical filters from normalize_filters
+
+        Returns:
+            Boolean mask indexed by vector id
+        """
+        mask = np.ones(len(self.dates), dtype=bool)
+        if 'source_file' in filters:
+            mask &= self._value_mask(filters['source_file'], self.sources, self.source_offsets, self.source_ids)
+        if 'tags' in filters:
+            mask &= self._value_mask(filters['tags'], self.tags, self.tag_offsets, self.tag_ids)
+        if 'date_from' in filters or 'date_to' in filters:
+            mask &= self.dates > 0
+            if 'date_from' in filters:
+                mask &= self.dates >= filters['date_from']
+            if 'date_to' in filters:
+                mask &= self.dates <= filters['date_to']
+        return mask
+
+
+def write_filter_index(metadata_path: Path, rows: Iterable[Dict[str, Any]]) -> Path:
+    """
+    Build and write the filter sidecar for a metadata.jsonl file.
+
+    Args:
+        metadata_path: Path to metadata.jsonl
+        rows: Its metadata dicts, in row order
+
+    Returns:
+        Path of the written sidecar
+    """
+    path = filters_path_for(metadata_path)
+    tmp_path = path.with_name(path.name + '.tmp')
+    MetadataFilterIndex.build(rows).save(tmp_path)
+    tmp_path.replace(path)
+    return path
+
+
+def load_filter_index(metadata_path: Path, metadata: Sequence[Dict[str, Any]],
+                      save: bool = True) -> MetadataFilterIndex:
+    """
+    Load the filter sidecar, rebuilding it if it is missing or stale.
+
+    Args:
+        metadata_path: Path to metadata.jsonl
+        metadata: Its rows (MetadataIndex), used when the sidecar has to be rebuilt
+        save: Write a rebuilt sidecar so the next load is instant
+            (skipped if the directory is read-only)
+
+    Returns:
+        MetadataFilterIndex covering every metadata row
+    """
+    path = filters_path_for(metadata_path)
+    try:
+        if path.exists() and path.stat().st_mtime >= Path(metadata_path).stat().st_mtime:
+            index = MetadataFilterIndex.load(path)
+            if len(index) == len(metadata):
+                return index
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning(f"Ignoring unreadable filter index {path}: {e}")
+
+    logger.info(f"Building metadata filter index for {metadata_path}")
+    index = MetadataFilterIndex.build(metadata)
+    if save:
+        try:
+            index.save(path)
+        except OSError as e:
+            logger.warning(f"Could not save metadata filter index: {e}")
+    return index
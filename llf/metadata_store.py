@@ -0,0 +1,199 @@
+"""
+Offset-indexed metadata for vector stores.
+
+A vector store keeps one JSON record per vector in metadata.jsonl. Parsing
+every line into a list of dicts costs gigabytes of heap and tens of seconds
+for multi-million chunk stores, while a query only needs its top-k rows.
+
+MetadataIndex memory-maps metadata.jsonl and reads rows through an offset
+table (metadata.offsets.npy, one (start, end) byte range per record). Only
+the rows a query asks for are decoded. The offset table is written by
+Create_VectorStore.py and rebuilt here (one pass over the bytes, no JSON
+parsing) when it is missing or older than metadata.jsonl.
+
+Design: metadata.jsonl stays the source of truth, so existing stores keep
+working and the sidecar can always be regenerated. MetadataIndex behaves like
+the read-only list it replaces (len() and [idx]).
+"""
+
+import json
+import mmap
+import operator
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+# Offset table file written next to metadata.jsonl
+OFFSETS_FILENAME = 'metadata.offsets.npy'
+
+
+def offsets_path_for(metadata_path: Path) -> Path:
+    """Get the offset table path for a metadata.jsonl file."""
+    return Path(metadata_path).with_name(OFFSETS_FILENAME)
+
+
+def build_offsets(metadata_path: Path) -> np.ndarray:
+    """
+    Scan metadata.jsonl and record the byte range of every non-blank line.
+
+    Args:
+        metadata_path: Path to metadata.jsonl
+
+    Returns:
+        uint64 array of shape (n + 1, 2). Row 0 is a header of
+        (file size, record count); rows 1..n are (start, end) byte offsets.
+    """
+    ranges = []
+    position = 0
+    with open(metadata_path, 'rb') as f:
+        for line in f:
+            end = position + len(line)
+            if line.strip():
+                ranges.append((position, end))
+            position = end
+
+    offsets = np.empty((len(ranges) + 1, 2), dtype=np.uint64)
+    offsets[0] = (position, len(ranges))
+    if ranges:
+        offsets[1:] = ranges
+    return offsets
+
+
+def write_offsets(metadata_path: Path, offsets: Optional[np.ndarray] = None) -> Path:
+    """
+    Write the offset table for a metadata.jsonl file.
+
+    Args:
+        metadata_path: Path to metadata.jsonl
+        offsets: Precomputed table from build_offsets (built if None)
+
+    Returns:
+        Path of the written offset table
+    """
+    if offsets is None:
+        offsets = build_offsets(metadata_path)
+    path = offsets_path_for(metadata_path)
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'wb') as f:
+        np.save(f, offsets)
+    tmp_path.replace(path)
+    return path
+
+
+def load_offsets(metadata_path: Path) -> Optional[np.ndarray]:
+    """
+    Load the offset table if it is present and current.
+
+    Args:
+        metadata_path: Path to metadata.jsonl
+
+    Returns:
+        Memory-mapped offset table, or None if missing or stale
+    """
+    path = offsets_path_for(metadata_path)
+    if not path.exists():
+        return None
+
+    try:
+        metadata_stat = Path(metadata_path).stat()
+        if path.stat().st_mtime < metadata_stat.st_mtime:
+            return None
+        offsets = np.load(path, mmap_mode='r')
+        if offsets.ndim != 2 or offsets.shape[1] != 2 or int(offsets[0, 0]) != metadata_stat.st_size:
+            return None
+        return offsets
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable offset table {path}: {e}")
+        return None
+
+
+class MetadataIndex:
+    """Read-only, random-access view of metadata.jsonl."""
+
+    def __init__(self, metadata_path: Path, save_offsets: bool = True):
+        """
+        Open a metadata file.
+
+        Args:
+            metadata_path: Path to metadata.jsonl
+            save_offsets: Write a rebuilt offset table next to the metadata
+                so the next load is instant (skipped if the directory is read-only)
+        """
+        self.metadata_path = Path(metadata_path)
+
+        offsets = load_offsets(self.metadata_path)
+        if offsets is None:
+            logger.info(f"Building metadata offset table for {self.metadata_path}")
+            offsets = build_offsets(self.metadata_path)
+            if save_offsets:
+                try:
+                    write_offsets(self.metadata_path, offsets)
+                except OSError as e:
+                    logger.warning(f"Could not save metadata offset table: {e}")
+
+        self._ranges = offsets[1:]
+        self._file = open(self.metadata_path, 'rb')
+        # mmap cannot map an empty file
+        self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if offsets[0, 0] else b''
+
+    def __len__(self) -> int:
+        return len(self._ranges)
+
+    def __getitem__(self, idx: Any) -> Dict[str, Any]:
+        """
+        Decode one record.
+
+        Args:
+            idx: Record index (Python or numpy integer; negative counts from the end)
+
+        Returns:
+            Metadata dict for the record
+
+        Raises:
+            IndexError: If idx is out of range
+        """
+        idx = operator.index(idx)
+        if idx < 0:
+            idx += len(self._ranges)
+        if not 0 <= idx < len(self._ranges):
+            raise IndexError(f"metadata index {idx} out of range")
+
+        start, end = self._ranges[idx]
+        return json.loads(self._data[int(start):int(end)])
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self[idx]
+
+    def rows(self, indices: Iterable[int]) -> List[Dict[str, Any]]:
+        """
+        Decode several records.
+
+        Args:
+            indices: Record indices
+
+        Returns:
+            Metadata dicts in the same order
+        """
+        return [self[idx] for idx in indices]
+
+    def close(self):
+        """Release the memory map and file handle."""
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        self._file.close()
+
+    def __enter__(self) -> 'MetadataIndex':
+        return self
+
+    def __exit__(self, _exc_type, _exc_val, _exc_tb):
+        self.close()
+
+    def __repr__(self) -> str:
+        return f"MetadataIndex({self.metadata_path}, records={len(self)})"
@@ -0,0 +1,174 @@
+"""
+Micro-batching of concurrent calls.
+
+When several users send messages at the same moment, each search thread
+would encode its query and search each store with a batch of one. Encoders
+and FAISS indexes do much more work per call on a batch than on a single
+row, so MicroBatcher lets calls that arrive together share one call:
+
+- The first caller for a key (an embedding model, a store's index) opens a
+  batch; callers arriving within max_wait_ms join it, up to max_batch_size
+- The caller that opened the batch runs it and hands every caller its own
+  result; an error is raised in every caller of the batch
+- A call for an item that is already pending or running (the same query
+  text on the same model) waits for that result instead of adding a row
+
+Design: There is no background thread. The opening caller only waits for
+others to join when calls for the same key are already under way, so a
+query on an idle retriever runs at once and batching only costs latency
+(at most max_wait_ms) under load, when it also saves the most.
+"""
+
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+# Default micro-batching configuration (registry "micro_batching" section)
+DEFAULT_MICRO_BATCH_CONFIG = {
+    "enabled": True,
+    "max_wait_ms": 2.0,
+    "max_batch_size": 32
+}
+
+
+class _Batch:
+    """Items collected for one batched call."""
+
+    def __init__(self, wait: bool):
+        self.wait = wait
+        self.items: List[Any] = []
+        self.item_keys: List[Optional[Hashable]] = []
+        self.futures: List[Future] = []
+        self.closed = threading.Event()
+
+
+class MicroBatcher:
+    """
+    Groups calls that arrive close together into one batched call.
+    """
+
+    def __init__(self, max_wait_ms: float = DEFAULT_MICRO_BATCH_CONFIG['max_wait_ms'],
+                 max_batch_size: int = DEFAULT_MICRO_BATCH_CONFIG['max_batch_size']):
+        """
+        Initialize the batcher.
+
+        Args:
+            max_wait_ms: Longest time a batch stays open for more callers
+            max_batch_size: Items after which a batch is run without waiting
+        """
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000
+        self.max_batch_size = max(1, int(max_batch_size))
+
+        self._lock = threading.Lock()
+        self._pending: Dict[Hashable, _Batch] = {}
+        self._inflight: Dict[Tuple[Hashable, Hashable], Future] = {}
+        self._active: Dict[Hashable, int] = {}
+
+        self._stats = {'calls': 0, 'batches': 0, 'batched_calls': 0, 'shared': 0, 'max_batch': 0}
+
+    def run(self, key: Hashable, item: Any, run_batch: Callable[[List[Any]], Sequence[Any]],
+            item_key: Optional[Hashable] = None) -> Any:
+        """
+        Run item as part of a batch and return its result.
+
+        Args:
+            key: Batches only combine items with the same key
+            item: Input for run_batch
+            run_batch: Takes a list of items and returns one result per item, in order
+            item_key: Identifies equal items; a call for an item that is already
+                pending or running shares its result (None = never shared)
+
+        Returns:
+            Result of item
+
+        Raises:
+            Exception: Whatever run_batch raised for the batch
+        """
+        with self._lock:
+            self._stats['calls'] += 1
+            shared = self._inflight.get((key, item_key)) if item_key is not None else None
+            if shared is not None:
+                self._stats['shared'] += 1
+            else:
+                future: Future = Future()
+                if item_key is not None:
+                    self._inflight[(key, item_key)] = future
+
+                batch = self._pending.get(key)
+                opened = batch is None
+                if opened:
+                    # Only wait for company when other calls for this key are under way
+                    batch = self._pending[key] = _Batch(wait=self._active.get(key, 0) > 0)
+                batch.items.append(item)
+                batch.item_keys.append(item_key)
+                batch.futures.append(future)
+                if len(batch.items) >= self.max_batch_size:
+                    self._close(key, batch)
+                self._active[key] = self._active.get(key, 0) + 1
+
+        if shared is not None:
+            return shared.result()
+
+        try:
+            if opened:
+                if batch.wait and self.max_wait > 0:
+                    batch.closed.wait(self.max_wait)
+                with self._lock:
+                    self._close(key, batch)
+                self._execute(key, batch, run_batch)
+            return future.result()
+        finally:
+            with self._lock:
+                self._active[key] -= 1
+                if not self._active[key]:
+                    del self._active[key]
+
+    def _close(self, key: Hashable, batch: _Batch) -> None:
+        """Stop a batch from taking more items (called with the lock held)."""
+        if self._pending.get(key) is batch:
+            del self._pending[key]
+        batch.closed.set()
+
+    def _execute(self, key: Hashable, batch: _Batch, run_batch: Callable[[List[Any]], Sequence[Any]]) -> None:
+        """Run a closed batch and resolve its callers' futures."""
+        started = time.monotonic()
+        try:
+            results = run_batch(batch.items)
+            if len(results) != len(batch.items):
+                raise ValueError(f"Batch of {len(batch.items)} items returned {len(results)} results")
+        except BaseException as e:
+            for future in batch.futures:
+                future.set_exception(e)
+        else:
+            for future, result in zip(batch.futures, results):
+                future.set_result(result)
+        finally:
+            with self._lock:
+                for item_key in batch.item_keys:
+                    if item_key is not None:
+                        self._inflight.pop((key, item_key), None)
+                self._stats['batches'] += 1
+                if len(batch.items) > 1:
+                    self._stats['batched_calls'] += len(batch.items)
+                self._stats['max_batch'] = max(self._stats['max_batch'], len(batch.items))
+
+        if len(batch.items) > 1:
+            logger.debug(f"Ran a batch of {len(batch.items)} in {(time.monotonic() - started) * 1000:.1f}ms")
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get batching statistics.
+
+        Returns:
+            Dict with calls, batches run, calls that ran in a batch of more
+            than one, calls that shared an equal item's result and the
+            largest batch
+        """
+        with self._lock:
+            return dict(self._stats)
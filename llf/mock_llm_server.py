@@ -0,0 +1,525 @@
+"""
+Mock llama-server for Local LLM Framework benchmarks and tests.
+
+This module provides a small, dependency-free stand-in for llama-server that
+speaks enough of its HTTP API for LLF to run end-to-end without a model:
+- GET  /health                   Health check used by LLMRuntime
+- GET  /v1/models                Model listing
+- POST /v1/chat/completions      Chat completions (streaming and tool calls)
+- POST /tokenize                 Approximate tokenizer
+- POST /v1/embeddings            Embeddings (llama-server --embedding)
+- POST /slots/{id}?action=...    Slot save/restore (when slot_save_path is set)
+
+Slots are simulated too: each remembers the last prompt it processed, and
+responses carry llama-server style 'timings' (cache_n / prompt_n) so prefix
+cache reuse can be measured. Requests honour 'id_slot' when given.
+
+Latency is simulated with a fixed prefill delay plus a decode rate, so LLF's
+own overhead can be separated from "model" time. Every request records the
+time the server spent on it, which benchmarks subtract from client wall time.
+
+Design: Built on http.server so it runs anywhere Python runs (no extra deps).
+"""
+
+import hashlib
+import json
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from dataclasses import dataclass, asdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+# Name of the tool the mock server asks LLF to call during tool-loop scenarios.
+# It is not registered anywhere, so LLF's dispatcher returns an error result
+# immediately and the loop continues without side effects.
+MOCK_TOOL_NAME = "bench_noop"
+
+# Crude tokenizer: words and individual punctuation marks
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+
+def approximate_tokens(text: str) -> List[int]:
+    """
+    Split text into approximate token ids.
+
+    Args:
+        text: Text to tokenize.
+
+    Returns:
+        List of integer token ids (stable per token string within a process).
+    """
+    return [hash(tok) % 32000 for tok in _TOKEN_PATTERN.findall(text or "")]
+
+
+def mock_embedding(text: str, dimension: int) -> List[float]:
+    """
+    Embed text as a bag of words.
+
+    Each lowercased word gets a fixed pseudo-random vector and a text is the
+    sum of its words' vectors, so texts sharing words are similar and the
+    same text gets the same vector in every process.
+
+    Args:
+        text: Text to embed.
+        dimension: Number of dimensions.
+
+    Returns:
+        Unnormalized embedding.
+    """
+    vector = [0.0] * dimension
+    for word in re.findall(r"\w+", (text or "").lower()):
+        rng = random.Random(hashlib.md5(word.encode('utf-8')).hexdigest())
+        for i in range(dimension):
+            vector[i] += rng.gauss(0.0, 1.0)
+    return vector
+
+
+@dataclass
+class MockServerSettings:
+    """Behaviour knobs for the mock server."""
+    latency_ms: float = 0.0          # Fixed delay before the first token (simulated prefill)
+    tokens_per_second: float = 0.0   # Decode rate; 0 means unlimited
+    response_tokens: int = 32        # Tokens in every assistant reply
+    tool_rounds: int = 0             # Tool calls to request per user turn before answering
+    slots: int = 1                   # Simulated KV cache slots (llama-server --parallel)
+    slot_save_path: Optional[str] = None  # Directory for slot save/restore (llama-server --slot-save-path)
+    model_name: str = "mock-model"
+    embedding_dim: int = 32          # Dimensions of /v1/embeddings vectors
+
+
+class MockLLMServer:
+    """
+    Threaded mock llama-server bound to localhost.
+
+    Usage:
+        with MockLLMServer(MockServerSettings(latency_ms=50)) as server:
+            config.api_base_url = server.api_base_url
+            ...
+            print(server.stats())
+    """
+
+    def __init__(self, settings: Optional[MockServerSettings] = None, host: str = "127.0.0.1", port: int = 0):
+        """
+        Initialize the mock server (not started).
+
+        Args:
+            settings: Behaviour settings. Defaults to zero latency.
+            host: Host to bind to.
+            port: Port to bind to (0 picks a free port).
+        """
+        self.settings = settings or MockServerSettings()
+        self.host = host
+        self._requested_port = port
+        self._httpd: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.requests: List[Dict[str, Any]] = []
+        # Simulated KV cache: slot id -> prompt tokens last processed on that slot
+        self._slot_prompts: Dict[int, List[int]] = {}
+        self._next_slot = 0
+
+    # ===== Lifecycle =====
+
+    def start(self) -> "MockLLMServer":
+        """Start serving on a background thread."""
+        if self._httpd is not None:
+            return self
+
+        server = self
+
+        class Handler(_MockRequestHandler):
+            mock = server
+
+        self._httpd = _QuietHTTPServer((self.host, self._requested_port), Handler)
+        self._httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        logger.debug(f"Mock LLM server listening on {self.base_url}")
+        return self
+
+    def stop(self) -> None:
+        """Stop serving and release the port."""
+        if self._httpd is None:
+            return
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self._httpd = None
+        self._thread = None
+
+    def __enter__(self):
+        """Context manager entry."""
+        return self.start()
+
+    def __exit__(self, _exc_type, _exc_val, _exc_tb):
+        """Context manager exit - stops the server."""
+        self.stop()
+
+    # ===== Addresses =====
+
+    @property
+    def port(self) -> int:
+        """Port the server is bound to."""
+        if self._httpd is None:
+            return self._requested_port
+        return self._httpd.server_address[1]
+
+    @property
+    def base_url(self) -> str:
+        """Server root URL (e.g., http://127.0.0.1:54321)."""
+        return f"http://{self.host}:{self.port}"
+
+    @property
+    def api_base_url(self) -> str:
+        """OpenAI-compatible API base URL."""
+        return f"{self.base_url}/v1"
+
+    # ===== Slots =====
+
+    def process_prompt(self, tokens: List[int], id_slot: Optional[int] = None) -> Dict[str, int]:
+        """
+        Run a prompt through a simulated slot and report prefix cache reuse.
+
+        Args:
+            tokens: Prompt tokens.
+            id_slot: Requested slot, or None/-1 to let the server pick one
+                     (assigned round-robin, like an unpinned request landing on
+                     whichever slot is free).
+
+        Returns:
+            Dict with 'id_slot', 'cache_n' (reused prefix) and 'prompt_n' (evaluated tokens).
+        """
+        num_slots = max(1, self.settings.slots)
+        with self._lock:
+            if id_slot is None or not 0 <= id_slot < num_slots:
+                id_slot = self._next_slot % num_slots
+                self._next_slot += 1
+            cached = self._slot_prompts.get(id_slot, [])
+            reused = 0
+            for old, new in zip(cached, tokens):
+                if old != new:
+                    break
+                reused += 1
+            self._slot_prompts[id_slot] = list(tokens)
+        return {'id_slot': id_slot, 'cache_n': reused, 'prompt_n': len(tokens) - reused}
+
+    def save_slot(self, id_slot: int, filename: str) -> int:
+        """
+        Write a slot's cached prompt to slot_save_path.
+
+        Args:
+            id_slot: Slot to save.
+            filename: File name inside slot_save_path.
+
+        Returns:
+            Number of saved tokens.
+        """
+        with self._lock:
+            tokens = list(self._slot_prompts.get(id_slot, []))
+        path = Path(self.settings.slot_save_path) / filename
+        path.write_text(json.dumps(tokens))
+        return len(tokens)
+
+    def restore_slot(self, id_slot: int, filename: str) -> int:
+        """
+        Load a slot's cached prompt from slot_save_path.
+
+        Args:
+            id_slot: Slot to restore into.
+            filename: File name inside slot_save_path.
+
+        Returns:
+            Number of restored tokens.
+        """
+        tokens = json.loads((Path(self.settings.slot_save_path) / filename).read_text())
+        with self._lock:
+            self._slot_prompts[id_slot] = tokens
+        return len(tokens)
+
+    # ===== Statistics =====
+
+    def record(self, entry: Dict[str, Any]) -> None:
+        """Record a served request (thread-safe)."""
+        with self._lock:
+            self.requests.append(entry)
+
+    def reset_stats(self) -> None:
+        """Forget all recorded requests."""
+        with self._lock:
+            self.requests = []
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Summarize served requests.
+
+        Returns:
+            Dict with request counts and total server-side time per endpoint.
+        """
+        with self._lock:
+            entries = list(self.requests)
+
+        by_path: Dict[str, Dict[str, Any]] = {}
+        for entry in entries:
+            bucket = by_path.setdefault(entry['path'], {'count': 0, 'server_seconds': 0.0})
+            bucket['count'] += 1
+            bucket['server_seconds'] += entry['server_seconds']
+
+        return {
+            'total_requests': len(entries),
+            'server_seconds': sum(e['server_seconds'] for e in entries),
+            'endpoints': by_path,
+            'settings': asdict(self.settings),
+        }
+
+
+class _QuietHTTPServer(ThreadingHTTPServer):
+    """ThreadingHTTPServer that ignores clients hanging up mid-response (e.g., timeouts)."""
+
+    def handle_error(self, request, client_address):
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            logger.debug(f"mock-llm: client {client_address} disconnected")
+            return
+        super().handle_error(request, client_address)
+
+
+class _MockRequestHandler(BaseHTTPRequestHandler):
+    """HTTP handler implementing the llama-server endpoints LLF uses."""
+
+    mock: MockLLMServer = None  # Bound per server in MockLLMServer.start()
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        """Route http.server logging through LLF's logger at debug level."""
+        logger.debug("mock-llm: " + format % args)
+
+    # ===== Helpers =====
+
+    def _read_json(self) -> Dict[str, Any]:
+        length = int(self.headers.get('Content-Length') or 0)
+        if not length:
+            return {}
+        try:
+            return json.loads(self.rfile.read(length).decode('utf-8'))
+        except (ValueError, UnicodeDecodeError):
+            return {}
+
+    def _send_json(self, payload: Dict[str, Any], status: int = 200) -> None:
+        body = json.dumps(payload).encode('utf-8')
+        self._record()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _record(self) -> None:
+        # Recorded just before the final bytes are written, so a client that
+        # has finished reading always sees its own request in the stats
+        self.mock.record({
+            'path': self.path,
+            'server_seconds': time.perf_counter() - self._started,
+        })
+
+    # ===== Routing =====
+
+    def do_GET(self):
+        self._started = time.perf_counter()
+        if self.path == '/health':
+            self._send_json({'status': 'ok'})
+        elif self.path in ('/v1/models', '/models'):
+            self._send_json({
+                'object': 'list',
+                'data': [{
+                    'id': self.mock.settings.model_name,
+                    'object': 'model',
+                    'created': 0,
+                    'owned_by': 'llf-mock',
+                }],
+            })
+        else:
+            self._send_json({'error': {'message': f'Unknown endpoint: {self.path}'}}, status=404)
+
+    def do_POST(self):
+        self._started = time.perf_counter()
+        payload = self._read_json()
+
+        if self.path in ('/v1/chat/completions', '/chat/completions'):
+            self._chat_completions(payload)
+        elif self.path in ('/v1/embeddings', '/embeddings'):
+            self._embeddings(payload)
+        elif self.path == '/tokenize':
+            self._send_json({'tokens': approximate_tokens(payload.get('content', ''))})
+        elif self.path.startswith('/slots/'):
+            self._slot_action(payload)
+        else:
+            self._send_json({'error': {'message': f'Unknown endpoint: {self.path}'}}, status=404)
+
+    # ===== Embeddings =====
+
+    def _embeddings(self, payload: Dict[str, Any]) -> None:
+        texts = payload.get('input', '')
+        if isinstance(texts, str):
+            texts = [texts]
+        settings = self.mock.settings
+        if settings.latency_ms > 0:
+            time.sleep(settings.latency_ms / 1000.0)
+        prompt_tokens = sum(len(approximate_tokens(text)) for text in texts)
+        self._send_json({
+            'object': 'list',
+            'data': [{'object': 'embedding', 'index': i, 'embedding': mock_embedding(text, settings.embedding_dim)}
+                     for i, text in enumerate(texts)],
+            'model': payload.get('model') or settings.model_name,
+            'usage': {'prompt_tokens': prompt_tokens, 'total_tokens': prompt_tokens},
+        })
+
+    # ===== Slot Save/Restore =====
+
+    def _slot_action(self, payload: Dict[str, Any]) -> None:
+        parsed = urlparse(self.path)
+        action = parse_qs(parsed.query).get('action', [''])[0]
+        filename = payload.get('filename', '')
+        try:
+            id_slot = int(parsed.path.rsplit('/', 1)[-1])
+        except ValueError:
+            self._send_json({'error': {'message': 'Invalid slot id'}}, status=400)
+            return
+
+        if not self.mock.settings.slot_save_path:
+            self._send_json({'error': {'message': 'This server does not support slot save/restore'}}, status=501)
+        elif not filename or '/' in filename or '\\' in filename:
+            self._send_json({'error': {'message': 'Invalid filename'}}, status=400)
+        elif action == 'save':
+            n_saved = self.mock.save_slot(id_slot, filename)
+            self._send_json({'id_slot': id_slot, 'filename': filename, 'n_saved': n_saved})
+        elif action == 'restore':
+            try:
+                n_restored = self.mock.restore_slot(id_slot, filename)
+            except (OSError, ValueError):
+                self._send_json({'error': {'message': f'Failed to restore {filename}'}}, status=400)
+                return
+            self._send_json({'id_slot': id_slot, 'filename': filename, 'n_restored': n_restored})
+        else:
+            self._send_json({'error': {'message': f'Invalid action: {action}'}}, status=400)
+
+    # ===== Chat Completions =====
+
+    def _pending_tool_rounds(self, messages: List[Dict[str, Any]]) -> int:
+        """Number of tool calls still owed for the current user turn."""
+        tool_results = 0
+        for msg in reversed(messages):
+            role = msg.get('role')
+            if role == 'user':
+                break
+            if role == 'tool':
+                tool_results += 1
+        return max(0, self.mock.settings.tool_rounds - tool_results)
+
+    def _reply_tokens(self) -> List[str]:
+        count = max(0, self.mock.settings.response_tokens)
+        return [f"tok{i} " for i in range(count)]
+
+    def _decode_delay(self) -> float:
+        rate = self.mock.settings.tokens_per_second
+        return 1.0 / rate if rate and rate > 0 else 0.0
+
+    def _chat_completions(self, payload: Dict[str, Any]) -> None:
+        settings = self.mock.settings
+        messages = payload.get('messages') or []
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+        model = payload.get('model') or settings.model_name
+        wants_tool = self._pending_tool_rounds(messages) > 0
+        tool_call = {
+            'id': f"call_{uuid.uuid4().hex[:8]}",
+            'type': 'function',
+            'function': {'name': MOCK_TOOL_NAME, 'arguments': '{}'},
+        }
+        prompt = [tok for m in messages for tok in approximate_tokens(f"{m.get('role')}: {m.get('content') or ''}")]
+        prompt_tokens = len(prompt)
+        id_slot = payload.get('id_slot')
+        slot_info = self.mock.process_prompt(prompt, id_slot if isinstance(id_slot, int) else None)
+        timings = {'cache_n': slot_info['cache_n'], 'prompt_n': slot_info['prompt_n']}
+
+        # Simulated prefill
+        if settings.latency_ms > 0:
+            time.sleep(settings.latency_ms / 1000.0)
+
+        if payload.get('stream'):
+            self._stream_chat(completion_id, created, model, tool_call if wants_tool else None, timings)
+            return
+
+        tokens = [] if wants_tool else self._reply_tokens()
+        delay = self._decode_delay()
+        if delay:
+            time.sleep(delay * len(tokens))
+
+        if wants_tool:
+            message = {'role': 'assistant', 'content': None, 'tool_calls': [tool_call]}
+            finish_reason = 'tool_calls'
+        else:
+            message = {'role': 'assistant', 'content': ''.join(tokens).strip()}
+            finish_reason = 'stop'
+
+        self._send_json({
+            'id': completion_id,
+            'object': 'chat.completion',
+            'created': created,
+            'model': model,
+            'choices': [{'index': 0, 'message': message, 'finish_reason': finish_reason}],
+            'usage': {
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': len(tokens),
+                'total_tokens': prompt_tokens + len(tokens),
+            },
+            'id_slot': slot_info['id_slot'],
+            'timings': timings,
+        })
+
+    def _stream_chat(self, completion_id: str, created: int, model: str, tool_call: Optional[Dict[str, Any]],
+                     timings: Dict[str, int]) -> None:
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+
+        def emit(delta: Dict[str, Any], finish_reason: Optional[str] = None) -> None:
+            chunk = {
+                'id': completion_id,
+                'object': 'chat.completion.chunk',
+                'created': created,
+                'model': model,
+                'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}],
+            }
+            if finish_reason:
+                chunk['timings'] = timings  # llama-server reports timings on the final chunk
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+            self.wfile.flush()
+
+        emit({'role': 'assistant', 'content': ''})
+        if tool_call:
+            emit({'tool_calls': [{'index': 0, **tool_call}]})
+            emit({}, finish_reason='tool_calls')
+        else:
+            delay = self._decode_delay()
+            for token in self._reply_tokens():
+                if delay:
+                    time.sleep(delay)
+                emit({'content': token})
+            emit({}, finish_reason='stop')
+        self._record()
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
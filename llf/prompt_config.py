@@ -6,9 +6,11 @@ how prompts are structured and formatted when sent to LLMs.
 """
 
 import json
+import threading
 from pathlib import Path
 from typing import Dict, Any, Optional, List
 
+from .context_packer import estimate_tokens
 from .logging_config import get_logger
 
 logger = get_logger(__name__)
@@ -28,6 +30,7 @@ class PromptConfig:
     CONFIGS_DIR: Path = PROJECT_ROOT / "configs"
     DEFAULT_CONFIG_FILE: Path = CONFIGS_DIR / "config_prompt.json"
     CONFIG_BACKUPS_DIR: Path = CONFIGS_DIR / "backups"
+    DATA_STORE_REGISTRY_FILE: Path = PROJECT_ROOT / "data_stores" / "data_store_registry.json"
 
     def __init__(self, config_file: Optional[Path] = None):
         """
@@ -47,8 +50,9 @@ class PromptConfig:
         self.suffix_messages: List[Dict[str, str]] = []  # Messages to append after user message
         self.custom_format: Optional[Dict[str, Any]] = None  # Custom formatting rules
 
-        # RAG retriever (lazy loaded when needed)
+        # RAG retriever (lazy loaded when needed, or warmed up by start_rag_preload)
         self._rag_retriever = None
+        self._rag_init_lock = threading.Lock()
 
         # Memory manager (lazy loaded when needed)
         self._memory_manager = None
@@ -110,21 +114,119 @@ class PromptConfig:
         except Exception as e:
             raise RuntimeError(f"Error loading prompt config from {config_file}: {e}")
 
-    def _init_rag_retriever(self):
-        """Lazy initialization of RAG retriever."""
-        if self._rag_retriever is not None:
-            return
+    def _init_rag_retriever(self, preload: bool = False):
+        """
+        Lazy initialization of RAG retriever.
+
+        Args:
+            preload: Also start loading the attached stores in the background
+        """
+        with self._rag_init_lock:
+            if self._rag_retriever is None:
+                try:
+                    from llf.rag_retriever import RAGRetriever
+                    self._rag_retriever = RAGRetriever()
+                    logger.info("RAG retriever initialized successfully")
+                except ImportError as e:
+                    logger.warning(f"RAG dependencies not available: {e}")
+                    self._rag_retriever = None
+                except Exception as e:
+                    logger.warning(f"Failed to initialize RAG retriever: {e}")
+                    self._rag_retriever = None
+
+            # Started before the lock is released, so a query never misses the warm-up
+            if preload and self._rag_retriever is not None:
+                self._rag_retriever.start_preload()
 
+    def start_rag_preload(self) -> bool:
+        """
+        Warm up RAG in the background if the data store registry opts in.
+
+        Importing the embedding stack and loading attached stores and models
+        happens on a background thread, so it overlaps with server startup
+        and the user typing the first message. A message sent before the
+        warm-up has finished waits for it.
+
+        Returns:
+            True if a warm-up was started (registry "preload": true and at
+            least one attached store)
+        """
         try:
-            from llf.rag_retriever import RAGRetriever
-            self._rag_retriever = RAGRetriever()
-            logger.info("RAG retriever initialized successfully")
-        except ImportError as e:
-            logger.warning(f"RAG dependencies not available: {e}")
-            self._rag_retriever = None
-        except Exception as e:
-            logger.warning(f"Failed to initialize RAG retriever: {e}")
-            self._rag_retriever = None
+            with open(self.DATA_STORE_REGISTRY_FILE, 'r') as f:
+                registry = json.load(f)
+        except (OSError, ValueError):
+            return False
+
+        if registry.get('preload') is not True:
+            return False
+        if not any(store.get('attached') for store in registry.get('data_stores', [])):
+            return False
+
+        threading.Thread(target=self._init_rag_retriever, kwargs={'preload': True},
+                         name="rag-preload-init", daemon=True).start()
+        return True
+
+    def get_rag_preload_status(self) -> Optional[Dict[str, Any]]:
+        """
+        Get the state of the RAG warm-up.
+
+        Returns:
+            Warm-up status from the retriever, or None if RAG is not initialized
+        """
+        if self._rag_retriever is None:
+            return None
+        return self._rag_retriever.get_preload_status()
+
+    def _refresh_rag_retriever(self):
+        """Apply data store registry changes made since the last message."""
+        if self._rag_retriever:
+            try:
+                self._rag_retriever.refresh()
+            except Exception as e:
+                logger.error(f"Error refreshing RAG stores: {e}")
+
+    def uses_retrieval_tool(self) -> bool:
+        """
+        Check if attached stores are searched only when the LLM calls search_knowledge_base.
+
+        Returns:
+            True if the data store registry sets "retrieval_mode": "tool" and
+            at least one store is attached
+        """
+        self._init_rag_retriever()
+        self._refresh_rag_retriever()
+        return self._rag_retriever is not None and self._rag_retriever.uses_retrieval_tool()
+
+    def get_rag_retriever(self):
+        """
+        Get the RAG retriever instance.
+
+        Returns:
+            RAGRetriever instance, or None if RAG is not available
+        """
+        self._init_rag_retriever()
+        return self._rag_retriever
+
+    def record_retrieval(self, searched: bool) -> None:
+        """
+        Record whether the model searched the knowledge base for a message.
+
+        Args:
+            searched: True if search_knowledge_base was called during the turn
+        """
+        if self._rag_retriever is not None:
+            self._rag_retriever.record_retrieval(searched)
+
+    def get_retrieval_stats(self) -> Optional[Dict[str, Any]]:
+        """
+        Get how many user messages were answered with and without a knowledge base search.
+
+        Returns:
+            Retrieval statistics from the retriever, or None if RAG is not initialized
+        """
+        if self._rag_retriever is None:
+            return None
+        return self._rag_retriever.get_retrieval_stats()
 
     def _init_memory_manager(self):
         """Lazy initialization of Memory manager."""
@@ -162,13 +264,33 @@ class PromptConfig:
                     return msg.get('content', '')
         return None
 
-    def _build_system_prompt_with_rag(self, rag_context: Optional[str], memory_instructions: Optional[str]) -> Optional[str]:
+    def _estimate_prompt_tokens(self, user_message: Optional[str],
+                                conversation_history: Optional[List[Dict[str, str]]]) -> int:
+        """
+        Approximate the prompt tokens used by everything except RAG context.
+
+        Args:
+            user_message: The user's current message
+            conversation_history: Previous messages in the conversation
+
+        Returns:
+            Estimated token count of the prompts, history and user message
+        """
+        contents = [self.system_prompt, self.master_prompt, user_message]
+        for message in (conversation_history or []) + self.prefix_messages + self.suffix_messages:
+            contents.append(message.get('content'))
+        return sum(estimate_tokens(content if isinstance(content, str) else json.dumps(content))
+                   for content in contents if content)
+
+    def _build_system_prompt_with_rag(self, rag_context: Optional[str], memory_instructions: Optional[str],
+                                      rag_tool_instructions: Optional[str] = None) -> Optional[str]:
         """
         Construct the final system prompt, optionally including RAG context and memory instructions.
 
         Args:
             rag_context: Retrieved context from vector stores (None if no stores attached)
             memory_instructions: Memory system instructions (None if memory disabled)
+            rag_tool_instructions: Knowledge base tool instructions (None unless retrieval is a tool)
 
         Returns:
             Final system prompt string, or None if no system prompt needed
@@ -196,6 +318,10 @@ The following information has been retrieved from attached knowledge bases and m
 """
             sections.append(rag_section)
 
+        # Add knowledge base tool instructions if stores are searched on demand
+        if rag_tool_instructions:
+            sections.append(rag_tool_instructions)
+
         # Add memory instructions if memory enabled
         if memory_instructions:
             sections.append(memory_instructions)
@@ -216,7 +342,10 @@ The following information has been retrieved from attached knowledge bases and m
 
 {additional_content}"""
 
-    def build_messages(self, user_message: str, conversation_history: Optional[List[Dict[str, str]]] = None) -> List[Dict[str, str]]:
+    def build_messages(self, user_message: str, conversation_history: Optional[List[Dict[str, str]]] = None,
+                       deadline=None, context_tokens: Optional[int] = None,
+                       retrieval_tool: bool = False,
+                       rag_filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, str]]:
         """
         Build the complete message list to send to the LLM.
 
@@ -227,6 +356,14 @@ The following information has been retrieved from attached knowledge bases and m
         Args:
             user_message: The user's current message
             conversation_history: Optional list of previous messages in the conversation
+            deadline: Optional Deadline for the turn; RAG retrieval is skipped once it has expired
+            context_tokens: Optional prompt tokens per request of the model's context;
+                           RAG context is packed into what the rest of the prompt leaves free
+            retrieval_tool: The caller offers get_rag_tools() and executes tool calls. With
+                           registry "retrieval_mode": "tool", stores are then not searched
+                           here and the caller records whether the model searched them
+            rag_filters: Optional metadata filters (source_file, tags, date_from, date_to);
+                        RAG retrieval only searches matching chunks
 
         Returns:
             List of message dictionaries in OpenAI chat format
@@ -236,15 +373,35 @@ The following information has been retrieved from attached knowledge bases and m
         # Step 1: Determine if we need RAG and retrieve context
         user_message_text = self._extract_user_message(user_message, conversation_history)
         rag_context = None
+        rag_tool_instructions = None
 
-        if user_message_text:
+        if user_message_text and deadline is not None and deadline.expired():
+            logger.warning("Turn deadline expired, skipping RAG retrieval")
+        elif user_message_text:
             # Lazy load RAG retriever only if needed
             self._init_rag_retriever()
 
-            # Check if any stores are attached and query them
-            if self._rag_retriever and self._rag_retriever.has_attached_stores():
+            # Pick up stores attached or detached since the last message
+            self._refresh_rag_retriever()
+
+            # Check if any stores are attached and query them (or leave it to the model)
+            if retrieval_tool and self._rag_retriever and self._rag_retriever.uses_retrieval_tool():
+                # Searched only if the model calls search_knowledge_base
+                from llf.rag_tools import get_rag_tool_system_prompt
+                rag_tool_instructions = get_rag_tool_system_prompt()
+            elif self._rag_retriever and self._rag_retriever.has_attached_stores():
                 try:
-                    rag_context = self._rag_retriever.query_all_stores(user_message_text)
+                    query_kwargs = {}
+                    if deadline is not None and deadline.has_budget:
+                        # Stores that cannot answer within the turn budget are skipped
+                        query_kwargs['timeout'] = deadline.remaining()
+                    if context_tokens is not None:
+                        query_kwargs['context_tokens'] = context_tokens - self._estimate_prompt_tokens(
+                            user_message, conversation_history)
+                    if rag_filters:
+                        query_kwargs['filters'] = rag_filters
+                    rag_context = self._rag_retriever.query_all_stores(user_message_text, **query_kwargs)
+                    self._rag_retriever.record_retrieval(searched=True)
                     if rag_context:
                         logger.debug(f"Retrieved RAG context: {len(rag_context)} chars")
                 except Exception as e:
@@ -265,7 +422,8 @@ The following information has been retrieved from attached knowledge bases and m
                 memory_instructions = None
 
         # Step 2: Build system prompt (with optional RAG and memory)
-        final_system_prompt = self._build_system_prompt_with_rag(rag_context, memory_instructions)
+        final_system_prompt = self._build_system_prompt_with_rag(rag_context, memory_instructions,
+                                                                 rag_tool_instructions)
 
         if final_system_prompt:
             messages.append({
@@ -345,6 +503,23 @@ The following information has been retrieved from attached knowledge bases and m
         else:
             return None
 
+    def get_rag_tools(self) -> Optional[List[Dict[str, Any]]]:
+        """
+        Get knowledge base tool definitions for function calling.
+
+        Returns:
+            List of tool definitions if retrieval is a tool, None otherwise
+        """
+        if not self.uses_retrieval_tool():
+            return None
+
+        try:
+            from llf.rag_tools import get_rag_tools
+            return get_rag_tools(self._rag_retriever.attached_stores)
+        except Exception as e:
+            logger.error(f"Error loading knowledge base tools: {e}")
+            return None
+
     def get_llm_invokable_tools(self) -> Optional[List[Dict[str, Any]]]:
         """
         Get LLM-invokable tools from tools registry.
@@ -381,12 +556,15 @@ The following information has been retrieved from attached knowledge bases and m
             logger.error(f"Error loading LLM-invokable tools: {e}")
             return None
 
-    def get_all_tools(self) -> Optional[List[Dict[str, Any]]]:
+    def get_all_tools(self, retrieval_tool: bool = False) -> Optional[List[Dict[str, Any]]]:
         """
-        Get all available tools (memory + llm_invokable).
+        Get all available tools (memory + knowledge base + llm_invokable).
 
         This method combines tools from both the memory system and the tools registry.
 
+        Args:
+            retrieval_tool: Include search_knowledge_base when retrieval is a tool
+
         Returns:
             Combined list of all tool definitions, None if no tools available
         """
@@ -397,6 +575,12 @@ The following information has been retrieved from attached knowledge bases and m
         if memory_tools:
             all_tools.extend(memory_tools)
 
+        # Get knowledge base tools
+        if retrieval_tool:
+            rag_tools = self.get_rag_tools()
+            if rag_tools:
+                all_tools.extend(rag_tools)
+
         # Get llm_invokable tools
         llm_invokable_tools = self.get_llm_invokable_tools()
         if llm_invokable_tools:
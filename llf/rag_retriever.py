@@ -4,9 +4,43 @@ RAG (Retrieval-Augmented Generation) Retriever
 This module provides functionality to query FAISS vector stores and retrieve
 relevant context for LLM prompts. It handles:
 - Loading attached data stores from the registry
-- Embedding user queries using sentence-transformers
-- Searching FAISS indices for similar content
+- Embedding user queries using sentence-transformers (once per embedding
+  model, with a small LRU of recent query embeddings), on the backend the
+  store was built with (PyTorch, ONNX Runtime with optional int8
+  quantization, OpenVINO, or a shared llama-server started with
+  --embedding); encoder passes run on a dedicated embedding
+  pool whose thread counts come from the registry "embedding_threads"
+  section and are applied when a model loads, not at import
+- Memory-mapping FAISS indices and reading metadata rows on demand
+- Searching FAISS indices for similar content (stores are searched in
+  parallel, each with its own timeout)
+- Micro-batching: queries arriving together (several users at once) share
+  one batched encoder pass per model and one batched FAISS search per
+  store (registry "micro_batching" section)
+- Hybrid search: stores with a BM25 sidecar (bm25.npz) and search_mode
+  "hybrid" also run a keyword search in parallel with FAISS and merge both
+  rankings by reciprocal rank fusion; "keyword" uses BM25 alone
+- Optionally reranking the merged candidates with a cross-encoder within a
+  latency budget (registry "reranking" section)
+- Packing the results into a token budget: near-duplicate chunks are dropped
+  by maximal marginal relevance, adjacent chunks of a record are merged and,
+  optionally, passages are widened by their neighbouring chunks through the
+  store's adjacency sidecar (metadata.adjacency.npy, see chunk_adjacency)
+  (registry "context_packing" section)
 - Merging and formatting results from multiple stores
+- Optionally warming up attached stores and models on a background thread
+  at startup (registry "preload": true), so the first query does not pay
+  for loading them
+- Picking up registry changes without a restart: refresh() loads only
+  newly attached stores, drops detached or rebuilt ones and keeps embedding
+  models that are still in use
+- Retrieval mode: stores are searched for every user message ("always") or
+  only when the LLM calls the search_knowledge_base tool ("tool", see
+  rag_tools); how many messages were searched or skipped is recorded
+- Metadata filters (source_file, tags, date range): the store's filter
+  sidecar (metadata.filters.npz, see metadata_filter) turns a filter into
+  the set of eligible vector ids, and only those are scored by FAISS and
+  BM25
 
 Author: Local LLM Framework
 License: MIT
@@ -14,19 +48,31 @@ License: MIT
 
 import json
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from collections import OrderedDict
 from pathlib import Path
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, Tuple
 import numpy as np
 
+from . import embedding_backend
+from .chunk_adjacency import load_adjacency
+from .context_packer import CHARS_PER_TOKEN, DEFAULT_PACKING_CONFIG, pack_context
+from .lexical_index import BM25_FILENAME, BM25Index, DEFAULT_RRF_K, reciprocal_rank_fusion
 from .logging_config import get_logger
-
-# Set environment variables before imports to prevent threading issues
+from .metadata_filter import load_filter_index, normalize_filters
+from .metadata_store import MetadataIndex
+from .micro_batch import DEFAULT_MICRO_BATCH_CONFIG, MicroBatcher
+from .rag_tools import DEFAULT_RETRIEVAL_MODE, RETRIEVAL_MODES
+from .reranker import CrossEncoderReranker, DEFAULT_RERANK_CONFIG
+from .vector_index import (
+    DEFAULT_STORAGE, SHARDS_FILENAME, IdFilter, RescoredBinaryIndex, ShardedIndex, filtered_search, set_search_params
+)
+
+# Tokenizer threads deadlock after fork; thread counts are set per model load
+# (embedding_backend.apply_thread_settings) instead of pinning the process here
 os.environ['TOKENIZERS_PARALLELISM'] = 'false'
-os.environ['OMP_NUM_THREADS'] = '1'
-os.environ['MKL_NUM_THREADS'] = '1'
-os.environ['OPENBLAS_NUM_THREADS'] = '1'
-os.environ['VECLIB_MAXIMUM_THREADS'] = '1'
-os.environ['NUMEXPR_NUM_THREADS'] = '1'
 
 try:
     import faiss
@@ -38,13 +84,6 @@ try:
 except ImportError:
     SentenceTransformer = None
 
-try:
-    import torch
-    torch.set_num_threads(1)
-    torch.set_num_interop_threads(1)
-except ImportError:
-    torch = None
-
 logger = get_logger(__name__)
 
 
@@ -53,9 +92,20 @@ DEFAULT_CONFIG = {
     "model_cache_dir": "data_stores/embedding_models",
     "top_k_results": 5,
     "similarity_threshold": 0.3,
-    "max_context_length": 4000
+    "max_context_length": 4000,
+    "query_embedding_cache_size": 128,
+    "filter_cache_size": 16,
+    "query_timeout": 10.0,
+    "max_parallel_searches": 8,
+    "mmap_index": True,
+    "search_mode": "semantic",
+    "rrf_k": DEFAULT_RRF_K,
+    "hybrid_candidates": 4
 }
 
+# metadata.search_mode values
+SEARCH_MODES = ('semantic', 'hybrid', 'keyword')
+
 
 class RAGRetriever:
     """
@@ -87,15 +137,78 @@ class RAGRetriever:
         # Project root for resolving relative paths
         self.project_root = Path(__file__).parent.parent
 
-        # Cache for embedding models (keyed by model name)
+        # Cache for embedding models (keyed by model name, plus @backend for non-torch backends)
         self._model_cache: Dict[str, SentenceTransformer] = {}
 
         # Cache for loaded stores (keyed by store name)
         self._store_cache: Dict[str, Dict[str, Any]] = {}
 
+        # LRU of recent query embeddings (keyed by (model name, query text)).
+        # Stores sharing an embedding model reuse one encoder pass per query.
+        # The size comes from registry "query_embedding_cache_size".
+        self._query_embedding_cache: "OrderedDict[Tuple[str, str], np.ndarray]" = OrderedDict()
+        self._query_embedding_cache_size = DEFAULT_CONFIG['query_embedding_cache_size']
+        self._query_embedding_lock = threading.Lock()
+        self._query_embedding_hits = 0
+        self._query_embedding_misses = 0
+
+        # Serializes cold loads so concurrent searches never load a model or store twice
+        self._load_lock = threading.RLock()
+
+        # Thread pool for fanning out store searches (created on first query).
+        # FAISS releases the GIL during index.search, so stores search concurrently.
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+        # Pool that runs encoder passes (created on first query). Its size bounds how many
+        # encodes share the CPU; each worker applies the intra-op thread count.
+        self._embedding_executor: Optional[ThreadPoolExecutor] = None
+
+        # Separate pool for BM25 searches started from inside a store search, so
+        # they never wait behind the store searches that are waiting for them
+        self._lexical_executor: Optional[ThreadPoolExecutor] = None
+
+        # Compiled metadata filters per store (keyed by the normalized filter), so a
+        # filter repeated across messages of a session is only evaluated once
+        # (size from registry "filter_cache_size")
+        self._filter_cache_size = DEFAULT_CONFIG['filter_cache_size']
+        self._filter_lock = threading.Lock()
+
+        # Per-store search timing (keyed by store name)
+        self._store_timings: Dict[str, Dict[str, Any]] = {}
+        self._timings_lock = threading.Lock()
+
         # Attached stores configuration
         self.attached_stores: Dict[str, Dict[str, Any]] = {}
 
+        # Cross-encoder reranking (registry "reranking" section; model loaded on first use)
+        self.rerank_config: Dict[str, Any] = dict(DEFAULT_RERANK_CONFIG)
+        self._reranker: Optional[CrossEncoderReranker] = None
+
+        # Context packing (registry "context_packing" section)
+        self.packing_config: Dict[str, Any] = dict(DEFAULT_PACKING_CONFIG)
+
+        # Embedding threads and workers (registry "embedding_threads" section)
+        self.threading_config: Dict[str, Any] = dict(embedding_backend.DEFAULT_THREADING_CONFIG)
+
+        # Micro-batching of concurrent encodes (per model) and searches (per index)
+        # (registry "micro_batching" section)
+        self.micro_batch_config: Dict[str, Any] = dict(DEFAULT_MICRO_BATCH_CONFIG)
+        self._encode_batcher, self._search_batcher = self._create_batchers()
+
+        # Search every message or only on request of the LLM (registry "retrieval_mode"),
+        # and how many user messages were searched or answered without a search
+        self.retrieval_mode = DEFAULT_RETRIEVAL_MODE
+        self._retrieval_counts = {'messages': 0, 'searched': 0, 'skipped': 0}
+        self._retrieval_lock = threading.Lock()
+
+        # Background warm-up (registry "preload"; started by start_preload)
+        self.preload_enabled = False
+        self._preload_thread: Optional[threading.Thread] = None
+        self._preload_status: Dict[str, Any] = {'state': 'idle', 'stores': 0, 'failed': [], 'seconds': None}
+
+        # Registry modification time when it was last read (see refresh)
+        self._registry_mtime: Optional[int] = None
+
         # Load attached stores from registry
         self._load_registry()
 
@@ -106,34 +219,357 @@ class RAGRetriever:
                 logger.warning(f"Data store registry not found at {self.registry_path}")
                 return
 
+            self._registry_mtime = self._registry_mtime_ns()
             with open(self.registry_path, 'r') as f:
                 registry = json.load(f)
 
+            self._apply_registry_settings(registry)
+
             # Filter attached stores
-            data_stores = registry.get('data_stores', [])
-            for store in data_stores:
-                if store.get('attached', False):
-                    name = store.get('name')
-                    if name:
-                        self.attached_stores[name] = store
-                        logger.info(f"Registered attached store: {name}")
+            for name, store in self._attached_in(registry).items():
+                self.attached_stores[name] = store
+                logger.info(f"Registered attached store: {name}")
 
         except Exception as e:
             logger.error(f"Error loading data store registry: {e}")
             self.attached_stores = {}
 
+    def _apply_registry_settings(self, registry: Dict[str, Any]):
+        """Apply the registry's top-level settings (reranking, context packing, embedding threads,
+        micro-batching, retrieval mode, preload, cache sizes)."""
+        rerank_config = dict(DEFAULT_RERANK_CONFIG, **registry.get('reranking', {}))
+        if rerank_config != self.rerank_config:
+            self.rerank_config = rerank_config
+            self._reranker = None
+        self.packing_config = dict(DEFAULT_PACKING_CONFIG, **registry.get('context_packing', {}))
+
+        threading_config = dict(embedding_backend.DEFAULT_THREADING_CONFIG, **registry.get('embedding_threads', {}))
+        if threading_config != self.threading_config:
+            self.threading_config = threading_config
+            # Recreated with the new sizes on the next query; the old pool's
+            # threads exit once running encodes are done with it
+            self._embedding_executor = None
+            if self._model_cache:
+                self._apply_thread_settings()
+
+        micro_batch_config = dict(DEFAULT_MICRO_BATCH_CONFIG, **registry.get('micro_batching', {}))
+        if micro_batch_config != self.micro_batch_config:
+            self.micro_batch_config = micro_batch_config
+            self._encode_batcher, self._search_batcher = self._create_batchers()
+
+        retrieval_mode = registry.get('retrieval_mode', DEFAULT_RETRIEVAL_MODE)
+        if retrieval_mode not in RETRIEVAL_MODES:
+            logger.warning(f"Unknown retrieval_mode '{retrieval_mode}' (expected one of "
+                           f"{', '.join(RETRIEVAL_MODES)}), using '{DEFAULT_RETRIEVAL_MODE}'")
+            retrieval_mode = DEFAULT_RETRIEVAL_MODE
+        self.retrieval_mode = retrieval_mode
+        self.preload_enabled = registry.get('preload') is True
+
+        self._query_embedding_cache_size = self._cache_size_setting(registry, 'query_embedding_cache_size')
+        self._filter_cache_size = self._cache_size_setting(registry, 'filter_cache_size')
+
+    @staticmethod
+    def _cache_size_setting(registry: Dict[str, Any], key: str) -> int:
+        """Get a cache size from the registry (DEFAULT_CONFIG value if missing or invalid)."""
+        size = registry.get(key, DEFAULT_CONFIG[key])
+        if isinstance(size, bool) or not isinstance(size, int) or size < 0:
+            logger.warning(f"Invalid {key} '{size}' (expected a non-negative integer), "
+                           f"using {DEFAULT_CONFIG[key]}")
+            size = DEFAULT_CONFIG[key]
+        return size
+
+    def _create_batchers(self) -> Tuple[MicroBatcher, MicroBatcher]:
+        """Create the encode and search batchers from micro_batch_config."""
+        if self.micro_batch_config.get('enabled', True):
+            max_wait_ms = self.micro_batch_config['max_wait_ms']
+            max_batch_size = self.micro_batch_config['max_batch_size']
+        else:
+            # Batches of one; equal queries on one model still share an encoder pass
+            max_wait_ms, max_batch_size = 0, 1
+        return MicroBatcher(max_wait_ms, max_batch_size), MicroBatcher(max_wait_ms, max_batch_size)
+
+    @staticmethod
+    def _attached_in(registry: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+        """Get the attached stores of a registry, keyed by name."""
+        return {
+            store['name']: store
+            for store in registry.get('data_stores', [])
+            if store.get('attached', False) and store.get('name')
+        }
+
+    def _registry_mtime_ns(self) -> Optional[int]:
+        """Get the registry file's modification time (None if it is missing)."""
+        try:
+            return self.registry_path.stat().st_mtime_ns
+        except OSError:
+            return None
+
+    @staticmethod
+    def _store_file_signature(vector_store_path: Path) -> Tuple[Optional[int], ...]:
+        """Get the modification times of a store's index (or shard list) and metadata files."""
+        signature = []
+        for filename in ('index.faiss', SHARDS_FILENAME, 'metadata.jsonl'):
+            try:
+                signature.append((vector_store_path / filename).stat().st_mtime_ns)
+            except OSError:
+                signature.append(None)
+        return tuple(signature)
+
+    def refresh(self) -> bool:
+        """
+        Apply registry and store changes made since they were loaded.
+
+        Cheap enough to call before every query: it compares the registry's
+        modification time and the index/metadata modification times of the
+        loaded stores. When something changed:
+        - newly attached stores are registered and load on first use
+        - detached stores, stores whose registry entry changed and stores
+          rebuilt or updated on disk are dropped from the cache and their
+          metadata closed, so the next query loads a fresh copy (loaded
+          indexes are never modified)
+        - embedding models no attached or loaded store uses are released;
+          models still in use stay loaded
+
+        Unlike reload(), stores and models that did not change are kept.
+
+        Returns:
+            True if anything changed
+        """
+        registry_mtime = self._registry_mtime_ns()
+        stale = {
+            store_name for store_name, store_data in list(self._store_cache.items())
+            if isinstance(store_data, dict) and store_data.get('file_signature') is not None
+            and self._store_file_signature(store_data['store_path']) != store_data['file_signature']
+        }
+        if registry_mtime == self._registry_mtime and not stale:
+            return False
+
+        with self._load_lock:
+            dropped = set(stale)
+            applied = False
+            for store_name in stale:
+                logger.info(f"Store {store_name} changed on disk, reloading it on next use")
+
+            if registry_mtime != self._registry_mtime:
+                try:
+                    with open(self.registry_path, 'r') as f:
+                        registry = json.load(f)
+                except (OSError, ValueError) as e:
+                    # Missing or half-written: keep the current stores and retry on the next call
+                    logger.warning(f"Could not re-read data store registry, keeping current stores: {e}")
+                    registry = None
+
+                if registry is not None:
+                    applied = True
+                    self._registry_mtime = registry_mtime
+                    attached = self._attached_in(registry)
+                    added = attached.keys() - self.attached_stores.keys()
+                    removed = self.attached_stores.keys() - attached.keys()
+                    changed = {name for name in attached.keys() & self.attached_stores.keys()
+                               if attached[name] != self.attached_stores[name]}
+                    dropped |= removed | changed
+
+                    self._apply_registry_settings(registry)
+                    # Replaced, not modified, so queries in flight keep a consistent view
+                    self.attached_stores = attached
+                    logger.info(f"Registry changed: {len(added)} store(s) attached, "
+                                f"{len(removed)} detached, {len(changed)} reconfigured")
+
+            for store_name in dropped:
+                self._close_store(self._store_cache.pop(store_name, None))
+                with self._timings_lock:
+                    self._store_timings.pop(store_name, None)
+            self._release_unused_models()
+        return applied or bool(dropped)
+
+    @staticmethod
+    def _close_store(store_data: Any):
+        """Release a dropped store's metadata memory map and file handle."""
+        if isinstance(store_data, dict) and isinstance(store_data.get('metadata'), MetadataIndex):
+            store_data['metadata'].close()
+
+    def _release_unused_models(self):
+        """Drop embedding models (and their cached query embeddings) no store uses any more."""
+        in_use = {store_data.get('model_name') for store_data in self._store_cache.values()
+                  if isinstance(store_data, dict)}
+        # Attached stores not loaded (yet or any more) keep the model variant they will load with
+        in_use.update(self._attached_model_key(store_config)
+                      for store_name, store_config in self.attached_stores.items()
+                      if store_name not in self._store_cache)
+
+        for model_name in [name for name in self._model_cache if name not in in_use]:
+            del self._model_cache[model_name]
+            with self._query_embedding_lock:
+                for key in [key for key in self._query_embedding_cache if key[0] == model_name]:
+                    del self._query_embedding_cache[key]
+            logger.info(f"Released embedding model no longer in use: {model_name}")
+
+    def _attached_model_key(self, store_config: Dict[str, Any]) -> Optional[str]:
+        """
+        Get the model cache key an attached store loads its embedding model with.
+
+        Like _read_vector_store, the store's config.json supplies the model and
+        whatever backend settings the registry entry leaves out.
+
+        Args:
+            store_config: Store configuration from registry
+
+        Returns:
+            Model cache key (None if the store names no embedding model)
+        """
+        stored_config: Dict[str, Any] = {}
+        vector_store_path = store_config.get('vector_store_path')
+        if vector_store_path:
+            try:
+                with open(self._resolve_path(vector_store_path) / 'config.json', 'r') as f:
+                    stored_config = json.load(f)
+            except (OSError, ValueError):
+                pass
+
+        model_name = stored_config.get('embedding_model') or store_config.get('embedding_model')
+        if not model_name:
+            return None
+        return embedding_backend.model_key(model_name, *self._backend_settings(store_config, stored_config))
+
+    @staticmethod
+    def _backend_settings(store_config: Dict[str, Any],
+                          stored_config: Dict[str, Any]) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+        """Get a store's embedding backend, quantization and server (registry overrides the build settings)."""
+        return (store_config.get('embedding_backend', stored_config.get('embedding_backend')),
+                store_config.get('embedding_quantization', stored_config.get('embedding_quantization')),
+                store_config.get('embedding_server', stored_config.get('embedding_server')))
+
     def has_attached_stores(self) -> bool:
         """Check if any stores are attached."""
         return len(self.attached_stores) > 0
 
+    def uses_retrieval_tool(self) -> bool:
+        """Check if stores are attached and only searched when the LLM calls search_knowledge_base."""
+        return self.retrieval_mode == 'tool' and self.has_attached_stores()
+
+    def record_retrieval(self, searched: bool) -> None:
+        """
+        Record whether the stores were searched for a user message.
+
+        Args:
+            searched: True if the message was answered with a knowledge base
+                     search, False if retrieval was skipped
+        """
+        with self._retrieval_lock:
+            self._retrieval_counts['messages'] += 1
+            self._retrieval_counts['searched' if searched else 'skipped'] += 1
+        if not searched:
+            logger.info("Knowledge base not searched for this message")
+
+    def get_retrieval_stats(self) -> Dict[str, Any]:
+        """
+        Get retrieval statistics.
+
+        Returns:
+            Dict with the retrieval mode and how many user messages were
+            searched or skipped
+        """
+        with self._retrieval_lock:
+            return dict(self._retrieval_counts, mode=self.retrieval_mode)
+
     def reload(self):
         """Reload the registry and clear caches."""
         logger.info("Reloading RAG retriever configuration")
         self._model_cache.clear()
-        self._store_cache.clear()
-        self.attached_stores.clear()
+        with self._load_lock:
+            for store_data in self._store_cache.values():
+                self._close_store(store_data)
+            self._store_cache.clear()
+        with self._query_embedding_lock:
+            self._query_embedding_cache.clear()
+        with self._timings_lock:
+            self._store_timings.clear()
+        self.attached_stores = {}
+        self.rerank_config = dict(DEFAULT_RERANK_CONFIG)
+        self._reranker = None
+        self.packing_config = dict(DEFAULT_PACKING_CONFIG)
         self._load_registry()
 
+    def start_preload(self) -> bool:
+        """
+        Start loading attached stores and their models on a background thread.
+
+        Queries that arrive before the warm-up has finished wait for it
+        (within their timeout) instead of loading stores themselves.
+
+        Returns:
+            True if a warm-up was started, False if there is nothing to load
+            or a warm-up has already run
+        """
+        with self._load_lock:
+            if self._preload_thread is not None or not self.attached_stores:
+                return False
+            self._preload_status = dict(self._preload_status, state='running')
+            self._preload_thread = threading.Thread(target=self._preload, name="rag-preload", daemon=True)
+            self._preload_thread.start()
+        logger.info(f"Warming up {len(self.attached_stores)} attached store(s) in the background")
+        return True
+
+    def wait_for_preload(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait for a background warm-up to finish.
+
+        Args:
+            timeout: Maximum seconds to wait (None = no limit)
+
+        Returns:
+            True if no warm-up is running any more
+        """
+        thread = self._preload_thread
+        if thread is not None:
+            thread.join(timeout)
+            return not thread.is_alive()
+        return True
+
+    def _preload(self):
+        """Load every attached store, its embedding model and the reranker (warm-up thread)."""
+        started = time.monotonic()
+        loaded = 0
+        failed = []
+        for stores in self._group_stores_by_model().values():
+            store_data = None
+            for store_name, store_config in stores:
+                try:
+                    store_data = self._load_vector_store(store_name, store_config)
+                    loaded += 1
+                except Exception as e:
+                    failed.append(store_name)
+                    logger.warning(f"Warm-up could not load store {store_name}: {e}")
+
+            # The first encoder pass is much slower than the rest; run it now
+            if store_data is not None:
+                try:
+                    self._run_encoder("warm-up", store_data['model'])
+                except Exception as e:
+                    logger.warning(f"Warm-up could not run embedding model {store_data['model_name']}: {e}")
+
+        reranker = self._get_reranker()
+        if reranker is not None:
+            try:
+                reranker.load()
+            except Exception as e:
+                logger.warning(f"Warm-up could not load reranker model: {e}")
+
+        seconds = round(time.monotonic() - started, 2)
+        self._preload_status = {'state': 'done', 'stores': loaded, 'failed': failed, 'seconds': seconds}
+        logger.info(f"RAG warm-up finished in {seconds:.2f}s: {loaded} store(s) loaded"
+                    + (f", {len(failed)} failed" if failed else ""))
+
+    def get_preload_status(self) -> Dict[str, Any]:
+        """
+        Get the state of the background warm-up.
+
+        Returns:
+            Dict with state ('idle', 'running' or 'done'), stores loaded,
+            names of stores that failed and seconds taken
+        """
+        return dict(self._preload_status)
+
     def _resolve_path(self, path: str) -> Path:
         """
         Resolve a path that may be relative or absolute.
@@ -150,24 +586,34 @@ class RAGRetriever:
         else:
             return (self.project_root / path).resolve()
 
-    def _load_embedding_model(self, model_name: str, cache_dir: Optional[str] = None) -> SentenceTransformer:
+    def _load_embedding_model(self, model_name: str, cache_dir: Optional[str] = None,
+                              backend: Optional[str] = None,
+                              quantization: Optional[str] = None,
+                              server: Optional[str] = None) -> SentenceTransformer:
         """
         Load an embedding model, using cache if available.
 
         Args:
             model_name: HuggingFace model identifier
             cache_dir: Directory to cache models
+            backend: Embedding backend (torch, onnx, openvino, llama-server; None = torch)
+            quantization: Weight quantization (None = full precision)
+            server: Embedding server name or URL (llama-server backend)
 
         Returns:
-            Loaded SentenceTransformer model
+            Loaded SentenceTransformer model (or a client of the embedding server)
         """
+        key = embedding_backend.model_key(model_name, backend, quantization, server)
+
         # Check cache first
-        if model_name in self._model_cache:
-            logger.debug(f"Using cached embedding model: {model_name}")
-            return self._model_cache[model_name]
+        if key in self._model_cache:
+            logger.debug(f"Using cached embedding model: {key}")
+            return self._model_cache[key]
 
-        # Load model
-        logger.info(f"Loading embedding model: {model_name}")
+        # Load model (thread counts are applied here rather than at import)
+        logger.info(f"Loading embedding model: {key}")
+        if backend != embedding_backend.SERVER_BACKEND:
+            self._apply_thread_settings()
 
         # Resolve cache directory
         if cache_dir:
@@ -176,18 +622,31 @@ class RAGRetriever:
             cache_path = self._resolve_path(DEFAULT_CONFIG['model_cache_dir'])
 
         try:
-            model = SentenceTransformer(model_name, cache_folder=str(cache_path))
+            if key == model_name:
+                model = SentenceTransformer(model_name, cache_folder=str(cache_path))
+            else:
+                model = embedding_backend.load_embedding_model(model_name, cache_folder=str(cache_path),
+                                                               backend=backend, quantization=quantization,
+                                                               server=server)
 
             # Set to single-threaded mode
             if hasattr(model, 'encode'):
                 # Cache the model
-                self._model_cache[model_name] = model
-                logger.info(f"Successfully loaded embedding model: {model_name}")
+                self._model_cache[key] = model
+                logger.info(f"Successfully loaded embedding model: {key}")
                 return model
         except Exception as e:
-            logger.error(f"Failed to load embedding model {model_name}: {e}")
+            logger.error(f"Failed to load embedding model {key}: {e}")
             raise
 
+    def _apply_thread_settings(self) -> Dict[str, Optional[int]]:
+        """Set the embedding thread counts from the registry's "embedding_threads" section."""
+        intra_op_threads, inter_op_threads, workers = embedding_backend.resolve_thread_counts(self.threading_config)
+        applied = embedding_backend.apply_thread_settings(intra_op_threads, inter_op_threads)
+        logger.info(f"Embedding threads: {intra_op_threads} intra-op, "
+                    f"{applied['inter_op_threads'] or inter_op_threads} inter-op, {workers} worker(s)")
+        return applied
+
     def _load_vector_store(self, store_name: str, store_config: Dict[str, Any]) -> Dict[str, Any]:
         """
         Load a vector store (FAISS index + metadata).
@@ -199,11 +658,30 @@ class RAGRetriever:
         Returns:
             Dict containing index, metadata, model, and config
         """
-        # Check cache first
-        if store_name in self._store_cache:
+        # Check cache first (refresh() may drop entries concurrently)
+        store_data = self._store_cache.get(store_name)
+        if store_data is not None:
             logger.debug(f"Using cached vector store: {store_name}")
-            return self._store_cache[store_name]
+            return store_data
+
+        # Cold load: only one thread loads at a time; others re-check the cache
+        with self._load_lock:
+            store_data = self._store_cache.get(store_name)
+            if store_data is not None:
+                return store_data
+            return self._read_vector_store(store_name, store_config)
 
+    def _read_vector_store(self, store_name: str, store_config: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Read a vector store from disk and add it to the store cache.
+
+        Args:
+            store_name: Name of the store
+            store_config: Store configuration from registry
+
+        Returns:
+            Dict containing index, metadata, model, and config
+        """
         logger.info(f"Loading vector store: {store_name}")
 
         # Get paths
@@ -212,14 +690,17 @@ class RAGRetriever:
         metadata_path = vector_store_path / 'metadata.jsonl'
         config_path = vector_store_path / 'config.json'
 
-        # Validate paths exist
-        if not index_path.exists():
+        # Validate paths exist (sharded stores list their shards instead of an index.faiss)
+        if not index_path.exists() and not index_path.with_name(SHARDS_FILENAME).exists():
             raise FileNotFoundError(f"FAISS index not found: {index_path}")
         if not metadata_path.exists():
             raise FileNotFoundError(f"Metadata file not found: {metadata_path}")
         if not config_path.exists():
             raise FileNotFoundError(f"Config file not found: {config_path}")
 
+        # Taken before reading, so a rebuild during the load is still noticed by refresh()
+        file_signature = self._store_file_signature(vector_store_path)
+
         # Load config and validate
         with open(config_path, 'r') as f:
             stored_config = json.load(f)
@@ -238,36 +719,72 @@ class RAGRetriever:
         else:
             embedding_model_name = registry_model
 
-        # Load embedding model
+        # Load embedding model on the backend the store was built with (registry may override)
         cache_dir = store_config.get('model_cache_dir')
-        embedding_model = self._load_embedding_model(embedding_model_name, cache_dir)
-
-        # Load FAISS index
-        logger.info(f"Loading FAISS index from {index_path}")
-        index = faiss.read_index(str(index_path))
-
-        # Load metadata
-        logger.info(f"Loading metadata from {metadata_path}")
-        metadata = []
-        with open(metadata_path, 'r') as f:
-            for line in f:
-                metadata.append(json.loads(line.strip()))
-
-        # Validate metadata count matches index
+        backend, quantization, server = self._backend_settings(store_config, stored_config)
+        if backend == embedding_backend.SERVER_BACKEND:
+            embedding_model = self._load_embedding_model(embedding_model_name, cache_dir, backend, quantization, server)
+        else:
+            embedding_model = self._load_embedding_model(embedding_model_name, cache_dir, backend, quantization)
+        model_key = embedding_backend.model_key(embedding_model_name, backend, quantization, server)
+
+        # Load FAISS index (memory-mapped unless disabled for this store)
+        use_mmap = store_config.get('mmap_index', DEFAULT_CONFIG['mmap_index'])
+        storage = stored_config.get('storage', DEFAULT_STORAGE)
+        if stored_config.get('shards', 1) > 1:
+            # Shards are searched in parallel, each memory-mapped like a single index
+            index = ShardedIndex.load(index_path, lambda path: self._read_faiss_index(path, use_mmap, storage))
+            logger.info(f"Loaded {len(index.shards)} shards for {store_name}")
+        else:
+            index = self._read_faiss_index(index_path, use_mmap, storage)
+
+        # Query-time knobs for approximate and binary indexes: registry overrides the build defaults
+        index_params = stored_config.get('index_params', {})
+        nprobe = store_config.get('nprobe', index_params.get('nprobe'))
+        ef_search = store_config.get('efSearch', index_params.get('efSearch'))
+        rescore_factor = store_config.get('rescore_factor', index_params.get('rescore_factor'))
+        knobs = {'rescore_factor': rescore_factor} if rescore_factor is not None else {}
+        if nprobe is not None or ef_search is not None or knobs:
+            applied = set_search_params(index, nprobe=nprobe, ef_search=ef_search, **knobs)
+            logger.info(f"Search parameters for {store_name}: {applied or 'none apply to this index type'}")
+
+        # Open metadata; rows are decoded on demand through the offset table
+        logger.info(f"Opening metadata from {metadata_path}")
+        metadata = MetadataIndex(metadata_path)
+
+        # Validate metadata count matches index. Updated stores keep metadata rows
+        # of removed vectors, so compare against the recorded row count when present.
         num_vectors = index.ntotal
-        if len(metadata) != num_vectors:
+        if len(metadata) != stored_config.get('metadata_records', num_vectors):
             logger.warning(
                 f"Metadata count mismatch for {store_name}: "
                 f"index={num_vectors}, metadata={len(metadata)}"
             )
 
+        # BM25 sidecar for hybrid/keyword search
+        lexical = None
+        if self._search_mode(store_config) != 'semantic':
+            bm25_path = vector_store_path / BM25_FILENAME
+            if bm25_path.exists():
+                lexical = BM25Index.load(bm25_path)
+                logger.info(f"Loaded keyword index for {store_name} ({len(lexical)} chunks)")
+            else:
+                logger.warning(
+                    f"search_mode for {store_name} needs {bm25_path} "
+                    f"(build it with Create_VectorStore.py --bm25); using semantic search"
+                )
+
         # Cache the store
         store_data = {
             'index': index,
             'metadata': metadata,
+            'lexical': lexical,
             'model': embedding_model,
+            'model_name': model_key,
             'config': stored_config,
-            'registry_config': store_config
+            'registry_config': store_config,
+            'store_path': vector_store_path,
+            'file_signature': file_signature
         }
 
         self._store_cache[store_name] = store_data
@@ -275,26 +792,158 @@ class RAGRetriever:
 
         return store_data
 
-    def _embed_query(self, query_text: str, model: SentenceTransformer) -> np.ndarray:
+    def _read_faiss_index(self, index_path: Path, use_mmap: bool, storage: str = DEFAULT_STORAGE):
+        """
+        Read a FAISS index from disk.
+
+        With use_mmap the index data stays in the page cache instead of the
+        Python heap, so large stores load instantly and share memory across
+        processes. A memory-mapped index is read-only and must never be
+        modified (add/remove) in place.
+
+        Args:
+            index_path: Path to index.faiss (or one shard of a sharded store)
+            use_mmap: Memory-map the index instead of reading it into RAM
+            storage: Vector storage from the store's config.json (binary stores
+                     load as a RescoredBinaryIndex with their vectors.f16.npy)
+
+        Returns:
+            Loaded FAISS index
+        """
+        if storage == 'binary':
+            if use_mmap:
+                try:
+                    logger.info(f"Memory-mapping binary index and rescoring vectors from {index_path.parent}")
+                    return RescoredBinaryIndex.load(index_path, mmap=True)
+                except Exception as e:
+                    logger.warning(f"Could not memory-map {index_path}, reading into memory: {e}")
+            logger.info(f"Loading binary index and rescoring vectors from {index_path.parent}")
+            return RescoredBinaryIndex.load(index_path)
+
+        if use_mmap:
+            # IO_FLAG_MMAP_IFC maps flat indexes (FAISS >= 1.9); IO_FLAG_MMAP covers IVF lists
+            flags = getattr(faiss, 'IO_FLAG_MMAP_IFC', None) or faiss.IO_FLAG_MMAP
+            try:
+                logger.info(f"Memory-mapping FAISS index from {index_path}")
+                return faiss.read_index(str(index_path), flags | faiss.IO_FLAG_READ_ONLY)
+            except Exception as e:
+                logger.warning(f"Could not memory-map {index_path}, reading into memory: {e}")
+
+        logger.info(f"Loading FAISS index from {index_path}")
+        return faiss.read_index(str(index_path))
+
+    def _embed_query(self, query_text: str, model: SentenceTransformer,
+                     model_name: Optional[str] = None) -> np.ndarray:
         """
         Convert query text to embedding vector.
 
+        When model_name is given, the embedding is cached so every store on
+        the same embedding model (and repeated questions) reuses it. Stores
+        searched in parallel wait for the first encoder pass instead of
+        running their own, and different queries arriving together are
+        encoded in one batch.
+
         Args:
             query_text: User's query string
             model: Loaded SentenceTransformer model
+            model_name: Embedding model identifier used as the cache key
 
         Returns:
             Normalized embedding vector
         """
+        if model_name is None:
+            return self._run_encoder(query_text, model)
+
+        key = (model_name, query_text)
+        with self._query_embedding_lock:
+            cached = self._query_embedding_cache.get(key)
+            if cached is not None:
+                self._query_embedding_cache.move_to_end(key)
+                self._query_embedding_hits += 1
+                logger.debug(f"Using cached query embedding for model: {model_name}")
+                return cached
+
+        return self._encode_batcher.run(
+            model_name, query_text,
+            lambda texts: self._encode_and_cache(texts, model, model_name),
+            item_key=query_text
+        )
+
+    def _encode_and_cache(self, texts: List[str], model: SentenceTransformer, model_name: str) -> List[np.ndarray]:
+        """
+        Encode a batch of queries and add them to the query embedding cache.
+
+        The cache is filled before the batch's callers are released, so a
+        store asking for the same query afterwards finds it there.
+
+        Args:
+            texts: Query strings
+            model: Loaded SentenceTransformer model
+            model_name: Embedding model identifier used as the cache key
+
+        Returns:
+            Normalized embedding vector per query
+        """
+        vectors = list(self._get_embedding_executor().submit(self._encode_texts, texts, model).result())
+
+        with self._query_embedding_lock:
+            for query_text, vector in zip(texts, vectors):
+                # Shared between stores, so make sure nobody modifies it in place
+                vector.setflags(write=False)
+                self._query_embedding_misses += 1
+                self._query_embedding_cache[(model_name, query_text)] = vector
+            while len(self._query_embedding_cache) > self._query_embedding_cache_size:
+                self._query_embedding_cache.popitem(last=False)
+        return vectors
+
+    def _run_encoder(self, query_text: str, model: SentenceTransformer) -> np.ndarray:
+        """
+        Encode a query on the embedding pool.
+
+        Args:
+            query_text: User's query string
+            model: Loaded SentenceTransformer model
+
+        Returns:
+            Normalized embedding vector
+        """
+        return self._get_embedding_executor().submit(self._encode_query, query_text, model).result()
+
+    def _encode_query(self, query_text: str, model: SentenceTransformer) -> np.ndarray:
+        """
+        Run the embedding model on a single query.
+
+        Args:
+            query_text: User's query string
+            model: Loaded SentenceTransformer model
+
+        Returns:
+            Normalized embedding vector
+        """
+        return self._encode_texts([query_text], model)[0]
+
+    def _encode_texts(self, texts: List[str], model: SentenceTransformer) -> np.ndarray:
+        """
+        Run the embedding model on a batch of queries.
+
+        Args:
+            texts: Query strings
+            model: Loaded SentenceTransformer model
+
+        Returns:
+            Normalized embedding vectors, one row per query
+        """
         try:
-            # Encode query with normalization (for cosine similarity)
-            embedding = model.encode(
-                [query_text],
+            # Encode queries with normalization (for cosine similarity)
+            embeddings = model.encode(
+                list(texts),
                 convert_to_numpy=True,
                 normalize_embeddings=True,
                 show_progress_bar=False
             )
-            return embedding[0]  # Return single vector
+            if len(embeddings) != len(texts):
+                raise ValueError(f"Embedding model returned {len(embeddings)} vectors for {len(texts)} queries")
+            return embeddings
         except Exception as e:
             logger.error(f"Failed to embed query: {e}")
             raise
@@ -303,56 +952,88 @@ class RAGRetriever:
         self,
         query_text: str,
         store_name: str,
-        store_config: Dict[str, Any]
+        store_config: Dict[str, Any],
+        filters: Optional[Dict[str, Any]] = None
     ) -> List[Dict[str, Any]]:
         """
         Query a single vector store.
 
+        In hybrid mode the BM25 search runs on the lexical pool while the
+        query is embedded and searched here; both candidate lists are merged
+        by reciprocal rank fusion.
+
         Args:
             query_text: User's query
             store_name: Name of the store
             store_config: Store configuration
+            filters: Normalized metadata filters (None = whole store)
 
         Returns:
-            List of result dicts with keys: text, score, store_name, chunk_id
+            List of result dicts with keys: text, score, store_name, chunk_id,
+            source_file, id (vector id), chunk_index and chunk_overlap.
+            Hybrid and keyword results also carry match ('semantic',
+            'keyword' or 'both') and rrf_score.
         """
         try:
             # Load store
             store_data = self._load_vector_store(store_name, store_config)
-
-            # Get components
-            index = store_data['index']
             metadata = store_data['metadata']
-            model = store_data['model']
-
-            # Embed query
-            query_embedding = self._embed_query(query_text, model)
-
-            # Get top_k from config
-            top_k = store_config.get('top_k_results', DEFAULT_CONFIG['top_k_results'])
-
-            # Search index
-            # Note: FAISS returns distances, convert to similarities for IndexFlatIP
-            # IndexFlatIP uses inner product, so higher scores = more similar
-            query_vector = query_embedding.reshape(1, -1)
-            distances, indices = index.search(query_vector, top_k)
+            lexical = store_data.get('lexical')
+
+            # Restrict the search to the chunks matching the metadata filters
+            id_filter = self._id_filter(store_data, filters) if filters else None
+            if id_filter is not None and not len(id_filter):
+                logger.info(f"No chunks in {store_name} match the metadata filters")
+                return []
+            allowed = id_filter.allowed if id_filter is not None else None
+
+            # Get top_k from config (raised to the candidate pool when reranking)
+            top_k = self._search_k(store_config)
+
+            search_mode = self._search_mode(store_config) if lexical is not None else 'semantic'
+            if search_mode == 'semantic':
+                ranked = [(idx, score, None, None)
+                          for idx, score in self._dense_search(query_text, store_data, top_k, id_filter)]
+            else:
+                candidates = top_k * store_config.get('hybrid_candidates', DEFAULT_CONFIG['hybrid_candidates'])
+                keyword_future = self._get_lexical_executor().submit(lexical.search, query_text, candidates, allowed)
+                dense = self._dense_search(query_text, store_data, candidates, id_filter) if search_mode == 'hybrid' else []
+                _, keyword_ids = keyword_future.result()
+
+                dense_scores = dict(dense)
+                keyword_set = set(keyword_ids.tolist())
+                fused = reciprocal_rank_fusion(
+                    [[idx for idx, _ in dense], keyword_ids.tolist()],
+                    k=store_config.get('rrf_k', DEFAULT_CONFIG['rrf_k'])
+                )
+                ranked = []
+                for idx, rrf_score in fused[:top_k]:
+                    if idx in dense_scores:
+                        match = 'both' if idx in keyword_set else 'semantic'
+                    else:
+                        match = 'keyword'
+                    ranked.append((idx, dense_scores.get(idx, 0.0), match, rrf_score))
 
             # Format results
             results = []
-            for i, (dist, idx) in enumerate(zip(distances[0], indices[0])):
-                if idx == -1:  # FAISS returns -1 for empty slots
-                    continue
-
+            for idx, score, match, rrf_score in ranked:
                 # Get metadata for this result
                 if idx < len(metadata):
                     meta = metadata[idx]
-                    results.append({
+                    result = {
                         'text': meta.get('text', ''),
-                        'score': float(dist),  # Inner product score (higher = better)
+                        'score': float(score),  # Inner product score (higher = better)
                         'store_name': store_config.get('display_name', store_name),
                         'chunk_id': meta.get('chunk_id', idx),
-                        'source_file': meta.get('source_file', 'unknown')
-                    })
+                        'source_file': meta.get('source_file', 'unknown'),
+                        'id': int(idx),
+                        'chunk_index': meta.get('_chunk_index'),
+                        'chunk_overlap': meta.get('_chunk_overlap')
+                    }
+                    if match is not None:
+                        result['match'] = match
+                        result['rrf_score'] = rrf_score
+                    results.append(result)
 
             logger.info(f"Retrieved {len(results)} results from {store_name}")
             return results
@@ -361,16 +1042,176 @@ class RAGRetriever:
             logger.error(f"Error querying store {store_name}: {e}")
             return []
 
-    def query_all_stores(self, query_text: str) -> Optional[str]:
+    def _id_filter(self, store_data: Dict[str, Any], filters: Dict[str, Any]) -> IdFilter:
+        """
+        Compile metadata filters into the store's eligible vector ids.
+
+        The store's filter index (metadata.filters.npz) is loaded on first
+        use, or rebuilt from metadata.jsonl if it is missing or stale.
+
+        Args:
+            store_data: Loaded store from _load_vector_store
+            filters: Normalized metadata filters
+
+        Returns:
+            IdFilter of the matching chunks
+        """
+        key = json.dumps(filters, sort_keys=True)
+        with self._filter_lock:
+            cached = store_data.setdefault('id_filters', OrderedDict())
+            id_filter = cached.get(key)
+            if id_filter is not None:
+                cached.move_to_end(key)
+                return id_filter
+
+        if store_data.get('filter_index') is None:
+            with self._load_lock:
+                if store_data.get('filter_index') is None:
+                    store_data['filter_index'] = load_filter_index(
+                        store_data['store_path'] / 'metadata.jsonl', store_data['metadata'])
+
+        id_filter = IdFilter(store_data['filter_index'].select(filters), key=key)
+        with self._filter_lock:
+            cached[key] = id_filter
+            while len(cached) > self._filter_cache_size:
+                cached.popitem(last=False)
+        return id_filter
+
+    def _neighbor_chunk(self, result: Dict[str, Any], step: int) -> Optional[Dict[str, Any]]:
+        """
+        Get the chunk before or after a result in its record (neighbour expansion).
+
+        The store's adjacency index (metadata.adjacency.npy, see chunk_adjacency)
+        is loaded on first use, or rebuilt from metadata.jsonl if it is missing
+        or stale. Only metadata is read; nothing is searched.
+
+        Args:
+            result: Result dict from _query_single_store (or a neighbour)
+            step: -1 for the previous chunk, 1 for the next one
+
+        Returns:
+            Result dict of the neighbour (with the score and match of result),
+            or None at the start/end of the record
+        """
+        store_name = next((name for name, config in self.attached_stores.items()
+                           if config.get('display_name', name) == result.get('store_name')), None)
+        store_data = self._store_cache.get(store_name) if store_name is not None else None
+        if store_data is None or result.get('id') is None:
+            return None
+
+        if store_data.get('adjacency') is None:
+            with self._load_lock:
+                if store_data.get('adjacency') is None:
+                    store_data['adjacency'] = load_adjacency(
+                        store_data['store_path'] / 'metadata.jsonl', store_data['metadata'])
+
+        neighbor_id = store_data['adjacency'].neighbor(result['id'], step)
+        if neighbor_id is None:
+            return None
+        meta = store_data['metadata'][neighbor_id]
+        return dict(result, text=meta.get('text', ''), chunk_id=meta.get('chunk_id', neighbor_id), id=neighbor_id,
+                    chunk_index=meta.get('_chunk_index'), chunk_overlap=meta.get('_chunk_overlap'))
+
+    def _dense_search(self, query_text: str, store_data: Dict[str, Any], k: int,
+                      id_filter: Optional[IdFilter] = None) -> List[Tuple[int, float]]:
+        """
+        Embed the query and search the store's FAISS index.
+
+        Args:
+            query_text: User's query
+            store_data: Loaded store from _load_vector_store
+            k: Number of results
+            id_filter: Eligible vector ids (None = all)
+
+        Returns:
+            List of (vector id, similarity), best first
+        """
+        # Embed query (shared with other stores on the same model)
+        query_embedding = self._embed_query(query_text, store_data['model'], store_data.get('model_name'))
+
+        # Search index, batched with concurrent searches of the same index and filter
+        index = store_data['index']
+        batch_key = id(index) if id_filter is None else (id(index), id_filter.key)
+        return self._search_batcher.run(batch_key, (query_embedding, k),
+                                        lambda items: self._search_index(index, items, id_filter))
+
+    @staticmethod
+    def _search_index(index, items: List[Tuple[np.ndarray, int]],
+                      id_filter: Optional[IdFilter] = None) -> List[List[Tuple[int, float]]]:
+        """
+        Search a FAISS index for a batch of query vectors.
+
+        Args:
+            index: FAISS index
+            items: (query embedding, k) per query
+            id_filter: Eligible vector ids (None = all)
+
+        Returns:
+            List of (vector id, similarity), best first, per query
+        """
+        # Note: FAISS returns distances, convert to similarities for IndexFlatIP
+        # IndexFlatIP uses inner product, so higher scores = more similar
+        if len(items) == 1:
+            query_vectors = items[0][0].reshape(1, -1)
+        else:
+            query_vectors = np.stack([vector for vector, _ in items])
+        k_max = max(k for _, k in items)
+        if id_filter is not None:
+            distances, indices = filtered_search(index, query_vectors, k_max, id_filter)
+        else:
+            distances, indices = index.search(query_vectors, k_max)
+
+        # FAISS returns -1 for empty slots; queries with a smaller k take the head of their row
+        return [
+            [(int(idx), float(dist)) for dist, idx in zip(distances[row][:k], indices[row][:k]) if idx != -1]
+            for row, (_, k) in enumerate(items)
+        ]
+
+    def _search_mode(self, store_config: Dict[str, Any]) -> str:
+        """
+        Get a store's search mode from its registry metadata.
+
+        Args:
+            store_config: Store configuration from registry
+
+        Returns:
+            'semantic', 'hybrid' or 'keyword'
+        """
+        mode = (store_config.get('metadata') or {}).get('search_mode', DEFAULT_CONFIG['search_mode'])
+        if mode not in SEARCH_MODES:
+            logger.warning(f"Unknown search_mode '{mode}', using semantic search")
+            return 'semantic'
+        return mode
+
+    def query_all_stores(self, query_text: str, timeout: Optional[float] = None,
+                         context_tokens: Optional[int] = None,
+                         filters: Optional[Dict[str, Any]] = None) -> Optional[str]:
         """
         Query all attached stores and return formatted context.
 
+        Stores are searched in parallel. A store that does not answer within
+        its query_timeout (or the overall timeout, if smaller) is skipped for
+        this query; a cold store keeps loading in the background.
+
+        The results are packed into a token budget: max_context_length,
+        lowered to context_share of context_tokens when the prompt room is
+        known.
+
         Args:
             query_text: User's query
+            timeout: Overall time budget in seconds (None uses per-store timeouts only)
+            context_tokens: Prompt tokens still free in the model's context (None = unknown)
+            filters: Metadata filters (source_file, tags, date_from, date_to);
+                     only matching chunks are searched (None = everything)
 
         Returns:
             Formatted context string, or None if no results
+
+        Raises:
+            ValueError: If filters has an unknown key or an invalid date
         """
+        filters = normalize_filters(filters)
+
         if not self.has_attached_stores():
             logger.debug("No attached stores to query")
             return None
@@ -379,25 +1220,53 @@ class RAGRetriever:
             logger.debug("Empty query text, skipping RAG")
             return None
 
-        logger.info(f"Querying {len(self.attached_stores)} attached store(s)")
-
-        # Collect results from all stores
-        all_results = []
-        for store_name, store_config in self.attached_stores.items():
+        # An unfinished warm-up holds the query until the stores are loaded
+        if self._preload_thread is not None and self._preload_thread.is_alive():
+            logger.info("Waiting for RAG warm-up to finish")
+            wait_started = time.monotonic()
+            self.wait_for_preload(timeout)
+            if timeout is not None:
+                timeout = max(0.0, timeout - (time.monotonic() - wait_started))
+
+        store_groups = self._group_stores_by_model()
+        logger.info(f"Querying {len(self.attached_stores)} attached store(s) "
+                    f"using {len(store_groups)} embedding model(s)")
+        search_kwargs = {'filters': filters} if filters else {}
+
+        # Fan out: search every store in parallel. Stores are submitted model by
+        # model; the first store of each group encodes the query and the rest reuse it.
+        store_results = []
+        submitted = []
+        started = time.monotonic()
+        for stores in store_groups.values():
+            for store_name, store_config in stores:
+                future = self._get_executor().submit(
+                    self._timed_query_single_store, query_text, store_name, store_config, **search_kwargs)
+                store_timeout = store_config.get('query_timeout', DEFAULT_CONFIG['query_timeout'])
+                if timeout is not None:
+                    store_timeout = min(store_timeout, timeout)
+                submitted.append((store_name, future, store_timeout))
+
+        # Each store gets its own timeout measured from the fan-out start
+        for store_name, future, store_timeout in submitted:
+            wait = max(0.0, started + store_timeout - time.monotonic())
             try:
-                results = self._query_single_store(query_text, store_name, store_config)
-                all_results.extend(results)
+                store_results.append(future.result(timeout=wait))
+            except FutureTimeoutError:
+                future.cancel()
+                self._record_store_timing(store_name, None, timed_out=True)
+                logger.warning(f"Store {store_name} did not answer within {store_timeout:.1f}s, skipping")
             except Exception as e:
                 logger.error(f"Failed to query store {store_name}: {e}")
                 continue
 
+        logger.info(f"Searched {len(submitted)} store(s) in {(time.monotonic() - started) * 1000:.1f}ms")
+
+        all_results = self._rank_results(store_results)
         if not all_results:
             logger.info("No results from any store")
             return None
 
-        # Sort by similarity score (descending)
-        all_results.sort(key=lambda x: x['score'], reverse=True)
-
         # Apply similarity threshold
         # Get threshold from first store config (or use default)
         threshold = DEFAULT_CONFIG['similarity_threshold']
@@ -405,7 +1274,10 @@ class RAGRetriever:
             threshold = store_config.get('similarity_threshold', threshold)
             break  # Use first store's threshold
 
-        filtered_results = [r for r in all_results if r['score'] >= threshold]
+        # Keyword hits already matched the query's terms, so they are kept
+        # even when their embedding is not similar enough
+        filtered_results = [r for r in all_results
+                            if r['score'] >= threshold or r.get('match') in ('keyword', 'both')]
 
         if not filtered_results:
             logger.info(f"No results met similarity threshold {threshold}")
@@ -416,22 +1288,269 @@ class RAGRetriever:
         for store_config in self.attached_stores.values():
             max_top_k = max(max_top_k, store_config.get('top_k_results', DEFAULT_CONFIG['top_k_results']))
 
-        final_results = filtered_results[:max_top_k]
+        # Rerank a bounded candidate pool down to fewer, better chunks
+        reranker = self._get_reranker()
+        reranked = None
+        if reranker is not None:
+            reranked = self._rerank(reranker, query_text, filtered_results, started, timeout)
+            if reranked is not None and not reranked:
+                logger.info("No results met the rerank min_score")
+                return None
+
+        # Pack whole, distinct chunks into the token budget. Without a reranker,
+        # candidates past top_k stand in for chunks dropped as duplicates.
+        budget = self._context_budget(context_tokens)
+        if reranked is not None:
+            candidates, max_results = reranked, len(reranked)
+        else:
+            candidates, max_results = filtered_results, max_top_k
+        final_results = pack_context(
+            candidates, budget, self._format_context,
+            max_results=max_results,
+            mmr_lambda=self.packing_config['mmr_lambda'],
+            duplicate_threshold=self.packing_config['duplicate_threshold'],
+            merge_adjacent=self.packing_config['merge_adjacent'],
+            neighbors=self._neighbor_chunk,
+            neighbor_chunks=self.packing_config['neighbor_chunks']
+        )
+        if not final_results:
+            logger.info(f"No results fit the context budget of {budget} tokens")
+            return None
 
-        # Format context
         context = self._format_context(final_results)
+        logger.info(f"Generated context with {len(final_results)} passage(s), {len(context)} chars")
+        return context
 
-        # Apply max_context_length
+    def _context_budget(self, context_tokens: Optional[int] = None) -> int:
+        """
+        Get the token budget for the formatted context.
+
+        Args:
+            context_tokens: Prompt tokens still free in the model's context (None = unknown)
+
+        Returns:
+            max_context_length (the largest of the attached stores) in tokens,
+            capped at context_share of context_tokens when given
+        """
         max_length = DEFAULT_CONFIG['max_context_length']
         for store_config in self.attached_stores.values():
             max_length = max(max_length, store_config.get('max_context_length', DEFAULT_CONFIG['max_context_length']))
 
-        if len(context) > max_length:
-            logger.info(f"Truncating context from {len(context)} to {max_length} chars")
-            context = context[:max_length] + "\n\n[Context truncated due to length limit]"
+        budget = max_length // CHARS_PER_TOKEN
+        if context_tokens is not None:
+            budget = min(budget, int(max(0, context_tokens) * self.packing_config['context_share']))
+        return budget
 
-        logger.info(f"Generated context with {len(final_results)} result(s), {len(context)} chars")
-        return context
+    def _rank_results(self, store_results: List[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """
+        Merge per-store result lists into one ranking.
+
+        Semantic results are ordered by similarity. Once a store returns fused
+        (hybrid or keyword) results, scores are no longer comparable across
+        stores, so every result is ranked by the reciprocal of its rank within
+        its own store, with similarity breaking ties.
+
+        Args:
+            store_results: Each store's results, best first
+
+        Returns:
+            All results, best first
+        """
+        all_results = [result for results in store_results for result in results]
+        if not any('rrf_score' in result for result in all_results):
+            all_results.sort(key=lambda x: x['score'], reverse=True)
+            return all_results
+
+        rrf_k = DEFAULT_CONFIG['rrf_k']
+        ranked = [
+            (1.0 / (rrf_k + rank), result['score'], position, result)
+            for position, results in enumerate(store_results)
+            for rank, result in enumerate(results, 1)
+        ]
+        ranked.sort(key=lambda item: (-item[0], -item[1], item[2]))
+        return [result for _, _, _, result in ranked]
+
+    def _search_k(self, store_config: Dict[str, Any]) -> int:
+        """
+        Get how many results to fetch from a store.
+
+        Args:
+            store_config: Store configuration from registry
+
+        Returns:
+            The store's top_k_results, or the rerank candidate pool if larger
+            and reranking is enabled
+        """
+        top_k = store_config.get('top_k_results', DEFAULT_CONFIG['top_k_results'])
+        if self.rerank_config.get('enabled'):
+            top_k = max(top_k, self.rerank_config['candidate_pool'])
+        return top_k
+
+    def _get_reranker(self) -> Optional[CrossEncoderReranker]:
+        """Get the cross-encoder reranker, creating it on first use (None if disabled)."""
+        if not self.rerank_config.get('enabled'):
+            return None
+        if self._reranker is None:
+            with self._load_lock:
+                if self._reranker is None:
+                    config = self.rerank_config
+                    cache_dir = self._resolve_path(config.get('model_cache_dir', DEFAULT_CONFIG['model_cache_dir']))
+                    try:
+                        self._reranker = CrossEncoderReranker(
+                            config['model'],
+                            cache_dir=str(cache_dir),
+                            batch_size=config['batch_size'],
+                            max_length=config['max_length'],
+                            cache_size=config['cache_size']
+                        )
+                    except ImportError as e:
+                        logger.warning(f"Reranking disabled: {e}")
+                        self.rerank_config['enabled'] = False
+                        return None
+        return self._reranker
+
+    def _rerank(self, reranker: CrossEncoderReranker, query_text: str, results: List[Dict[str, Any]],
+                started: float, timeout: Optional[float]) -> Optional[List[Dict[str, Any]]]:
+        """
+        Rerank the best candidates within the latency budget.
+
+        Args:
+            reranker: Cross-encoder reranker
+            query_text: User's query
+            results: Ranked and filtered results
+            started: time.monotonic() when the search started
+            timeout: Overall time budget of the query, if any
+
+        Returns:
+            Reranked results, or None if reranking failed
+        """
+        config = self.rerank_config
+        budget = config['latency_budget_ms'] / 1000
+        if timeout is not None:
+            budget = min(budget, max(0.0, started + timeout - time.monotonic()))
+
+        try:
+            return reranker.rerank(
+                query_text,
+                results[:config['candidate_pool']],
+                top_n=config['top_n'],
+                budget_seconds=budget,
+                min_score=config.get('min_score')
+            )
+        except Exception as e:
+            logger.error(f"Reranking failed, using retrieval order: {e}")
+            return None
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """Get the search thread pool, creating it on first use."""
+        if self._executor is None:
+            with self._load_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=DEFAULT_CONFIG['max_parallel_searches'],
+                        thread_name_prefix="rag-search"
+                    )
+        return self._executor
+
+    def _get_embedding_executor(self) -> ThreadPoolExecutor:
+        """Get the embedding thread pool, creating it on first use."""
+        executor = self._embedding_executor
+        if executor is None:
+            with self._load_lock:
+                executor = self._embedding_executor
+                if executor is None:
+                    intra_op_threads, _, workers = embedding_backend.resolve_thread_counts(self.threading_config)
+                    executor = self._embedding_executor = ThreadPoolExecutor(
+                        max_workers=workers,
+                        thread_name_prefix="rag-embed",
+                        # OpenMP keeps the intra-op thread count per thread
+                        initializer=embedding_backend.apply_thread_settings,
+                        initargs=(intra_op_threads,)
+                    )
+        return executor
+
+    def _get_lexical_executor(self) -> ThreadPoolExecutor:
+        """Get the BM25 search thread pool, creating it on first use."""
+        if self._lexical_executor is None:
+            with self._load_lock:
+                if self._lexical_executor is None:
+                    self._lexical_executor = ThreadPoolExecutor(
+                        max_workers=DEFAULT_CONFIG['max_parallel_searches'],
+                        thread_name_prefix="rag-keyword"
+                    )
+        return self._lexical_executor
+
+    def _timed_query_single_store(
+        self,
+        query_text: str,
+        store_name: str,
+        store_config: Dict[str, Any],
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        """Run _query_single_store and record how long it took."""
+        search_kwargs = {'filters': filters} if filters else {}
+        start = time.monotonic()
+        try:
+            return self._query_single_store(query_text, store_name, store_config, **search_kwargs)
+        finally:
+            elapsed_ms = (time.monotonic() - start) * 1000
+            self._record_store_timing(store_name, elapsed_ms)
+            logger.info(f"Store {store_name} searched in {elapsed_ms:.1f}ms")
+
+    def _record_store_timing(self, store_name: str, elapsed_ms: Optional[float], timed_out: bool = False):
+        """
+        Record a store search for metrics.
+
+        Args:
+            store_name: Name of the store
+            elapsed_ms: Search time in milliseconds (None for a timeout)
+            timed_out: True if the store missed its timeout
+        """
+        with self._timings_lock:
+            timing = self._store_timings.setdefault(store_name, {
+                'queries': 0, 'timeouts': 0, 'total_ms': 0.0, 'last_ms': None, 'max_ms': 0.0
+            })
+            if timed_out:
+                timing['timeouts'] += 1
+                return
+            timing['queries'] += 1
+            timing['total_ms'] += elapsed_ms
+            timing['last_ms'] = round(elapsed_ms, 2)
+            timing['max_ms'] = round(max(timing['max_ms'], elapsed_ms), 2)
+
+    def clear_query_cache(self) -> None:
+        """Forget cached query embeddings, so the next queries are encoded again."""
+        with self._query_embedding_lock:
+            self._query_embedding_cache.clear()
+
+    def get_store_timings(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Get per-store search timing.
+
+        Returns:
+            Dict mapping store name to queries, timeouts, last/avg/max milliseconds
+        """
+        with self._timings_lock:
+            timings = {}
+            for store_name, timing in self._store_timings.items():
+                entry = dict(timing)
+                entry['total_ms'] = round(entry['total_ms'], 2)
+                entry['avg_ms'] = round(timing['total_ms'] / timing['queries'], 2) if timing['queries'] else None
+                timings[store_name] = entry
+            return timings
+
+    def _group_stores_by_model(self) -> Dict[str, List[Tuple[str, Dict[str, Any]]]]:
+        """
+        Group attached stores by embedding model.
+
+        Returns:
+            Dict mapping embedding model name to a list of (store_name, store_config)
+        """
+        groups: Dict[str, List[Tuple[str, Dict[str, Any]]]] = {}
+        for store_name, store_config in self.attached_stores.items():
+            model_name = store_config.get('embedding_model') or ''
+            groups.setdefault(model_name, []).append((store_name, store_config))
+        return groups
 
     def _format_context(self, results: List[Dict[str, Any]]) -> str:
         """
@@ -456,9 +1575,13 @@ class RAGRetriever:
                 continue
 
             # Format: [Source: Store Name | Similarity: 0.85]
-            context_parts.append(
-                f"[Source: {store_name} | Similarity: {score:.2f}]\n{text}"
-            )
+            # Keyword-only hits have no similarity: [Source: Store Name | Keyword match]
+            if result.get('match') == 'keyword':
+                context_parts.append(f"[Source: {store_name} | Keyword match]\n{text}")
+            else:
+                context_parts.append(
+                    f"[Source: {store_name} | Similarity: {score:.2f}]\n{text}"
+                )
 
         return "\n\n".join(context_parts)
 
@@ -473,5 +1596,15 @@ class RAGRetriever:
             'attached_stores': len(self.attached_stores),
             'cached_stores': len(self._store_cache),
             'cached_models': len(self._model_cache),
-            'store_names': list(self.attached_stores.keys())
+            'cached_query_embeddings': len(self._query_embedding_cache),
+            'query_embedding_hits': self._query_embedding_hits,
+            'query_embedding_misses': self._query_embedding_misses,
+            'store_names': list(self.attached_stores.keys()),
+            'store_timings': self.get_store_timings(),
+            'reranker': self._reranker.stats() if self._reranker is not None else None,
+            'preload': self.get_preload_status(),
+            'embedding_threads': dict(zip(('intra_op_threads', 'inter_op_threads', 'workers'),
+                                          embedding_backend.resolve_thread_counts(self.threading_config))),
+            'micro_batching': {'encode': self._encode_batcher.stats(), 'search': self._search_batcher.stats()},
+            'retrieval': self.get_retrieval_stats()
         }
@@ -0,0 +1,185 @@
+"""
+Knowledge Base Tool for LLM Function Calling
+
+By default every user message is sent to all attached data stores and the
+retrieved context is added to the system prompt, even for "thanks!" or a
+follow-up the conversation already answers. With the data store registry's
+"retrieval_mode" set to "tool", retrieval is offered to the LLM as the
+search_knowledge_base tool instead (next to the memory tools), so stores are
+only searched when the model decides it needs them.
+
+The tool also takes optional metadata filters (source_file, tags,
+date_from, date_to; see metadata_filter), so the model can narrow a search
+to one document or period.
+
+Design: The tool runs the same RAGRetriever.query_all_stores call as
+always-on retrieval, so reranking, context packing and store timeouts apply
+unchanged; the model writes the search query, which for follow-ups is
+usually better than the raw message.
+
+Author: Local LLM Framework
+License: MIT
+"""
+
+from typing import Any, Dict, List, Optional
+
+from .logging_config import get_logger
+from .metadata_filter import FILTER_KEYS
+
+logger = get_logger(__name__)
+
+
+# Retrieval modes (registry "retrieval_mode")
+RETRIEVAL_MODES = ('always', 'tool')
+DEFAULT_RETRIEVAL_MODE = 'always'
+
+# Knowledge base tool names for dispatcher routing
+RAG_TOOL_NAMES = {'search_knowledge_base'}
+
+
+def get_rag_tools(attached_stores: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Get the knowledge base tool definitions for OpenAI-style function calling.
+
+    Args:
+        attached_stores: Registry entries of the attached stores, keyed by name;
+                        their display names and descriptions tell the model
+                        what it can find
+
+    Returns:
+        List with the search_knowledge_base tool definition
+    """
+    contents = []
+    for name, store in attached_stores.items():
+        label = store.get('display_name') or name
+        description = store.get('description')
+        contents.append(f"{label} ({description})" if description else label)
+
+    description = ("Search the attached knowledge bases for information relevant to the user's question. "
+                   "Use this when the answer needs specific facts from these documents, not for greetings, "
+                   "thanks or questions the conversation already answers.")
+    if contents:
+        description += " Knowledge bases: " + "; ".join(contents) + "."
+
+    return [
+        {
+            "type": "function",
+            "function": {
+                "name": "search_knowledge_base",
+                "description": description,
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "query": {
+                            "type": "string",
+                            "description": "What to look up. Write a self-contained search query "
+                                           "(resolve 'it', 'that' etc. from the conversation)."
+                        },
+                        "source_file": {
+                            "type": "array",
+                            "items": {"type": "string"},
+                            "description": "Optional: only search these source files (wildcards allowed, e.g. 'manual*.pdf')"
+                        },
+                        "tags": {
+                            "type": "array",
+                            "items": {"type": "string"},
+                            "description": "Optional: only search chunks with any of these tags"
+                        },
+                        "date_from": {
+                            "type": "string",
+                            "description": "Optional: only search chunks dated on or after this day (YYYY-MM-DD)"
+                        },
+                        "date_to": {
+                            "type": "string",
+                            "description": "Optional: only search chunks dated on or before this day (YYYY-MM-DD)"
+                        }
+                    },
+                    "required": ["query"]
+                }
+            }
+        }
+    ]
+
+
+def execute_rag_tool(tool_name: str, arguments: Dict[str, Any], rag_retriever,
+                     timeout: Optional[float] = None,
+                     filters: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Execute a knowledge base tool function.
+
+    Args:
+        tool_name: Name of the tool function to execute
+        arguments: Arguments for the function
+        rag_retriever: RAGRetriever instance
+        timeout: Overall time budget for the search in seconds (None = per-store timeouts only)
+        filters: Metadata filters set for the session; they take precedence over
+                 filters of the same key in the arguments
+
+    Returns:
+        Dict with result or error information
+    """
+    if tool_name != 'search_knowledge_base':
+        return {
+            "success": False,
+            "error": f"Unknown tool: {tool_name}"
+        }
+
+    query = (arguments.get('query') or '').strip()
+    if not query:
+        return {
+            "success": False,
+            "error": "A search query is required"
+        }
+
+    search_filters = {key: arguments[key] for key in FILTER_KEYS if arguments.get(key)}
+    search_filters.update(filters or {})
+
+    try:
+        if search_filters:
+            context = rag_retriever.query_all_stores(query, timeout=timeout, filters=search_filters)
+        else:
+            context = rag_retriever.query_all_stores(query, timeout=timeout)
+    except Exception as e:
+        logger.error(f"Error executing knowledge base tool '{tool_name}': {e}")
+        return {
+            "success": False,
+            "error": str(e)
+        }
+
+    if not context:
+        return {
+            "success": True,
+            "found": False,
+            "message": "No relevant information found in the knowledge base"
+        }
+
+    logger.debug(f"Knowledge base search returned {len(context)} chars")
+    return {
+        "success": True,
+        "found": True,
+        "context": context
+    }
+
+
+# System prompt addition when retrieval is a tool
+RAG_TOOL_SYSTEM_PROMPT = """---
+
+# Knowledge Base
+
+Attached knowledge bases can be searched with the `search_knowledge_base` tool. They are not searched automatically.
+
+- Search when the user's question needs specific information that may be in the knowledge bases
+- Don't search for greetings, thanks, small talk or questions the conversation already answers
+- Cite specific information from the search results when applicable
+- If the results don't contain relevant information, rely on your general knowledge
+"""
+
+
+def get_rag_tool_system_prompt() -> str:
+    """
+    Get the system prompt text for the knowledge base tool.
+
+    Returns:
+        System prompt text to be appended to user's system prompt
+    """
+    return RAG_TOOL_SYSTEM_PROMPT
@@ -0,0 +1,201 @@
+"""
+Cross-encoder reranking for RAG results.
+
+Stores return candidates ranked by embedding similarity (or by fused rank
+for hybrid stores), and those scores are neither precise nor comparable
+across stores and embedding models. A cross-encoder reads the query and a
+chunk together and scores their relevance directly, so a handful of
+reranked chunks can replace a long list of loosely ranked ones.
+
+CrossEncoderReranker scores a bounded candidate pool on the CPU, best
+candidates first and in batches, within a latency budget. Candidates that
+are not scored before the budget runs out keep their original order behind
+the scored ones. (query, chunk text) scores are kept in an LRU cache, so
+follow-up questions over the same chunks only score new candidates.
+
+Design: The model is loaded lazily on the first rerank, so enabling
+reranking costs nothing until a store actually returns results. Scores are
+returned on the result dicts (rerank_score) rather than replacing the
+similarity score shown in the context.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from .logging_config import get_logger
+
+try:
+    from sentence_transformers import CrossEncoder
+except ImportError:
+    CrossEncoder = None
+
+logger = get_logger(__name__)
+
+
+# Default reranking configuration (registry "reranking" section)
+DEFAULT_RERANK_CONFIG = {
+    "enabled": False,
+    "model": "cross-encoder/ms-marco-MiniLM-L-6-v2",
+    "candidate_pool": 20,
+    "top_n": 3,
+    "latency_budget_ms": 300,
+    "min_score": None,
+    "batch_size": 8,
+    "max_length": 512,
+    "cache_size": 2048
+}
+
+
+class CrossEncoderReranker:
+    """
+    Reranks retrieved chunks with a cross-encoder model.
+    """
+
+    def __init__(self, model_name: str, cache_dir: Optional[str] = None,
+                 batch_size: int = DEFAULT_RERANK_CONFIG['batch_size'],
+                 max_length: int = DEFAULT_RERANK_CONFIG['max_length'],
+                 cache_size: int = DEFAULT_RERANK_CONFIG['cache_size']):
+        """
+        Initialize the reranker.
+
+        Args:
+            model_name: HuggingFace cross-encoder model identifier or local path
+            cache_dir: Directory to cache the model
+            batch_size: Candidates scored per model call (the budget is checked between calls)
+            max_length: Maximum tokens of query + chunk passed to the model
+            cache_size: Number of (query, chunk) scores to keep
+        """
+        if CrossEncoder is None:
+            raise ImportError("sentence-transformers is required. Install: pip install sentence-transformers")
+
+        self.model_name = model_name
+        self.cache_dir = cache_dir
+        self.batch_size = max(1, int(batch_size))
+        self.max_length = max_length
+        self.cache_size = cache_size
+
+        self._model = None
+        self._model_lock = threading.Lock()
+
+        # LRU of scores keyed by (query text, chunk text)
+        self._scores: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+        self._stats = {
+            'reranks': 0, 'cache_hits': 0, 'scored': 0, 'over_budget': 0,
+            'last_ms': None, 'max_ms': 0.0
+        }
+
+    def _load_model(self):
+        """Load the cross-encoder on first use."""
+        if self._model is None:
+            logger.info(f"Loading reranker model: {self.model_name}")
+            try:
+                self._model = CrossEncoder(self.model_name, max_length=self.max_length,
+                                           device='cpu', cache_folder=self.cache_dir)
+            except TypeError:
+                # cache_folder needs sentence-transformers >= 3.0
+                self._model = CrossEncoder(self.model_name, max_length=self.max_length, device='cpu')
+        return self._model
+
+    def load(self) -> None:
+        """Load the model now instead of on the first rerank."""
+        with self._model_lock:
+            self._load_model()
+
+    def rerank(self, query_text: str, candidates: List[Dict[str, Any]], top_n: int,
+               budget_seconds: Optional[float] = None,
+               min_score: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Rerank candidates by cross-encoder relevance.
+
+        Args:
+            query_text: User's query
+            candidates: Result dicts with a 'text' key, best first
+            top_n: Number of results to return
+            budget_seconds: Time allowed for scoring (None = score every candidate)
+            min_score: Drop scored candidates below this relevance score
+
+        Returns:
+            Up to top_n result dicts: scored candidates by rerank_score, then
+            unscored candidates in their original order
+        """
+        if not candidates:
+            return []
+
+        started = time.monotonic()
+        scores: Dict[int, float] = {}
+        pending = []
+
+        with self._cache_lock:
+            for position, candidate in enumerate(candidates):
+                cached = self._scores.get((query_text, candidate.get('text', '')))
+                if cached is not None:
+                    self._scores.move_to_end((query_text, candidate.get('text', '')))
+                    scores[position] = cached
+                else:
+                    pending.append(position)
+            self._stats['cache_hits'] += len(scores)
+
+        # Score best-ranked candidates first; stop before a batch would overrun the budget
+        with self._model_lock:
+            model = self._load_model() if pending else None
+            batch_seconds = 0.0
+            for start in range(0, len(pending), self.batch_size):
+                elapsed = time.monotonic() - started
+                if budget_seconds is not None and elapsed + batch_seconds >= budget_seconds:
+                    self._stats['over_budget'] += 1
+                    logger.info(f"Rerank budget of {budget_seconds * 1000:.0f}ms reached, "
+                                f"{len(pending) - start} candidate(s) left unscored")
+                    break
+
+                batch = pending[start:start + self.batch_size]
+                batch_started = time.monotonic()
+                batch_scores = model.predict(
+                    [(query_text, candidates[position].get('text', '')) for position in batch],
+                    batch_size=self.batch_size,
+                    show_progress_bar=False
+                )
+                batch_seconds = time.monotonic() - batch_started
+
+                with self._cache_lock:
+                    for position, score in zip(batch, batch_scores):
+                        scores[position] = float(score)
+                        self._scores[(query_text, candidates[position].get('text', ''))] = float(score)
+                    while len(self._scores) > self.cache_size:
+                        self._scores.popitem(last=False)
+                    self._stats['scored'] += len(batch)
+
+        scored = sorted(scores, key=lambda position: scores[position], reverse=True)
+        if min_score is not None:
+            scored = [position for position in scored if scores[position] >= min_score]
+        unscored = [position for position in range(len(candidates)) if position not in scores]
+
+        reranked = []
+        for position in (scored + unscored)[:top_n]:
+            result = dict(candidates[position])
+            if position in scores:
+                result['rerank_score'] = scores[position]
+            reranked.append(result)
+
+        elapsed_ms = (time.monotonic() - started) * 1000
+        with self._cache_lock:
+            self._stats['reranks'] += 1
+            self._stats['last_ms'] = round(elapsed_ms, 2)
+            self._stats['max_ms'] = round(max(self._stats['max_ms'], elapsed_ms), 2)
+        logger.info(f"Reranked {len(candidates)} candidate(s) to {len(reranked)} in {elapsed_ms:.1f}ms "
+                    f"({len(scores)} scored)")
+        return reranked
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get reranking statistics.
+
+        Returns:
+            Dict with model name, cached scores, reranks, cache hits, scored
+            candidates, budget overruns and last/max milliseconds
+        """
+        with self._cache_lock:
+            return dict(self._stats, model=self.model_name, cached_scores=len(self._scores))
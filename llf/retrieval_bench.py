@@ -0,0 +1,305 @@
+"""
+Retrieval quality and latency benchmark for data stores (llf datastore bench).
+
+A query set is a JSONL file with one labelled query per line:
+
+    {"query": "How do I rotate API keys?", "expected_sources": ["security.md"]}
+    {"query": "What does ERR-1042 mean?", "expected_ids": [812, 813]}
+
+expected_ids are vector ids (metadata row numbers) of the chunks that answer
+the query; expected_sources match a chunk's source file like the source_file
+metadata filter (case-insensitive, wildcards allowed), so they stay valid
+when a store is rebuilt with another chunk size or index type. Every
+expected id and every expected source is one target of the query.
+
+Each store is searched through the same code path as a chat message
+(RAGRetriever._query_single_store, then the similarity threshold), once per
+configuration of a sweep over registry settings:
+
+- top_k_results, similarity_threshold, search_mode
+- nprobe, efSearch, rescore_factor (query knobs of approximate and binary indexes)
+
+and the report holds, per configuration:
+
+- recall@k: share of a query's targets among the kept results (mean over queries)
+- MRR: mean reciprocal rank of the first result that hits a target
+- p50/p95 retrieval latency (query encoding plus search, embedding cache cleared)
+
+and per store the cold load time (embedding model, index and metadata), the
+process memory it added, and its size on disk. Chunk size and index type are
+compared by building a store per variant and benchmarking them together.
+
+Design: The benchmark drives RAGRetriever directly and leaves reranking and
+context packing out, because they work on the merged results of all attached
+stores; what is measured is one store's retrieval.
+"""
+
+import itertools
+import json
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from .logging_config import get_logger
+from .metadata_filter import normalize_filters
+from .vector_index import SHARDS_FILENAME, set_search_params
+
+logger = get_logger(__name__)
+
+
+# Report schema version (bump when keys change)
+REPORT_VERSION = 1
+
+# Registry settings that can be swept, and how their values are parsed
+SWEEP_KEYS = {
+    'top_k_results': int,
+    'similarity_threshold': float,
+    'search_mode': str,
+    'nprobe': int,
+    'efSearch': int,
+    'rescore_factor': int,
+}
+
+# Query knobs applied to the loaded index rather than read from the registry entry
+INDEX_KNOBS = {'nprobe': 'nprobe', 'efSearch': 'ef_search', 'rescore_factor': 'rescore_factor'}
+
+
+def load_queries(path: Path) -> List[Dict[str, Any]]:
+    """
+    Read a labelled query set.
+
+    Args:
+        path: JSONL file with query and expected_ids and/or expected_sources per line
+
+    Returns:
+        List of queries (query, expected_ids, expected_sources)
+
+    Raises:
+        ValueError: If a line is not valid JSON, has no query or no expected chunks
+    """
+    queries = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"{path}:{line_number}: invalid JSON ({e})")
+            query = entry.get('query') if isinstance(entry, dict) else None
+            if not isinstance(query, str) or not query.strip():
+                raise ValueError(f"{path}:{line_number}: 'query' is missing")
+            expected_ids = [int(value) for value in entry.get('expected_ids') or []]
+            expected_sources = entry.get('expected_sources') or []
+            if isinstance(expected_sources, str):
+                expected_sources = [expected_sources]
+            if not expected_ids and not expected_sources:
+                raise ValueError(f"{path}:{line_number}: needs expected_ids or expected_sources")
+            queries.append({'query': query, 'expected_ids': expected_ids, 'expected_sources': expected_sources})
+
+    if not queries:
+        raise ValueError(f"No queries in {path}")
+    return queries
+
+
+def parse_sweep(expressions: Sequence[str]) -> Dict[str, List[Any]]:
+    """
+    Parse KEY=VALUE[,VALUE...] sweep expressions.
+
+    Args:
+        expressions: e.g. ["top_k_results=3,5,10", "similarity_threshold=0.2,0.3"]
+
+    Returns:
+        Values per setting, in the given order
+
+    Raises:
+        ValueError: If a key cannot be swept or a value does not parse
+    """
+    sweep: Dict[str, List[Any]] = {}
+    for expression in expressions:
+        key, separator, values = expression.partition('=')
+        key = key.strip()
+        if not separator or key not in SWEEP_KEYS:
+            raise ValueError(f"Invalid sweep '{expression}': use KEY=VALUE[,VALUE...] with KEY one of "
+                             f"{', '.join(SWEEP_KEYS)}")
+        try:
+            parsed = [SWEEP_KEYS[key](value.strip()) for value in values.split(',') if value.strip()]
+        except ValueError:
+            raise ValueError(f"Invalid value in sweep '{expression}'")
+        sweep.setdefault(key, []).extend(value for value in parsed if value not in sweep.get(key, []))
+    return sweep
+
+
+def expand_sweep(sweep: Dict[str, List[Any]]) -> List[Dict[str, Any]]:
+    """
+    Get every combination of the swept settings.
+
+    Args:
+        sweep: Values per setting (see parse_sweep)
+
+    Returns:
+        List of setting overrides ([{}] for no sweep: the registry settings as they are)
+    """
+    keys = [key for key in sweep if sweep[key]]
+    return [dict(zip(keys, values)) for values in itertools.product(*(sweep[key] for key in keys))]
+
+
+def _rss_bytes() -> Optional[int]:
+    """Get the resident memory of this process (None without psutil)."""
+    try:
+        import psutil
+        return psutil.Process(os.getpid()).memory_info().rss
+    except ImportError:
+        return None
+
+
+def _disk_bytes(store_path: Path) -> int:
+    """Get the size of a store's index and metadata files."""
+    return sum(path.stat().st_size for path in Path(store_path).iterdir()
+               if path.is_file() and (path.suffix in ('.faiss', '.npy', '.npz', '.jsonl')
+                                      or path.name == SHARDS_FILENAME))
+
+
+def _targets(retriever, store_data: Dict[str, Any], query: Dict[str, Any]) -> List[set]:
+    """Get the vector ids of each target of a query (one set per expected id or source)."""
+    targets = [{row_id} for row_id in query['expected_ids']]
+    for source in query['expected_sources']:
+        id_filter = retriever._id_filter(store_data, normalize_filters({'source_file': [source]}))
+        targets.append(set(id_filter.ids.tolist()))
+    return targets
+
+
+def _configuration(store_config: Dict[str, Any], overrides: Dict[str, Any]) -> Dict[str, Any]:
+    """Apply setting overrides to a registry entry (search_mode lives in its metadata)."""
+    config = dict(store_config, **{key: value for key, value in overrides.items() if key != 'search_mode'})
+    if 'search_mode' in overrides:
+        config['metadata'] = dict(store_config.get('metadata') or {}, search_mode=overrides['search_mode'])
+    return config
+
+
+def bench_store(retriever, store_name: str, store_config: Dict[str, Any], queries: List[Dict[str, Any]],
+                configurations: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Benchmark one store for every configuration.
+
+    Args:
+        retriever: RAGRetriever (the store does not need to be attached)
+        store_name: Registry name of the store
+        store_config: Registry entry of the store
+        queries: Labelled queries (see load_queries)
+        configurations: Setting overrides to run (see expand_sweep)
+
+    Returns:
+        Dict with load_seconds, memory_bytes, disk_bytes, num_vectors and
+        one result per configuration
+    """
+    from .rag_retriever import DEFAULT_CONFIG
+
+    # Loaded with its keyword index when any configuration searches with it
+    modes = {retriever._search_mode(_configuration(store_config, overrides)) for overrides in configurations}
+    load_config = _configuration(store_config, {'search_mode': 'hybrid'}) if modes - {'semantic'} else store_config
+
+    rss_before = _rss_bytes()
+    started = time.perf_counter()
+    store_data = retriever._load_vector_store(store_name, load_config)
+    load_seconds = time.perf_counter() - started
+    rss_after = _rss_bytes()
+
+    index = store_data['index']
+    index_params = store_data['config'].get('index_params', {})
+    targets = [_targets(retriever, store_data, query) for query in queries]
+
+    # Untimed warm-up so the first configuration does not pay for lazy initialization
+    retriever._query_single_store(queries[0]['query'], store_name, store_config)
+
+    results = []
+    for overrides in configurations:
+        config = _configuration(store_config, overrides)
+        knobs = {knob: config.get(knob, index_params.get(knob)) for knob in INDEX_KNOBS}
+        set_search_params(index, **{INDEX_KNOBS[knob]: value for knob, value in knobs.items()})
+        top_k = config.get('top_k_results', DEFAULT_CONFIG['top_k_results'])
+        threshold = config.get('similarity_threshold', DEFAULT_CONFIG['similarity_threshold'])
+        search_mode = retriever._search_mode(config) if store_data.get('lexical') is not None else 'semantic'
+
+        recalls, reciprocal_ranks, latencies = [], [], []
+        for query, query_targets in zip(queries, targets):
+            retriever.clear_query_cache()
+            query_started = time.perf_counter()
+            found = retriever._query_single_store(query['query'], store_name, config)
+            latencies.append((time.perf_counter() - query_started) * 1000)
+
+            # Kept as query_all_stores keeps them: keyword hits pass the threshold
+            kept = [result['id'] for result in found
+                    if result['score'] >= threshold or result.get('match') in ('keyword', 'both')][:top_k]
+            recalls.append(sum(1 for target in query_targets if target.intersection(kept)) / len(query_targets))
+            relevant = set().union(*query_targets)
+            rank = next((position for position, row_id in enumerate(kept, 1) if row_id in relevant), None)
+            reciprocal_ranks.append(1 / rank if rank else 0.0)
+
+        results.append({
+            'settings': dict({'top_k_results': top_k, 'similarity_threshold': threshold,
+                              'search_mode': search_mode},
+                             **{knob: value for knob, value in knobs.items() if value is not None}),
+            'recall': round(float(np.mean(recalls)), 4),
+            'mrr': round(float(np.mean(reciprocal_ranks)), 4),
+            'p50_ms': round(float(np.percentile(latencies, 50)), 3),
+            'p95_ms': round(float(np.percentile(latencies, 95)), 3),
+        })
+
+    return {
+        'num_vectors': int(index.ntotal),
+        'index_type': store_data['config'].get('index_type'),
+        'load_seconds': round(load_seconds, 3),
+        'memory_bytes': rss_after - rss_before if rss_before is not None and rss_after is not None else None,
+        'disk_bytes': _disk_bytes(store_data['store_path']),
+        'configurations': results,
+    }
+
+
+def run_retrieval_bench(store_names: Sequence[str], queries: List[Dict[str, Any]],
+                        sweep: Optional[Dict[str, List[Any]]] = None,
+                        registry_path: Optional[Path] = None, retriever=None) -> Dict[str, Any]:
+    """
+    Benchmark data stores on a labelled query set.
+
+    Args:
+        store_names: Registry names or display names of the stores
+        queries: Labelled queries (see load_queries)
+        sweep: Values per setting to combine (see parse_sweep; None = registry settings)
+        registry_path: data_store_registry.json (default: the project's)
+        retriever: RAGRetriever to use (default: a new one on registry_path)
+
+    Returns:
+        Report dict with one entry per store
+
+    Raises:
+        ValueError: If a store is not in the registry
+    """
+    if retriever is None:
+        from .rag_retriever import RAGRetriever
+        retriever = RAGRetriever(registry_path)
+
+    with open(retriever.registry_path, 'r', encoding='utf-8') as f:
+        entries = json.load(f).get('data_stores', [])
+
+    configurations = expand_sweep(sweep or {})
+    report: Dict[str, Any] = {
+        'report_version': REPORT_VERSION,
+        'created': datetime.now().isoformat(),
+        'num_queries': len(queries),
+        'sweep': sweep or {},
+        'stores': {},
+    }
+    for store_name in store_names:
+        entry = next((entry for entry in entries
+                      if store_name in (entry.get('name'), entry.get('display_name'))), None)
+        if entry is None:
+            raise ValueError(f"Data store '{store_name}' not found")
+        logger.info(f"Benchmarking {entry['name']} on {len(queries)} queries, "
+                    f"{len(configurations)} configuration(s)")
+        report['stores'][entry['name']] = bench_store(retriever, entry['name'], entry, queries, configurations)
+    return report
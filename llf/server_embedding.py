@@ -0,0 +1,168 @@
+"""
+Embedding backend that calls a local llama-server.
+
+Every LLF process (CLI chat, GUI, daemon, Create_VectorStore.py) otherwise
+loads its own SentenceTransformer copy of a store's embedding model, which
+costs hundreds of MB per process and needs PyTorch. A store can instead
+use the "llama-server" embedding backend: texts are sent to a llama-server
+started with --embedding (and a GGUF build of the embedding model), and the
+one model it holds serves every process.
+
+The server is named by "embedding_server" in the store's config.json
+(Create_VectorStore.py --embedding-server) or its registry entry: either a
+local_llm_servers entry of configs/config.json, whose server_host and
+server_port give the address, or a URL.
+
+LlamaServerEmbedder has the encode() signature of SentenceTransformer, so
+the retriever's micro-batched query encoding, Create_VectorStore.py and
+embedding_backend.compare_backends use it unchanged. A batch of texts is
+one POST to the OpenAI-compatible /v1/embeddings endpoint (batch_size
+texts per request).
+
+Design: The server has to be started separately (llf server start NAME)
+with --embedding in its server_params; nothing is started implicitly,
+because a missing server would otherwise turn every query into a model
+load. Vectors are normalized here, whatever the server's own
+normalization, so inner-product search stays cosine similarity.
+"""
+
+from typing import List, Optional, Sequence, Union
+
+import numpy as np
+import requests
+
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+# OpenAI-compatible embeddings endpoint of llama-server
+EMBEDDINGS_PATH = '/v1/embeddings'
+
+# Seconds to wait for one embeddings request
+DEFAULT_TIMEOUT = 60.0
+
+
+def resolve_server_url(server: str, config=None) -> str:
+    """
+    Get the base URL of an embedding server.
+
+    Args:
+        server: URL (http://host:port) or name of a local_llm_servers entry
+        config: Config to look the name up in (default: configs/config.json)
+
+    Returns:
+        Base URL without a trailing slash or /v1
+
+    Raises:
+        ValueError: If server is neither a URL nor a configured server
+    """
+    if not server:
+        raise ValueError("The llama-server embedding backend needs an embedding_server (server name or URL)")
+
+    if server.startswith(('http://', 'https://')):
+        url = server.rstrip('/')
+        return url[:-len('/v1')] if url.endswith('/v1') else url
+
+    if config is None:
+        from .config import get_config
+        config = get_config()
+    server_config = config.get_server_by_name(server)
+    if server_config is None:
+        raise ValueError(f"Embedding server '{server}' is not in local_llm_servers (configs/config.json)")
+    return f"http://{server_config.server_host}:{server_config.server_port}"
+
+
+class LlamaServerEmbedder:
+    """
+    SentenceTransformer-compatible client of a llama-server embeddings endpoint.
+
+    Thread-safe: concurrent encode() calls send independent requests.
+    """
+
+    # encode() runs remotely; Create_VectorStore.py reads model.device
+    device = 'cpu'
+
+    def __init__(self, base_url: str, model_name: Optional[str] = None, timeout: float = DEFAULT_TIMEOUT):
+        """
+        Initialize the client (no request is made yet).
+
+        Args:
+            base_url: Server URL (see resolve_server_url)
+            model_name: Embedding model name sent with each request (llama-server
+                        serves the model it was started with whatever the name)
+            timeout: Seconds to wait for one request
+        """
+        self.base_url = base_url.rstrip('/')
+        self.model_name = model_name
+        self.timeout = timeout
+        self._dimension: Optional[int] = None
+
+    def __repr__(self) -> str:
+        return f"LlamaServerEmbedder({self.base_url!r}, model_name={self.model_name!r})"
+
+    def _request(self, texts: List[str]) -> np.ndarray:
+        """Embed one batch of texts with a single request."""
+        payload = {'input': texts}
+        if self.model_name:
+            payload['model'] = self.model_name
+        try:
+            response = requests.post(self.base_url + EMBEDDINGS_PATH, json=payload, timeout=self.timeout)
+            response.raise_for_status()
+            data = response.json()['data']
+        except (requests.RequestException, ValueError, KeyError, TypeError) as e:
+            raise RuntimeError(f"Embedding request to {self.base_url} failed "
+                               f"(is llama-server running with --embedding?): {e}") from e
+
+        if len(data) != len(texts):
+            raise RuntimeError(f"Embedding server returned {len(data)} vectors for {len(texts)} texts")
+        rows = sorted(data, key=lambda item: item.get('index', 0))
+        return np.array([row['embedding'] for row in rows], dtype=np.float32)
+
+    def encode(self, sentences: Union[str, Sequence[str]], batch_size: int = 32, show_progress_bar: bool = False,
+               convert_to_numpy: bool = True, normalize_embeddings: bool = False, **kwargs) -> np.ndarray:
+        """
+        Embed texts on the server (same arguments as SentenceTransformer.encode).
+
+        Args:
+            sentences: Text or texts to embed
+            batch_size: Texts per request
+            show_progress_bar: Log progress per request
+            convert_to_numpy: Accepted for compatibility (always NumPy)
+            normalize_embeddings: Scale each vector to unit length
+            **kwargs: Other SentenceTransformer options (device, ...), ignored
+
+        Returns:
+            float32 array (len(sentences), dimension), or one vector for a single text
+
+        Raises:
+            RuntimeError: If the server cannot be reached or answers badly
+        """
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        batch_size = max(1, int(batch_size))
+
+        batches = []
+        for start in range(0, len(texts), batch_size):
+            batches.append(self._request(texts[start:start + batch_size]))
+            if show_progress_bar:
+                logger.info(f"Embedded {min(start + batch_size, len(texts))}/{len(texts)} texts on {self.base_url}")
+        embeddings = np.concatenate(batches) if batches else np.zeros((0, self._dimension or 0), dtype=np.float32)
+
+        if normalize_embeddings and len(embeddings):
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            embeddings = embeddings / np.maximum(norms, 1e-12)
+        if len(embeddings):
+            self._dimension = embeddings.shape[1]
+        return embeddings[0] if single else embeddings
+
+    def get_sentence_embedding_dimension(self) -> int:
+        """
+        Get the embedding dimension (one request the first time).
+
+        Returns:
+            Number of dimensions of the server's embeddings
+        """
+        if self._dimension is None:
+            self._dimension = int(self._request(['dimension probe']).shape[1])
+        return self._dimension
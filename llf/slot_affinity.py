@@ -0,0 +1,223 @@
+"""
+Slot affinity module for Local LLM Framework.
+
+llama-server runs a fixed number of slots (--parallel / -np), each holding the
+KV cache of the last prompt it processed. Without guidance the server hands a
+request to any idle slot, so a returning conversation often lands on a slot
+holding someone else's cache and has to re-prefill its whole history.
+
+This module keeps a conversation-to-slot map so each session is sent back to
+the slot that already holds its prefix (via the 'id_slot' request field), and
+tracks how much of each prompt the server reported as served from cache.
+
+Design: Pure bookkeeping, no I/O. LLMRuntime asks for a slot before a request
+and releases it afterwards. If the pinned slot is already serving another
+request from this process, acquire() returns None so the request goes to any
+free slot instead of queueing behind the busy one.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+# server_params keys that set the llama-server slot count
+PARALLEL_PARAM_KEYS = ('parallel', 'np', '-np', '--parallel')
+
+
+def get_slot_count(server_params: Optional[Dict[str, Any]]) -> int:
+    """
+    Read the configured llama-server slot count from server_params.
+
+    Args:
+        server_params: Server parameters from the local_llm_servers config.
+
+    Returns:
+        Number of slots, or 0 if not configured (or not a positive integer).
+    """
+    for key in PARALLEL_PARAM_KEYS:
+        if server_params and key in server_params:
+            try:
+                return max(0, int(server_params[key]))
+            except (TypeError, ValueError):
+                logger.warning(f"Ignoring invalid slot count in server_params: {key}={server_params[key]!r}")
+                return 0
+    return 0
+
+
+class SlotAffinity:
+    """
+    Thread-safe conversation-to-slot assignment for llama-server.
+
+    Sessions keep their slot until it is needed by a newer session; when all
+    slots are owned, the least recently used idle session loses its slot. If
+    every slot is busy, the request is sent unpinned and the server chooses.
+    """
+
+    def __init__(self, num_slots: int):
+        """
+        Initialize slot affinity tracking.
+
+        Args:
+            num_slots: Number of llama-server slots (must be >= 1).
+
+        Raises:
+            ValueError: If num_slots is less than 1.
+        """
+        if num_slots < 1:
+            raise ValueError("num_slots must be at least 1")
+
+        self.num_slots = num_slots
+        self._lock = threading.Lock()
+        # session_id -> slot, ordered from least to most recently used
+        self._sessions: "OrderedDict[str, int]" = OrderedDict()
+        # slot -> number of in-flight requests sent from this process
+        self._in_flight: Dict[int, int] = {}
+
+        # Statistics
+        self._pinned_requests = 0
+        self._busy_fallbacks = 0
+        self._evictions = 0
+        self._cached_tokens = 0
+        self._prompt_tokens = 0
+
+    def _pick_slot(self) -> Optional[int]:
+        """Choose an idle slot for a new session, or None if all are busy (caller holds the lock)."""
+        owned = set(self._sessions.values())
+        for slot in range(self.num_slots):
+            if slot not in owned and not self._in_flight.get(slot):
+                return slot
+
+        # Take the least recently used idle session's slot; a busy slot would make
+        # the new request queue behind a running one, so the server chooses instead
+        for session_id, slot in self._sessions.items():
+            if not self._in_flight.get(slot):
+                break
+        else:
+            return None
+        del self._sessions[session_id]
+        self._evictions += 1
+        logger.debug(f"Slot {slot} reassigned from session {session_id}")
+        return slot
+
+    def acquire(self, session_id: str) -> Optional[int]:
+        """
+        Reserve the slot for a session's next request.
+
+        Args:
+            session_id: Conversation identifier.
+
+        Returns:
+            Slot id to send as 'id_slot', or None to let the server choose
+            (the pinned slot, or every slot for a new session, is busy with
+            another request from this process).
+        """
+        with self._lock:
+            slot = self._sessions.get(session_id)
+            if slot is None:
+                slot = self._pick_slot()
+                if slot is None:
+                    self._busy_fallbacks += 1
+                    logger.debug(f"All slots busy, session {session_id} falls back to any slot")
+                    return None
+                self._sessions[session_id] = slot
+            else:
+                self._sessions.move_to_end(session_id)
+                if self._in_flight.get(slot):
+                    self._busy_fallbacks += 1
+                    logger.debug(f"Slot {slot} busy, session {session_id} falls back to any slot")
+                    return None
+
+            self._in_flight[slot] = self._in_flight.get(slot, 0) + 1
+            self._pinned_requests += 1
+            return slot
+
+    def release(self, slot: Optional[int]) -> None:
+        """
+        Mark a request on a slot as finished.
+
+        Args:
+            slot: Slot returned by acquire() (None is ignored).
+        """
+        if slot is None:
+            return
+        with self._lock:
+            remaining = self._in_flight.get(slot, 0) - 1
+            if remaining > 0:
+                self._in_flight[slot] = remaining
+            else:
+                self._in_flight.pop(slot, None)
+
+    def record_fallback(self) -> None:
+        """Count a request that was retried without its pinned slot."""
+        with self._lock:
+            self._busy_fallbacks += 1
+
+    def forget(self, session_id: str) -> None:
+        """
+        Drop a session's slot assignment (e.g., when the conversation is cleared).
+
+        Args:
+            session_id: Conversation identifier.
+        """
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def get_slot(self, session_id: str) -> Optional[int]:
+        """
+        Get the slot currently assigned to a session.
+
+        Args:
+            session_id: Conversation identifier.
+
+        Returns:
+            Slot id or None if the session has no slot.
+        """
+        with self._lock:
+            return self._sessions.get(session_id)
+
+    def record_timings(self, timings: Optional[Dict[str, Any]]) -> None:
+        """
+        Record llama-server prompt timings for the cache hit rate.
+
+        llama-server reports 'cache_n' (prompt tokens reused from the slot's
+        KV cache) and 'prompt_n' (prompt tokens actually evaluated).
+
+        Args:
+            timings: The 'timings' object from a llama-server response.
+        """
+        if not timings:
+            return
+        try:
+            cached = int(timings.get('cache_n', 0) or 0)
+            evaluated = int(timings.get('prompt_n', 0) or 0)
+        except (TypeError, ValueError, AttributeError):
+            return
+        with self._lock:
+            self._cached_tokens += cached
+            self._prompt_tokens += evaluated
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get affinity and prefix cache statistics.
+
+        Returns:
+            Dict with slot count, active sessions, request counters, and the
+            prefix cache hit rate (cached prompt tokens / total prompt tokens).
+        """
+        with self._lock:
+            total = self._cached_tokens + self._prompt_tokens
+            return {
+                'num_slots': self.num_slots,
+                'sessions': len(self._sessions),
+                'pinned_requests': self._pinned_requests,
+                'busy_fallbacks': self._busy_fallbacks,
+                'evictions': self._evictions,
+                'cached_prompt_tokens': self._cached_tokens,
+                'evaluated_prompt_tokens': self._prompt_tokens,
+                'cache_hit_rate': round(self._cached_tokens / total, 4) if total else 0.0,
+            }
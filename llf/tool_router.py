@@ -0,0 +1,242 @@
+"""
+Tool router for Local LLM Framework.
+
+Every tool schema attached to a request is prefilled by the model, so sending
+all memory and llm_invokable tools with every message costs hundreds of prompt
+tokens even for "tell me a joke". The router picks the subset of tools that is
+plausibly relevant to the current message:
+
+- Memory tools follow the operation type from operation_detector
+  (READ -> lookup tools, WRITE -> storage tools, GENERAL -> none)
+- The knowledge base tool is offered unless the message is small talk
+  ("thanks!", "ok"); whether to search is otherwise the model's decision
+- Built-in llm_invokable tools have keyword rules (URLs -> fetch_webpage, etc.)
+- Other tools match when the message shares a meaningful word with the
+  tool's name or description
+
+A routing miss is a routed request the model answered without calling a
+tool while admitting it lacks a capability ("I don't have access to your
+files"). The runtime then repeats the request once with every tool, so a
+dropped tool costs one extra call rather than the answer.
+
+The router also keeps statistics: how many schema tokens were not sent,
+routing misses, and the tools the model called without having been offered
+them in the routed request (after a miss, or from a schema it remembers).
+
+Design: Rule-based and dependency-free so routing costs microseconds. Routing
+is opt-in (config "tool_routing"); a miss is never fatal because of the
+retry, and the tool loop still executes any known tool.
+"""
+
+import json
+import re
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from .logging_config import get_logger
+from .operation_detector import OperationType, detect_operation_type
+
+logger = get_logger(__name__)
+
+
+# Memory tools offered per operation type
+MEMORY_READ_TOOLS = {'search_memories', 'get_memory', 'get_memory_stats'}
+MEMORY_WRITE_TOOLS = {'add_memory', 'update_memory', 'delete_memory', 'search_memories'}
+
+# Messages that talk about memory itself get all memory tools
+MEMORY_KEYWORDS = re.compile(r'\b(memory|memories|remember|forget|recall)\b')
+
+# Knowledge base tools (rag_tools) and the messages that never need them
+KNOWLEDGE_BASE_TOOLS = {'search_knowledge_base'}
+SMALL_TALK = re.compile(
+    r'^\W*((hi|hello|hey|thanks|thank you|thx|ok|okay|cool|great|nice|perfect|got it|bye|goodbye|yes|no|sure'
+    r'|so much|a lot|there)\b\W*)+$')
+
+# Keyword rules for the tools shipped in tools/
+TOOL_PATTERNS = {
+    'fetch_webpage': re.compile(r'https?://|\bwww\.|\b(web ?page|website|url|link|article)\b'),
+    'search_internet_duckduckgo': re.compile(
+        r'\b(search|google|web|internet|online|latest|news|current(ly)?|today|recent|look up|weather|price)\b'),
+    'search_internet_google': re.compile(
+        r'\b(search|google|web|internet|online|latest|news|current(ly)?|today|recent|look up|weather|price)\b'),
+    'search_internet_google_api': re.compile(
+        r'\b(search|google|web|internet|online|latest|news|current(ly)?|today|recent|look up|weather|price)\b'),
+    'command_exec': re.compile(
+        r'\b(run|execute|command|shell|terminal|bash|process(es)?|disk|ls|grep|find|cat|ps|df|du|git|uptime)\b'),
+    'file_access': re.compile(
+        r'\b(files?|folders?|director(y|ies)|path|read|write|open|save to|contents?)\b|\w+\.(txt|md|json|csv|py|log|yaml|yml)\b|[~/][\w./-]+'),
+}
+
+# Replies in which the model says it cannot do something a tool could do
+CAPABILITY_REFUSAL = re.compile(
+    r"\b(i|i'm|i am)\b[^.!?\n]{0,40}?\b("
+    r"(do not|don't|doesn't|does not) have (the )?(access|ability|tools?|a way|any way|real-time|internet|"
+    r"browsing|memory)"
+    r"|(can't|cannot|can not|unable to|not able to) (access|browse|check|run|execute|read|open|look up|"
+    r"search|remember|store|save|fetch|retrieve|recall|see your|view)"
+    r"|(have )?no (access|ability|way) to)")
+
+# Words ignored when matching a message against tool descriptions
+_STOPWORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'can', 'do', 'for', 'from', 'get', 'has', 'have',
+    'how', 'i', 'if', 'in', 'is', 'it', 'its', 'me', 'my', 'of', 'on', 'or', 'please', 'that', 'the',
+    'this', 'to', 'use', 'using', 'what', 'when', 'where', 'which', 'with', 'you', 'your', 'tool',
+    'returns', 'list', 'need', 'want', 'tell', 'about', 'any', 'all', 'will', 'would', 'should',
+}
+_WORD = re.compile(r'[a-z][a-z0-9]+')
+
+
+def tool_name(tool: Dict[str, Any]) -> str:
+    """Get the function name of an OpenAI-style tool definition."""
+    return tool.get('function', {}).get('name', '')
+
+
+def estimate_tool_tokens(tools: Iterable[Dict[str, Any]]) -> int:
+    """
+    Approximate prompt tokens used by tool schemas (about 4 characters per token).
+
+    Args:
+        tools: Tool definitions.
+
+    Returns:
+        Estimated token count.
+    """
+    return sum(len(json.dumps(tool, separators=(',', ':'))) for tool in tools) // 4
+
+
+def admits_missing_capability(text: Optional[str]) -> bool:
+    """
+    Check whether a reply says the model cannot do something a tool could.
+
+    Args:
+        text: Assistant reply.
+
+    Returns:
+        True for replies such as "I don't have access to your files".
+    """
+    return bool(text) and bool(CAPABILITY_REFUSAL.search(text.lower()))
+
+
+def _keywords(text: str) -> Set[str]:
+    return {w for w in _WORD.findall(text.lower()) if w not in _STOPWORDS and len(w) > 2}
+
+
+class ToolRouter:
+    """Selects the tools to attach to a request."""
+
+    def __init__(self):
+        """Initialize router statistics."""
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._tools_available = 0
+        self._tools_offered = 0
+        self._tokens_saved = 0
+        self._misses = 0
+        self._unoffered_calls: Dict[str, int] = {}
+
+    def _matches(self, tool: Dict[str, Any], text: str, operation: OperationType, words: Set[str],
+                 latest: str) -> bool:
+        name = tool_name(tool)
+
+        if name in KNOWLEDGE_BASE_TOOLS:
+            return not SMALL_TALK.match(latest)
+
+        if name in MEMORY_READ_TOOLS or name in MEMORY_WRITE_TOOLS:
+            if MEMORY_KEYWORDS.search(text):
+                return True
+            if operation == OperationType.READ:
+                return name in MEMORY_READ_TOOLS
+            if operation == OperationType.WRITE:
+                return name in MEMORY_WRITE_TOOLS
+            return False
+
+        pattern = TOOL_PATTERNS.get(name)
+        if pattern is not None:
+            return bool(pattern.search(text))
+
+        # Unknown tool: match on shared words with its name and description
+        function = tool.get('function', {})
+        tool_words = _keywords(name.replace('_', ' ') + ' ' + function.get('description', ''))
+        return bool(words & tool_words)
+
+    def select(self, messages: List[Dict[str, Any]], tools: Optional[List[Dict[str, Any]]]) -> Optional[List[Dict[str, Any]]]:
+        """
+        Pick the tools relevant to the latest user message.
+
+        The previous user message is considered too, so short follow-ups
+        ("do it again", "and for Paris?") keep the tools of the turn before.
+
+        Args:
+            messages: Conversation messages (OpenAI format).
+            tools: All available tool definitions.
+
+        Returns:
+            Selected tool definitions, or None if no tool is relevant.
+        """
+        if not tools:
+            return tools
+
+        user_texts = [str(m.get('content') or '') for m in messages if m.get('role') == 'user'][-2:]
+        if not user_texts:
+            return tools
+
+        latest = user_texts[-1].lower()
+        context = ' '.join(user_texts).lower()
+        operation = detect_operation_type(latest)
+        words = _keywords(context)
+
+        selected = [tool for tool in tools if self._matches(tool, context, operation, words, latest)]
+
+        saved = estimate_tool_tokens(tools) - estimate_tool_tokens(selected)
+        with self._lock:
+            self._requests += 1
+            self._tools_available += len(tools)
+            self._tools_offered += len(selected)
+            self._tokens_saved += saved
+
+        logger.debug(f"Tool router: offering {len(selected)}/{len(tools)} tools "
+                     f"({[tool_name(t) for t in selected]}), ~{saved} tokens saved")
+        return selected or None
+
+    def record_miss(self, dropped: Iterable[str]) -> None:
+        """
+        Record a routing miss: the model answered a routed request without a
+        tool and said it lacks a capability, so every tool is offered again.
+
+        Args:
+            dropped: Names of the tools the routed request did not offer.
+        """
+        logger.info(f"Tool router miss: reply admits a missing capability, re-offering "
+                    f"{sorted(dropped)}")
+        with self._lock:
+            self._misses += 1
+
+    def record_unoffered_call(self, name: str) -> None:
+        """
+        Record that the model called a tool the routed request did not offer.
+
+        Args:
+            name: Tool name the model called.
+        """
+        logger.info(f"Tool router: model called '{name}' which the routed request did not offer")
+        with self._lock:
+            self._unoffered_calls[name] = self._unoffered_calls.get(name, 0) + 1
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get routing statistics.
+
+        Returns:
+            Dict with request count, tools offered vs available, estimated
+            schema tokens saved, routing misses, and unoffered tool calls per tool.
+        """
+        with self._lock:
+            return {
+                'requests': self._requests,
+                'tools_available': self._tools_available,
+                'tools_offered': self._tools_offered,
+                'tokens_saved': self._tokens_saved,
+                'misses': self._misses,
+                'unoffered_calls': sum(self._unoffered_calls.values()),
+                'unoffered_calls_by_tool': dict(self._unoffered_calls),
+            }
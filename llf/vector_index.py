@@ -0,0 +1,1087 @@
+"""
+FAISS index construction and tuning for vector stores.
+
+Create_VectorStore.py builds indexes through build_index, and RAGRetriever
+applies per-store query-time knobs through set_search_params. Supported
+index types (all inner product, i.e. cosine similarity on normalized vectors):
+
+- IndexFlatIP:   Exact brute-force search (default)
+- IndexIVFFlat:  Inverted file; searches the nprobe closest of nlist clusters
+- IndexHNSWFlat: HNSW graph with M links per node; efSearch controls breadth
+- IndexIVFPQ:    Inverted file with product quantization (pq_m sub-vectors
+                 of pq_bits each); smallest memory, approximate scores
+
+Vector storage (Create_VectorStore.py --storage):
+
+- float32: Full precision (default)
+- float16: Scalar-quantized to half precision (IndexScalarQuantizer,
+           IndexHNSWSQ, IndexIVFScalarQuantizer); half the memory and
+           practically the same scores
+- binary:  One sign bit per dimension (IndexBinaryFlat, 1/32 of float32);
+           RescoredBinaryIndex searches the bits by Hamming distance for
+           rescore_factor * k candidates and rescores those exactly against
+           float16 vectors memory-mapped from vectors.f16.npy
+storage_report measures the memory saved and the recall kept.
+
+Sharded stores (Create_VectorStore.py --shards) split the vectors across N
+indexes by id (id % N), listed in index.shards.json. ShardedIndex searches
+the shards in parallel on a shared thread pool (FAISS releases the GIL, and
+memory-mapped shards share the page cache) and merges their top-k.
+
+Stores built with explicit ids (metadata row numbers) can be updated in
+place: ensure_id_map, add_with_ids and remove_ids keep vector ids stable, so
+metadata.jsonl only ever grows.
+
+IdFilter restricts a search to a set of vector ids (metadata filters): a
+FAISS ID selector skips ineligible vectors, and a small eligible set is
+scored exactly instead of searched.
+
+recall_report measures recall@k and latency of an approximate index against
+the exact IndexFlatIP result for a sweep of nprobe/efSearch values.
+
+Design: Index parameters are returned as a plain dict so they can be stored
+in the vector store's config.json next to index_type.
+"""
+
+import json
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .logging_config import get_logger
+
+try:
+    import faiss
+except ImportError:
+    faiss = None
+
+logger = get_logger(__name__)
+
+
+# Supported index types, in order of increasing approximation
+INDEX_TYPES = ('IndexFlatIP', 'IndexIVFFlat', 'IndexHNSWFlat', 'IndexIVFPQ')
+
+# Vector storage formats, and the float16 vectors kept next to binary codes for rescoring
+STORAGE_TYPES = ('float32', 'float16', 'binary')
+DEFAULT_STORAGE = 'float32'
+VECTORS_FILENAME = 'vectors.f16.npy'
+
+# Binary candidates rescored exactly per requested result
+DEFAULT_RESCORE_FACTOR = 8
+
+# Shard list of a sharded store (replaces index.faiss), and its shard files
+SHARDS_FILENAME = 'index.shards.json'
+SHARD_FILENAME = 'index.{:03d}.faiss'
+
+# Default build parameters
+DEFAULT_HNSW_M = 32
+DEFAULT_HNSW_EF_CONSTRUCTION = 80
+DEFAULT_PQ_BITS = 8
+DEFAULT_NPROBE = 8
+DEFAULT_EF_SEARCH = 64
+
+# FAISS k-means wants at least this many training points per centroid
+MIN_POINTS_PER_CENTROID = 39
+
+# Eligible sets up to this size are scored exactly rather than searched
+EXACT_FILTER_LIMIT = 4096
+
+# Filtered HNSW searches widen efSearch up to this value
+MAX_FILTERED_EF_SEARCH = 1024
+
+
+def _require_faiss():
+    if faiss is None:
+        raise ImportError("faiss-cpu is required. Install: pip install faiss-cpu")
+
+
+def default_nlist(num_vectors: int) -> int:
+    """
+    Pick the number of IVF clusters for a store size (about 4 * sqrt(n)).
+
+    Args:
+        num_vectors: Number of vectors in the store
+
+    Returns:
+        Cluster count, small enough that every cluster can be trained
+    """
+    nlist = int(4 * math.sqrt(num_vectors))
+    return max(1, min(nlist, num_vectors // MIN_POINTS_PER_CENTROID))
+
+
+def default_pq_m(dimension: int) -> int:
+    """
+    Pick the number of PQ sub-vectors: the largest divisor of the dimension
+    that gives sub-vectors of at least 8 dimensions.
+
+    Args:
+        dimension: Embedding dimension
+
+    Returns:
+        Number of sub-vectors (divides dimension)
+    """
+    for m in range(max(1, dimension // 8), 0, -1):
+        if dimension % m == 0:
+            return m
+    return 1
+
+
+def select_training_sample(embeddings: np.ndarray, train_size: Optional[int] = None,
+                           seed: int = 0) -> np.ndarray:
+    """
+    Select a uniform random training sample without replacement.
+
+    Args:
+        embeddings: All vectors (n x d, float32)
+        train_size: Number of vectors to train on (None or >= n uses all)
+        seed: Random seed, so rebuilding a store is reproducible
+
+    Returns:
+        Training vectors
+    """
+    num_vectors = embeddings.shape[0]
+    if train_size is None or train_size >= num_vectors:
+        return embeddings
+    rows = np.random.default_rng(seed).choice(num_vectors, size=train_size, replace=False)
+    rows.sort()  # Sequential reads when embeddings is memory-mapped
+    return embeddings[rows]
+
+
+def build_index(
+    embeddings: np.ndarray,
+    index_type: str = 'IndexFlatIP',
+    nlist: Optional[int] = None,
+    hnsw_m: int = DEFAULT_HNSW_M,
+    pq_m: Optional[int] = None,
+    pq_bits: int = DEFAULT_PQ_BITS,
+    train_size: Optional[int] = None,
+    seed: int = 0,
+    ids: Optional[np.ndarray] = None,
+    storage: str = DEFAULT_STORAGE
+) -> Tuple[Any, Dict[str, Any]]:
+    """
+    Build and fill a FAISS index.
+
+    Args:
+        embeddings: Normalized vectors (n x d)
+        index_type: One of INDEX_TYPES
+        nlist: IVF cluster count (default: default_nlist)
+        hnsw_m: HNSW links per node
+        pq_m: PQ sub-vector count (default: default_pq_m)
+        pq_bits: Bits per PQ code
+        train_size: Training sample size for IVF/PQ (default: enough for the
+            cluster and codebook counts, capped at n)
+        seed: Training sample seed
+        ids: Vector ids (int64, one per vector). Flat and HNSW indexes are
+            wrapped in IndexIDMap2 so they can be updated later; IVF indexes
+            store ids natively.
+        storage: One of STORAGE_TYPES. float16 works with every type except
+            IndexIVFPQ (already compressed); binary only with IndexFlatIP and
+            returns a RescoredBinaryIndex.
+
+    Returns:
+        Tuple of (index, params) where params records the build parameters and
+        default query-time knobs for config.json
+
+    Raises:
+        ValueError: If the index type or parameters are invalid for the data
+    """
+    _require_faiss()
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{index_type}'. Choose from: {', '.join(INDEX_TYPES)}")
+    if storage not in STORAGE_TYPES:
+        raise ValueError(f"Unknown storage '{storage}'. Choose from: {', '.join(STORAGE_TYPES)}")
+
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    num_vectors, dimension = embeddings.shape
+    params: Dict[str, Any] = {}
+    fp16 = faiss.ScalarQuantizer.QT_fp16
+
+    if storage == 'binary':
+        if index_type != 'IndexFlatIP':
+            raise ValueError("Binary storage is searched exhaustively; use it with IndexFlatIP")
+        if dimension % 8:
+            raise ValueError(f"Binary storage needs an embedding dimension divisible by 8 (got {dimension})")
+        index = RescoredBinaryIndex(faiss.IndexBinaryIDMap2(faiss.IndexBinaryFlat(dimension)),
+                                    np.empty((0, dimension), dtype=np.float16))
+        index.add_with_ids(embeddings, np.arange(num_vectors) if ids is None else ids)
+        return index, {'rescore_factor': DEFAULT_RESCORE_FACTOR}
+
+    if storage == 'float16' and index_type == 'IndexIVFPQ':
+        raise ValueError("IndexIVFPQ already compresses vectors; use float32 storage with it")
+
+    if index_type == 'IndexFlatIP':
+        if storage == 'float16':
+            index = faiss.IndexScalarQuantizer(dimension, fp16, faiss.METRIC_INNER_PRODUCT)
+        else:
+            index = faiss.IndexFlatIP(dimension)
+
+    elif index_type == 'IndexHNSWFlat':
+        if hnsw_m < 2:
+            raise ValueError("HNSW M must be at least 2")
+        if storage == 'float16':
+            index = faiss.IndexHNSWSQ(dimension, fp16, hnsw_m, faiss.METRIC_INNER_PRODUCT)
+        else:
+            index = faiss.IndexHNSWFlat(dimension, hnsw_m, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = DEFAULT_HNSW_EF_CONSTRUCTION
+        params.update({'M': hnsw_m, 'efConstruction': DEFAULT_HNSW_EF_CONSTRUCTION,
+                       'efSearch': DEFAULT_EF_SEARCH})
+
+    else:
+        nlist = nlist or default_nlist(num_vectors)
+        if nlist < 1 or nlist > num_vectors:
+            raise ValueError(f"nlist must be between 1 and the number of vectors ({num_vectors})")
+
+        quantizer = faiss.IndexFlatIP(dimension)
+        if index_type == 'IndexIVFFlat':
+            if storage == 'float16':
+                index = faiss.IndexIVFScalarQuantizer(quantizer, dimension, nlist, fp16, faiss.METRIC_INNER_PRODUCT)
+            else:
+                index = faiss.IndexIVFFlat(quantizer, dimension, nlist, faiss.METRIC_INNER_PRODUCT)
+            min_train = nlist
+            wanted_train = nlist * MIN_POINTS_PER_CENTROID
+        else:
+            pq_m = pq_m or default_pq_m(dimension)
+            if dimension % pq_m != 0:
+                raise ValueError(f"pq_m ({pq_m}) must divide the embedding dimension ({dimension})")
+            min_train = max(nlist, 2 ** pq_bits)
+            if num_vectors < min_train:
+                raise ValueError(
+                    f"IndexIVFPQ with pq_bits={pq_bits} needs at least {min_train} vectors to train "
+                    f"(store has {num_vectors}); lower --pq-bits or use IndexIVFFlat"
+                )
+            index = faiss.IndexIVFPQ(quantizer, dimension, nlist, pq_m, pq_bits, faiss.METRIC_INNER_PRODUCT)
+            wanted_train = max(nlist, 2 ** pq_bits) * MIN_POINTS_PER_CENTROID
+            params.update({'pq_m': pq_m, 'pq_bits': pq_bits})
+
+        train_size = min(num_vectors, train_size or wanted_train)
+        if train_size < min_train:
+            raise ValueError(f"Training sample ({train_size}) is smaller than the {min_train} centroids to train")
+
+        training = select_training_sample(embeddings, train_size, seed)
+        logger.info(f"Training {index_type} (nlist={nlist}) on {len(training)} of {num_vectors} vectors")
+        index.train(training)
+        nprobe = min(DEFAULT_NPROBE, nlist)
+        index.nprobe = nprobe
+        params.update({'nlist': nlist, 'train_size': int(train_size), 'nprobe': nprobe})
+
+    if ids is None:
+        index.add(embeddings)
+        return index, params
+
+    if not hasattr(index, 'nprobe'):
+        index = faiss.IndexIDMap2(index)
+    add_with_ids(index, embeddings, ids)
+    return index, params
+
+
+class RescoredBinaryIndex:
+    """
+    Binary (sign bit) index whose candidates are rescored exactly.
+
+    Offers the parts of the FAISS index interface the retriever and
+    incremental updates use (ntotal, d, search, reconstruct_batch,
+    add_with_ids, remove_ids).
+    """
+
+    def __init__(self, codes: Any, vectors: np.ndarray, rescore_factor: int = DEFAULT_RESCORE_FACTOR):
+        """
+        Initialize the index.
+
+        Args:
+            codes: IndexBinaryIDMap2 over the sign bits of the vectors
+            vectors: float16 vectors, row = vector id (memory-mapped when loaded)
+            rescore_factor: Binary candidates rescored per requested result
+        """
+        self.codes = codes
+        self.vectors = vectors
+        self.rescore_factor = max(1, int(rescore_factor))
+
+    @property
+    def ntotal(self) -> int:
+        return self.codes.ntotal
+
+    @property
+    def d(self) -> int:
+        return self.vectors.shape[1]
+
+    @staticmethod
+    def binarize(vectors: np.ndarray) -> np.ndarray:
+        """Pack the sign of each dimension into bits (8 dimensions per byte)."""
+        return np.packbits(np.asarray(vectors) > 0, axis=1)
+
+    def add_with_ids(self, vectors: np.ndarray, ids: np.ndarray) -> None:
+        """
+        Add vectors; ids must continue the vector rows (metadata row numbers do).
+
+        Raises:
+            ValueError: If ids are not the next row numbers
+        """
+        ids = np.ascontiguousarray(ids, dtype=np.int64)
+        if not np.array_equal(ids, np.arange(len(self.vectors), len(self.vectors) + len(ids))):
+            raise ValueError("Binary stores add vectors under the next row ids only")
+        self.vectors = np.concatenate([self.vectors, np.asarray(vectors, dtype=np.float16)])
+        self.codes.add_with_ids(self.binarize(vectors), ids)
+
+    def remove_ids(self, ids: np.ndarray) -> int:
+        """Remove ids from search; their float16 rows stay behind, like their metadata rows."""
+        return self.codes.remove_ids(np.ascontiguousarray(ids, dtype=np.int64))
+
+    def reconstruct_batch(self, ids: np.ndarray) -> np.ndarray:
+        """Get the stored (float16) vectors of ids as float32."""
+        return np.asarray(self.vectors[np.asarray(ids)], dtype=np.float32)
+
+    def search(self, queries: np.ndarray, k: int, params: Any = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Search by Hamming distance, then rescore the candidates by inner product.
+
+        Args:
+            queries: Query vectors (n x d)
+            k: Results per query
+            params: Optional faiss.SearchParameters (ID selector) for the binary search
+
+        Returns:
+            Tuple of (scores, ids) like a FAISS search (-inf/-1 for empty slots)
+        """
+        queries = np.ascontiguousarray(queries, dtype=np.float32)
+        candidates = min(self.ntotal, k * self.rescore_factor)
+        if candidates < 1:
+            return np.full((len(queries), k), -np.inf, dtype=np.float32), np.full((len(queries), k), -1, dtype=np.int64)
+
+        if params is None:
+            _, ids = self.codes.search(self.binarize(queries), candidates)
+        else:
+            _, ids = self.codes.search(self.binarize(queries), candidates, params=params)
+
+        # Read each candidate row once, in file order
+        valid = ids >= 0
+        rows = np.unique(ids[valid])
+        vectors = np.asarray(self.vectors[rows], dtype=np.float32)
+        scores = np.full(ids.shape, -np.inf, dtype=np.float32)
+        query_rows = np.nonzero(valid)[0]
+        scores[valid] = np.einsum('ij,ij->i', queries[query_rows], vectors[np.searchsorted(rows, ids[valid])])
+
+        order = np.argsort(-scores, axis=1, kind='stable')[:, :k]
+        distances = np.take_along_axis(scores, order, axis=1)
+        labels = np.where(np.isfinite(distances), np.take_along_axis(ids, order, axis=1), -1)
+        if order.shape[1] < k:
+            pad = k - order.shape[1]
+            distances = np.pad(distances, ((0, 0), (0, pad)), constant_values=-np.inf)
+            labels = np.pad(labels, ((0, 0), (0, pad)), constant_values=-1)
+        return distances, labels
+
+    def save(self, index_path: Path, vectors_path: Optional[Path] = None) -> None:
+        """
+        Write the binary codes and the float16 vectors.
+
+        Args:
+            index_path: Path for the binary index (index.faiss)
+            vectors_path: Path for the vectors (default: vectors.f16.npy next to index_path)
+        """
+        faiss.write_index_binary(self.codes, str(index_path))
+        with open(vectors_path or Path(index_path).with_name(VECTORS_FILENAME), 'wb') as f:
+            np.save(f, np.ascontiguousarray(self.vectors, dtype=np.float16))
+
+    @classmethod
+    def load(cls, index_path: Path, mmap: bool = False) -> 'RescoredBinaryIndex':
+        """
+        Read an index written by save().
+
+        Args:
+            index_path: Path to the binary index (index.faiss)
+            mmap: Memory-map codes and vectors (read-only; rescoring then
+                only reads the candidate rows)
+
+        Returns:
+            RescoredBinaryIndex
+        """
+        _require_faiss()
+        flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY if mmap else 0
+        codes = faiss.read_index_binary(str(index_path), flags)
+        vectors = np.load(Path(index_path).with_name(VECTORS_FILENAME), mmap_mode='r' if mmap else None)
+        return cls(codes, vectors)
+
+
+# Threads shared by the shard searches of all sharded stores
+_shard_executor: Optional[ThreadPoolExecutor] = None
+_shard_executor_lock = threading.Lock()
+
+
+def _get_shard_executor() -> ThreadPoolExecutor:
+    global _shard_executor
+    if _shard_executor is None:
+        with _shard_executor_lock:
+            if _shard_executor is None:
+                _shard_executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix='faiss-shard')
+    return _shard_executor
+
+
+class ShardedIndex:
+    """
+    Vectors split across shard indexes by id (shard = id % number of shards).
+
+    Offers the same interface as RescoredBinaryIndex. Searches run on all
+    shards in parallel and the per-shard results are merged by score.
+    """
+
+    def __init__(self, shards: List[Any]):
+        """
+        Initialize the index.
+
+        Args:
+            shards: Id-mapped FAISS indexes of the same type and dimension
+        """
+        self.shards = list(shards)
+
+    @property
+    def ntotal(self) -> int:
+        return sum(shard.ntotal for shard in self.shards)
+
+    @property
+    def d(self) -> int:
+        return self.shards[0].d
+
+    def owners(self, ids: np.ndarray) -> np.ndarray:
+        """Get the shard number of each id."""
+        return np.asarray(ids, dtype=np.int64) % len(self.shards)
+
+    def search(self, queries: np.ndarray, k: int, params: Optional[List[Any]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Search every shard in parallel and merge the results.
+
+        Args:
+            queries: Query vectors (n x d)
+            k: Results per query
+            params: Optional search parameters, one per shard (see IdFilter.search_params)
+
+        Returns:
+            Tuple of (scores, ids) like a FAISS search (-1 for empty slots)
+        """
+        queries = np.ascontiguousarray(queries, dtype=np.float32)
+
+        def search_shard(shard_no: int) -> Tuple[np.ndarray, np.ndarray]:
+            if params is None:
+                return self.shards[shard_no].search(queries, k)
+            return self.shards[shard_no].search(queries, k, params=params[shard_no])
+
+        if len(self.shards) == 1:
+            return search_shard(0)
+        results = list(_get_shard_executor().map(search_shard, range(len(self.shards))))
+
+        distances = np.concatenate([result[0] for result in results], axis=1)
+        labels = np.concatenate([result[1] for result in results], axis=1)
+        order = np.argsort(-distances, axis=1, kind='stable')[:, :k]
+        return np.take_along_axis(distances, order, axis=1), np.take_along_axis(labels, order, axis=1)
+
+    def reconstruct_batch(self, ids: np.ndarray) -> np.ndarray:
+        """Get the stored vectors of ids from their shards."""
+        ids = np.asarray(ids, dtype=np.int64)
+        owners = self.owners(ids)
+        vectors = np.empty((len(ids), self.d), dtype=np.float32)
+        for shard_no, shard in enumerate(self.shards):
+            rows = np.flatnonzero(owners == shard_no)
+            if len(rows):
+                vectors[rows] = shard.reconstruct_batch(ids[rows])
+        return vectors
+
+    def shard_paths(self, index_path: Path) -> List[Path]:
+        """Get the shard files of a store whose single index would be index_path."""
+        return [Path(index_path).with_name(SHARD_FILENAME.format(shard_no)) for shard_no in range(len(self.shards))]
+
+    def save(self, index_path: Path, suffix: str = '') -> None:
+        """
+        Write the shards and index.shards.json.
+
+        Args:
+            index_path: Path the store's single index would have (index.faiss)
+            suffix: Appended to every file name (e.g. '.tmp')
+        """
+        for shard, path in zip(self.shards, self.shard_paths(index_path)):
+            faiss.write_index(shard, f"{path}{suffix}")
+        manifest = {
+            'assignment': 'id % shards',
+            'shards': [{'file': path.name, 'num_vectors': int(shard.ntotal)}
+                       for shard, path in zip(self.shards, self.shard_paths(index_path))],
+        }
+        with open(f"{Path(index_path).with_name(SHARDS_FILENAME)}{suffix}", 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+
+    @classmethod
+    def load(cls, index_path: Path, read_shard: Optional[Callable[[Path], Any]] = None) -> 'ShardedIndex':
+        """
+        Read the shards listed in index.shards.json.
+
+        Args:
+            index_path: Path the store's single index would have (index.faiss)
+            read_shard: Reads one shard file (default: faiss.read_index into memory)
+
+        Returns:
+            ShardedIndex
+        """
+        _require_faiss()
+        with open(Path(index_path).with_name(SHARDS_FILENAME), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        read_shard = read_shard or (lambda path: faiss.read_index(str(path)))
+        return cls([read_shard(Path(index_path).with_name(shard['file'])) for shard in manifest['shards']])
+
+
+def build_sharded_index(embeddings: np.ndarray, shards: int, ids: Optional[np.ndarray] = None,
+                        **options: Any) -> Tuple[ShardedIndex, Dict[str, Any]]:
+    """
+    Build a ShardedIndex; each shard is built by build_index from its own vectors.
+
+    Args:
+        embeddings: Normalized vectors (n x d)
+        shards: Number of shards
+        ids: Vector ids (default: row numbers); shard = id % shards
+        **options: build_index options (index_type, nlist, storage, ...)
+
+    Returns:
+        Tuple of (index, parameters of the first shard)
+
+    Raises:
+        ValueError: For binary storage, or more shards than vectors
+    """
+    if options.get('storage') == 'binary':
+        raise ValueError("Binary storage cannot be sharded; use float32 or float16")
+    if not 1 <= shards <= len(embeddings):
+        raise ValueError(f"Shard count must be between 1 and the number of vectors ({len(embeddings)})")
+
+    ids = np.arange(len(embeddings), dtype=np.int64) if ids is None else np.asarray(ids, dtype=np.int64)
+    owners = ids % shards
+    parts = []
+    for shard_no in range(shards):
+        rows = np.flatnonzero(owners == shard_no)
+        logger.info(f"Building shard {shard_no + 1}/{shards} ({len(rows)} vectors)")
+        parts.append(build_index(embeddings[rows], ids=ids[rows], **options))
+    return ShardedIndex([index for index, _ in parts]), parts[0][1]
+
+
+def index_files(index: Any, index_path: Path) -> List[Path]:
+    """
+    Get the files write_index writes, in the order to swap them into place.
+
+    Files an index references come first, so the file that is read first
+    (index.faiss or index.shards.json) is replaced last.
+
+    Args:
+        index: FAISS index, RescoredBinaryIndex or ShardedIndex
+        index_path: The store's index.faiss
+
+    Returns:
+        List of paths
+    """
+    index_path = Path(index_path)
+    if isinstance(index, ShardedIndex):
+        return index.shard_paths(index_path) + [index_path.with_name(SHARDS_FILENAME)]
+    if isinstance(index, RescoredBinaryIndex):
+        return [index_path.with_name(VECTORS_FILENAME), index_path]
+    return [index_path]
+
+
+def write_index(index: Any, index_path: Path, suffix: str = '') -> None:
+    """
+    Write an index built by build_index or build_sharded_index.
+
+    Args:
+        index: FAISS index, RescoredBinaryIndex or ShardedIndex
+        index_path: The store's index.faiss (see index_files for the files written)
+        suffix: Appended to every file name (e.g. '.tmp')
+    """
+    _require_faiss()
+    if isinstance(index, ShardedIndex):
+        index.save(index_path, suffix)
+    elif isinstance(index, RescoredBinaryIndex):
+        index.save(Path(f"{index_path}{suffix}"), Path(f"{Path(index_path).with_name(VECTORS_FILENAME)}{suffix}"))
+    else:
+        faiss.write_index(index, f"{index_path}{suffix}")
+
+
+def base_index(index: Any) -> Any:
+    """
+    Get the underlying index of an id-mapped index.
+
+    Args:
+        index: FAISS index (possibly IndexIDMap/IndexIDMap2), RescoredBinaryIndex
+            or ShardedIndex (first shard)
+
+    Returns:
+        Downcast inner index
+    """
+    if isinstance(index, ShardedIndex):
+        return base_index(index.shards[0])
+    if isinstance(index, RescoredBinaryIndex):
+        return faiss.downcast_IndexBinary(index.codes.index)
+    index = faiss.downcast_index(index)
+    if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        return faiss.downcast_index(index.index)
+    return index
+
+
+def _is_ivf(index: Any) -> bool:
+    try:
+        return faiss.extract_index_ivf(index) is not None
+    except RuntimeError:
+        return False
+
+
+def _rebuild_id_map(index: Any, vectors: np.ndarray, ids: np.ndarray) -> Any:
+    """Build an empty copy of index's base type wrapped in IndexIDMap2 and fill it."""
+    empty = faiss.clone_index(base_index(index))
+    empty.reset()
+    rebuilt = faiss.IndexIDMap2(empty)
+    if len(ids):
+        rebuilt.add_with_ids(np.ascontiguousarray(vectors, dtype=np.float32), ids.astype(np.int64))
+    return rebuilt
+
+
+def ensure_id_map(index: Any) -> Any:
+    """
+    Make an index addressable by vector id.
+
+    IVF indexes and id-mapped indexes are returned unchanged. A plain flat or
+    HNSW index (stores built before ids were recorded) is rebuilt as an
+    IndexIDMap2 whose ids are the vector positions, which is what the
+    metadata row numbers already were.
+
+    Args:
+        index: Loaded FAISS index (must not be memory-mapped)
+
+    Returns:
+        Id-addressable index
+    """
+    _require_faiss()
+    if isinstance(index, ShardedIndex):
+        index.shards = [ensure_id_map(shard) for shard in index.shards]
+        return index
+    if isinstance(index, RescoredBinaryIndex):
+        return index
+    concrete = faiss.downcast_index(index)
+    if isinstance(concrete, (faiss.IndexIDMap, faiss.IndexIDMap2)) or _is_ivf(concrete):
+        return index
+
+    logger.info(f"Converting {type(concrete).__name__} to an id-mapped index")
+    vectors = concrete.reconstruct_n(0, concrete.ntotal)
+    return _rebuild_id_map(concrete, vectors, np.arange(concrete.ntotal, dtype=np.int64))
+
+
+def add_with_ids(index: Any, vectors: np.ndarray, ids: np.ndarray) -> None:
+    """
+    Add vectors under explicit ids.
+
+    Args:
+        index: Id-addressable index (see ensure_id_map)
+        vectors: Vectors to add (n x d)
+        ids: One id per vector
+    """
+    _require_faiss()
+    if isinstance(index, ShardedIndex):
+        owners = index.owners(ids)
+        for shard_no, shard in enumerate(index.shards):
+            rows = np.flatnonzero(owners == shard_no)
+            add_with_ids(shard, np.asarray(vectors)[rows], np.asarray(ids)[rows])
+        return
+    if len(ids):
+        index.add_with_ids(np.ascontiguousarray(vectors, dtype=np.float32),
+                           np.ascontiguousarray(ids, dtype=np.int64))
+
+
+def remove_ids(index: Any, ids: np.ndarray) -> Any:
+    """
+    Remove vectors by id.
+
+    HNSW graphs cannot delete nodes, so an id-mapped HNSW index is rebuilt
+    from its remaining (exactly stored) vectors instead; no re-embedding is needed.
+
+    Args:
+        index: Id-addressable index (see ensure_id_map)
+        ids: Ids to remove
+
+    Returns:
+        The index with the ids removed (a new object if it had to be rebuilt)
+    """
+    _require_faiss()
+    ids = np.ascontiguousarray(ids, dtype=np.int64)
+    if not len(ids):
+        return index
+
+    if isinstance(index, ShardedIndex):
+        owners = index.owners(ids)
+        index.shards = [remove_ids(shard, ids[owners == shard_no]) for shard_no, shard in enumerate(index.shards)]
+        return index
+
+    if not hasattr(base_index(index), 'hnsw'):
+        index.remove_ids(ids)
+        return index
+
+    index = faiss.downcast_index(index)
+    current_ids = faiss.vector_to_array(index.id_map)
+    keep = ~np.isin(current_ids, ids)
+    vectors = base_index(index).reconstruct_n(0, index.ntotal)
+    logger.info(f"Rebuilding HNSW graph without {int((~keep).sum())} removed vectors")
+    return _rebuild_id_map(index, vectors[keep], current_ids[keep])
+
+
+def set_search_params(index: Any, nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+                      rescore_factor: Optional[int] = None) -> Dict[str, int]:
+    """
+    Apply query-time knobs to a loaded index.
+
+    Knobs that do not apply to the index type are ignored (nprobe on HNSW,
+    efSearch on IVF, both on flat indexes, rescore_factor on all but binary
+    storage).
+
+    Args:
+        index: Loaded FAISS index or RescoredBinaryIndex
+        nprobe: IVF clusters to visit per query
+        ef_search: HNSW candidate list size per query
+        rescore_factor: Binary candidates rescored per requested result
+
+    Returns:
+        Dict of the knobs that were applied
+    """
+    _require_faiss()
+    applied = {}
+
+    if isinstance(index, ShardedIndex):
+        for shard in index.shards:
+            applied = set_search_params(shard, nprobe=nprobe, ef_search=ef_search, rescore_factor=rescore_factor)
+        return applied
+
+    if isinstance(index, RescoredBinaryIndex):
+        if rescore_factor is not None:
+            index.rescore_factor = max(1, int(rescore_factor))
+            applied['rescore_factor'] = index.rescore_factor
+        return applied
+
+    if nprobe is not None:
+        try:
+            ivf = faiss.extract_index_ivf(index)
+        except RuntimeError:
+            ivf = None
+        if ivf is not None:
+            ivf.nprobe = int(nprobe)
+            applied['nprobe'] = int(nprobe)
+
+    if ef_search is not None:
+        hnsw_index = base_index(index)
+        if hasattr(hnsw_index, 'hnsw'):
+            hnsw_index.hnsw.efSearch = int(ef_search)
+            applied['efSearch'] = int(ef_search)
+
+    return applied
+
+
+class IdFilter:
+    """
+    Vector ids a search is restricted to.
+    """
+
+    def __init__(self, allowed: np.ndarray, key: Optional[Any] = None):
+        """
+        Compile an eligibility mask into a FAISS ID selector.
+
+        Args:
+            allowed: Boolean mask indexed by vector id; ids past its end are not eligible
+            key: Hashable identity of the filter (equal keys select the same ids)
+        """
+        _require_faiss()
+        self.allowed = allowed
+        self.key = key
+        self.size = len(allowed)
+        self.ids = np.flatnonzero(allowed).astype(np.int64)
+        # Bit i of byte i // 8 is id i; kept referenced while the selector is in use
+        self._bitmap = np.packbits(allowed, bitorder='little')
+        self.selector = faiss.IDSelectorBitmap(self.size, faiss.swig_ptr(self._bitmap))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def search_params(self, index: Any) -> Any:
+        """
+        Build search parameters that apply the selector to an index.
+
+        IVF and HNSW searches visit more lists or candidates the fewer
+        vectors are eligible, so a selective filter still finds k results.
+
+        Args:
+            index: FAISS index (possibly id-mapped) or ShardedIndex
+
+        Returns:
+            SearchParameters (IVF/HNSW variant where applicable; a list with
+            one per shard for a ShardedIndex)
+        """
+        if isinstance(index, ShardedIndex):
+            return [self.search_params(shard) for shard in index.shards]
+        if isinstance(index, RescoredBinaryIndex):
+            return faiss.SearchParameters(sel=self.selector)
+
+        share = max(len(self.ids), 1) / max(index.ntotal, 1)
+        try:
+            ivf = faiss.extract_index_ivf(index)
+        except RuntimeError:
+            ivf = None
+        if ivf is not None:
+            nprobe = min(ivf.nlist, math.ceil(ivf.nprobe / min(share, 1.0)))
+            return faiss.SearchParametersIVF(sel=self.selector, nprobe=int(nprobe))
+
+        hnsw_index = base_index(index)
+        if hasattr(hnsw_index, 'hnsw'):
+            ef_search = hnsw_index.hnsw.efSearch
+            ef_search = min(max(ef_search, MAX_FILTERED_EF_SEARCH), math.ceil(ef_search / min(share, 1.0)))
+            return faiss.SearchParametersHNSW(sel=self.selector, efSearch=int(ef_search))
+
+        return faiss.SearchParameters(sel=self.selector)
+
+
+def _exact_search(index: Any, queries: np.ndarray, ids: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Score queries against the stored vectors of ids (RuntimeError if they cannot be reconstructed)."""
+    vectors = index.reconstruct_batch(ids)
+    scores = queries @ vectors.T
+    top = np.argsort(-scores, axis=1, kind='stable')[:, :k]
+    distances = np.take_along_axis(scores, top, axis=1)
+    labels = ids[top]
+    if top.shape[1] < k:
+        pad = k - top.shape[1]
+        distances = np.pad(distances, ((0, 0), (0, pad)), constant_values=-np.inf)
+        labels = np.pad(labels, ((0, 0), (0, pad)), constant_values=-1)
+    return distances, labels
+
+
+def filtered_search(index: Any, queries: np.ndarray, k: int, id_filter: IdFilter) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Search an index for the best eligible vectors.
+
+    Up to EXACT_FILTER_LIMIT eligible vectors are reconstructed and scored
+    exactly (only those vectors are read); larger sets, and indexes that
+    cannot reconstruct by id (IVF without a direct map), are searched with
+    the filter's ID selector.
+
+    Args:
+        index: FAISS index
+        queries: Query vectors (n x d)
+        k: Results per query
+        id_filter: Eligible vector ids
+
+    Returns:
+        Tuple of (scores, ids) as returned by index.search (-1 for empty slots)
+    """
+    if not len(id_filter):
+        return np.full((len(queries), k), -np.inf, dtype=np.float32), np.full((len(queries), k), -1, dtype=np.int64)
+
+    if len(id_filter) <= EXACT_FILTER_LIMIT:
+        try:
+            return _exact_search(index, queries, id_filter.ids, k)
+        except RuntimeError:
+            pass
+
+    return index.search(queries, k, params=id_filter.search_params(index))
+
+
+def _sweep_values(index: Any) -> Tuple[Optional[str], List[int]]:
+    """Get the query-time knob and values to sweep for an index."""
+    if isinstance(index, ShardedIndex):
+        return _sweep_values(index.shards[0])
+    if isinstance(index, RescoredBinaryIndex):
+        return 'rescore_factor', [1, 2, 4, 8, 16]
+    try:
+        ivf = faiss.extract_index_ivf(index)
+    except RuntimeError:
+        ivf = None
+    if ivf is not None:
+        values = [v for v in (1, 2, 4, 8, 16, 32, 64, 128, 256) if v <= ivf.nlist]
+        return 'nprobe', values
+    if hasattr(base_index(index), 'hnsw'):
+        return 'efSearch', [16, 32, 64, 128, 256]
+    return None, []
+
+
+def _recall(ids: np.ndarray, truth: np.ndarray) -> float:
+    """Share of the exact neighbours (truth, one row per query) found in ids."""
+    hits = sum(len(set(row[row >= 0]) & set(expected)) for row, expected in zip(ids, truth))
+    return round(hits / truth.size, 4)
+
+
+def recall_report(index: Any, embeddings: np.ndarray, k: int = 5, num_queries: int = 200,
+                  seed: int = 0) -> Dict[str, Any]:
+    """
+    Measure recall@k and latency of an index against exact search.
+
+    Queries are sampled from the stored vectors. Ground truth comes from an
+    IndexFlatIP over the same vectors. The index's own query knob is swept
+    (nprobe for IVF, efSearch for HNSW) and restored afterwards.
+
+    Args:
+        index: Index to evaluate
+        embeddings: Vectors the index was built from
+        k: Neighbours per query
+        num_queries: Number of sampled queries
+        seed: Query sample seed
+
+    Returns:
+        Dict with index_type, k, num_queries, the exact search latency, and
+        rows of {knob value, recall, mean_ms, p95_ms}
+    """
+    _require_faiss()
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    queries = select_training_sample(embeddings, min(num_queries, embeddings.shape[0]), seed)
+
+    exact = faiss.IndexFlatIP(embeddings.shape[1])
+    exact.add(embeddings)
+
+    def timed_search(search_index) -> Tuple[np.ndarray, List[float]]:
+        latencies = []
+        results = []
+        for query in queries:
+            start = time.perf_counter()
+            _, ids = search_index.search(query.reshape(1, -1), k)
+            latencies.append((time.perf_counter() - start) * 1000)
+            results.append(ids[0])
+        return np.array(results), latencies
+
+    def summarize(latencies: List[float]) -> Dict[str, float]:
+        ordered = sorted(latencies)
+        return {
+            'mean_ms': round(sum(ordered) / len(ordered), 4),
+            'p95_ms': round(ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))], 4),
+        }
+
+    truth, exact_latencies = timed_search(exact)
+
+    knob, values = _sweep_values(index)
+    rows = []
+    if knob is None:
+        ids, latencies = timed_search(index)
+        rows.append(dict({'recall': _recall(ids, truth)}, **summarize(latencies)))
+    else:
+        # Shards share their knob values
+        probe = index.shards[0] if isinstance(index, ShardedIndex) else index
+        if knob == 'nprobe':
+            original = faiss.extract_index_ivf(probe).nprobe
+        elif knob == 'efSearch':
+            original = base_index(probe).hnsw.efSearch
+        else:
+            original = probe.rescore_factor
+        argument = {'nprobe': 'nprobe', 'efSearch': 'ef_search'}.get(knob, knob)
+
+        for value in values:
+            set_search_params(index, **{argument: value})
+            ids, latencies = timed_search(index)
+            rows.append(dict({knob: value, 'recall': _recall(ids, truth)}, **summarize(latencies)))
+        set_search_params(index, **{argument: original})
+
+    return {
+        'index_type': type(base_index(index)).__name__,
+        'k': k,
+        'num_queries': len(queries),
+        'knob': knob,
+        'exact': summarize(exact_latencies),
+        'rows': rows,
+    }
+
+
+def format_recall_report(report: Dict[str, Any]) -> str:
+    """
+    Format a recall report as a text table.
+
+    Args:
+        report: Result of recall_report
+
+    Returns:
+        Multi-line table
+    """
+    knob = report['knob']
+    lines = [
+        f"Recall@{report['k']} vs exact IndexFlatIP ({report['index_type']}, {report['num_queries']} queries)",
+        f"  exact: mean {report['exact']['mean_ms']:.3f} ms, p95 {report['exact']['p95_ms']:.3f} ms",
+        f"  {knob or '':>9}  {'recall':>7}  {'mean ms':>8}  {'p95 ms':>8}",
+    ]
+    for row in report['rows']:
+        value = row.get(knob, '') if knob else ''
+        lines.append(f"  {value:>9}  {row['recall']:>7.3f}  {row['mean_ms']:>8.3f}  {row['p95_ms']:>8.3f}")
+    return "\n".join(lines)
+
+
+def index_memory_bytes(index: Any) -> int:
+    """
+    Get the in-memory size of an index (its serialized size).
+
+    The float16 vectors of a RescoredBinaryIndex are not counted: they are
+    memory-mapped and only the rescored rows are read.
+
+    Args:
+        index: FAISS index, RescoredBinaryIndex or ShardedIndex
+
+    Returns:
+        Size in bytes
+    """
+    _require_faiss()
+    if isinstance(index, ShardedIndex):
+        return sum(index_memory_bytes(shard) for shard in index.shards)
+    if isinstance(index, RescoredBinaryIndex):
+        return int(faiss.serialize_index_binary(index.codes).nbytes)
+    return int(faiss.serialize_index(index).nbytes)
+
+
+def storage_report(index: Any, embeddings: np.ndarray, storage: str, k: int = 5,
+                   num_queries: int = 200, seed: int = 0) -> Dict[str, Any]:
+    """
+    Measure the memory a storage format saves and the recall it keeps.
+
+    The float32 size is the same index with 4-byte dimensions. Recall@k is
+    measured at the index's current query knobs against exact float32
+    search, for queries sampled from the stored vectors.
+
+    Args:
+        index: Index built with the given storage
+        embeddings: Vectors the index was built from
+        storage: One of STORAGE_TYPES
+        k: Neighbours per query
+        num_queries: Number of sampled queries
+        seed: Query sample seed
+
+    Returns:
+        Dict with storage, bytes, float32_bytes, saved (fraction), k and recall
+    """
+    _require_faiss()
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    dimension = embeddings.shape[1]
+    code_size = {'float32': 4 * dimension, 'float16': 2 * dimension, 'binary': dimension // 8}[storage]
+    size = index_memory_bytes(index)
+    float32_size = size + index.ntotal * (4 * dimension - code_size)
+
+    queries = select_training_sample(embeddings, min(num_queries, embeddings.shape[0]), seed)
+    exact = faiss.IndexFlatIP(dimension)
+    exact.add(embeddings)
+    _, truth = exact.search(queries, k)
+    _, ids = index.search(queries, k)
+
+    return {
+        'storage': storage,
+        'bytes': size,
+        'float32_bytes': float32_size,
+        'saved': round(1 - size / float32_size, 4) if float32_size else 0.0,
+        'k': k,
+        'recall': _recall(ids, truth),
+    }
+
+
+def format_storage_report(report: Dict[str, Any]) -> str:
+    """
+    Format a storage report as one line.
+
+    Args:
+        report: Result of storage_report
+
+    Returns:
+        Text such as "float16 storage: 1.5 MB in memory vs 2.9 MB as float32 (49% saved), recall@5 0.998"
+    """
+    return (f"{report['storage']} storage: {report['bytes'] / 1e6:.1f} MB in memory vs "
+            f"{report['float32_bytes'] / 1e6:.1f} MB as float32 ({report['saved']:.0%} saved), "
+            f"recall@{report['k']} {report['recall']:.3f} vs exact float32 search")
@@ -0,0 +1,409 @@
+"""
+Incremental vector store updates.
+
+A vector store built by Create_VectorStore.py carries a manifest.json that
+records, for every source JSONL file, a content hash and the vector ids of
+its chunks. Vector ids are metadata row numbers, so metadata.jsonl is
+append-only:
+
+- New sources:      chunks are embedded, appended to metadata.jsonl and
+                    added to the index under new ids
+- Changed sources:  old ids are removed from the index, then handled as new
+- Removed sources:  ids are removed from the index (their metadata rows stay
+                    as unreferenced orphans until the next full rebuild)
+- Unchanged sources are not touched, so nothing is re-embedded
+
+A BM25 keyword index (bm25.npz), if the store has one, is updated the same
+way: stale ids are dropped and the new chunks are added under their new ids.
+The metadata filter index (metadata.filters.npz) and the chunk adjacency
+index (metadata.adjacency.npy) gain the new rows. Binary
+stores append the new float16 rescoring vectors (vectors.f16.npy); sharded
+stores route each id to its shard (index.NNN.faiss).
+
+All files are first written next to the originals as *.tmp and then renamed
+into place (metadata first, index last). A retriever that loads the store at
+any point sees a consistent store: new metadata rows are never referenced by
+an older index, and removed ids only disappear from the index.
+
+Design: Chunking and embedding are passed in as callables so this module
+does not depend on sentence-transformers; Create_VectorStore.py supplies its
+own prepare_chunks and create_embeddings.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .chunk_adjacency import adjacency_path_for, load_adjacency
+from .lexical_index import BM25_FILENAME, BM25Index
+from .logging_config import get_logger
+from .metadata_filter import filters_path_for, load_filter_index
+from .metadata_store import MetadataIndex, build_offsets, load_offsets
+from . import vector_index
+
+logger = get_logger(__name__)
+
+
+# Manifest written next to index.faiss
+MANIFEST_FILENAME = 'manifest.json'
+MANIFEST_VERSION = 1
+
+# Record key holding the source JSONL file name (set by Create_VectorStore.load_jsonl_files)
+SOURCE_KEY = '_source_jsonl'
+
+
+@dataclass
+class UpdatePlan:
+    """Sources to add, re-embed, remove, or leave alone."""
+    added: List[str] = field(default_factory=list)
+    changed: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    unchanged: List[str] = field(default_factory=list)
+
+    @property
+    def has_changes(self) -> bool:
+        return bool(self.added or self.changed or self.removed)
+
+
+def source_of(record: Dict[str, Any]) -> str:
+    """Get the source name of a record or metadata row."""
+    return str(record.get(SOURCE_KEY, 'unknown'))
+
+
+def group_records_by_source(records: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Group records by source file, keeping record order.
+
+    Args:
+        records: Records from load_jsonl_files
+
+    Returns:
+        Dict mapping source name to its records
+    """
+    groups: Dict[str, List[Dict[str, Any]]] = {}
+    for record in records:
+        groups.setdefault(source_of(record), []).append(record)
+    return groups
+
+
+def hash_source(records: List[Dict[str, Any]]) -> str:
+    """
+    Hash the content of one source.
+
+    Args:
+        records: The source's records
+
+    Returns:
+        SHA-256 hex digest of the canonical JSON of the records
+    """
+    digest = hashlib.sha256()
+    for record in records:
+        digest.update(json.dumps(record, sort_keys=True, ensure_ascii=False).encode('utf-8'))
+        digest.update(b'\n')
+    return digest.hexdigest()
+
+
+def build_manifest(records: List[Dict[str, Any]], metadata: List[Dict[str, Any]],
+                   settings: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Build the manifest for a freshly created store (ids are metadata row numbers).
+
+    Args:
+        records: Source records the store was built from
+        metadata: Metadata rows, in id order
+        settings: Build settings that updates must reuse (chunk_size, overlap, ...)
+
+    Returns:
+        Manifest dict
+    """
+    ids_by_source: Dict[str, List[int]] = {}
+    for row_id, meta in enumerate(metadata):
+        ids_by_source.setdefault(source_of(meta), []).append(row_id)
+
+    return {
+        'version': MANIFEST_VERSION,
+        'settings': settings,
+        'next_id': len(metadata),
+        'sources': {
+            source: {'hash': hash_source(source_records), 'ids': ids_by_source.get(source, [])}
+            for source, source_records in group_records_by_source(records).items()
+        },
+    }
+
+
+def load_manifest(store_dir: Path) -> Optional[Dict[str, Any]]:
+    """
+    Load a store's manifest.
+
+    Args:
+        store_dir: Vector store directory
+
+    Returns:
+        Manifest dict, or None if the store has no manifest
+    """
+    path = Path(store_dir) / MANIFEST_FILENAME
+    if not path.exists():
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _manifest_from_metadata(store_dir: Path) -> Dict[str, Any]:
+    """
+    Reconstruct a manifest for a store built before manifests existed.
+
+    Content hashes are unknown, so every existing source counts as changed
+    and is re-embedded once.
+    """
+    metadata = MetadataIndex(Path(store_dir) / 'metadata.jsonl')
+    ids_by_source: Dict[str, List[int]] = {}
+    for row_id, meta in enumerate(metadata):
+        ids_by_source.setdefault(source_of(meta), []).append(row_id)
+    row_count = len(metadata)
+    metadata.close()
+
+    return {
+        'version': MANIFEST_VERSION,
+        'settings': {},
+        'next_id': row_count,
+        'sources': {source: {'hash': None, 'ids': ids} for source, ids in ids_by_source.items()},
+    }
+
+
+def plan_update(manifest: Dict[str, Any], records_by_source: Dict[str, List[Dict[str, Any]]]) -> UpdatePlan:
+    """
+    Compare current sources against the manifest.
+
+    Args:
+        manifest: Store manifest
+        records_by_source: Current records grouped by source
+
+    Returns:
+        UpdatePlan
+    """
+    plan = UpdatePlan()
+    known = manifest.get('sources', {})
+
+    for source, records in records_by_source.items():
+        if source not in known:
+            plan.added.append(source)
+        elif known[source].get('hash') != hash_source(records):
+            plan.changed.append(source)
+        else:
+            plan.unchanged.append(source)
+
+    plan.removed = [source for source in known if source not in records_by_source]
+    return plan
+
+
+def _write_json(path: Path, data: Dict[str, Any]) -> None:
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+
+
+def update_vector_store(
+    store_dir: Path,
+    records: List[Dict[str, Any]],
+    chunk_records: Callable[[List[Dict[str, Any]]], Tuple[List[str], List[Dict[str, Any]]]],
+    embed_texts: Callable[[List[str]], np.ndarray],
+    dry_run: bool = False
+) -> Dict[str, Any]:
+    """
+    Bring an existing vector store in line with the current source records.
+
+    Args:
+        store_dir: Vector store directory (index.faiss, metadata.jsonl, config.json)
+        records: All current source records (the full corpus, not just new files)
+        chunk_records: Splits records into (texts, metadata rows)
+        embed_texts: Embeds texts into normalized vectors
+        dry_run: Only compute the plan
+
+    Returns:
+        Summary dict: the plan, vectors added/removed, and the new vector count
+
+    Raises:
+        FileNotFoundError: If the store files are missing
+        ValueError: If the manifest does not match the metadata, or the
+            embedding dimension does not match the index
+    """
+    faiss = vector_index.faiss
+    if faiss is None:
+        raise ImportError("faiss-cpu is required. Install: pip install faiss-cpu")
+
+    store_dir = Path(store_dir)
+    index_path = store_dir / 'index.faiss'
+    metadata_path = store_dir / 'metadata.jsonl'
+    config_path = store_dir / 'config.json'
+    # Sharded stores list their shards in index.shards.json instead of an index.faiss
+    shards_path = store_dir / vector_index.SHARDS_FILENAME
+    for path in (shards_path if shards_path.exists() else index_path, metadata_path, config_path):
+        if not path.exists():
+            raise FileNotFoundError(f"Vector store file not found: {path}")
+
+    manifest = load_manifest(store_dir)
+    if manifest is None:
+        logger.warning("Store has no manifest.json; re-embedding every source once to create one")
+        manifest = _manifest_from_metadata(store_dir)
+
+    records_by_source = group_records_by_source(records)
+    plan = plan_update(manifest, records_by_source)
+    summary = {
+        'added': plan.added,
+        'changed': plan.changed,
+        'removed': plan.removed,
+        'unchanged': len(plan.unchanged),
+        'vectors_added': 0,
+        'vectors_removed': 0,
+    }
+
+    with open(config_path, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    if dry_run or not plan.has_changes:
+        summary['num_vectors'] = config.get('num_vectors')
+        return summary
+
+    # Embed new and changed sources
+    embed_sources = plan.added + plan.changed
+    new_records = [record for source in embed_sources for record in records_by_source[source]]
+    texts, new_metadata = chunk_records(new_records) if new_records else ([], [])
+    vectors = embed_texts(texts) if texts else None
+
+    next_id = manifest['next_id']
+    new_ids = np.arange(next_id, next_id + len(new_metadata), dtype=np.int64)
+
+    # Update the index in memory (read fully, never memory-mapped, since it is modified)
+    stale_ids = [row_id for source in plan.changed + plan.removed
+                 for row_id in manifest['sources'][source]['ids']]
+    if config.get('storage') == 'binary':
+        index = vector_index.RescoredBinaryIndex.load(index_path)
+    elif config.get('shards', 1) > 1:
+        index = vector_index.ensure_id_map(vector_index.ShardedIndex.load(index_path))
+    else:
+        index = vector_index.ensure_id_map(faiss.read_index(str(index_path)))
+    index = vector_index.remove_ids(index, np.array(stale_ids, dtype=np.int64))
+    if vectors is not None:
+        if vectors.shape[1] != index.d:
+            raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match the store ({index.d})")
+        vector_index.add_with_ids(index, vectors, new_ids)
+
+    # metadata.jsonl.tmp: existing bytes plus the new rows
+    metadata_tmp = metadata_path.with_name(metadata_path.name + '.tmp')
+    old_offsets = load_offsets(metadata_path)
+    if old_offsets is None:
+        old_offsets = build_offsets(metadata_path)
+    old_rows = int(old_offsets[0, 1])
+    if old_rows != next_id:
+        raise ValueError(f"Manifest expects {next_id} metadata rows but metadata.jsonl has {old_rows}")
+
+    shutil.copyfile(metadata_path, metadata_tmp)
+    position = int(old_offsets[0, 0])
+    ranges = []
+    with open(metadata_tmp, 'r+b') as f:
+        f.seek(position)
+        if position:
+            f.seek(position - 1)
+            if f.read(1) != b'\n':
+                f.write(b'\n')
+                position += 1
+        for meta in new_metadata:
+            line = (json.dumps(meta, ensure_ascii=False) + '\n').encode('utf-8')
+            f.write(line)
+            ranges.append((position, position + len(line)))
+            position += len(line)
+
+    offsets = np.empty((old_rows + len(ranges) + 1, 2), dtype=np.uint64)
+    offsets[0] = (position, old_rows + len(ranges))
+    offsets[1:old_rows + 1] = old_offsets[1:]
+    if ranges:
+        offsets[old_rows + 1:] = ranges
+
+    offsets_path = metadata_path.with_name('metadata.offsets.npy')
+    offsets_tmp = offsets_path.with_name(offsets_path.name + '.tmp')
+    with open(offsets_tmp, 'wb') as f:
+        np.save(f, offsets)
+
+    # Filter index: rows are append-only too (written after metadata.jsonl.tmp, so it stays current)
+    filters_path = filters_path_for(metadata_path)
+    filters_tmp = filters_path.with_name(filters_path.name + '.tmp')
+    has_filters = filters_path.exists()
+
+    # Chunk adjacency: new sources are whole records, linked among themselves
+    adjacency_path = adjacency_path_for(metadata_path)
+    adjacency_tmp = adjacency_path.with_name(adjacency_path.name + '.tmp')
+    has_adjacency = adjacency_path.exists()
+
+    if has_filters or has_adjacency:
+        # One view of the old rows for both sidecars, closed before metadata.jsonl is
+        # replaced (an open mmap blocks the swap on Windows)
+        with MetadataIndex(metadata_path) as metadata:
+            if has_filters:
+                filter_index = load_filter_index(metadata_path, metadata, save=False)
+            if has_adjacency:
+                adjacency = load_adjacency(metadata_path, metadata, save=False)
+        if has_filters:
+            filter_index.extend(new_metadata).save(filters_tmp)
+        if has_adjacency:
+            adjacency.extend(new_metadata).save(adjacency_tmp)
+
+    # Keyword index follows the vector index
+    bm25_path = store_dir / BM25_FILENAME
+    bm25_tmp = bm25_path.with_name(bm25_path.name + '.tmp')
+    has_bm25 = bm25_path.exists()
+    if has_bm25:
+        BM25Index.load(bm25_path).update(stale_ids, texts, new_ids.tolist()).save(bm25_tmp)
+
+    # index.faiss.tmp (plus the rescoring vectors or shards it references)
+    vector_index.write_index(index, index_path, suffix='.tmp')
+
+    # New manifest
+    for source in plan.removed + plan.changed:
+        del manifest['sources'][source]
+    source_ids: Dict[str, List[int]] = {}
+    for row_id, meta in zip(new_ids.tolist(), new_metadata):
+        source_ids.setdefault(source_of(meta), []).append(row_id)
+    for source in embed_sources:
+        manifest['sources'][source] = {
+            'hash': hash_source(records_by_source[source]),
+            'ids': source_ids.get(source, []),
+        }
+    manifest['next_id'] = next_id + len(new_metadata)
+    manifest_tmp = store_dir / (MANIFEST_FILENAME + '.tmp')
+    _write_json(manifest_tmp, manifest)
+
+    config['num_vectors'] = int(index.ntotal)
+    config['metadata_records'] = manifest['next_id']
+    config_tmp = config_path.with_name(config_path.name + '.tmp')
+    _write_json(config_tmp, config)
+
+    # Swap files in: metadata (a superset) before the index that references it; each shard
+    # is consistent with the new metadata on its own, and shard list / index.faiss come last
+    os.replace(metadata_tmp, metadata_path)
+    os.replace(offsets_tmp, offsets_path)
+    if has_filters:
+        os.replace(filters_tmp, filters_path)
+    if has_adjacency:
+        os.replace(adjacency_tmp, adjacency_path)
+    if has_bm25:
+        os.replace(bm25_tmp, bm25_path)
+    for path in vector_index.index_files(index, index_path):
+        os.replace(f"{path}.tmp", path)
+    os.replace(config_tmp, config_path)
+    os.replace(manifest_tmp, store_dir / MANIFEST_FILENAME)
+
+    summary.update({
+        'vectors_added': len(new_ids),
+        'vectors_removed': len(stale_ids),
+        'num_vectors': int(index.ntotal),
+    })
+    logger.info(
+        f"Updated {store_dir}: {len(plan.added)} added, {len(plan.changed)} changed, "
+        f"{len(plan.removed)} removed, {len(plan.unchanged)} unchanged source(s); "
+        f"+{len(new_ids)}/-{len(stale_ids)} vectors"
+    )
+    return summary
@@ -0,0 +1,8 @@
+"""
+Benchmark tests for Local LLM Framework.
+
+These keep the benchmark tooling working: the offline benchmark suite
+(llf.benchmark) and the mock llama-server (llf.mock_llm_server) run with a
+handful of iterations, and store loading is checked in both modes. Timing
+assertions only run with LLF_BENCHMARKS=1. Use `llf bench` for real numbers.
+"""
@@ -0,0 +1,99 @@
+"""
+Smoke tests for the offline benchmark suite.
+"""
+
+import json
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+
+from llf.benchmark import REPORT_VERSION, SCENARIOS, run_benchmarks, save_report, _percentile
+from llf.config import Config
+from llf.mock_llm_server import MockServerSettings
+from llf.prompt_config import PromptConfig
+
+
+@pytest.fixture
+def config(tmp_path):
+    """Create an isolated configuration."""
+    config = Config()
+    config.model_dir = tmp_path / "models"
+    config.cache_dir = tmp_path / ".cache"
+    return config
+
+
+@pytest.fixture
+def prompt_config(tmp_path):
+    """Create a prompt configuration without RAG or memory."""
+    prompt_config = PromptConfig(config_file=tmp_path / "missing_prompt.json")
+    prompt_config._rag_retriever = False  # Truthy check in build_messages skips RAG
+    return prompt_config
+
+
+class TestRunBenchmarks:
+    """Test run_benchmarks report generation."""
+
+    def test_report_structure(self, config, prompt_config):
+        """Test a short run produces a complete report."""
+        report = run_benchmarks(
+            iterations=2,
+            settings=MockServerSettings(response_tokens=4),
+            scenarios=['chat', 'chat_stream', 'build_messages', 'tool_loop'],
+            config=config,
+            prompt_config=prompt_config,
+        )
+
+        assert report['report_version'] == REPORT_VERSION
+        assert report['iterations'] == 2
+        for name in ['chat', 'chat_stream', 'build_messages', 'tool_loop']:
+            result = report['scenarios'][name]
+            assert result['status'] == 'ok', result
+            assert set(result['overhead_ms']) == {'mean', 'p50', 'p95', 'min', 'max'}
+
+        # Health check + chat request per turn; tool loop adds one request per tool round
+        assert report['scenarios']['chat']['requests_per_iteration'] == 2
+        assert report['scenarios']['tool_loop']['requests_per_iteration'] == 4
+        assert report['scenarios']['build_messages']['requests_per_iteration'] == 0
+
+    def test_does_not_modify_config(self, config, prompt_config):
+        """Test the caller's configuration still points at its own endpoint."""
+        original_url = config.api_base_url
+        run_benchmarks(iterations=1, scenarios=['chat'], config=config, prompt_config=prompt_config)
+        assert config.api_base_url == original_url
+
+    def test_unknown_scenario(self, config, prompt_config):
+        """Test unknown scenario names are rejected."""
+        with pytest.raises(ValueError, match="Unknown benchmark scenario"):
+            run_benchmarks(iterations=1, scenarios=['nope'], config=config, prompt_config=prompt_config)
+
+    def test_invalid_iterations(self, config, prompt_config):
+        """Test iterations must be positive."""
+        with pytest.raises(ValueError, match="iterations"):
+            run_benchmarks(iterations=0, config=config, prompt_config=prompt_config)
+
+    def test_zero_tool_rounds_rejected(self, config, prompt_config):
+        from llf.cli import bench_command
+        args = SimpleNamespace(latency_ms=0.0, tokens_per_second=0.0, response_tokens=8, tool_rounds=0,
+                               iterations=1, scenario=['tool_loop'], output=None)
+
+        with patch('llf.benchmark.run_benchmarks') as run:
+            assert bench_command(config, prompt_config, args) == 1
+        run.assert_not_called()
+
+    def test_all_scenarios_listed(self):
+        """Test the scenario list covers the documented code paths."""
+        assert SCENARIOS == ['chat', 'chat_stream', 'build_messages', 'tool_loop', 'gui_stream']
+
+
+def test_save_report(tmp_path):
+    """Test saving a report as JSON."""
+    path = save_report({'report_version': REPORT_VERSION, 'scenarios': {}}, tmp_path / "out" / "bench.json")
+    assert json.loads(path.read_text())['report_version'] == REPORT_VERSION
+
+
+def test_percentile():
+    """Test nearest-rank percentile."""
+    assert _percentile([], 50) == 0.0
+    assert _percentile([1, 2, 3, 4], 50) == 2
+    assert _percentile([1, 2, 3, 4], 95) == 4
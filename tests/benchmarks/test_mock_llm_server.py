@@ -0,0 +1,113 @@
+"""
+Unit tests for the mock llama-server used by benchmarks.
+"""
+
+import json
+
+import pytest
+import requests
+from openai import OpenAI
+
+from llf.mock_llm_server import MockLLMServer, MockServerSettings, MOCK_TOOL_NAME, approximate_tokens
+
+
+@pytest.fixture
+def server():
+    """Start a mock server with default settings."""
+    with MockLLMServer(MockServerSettings(response_tokens=4)) as srv:
+        yield srv
+
+
+class TestMockServerEndpoints:
+    """Test the HTTP endpoints LLF relies on."""
+
+    def test_health(self, server):
+        """Test /health returns 200."""
+        response = requests.get(f"{server.base_url}/health", timeout=5)
+        assert response.status_code == 200
+        assert response.json()['status'] == 'ok'
+
+    def test_tokenize(self, server):
+        """Test /tokenize returns approximate tokens."""
+        response = requests.post(f"{server.base_url}/tokenize", json={'content': 'Hello, world'}, timeout=5)
+        assert response.status_code == 200
+        assert len(response.json()['tokens']) == 3
+
+    def test_embeddings(self, server):
+        """Test /v1/embeddings returns one OpenAI-format vector per input."""
+        response = requests.post(f"{server.base_url}/v1/embeddings",
+                                 json={'input': ['rotate keys', 'install'], 'model': 'embed'}, timeout=5)
+        assert response.status_code == 200
+        data = response.json()
+        assert data['model'] == 'embed'
+        assert [row['index'] for row in data['data']] == [0, 1]
+        assert all(len(row['embedding']) == 32 for row in data['data'])
+
+    def test_unknown_endpoint(self, server):
+        """Test unknown endpoints return 404."""
+        response = requests.get(f"{server.base_url}/nope", timeout=5)
+        assert response.status_code == 404
+
+    def test_chat_completion(self, server):
+        """Test non-streaming chat completion through the OpenAI client."""
+        client = OpenAI(base_url=server.api_base_url, api_key="EMPTY")
+        response = client.chat.completions.create(
+            model="mock", messages=[{'role': 'user', 'content': 'Hi'}]
+        )
+        assert response.choices[0].message.content == "tok0 tok1 tok2 tok3"
+        assert response.choices[0].finish_reason == 'stop'
+
+    def test_chat_completion_streaming(self, server):
+        """Test streaming chat completion through the OpenAI client."""
+        client = OpenAI(base_url=server.api_base_url, api_key="EMPTY")
+        stream = client.chat.completions.create(
+            model="mock", messages=[{'role': 'user', 'content': 'Hi'}], stream=True
+        )
+        content = "".join(chunk.choices[0].delta.content or "" for chunk in stream)
+        assert content == "tok0 tok1 tok2 tok3 "
+
+    def test_chat_completion_tool_rounds(self, server):
+        """Test the server requests tool calls until enough tool results are present."""
+        server.settings.tool_rounds = 1
+        client = OpenAI(base_url=server.api_base_url, api_key="EMPTY")
+        messages = [{'role': 'user', 'content': 'Hi'}]
+
+        first = client.chat.completions.create(model="mock", messages=messages)
+        tool_calls = first.choices[0].message.tool_calls
+        assert tool_calls and tool_calls[0].function.name == MOCK_TOOL_NAME
+
+        messages.append({'role': 'assistant', 'content': None, 'tool_calls': [tc.model_dump() for tc in tool_calls]})
+        messages.append({'role': 'tool', 'tool_call_id': tool_calls[0].id, 'content': json.dumps({})})
+        second = client.chat.completions.create(model="mock", messages=messages)
+        assert second.choices[0].message.tool_calls is None
+        assert second.choices[0].message.content
+
+
+class TestMockServerStats:
+    """Test request accounting."""
+
+    def test_stats_and_reset(self, server):
+        """Test requests are counted per endpoint and can be reset."""
+        requests.get(f"{server.base_url}/health", timeout=5)
+        requests.get(f"{server.base_url}/health", timeout=5)
+
+        stats = server.stats()
+        assert stats['total_requests'] == 2
+        assert stats['endpoints']['/health']['count'] == 2
+        assert stats['server_seconds'] >= 0
+
+        server.reset_stats()
+        assert server.stats()['total_requests'] == 0
+
+    def test_latency_is_recorded(self):
+        """Test simulated latency shows up as server time."""
+        with MockLLMServer(MockServerSettings(latency_ms=20, response_tokens=1)) as srv:
+            client = OpenAI(base_url=srv.api_base_url, api_key="EMPTY")
+            client.chat.completions.create(model="mock", messages=[{'role': 'user', 'content': 'Hi'}])
+            assert srv.stats()['server_seconds'] >= 0.02
+
+
+def test_approximate_tokens_empty():
+    """Test tokenizing empty text."""
+    assert approximate_tokens("") == []
+    assert approximate_tokens(None) == []
@@ -0,0 +1,131 @@
+"""
+Store loading benchmark: eager (read_index + list of dicts) vs memory-mapped
+(mmap FAISS index + MetadataIndex).
+
+Each mode runs in a fresh interpreter so RSS is measured in isolation. Both
+modes must return the same rows. Wall-clock and RSS vary with the machine
+and its load, so the timing comparison only runs with LLF_BENCHMARKS=1
+(add -s to see the before/after table).
+"""
+
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+
+NUM_VECTORS = 50000
+DIMENSION = 384
+
+# Timing and memory comparisons are opt-in (LLF_BENCHMARKS=1)
+RUN_BENCHMARKS = os.environ.get('LLF_BENCHMARKS') == '1'
+
+BUILD_STORE = """
+import json, sys
+import numpy as np
+import faiss
+store_dir, num_vectors, dimension = sys.argv[1], int(sys.argv[2]), int(sys.argv[3])
+vectors = np.random.default_rng(0).random((num_vectors, dimension), dtype=np.float32)
+index = faiss.IndexFlatIP(dimension)
+index.add(vectors)
+faiss.write_index(index, store_dir + '/index.faiss')
+with open(store_dir + '/metadata.jsonl', 'w') as f:
+    for i in range(num_vectors):
+        f.write(json.dumps({'text': 'chunk %d ' % i + 'lorem ipsum ' * 40, 'chunk_id': i, 'source_file': 'doc.md'}) + '\\n')
+"""
+
+LOAD_STORE = """
+import json, resource, sys, time
+import numpy as np
+import faiss
+
+def rss_mb():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss / (1024 * 1024) if sys.platform == 'darwin' else maxrss / 1024
+
+store_dir, mode = sys.argv[1], sys.argv[2]
+sys.path.insert(0, sys.argv[3])
+from llf.metadata_store import MetadataIndex
+
+before = rss_mb()
+start = time.perf_counter()
+if mode == 'eager':
+    index = faiss.read_index(store_dir + '/index.faiss')
+    metadata = []
+    with open(store_dir + '/metadata.jsonl') as f:
+        for line in f:
+            metadata.append(json.loads(line.strip()))
+else:
+    flags = getattr(faiss, 'IO_FLAG_MMAP_IFC', None) or faiss.IO_FLAG_MMAP
+    index = faiss.read_index(store_dir + '/index.faiss', flags | faiss.IO_FLAG_READ_ONLY)
+    metadata = MetadataIndex(store_dir + '/metadata.jsonl')
+load_seconds = time.perf_counter() - start
+loaded = rss_mb()
+
+query = np.random.default_rng(1).random((1, index.d), dtype=np.float32)
+start = time.perf_counter()
+_, indices = index.search(query, 5)
+rows = [metadata[idx] for idx in indices[0]]
+query_ms = (time.perf_counter() - start) * 1000
+
+print(json.dumps({'load_seconds': load_seconds, 'rss_mb': loaded - before,
+                  'query_ms': query_ms, 'rows': [row['chunk_id'] for row in rows]}))
+"""
+
+
+def _run(script, *args):
+    result = subprocess.run([sys.executable, '-c', script, *map(str, args)],
+                            capture_output=True, text=True, timeout=300)
+    if result.returncode != 0:
+        if 'No module named' in result.stderr:
+            pytest.skip(result.stderr.strip().splitlines()[-1])
+        raise AssertionError(result.stderr)
+    return result.stdout
+
+
+@pytest.fixture(scope="module")
+def store_dir(tmp_path_factory):
+    """Build a synthetic store once for all modes."""
+    store_dir = tmp_path_factory.mktemp("bench_store")
+    _run(BUILD_STORE, store_dir, NUM_VECTORS, DIMENSION)
+    # First MetadataIndex load writes the offset table, as Create_VectorStore.py would
+    _run(LOAD_STORE, store_dir, 'mmap', PROJECT_ROOT)
+    return store_dir
+
+
+def _load_all_modes(store_dir):
+    return {mode: json.loads(_run(LOAD_STORE, store_dir, mode, PROJECT_ROOT)) for mode in ['eager', 'mmap']}
+
+
+def test_mmap_store_returns_same_rows(store_dir):
+    """Test memory-mapped loading finds the same rows as eager loading."""
+    results = _load_all_modes(store_dir)
+
+    assert len(results['mmap']['rows']) == 5
+    assert results['mmap']['rows'] == results['eager']['rows']
+
+
+@pytest.mark.skipif(not RUN_BENCHMARKS, reason="timing benchmark, set LLF_BENCHMARKS=1 to run")
+def test_mmap_store_loading(store_dir):
+    """Test memory-mapped loading is faster and uses less resident memory."""
+    results = _load_all_modes(store_dir)
+
+    print(f"\nStore loading, {NUM_VECTORS} x {DIMENSION} vectors:")
+    print(f"{'mode':<8}{'load s':>10}{'RSS MB':>10}{'query ms':>10}")
+    for mode, result in results.items():
+        print(f"{mode:<8}{result['load_seconds']:>10.3f}{result['rss_mb']:>10.1f}{result['query_ms']:>10.2f}")
+
+    assert results['mmap']['load_seconds'] < results['eager']['load_seconds']
+    assert results['mmap']['rss_mb'] < results['eager']['rss_mb'] / 2
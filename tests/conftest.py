@@ -9,6 +9,13 @@ import signal
 import atexit
 import gc
 
+# Keep a reference to the real faiss module: test_rag_retriever replaces
+# sys.modules['faiss'] with a MagicMock when it is imported
+try:
+    import faiss as _real_faiss
+except ImportError:
+    _real_faiss = None
+
 
 # Simple mock classes that don't use MagicMock (avoids cleanup issues)
 class SimpleMock:
@@ -181,3 +188,13 @@ def pytest_runtest_call(item):
     yield  # Run the test
     _ignore_signals()  # Ignore signals after test
 
+
+
+@pytest.fixture
+def real_faiss(monkeypatch):
+    """Real faiss module patched into llf.vector_index for one test."""
+    if _real_faiss is None:
+        pytest.skip("faiss-cpu not installed")
+    import llf.vector_index as vector_index
+    monkeypatch.setattr(vector_index, 'faiss', _real_faiss)
+    return _real_faiss
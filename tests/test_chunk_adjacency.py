@@ -0,0 +1,88 @@
+"""
+Unit tests for chunk_adjacency module.
+"""
+
+import json
+import os
+
+import pytest
+
+from llf.chunk_adjacency import (
+    ADJACENCY_FILENAME, ChunkAdjacency, load_adjacency, write_adjacency
+)
+from llf.metadata_store import MetadataIndex
+
+
+def _chunks(source, source_file, count):
+    return [{'text': f'{source_file} {i}', '_source_jsonl': source, 'source_file': source_file,
+             '_chunk_index': i, '_total_chunks': count} for i in range(count)]
+
+
+ROWS = (_chunks('a.jsonl', 'manual.pdf', 3)       # ids 0-2
+        + _chunks('a.jsonl', 'manual.pdf', 2)     # ids 3-4: next record of the same file
+        + [{'text': 'no chunk position'}]         # id 5
+        + _chunks('b.jsonl', 'notes.md', 1))      # id 6
+
+
+def _links(adjacency):
+    return [(adjacency.neighbor(i, -1), adjacency.neighbor(i, 1)) for i in range(len(adjacency))]
+
+
+@pytest.fixture
+def metadata_path(tmp_path):
+    """Create a metadata.jsonl with the test rows."""
+    path = tmp_path / "metadata.jsonl"
+    path.write_text(''.join(json.dumps(row) + '\n' for row in ROWS), encoding='utf-8')
+    return path
+
+
+class TestChunkAdjacency:
+    """Test linking the chunks of a record."""
+
+    def test_build(self):
+        adjacency = ChunkAdjacency.build(ROWS)
+
+        assert _links(adjacency) == [(None, 1), (0, 2), (1, None), (None, 4), (3, None),
+                                     (None, None), (None, None)]
+
+    def test_out_of_range(self):
+        adjacency = ChunkAdjacency.build(ROWS)
+        assert adjacency.neighbor(-1, 1) is None
+        assert adjacency.neighbor(len(ROWS), -1) is None
+
+    def test_extend_matches_build(self):
+        extended = ChunkAdjacency.build(ROWS[:3]).extend(ROWS[3:])
+        assert _links(extended) == _links(ChunkAdjacency.build(ROWS))
+
+    def test_save_and_load(self, tmp_path):
+        ChunkAdjacency.build(ROWS).save(tmp_path / ADJACENCY_FILENAME)
+        loaded = ChunkAdjacency.load(tmp_path / ADJACENCY_FILENAME)
+
+        assert _links(loaded) == _links(ChunkAdjacency.build(ROWS))
+        assert _links(loaded.extend(_chunks('c.jsonl', 'faq.md', 2)))[-2:] == [(None, 8), (7, None)]
+
+
+class TestLoadAdjacency:
+    """Test the metadata.adjacency.npy sidecar."""
+
+    def test_built_and_saved_when_missing(self, metadata_path):
+        adjacency = load_adjacency(metadata_path, MetadataIndex(metadata_path))
+
+        assert len(adjacency) == len(ROWS)
+        assert (metadata_path.parent / ADJACENCY_FILENAME).exists()
+
+    def test_current_sidecar_is_used(self, metadata_path):
+        write_adjacency(metadata_path, [{}] * len(ROWS))
+
+        adjacency = load_adjacency(metadata_path, MetadataIndex(metadata_path))
+        assert adjacency.neighbor(0, 1) is None
+
+    def test_stale_sidecar_is_rebuilt(self, metadata_path):
+        sidecar = write_adjacency(metadata_path, ROWS[:2])  # Fewer rows than metadata.jsonl
+        assert load_adjacency(metadata_path, MetadataIndex(metadata_path)).neighbor(1, 1) == 2
+
+        write_adjacency(metadata_path, [{}] * len(ROWS))
+        stat = metadata_path.stat()
+        os.utime(sidecar, ns=(stat.st_atime_ns, stat.st_mtime_ns - 10**9))  # Older than metadata.jsonl
+        adjacency = load_adjacency(metadata_path, MetadataIndex(metadata_path), save=False)
+        assert adjacency.neighbor(0, 1) == 1
@@ -0,0 +1,210 @@
+"""
+Unit tests for context_packer module.
+"""
+
+from unittest.mock import Mock
+
+from llf.context_packer import (
+    TRUNCATION_MARKER, estimate_tokens, get_context_window, merge_text, mmr_order, pack_context, truncate_text
+)
+from llf.prompt_config import PromptConfig
+
+
+def _format(results):
+    return "\n\n".join(f"[Source: {r.get('store_name', 'Unknown')}]\n{r['text'].strip()}" for r in results)
+
+
+def _result(text, id=None, chunk_index=None, **extra):
+    return dict({'text': text, 'score': 0.5, 'store_name': 'docs', 'source_file': 'a.jsonl',
+                 'id': id, 'chunk_index': chunk_index}, **extra)
+
+
+def _chunks(text, size, overlap):
+    """Split text the way Create_VectorStore.chunk_text does."""
+    chunks, start = [], 0
+    while start < len(text):
+        chunks.append(text[start:start + size])
+        start += size - overlap
+    return chunks
+
+
+class TestGetContextWindow:
+    """Test reading the per-request context size from server_params."""
+
+    def test_not_configured(self):
+        assert get_context_window({}) is None
+        assert get_context_window(None) is None
+        assert get_context_window({'ctx-size': '0'}) is None
+
+    def test_reply_reserved(self):
+        assert get_context_window({'ctx-size': '8192'}, max_tokens=2048) == 6144
+
+    def test_split_between_slots(self):
+        assert get_context_window({'ctx-size': 8192, 'parallel': 4}, max_tokens=512) == 1536
+
+    def test_invalid_value(self):
+        assert get_context_window({'ctx-size': 'large'}) is None
+
+
+class TestMergeText:
+    """Test joining consecutive chunks."""
+
+    def test_recorded_overlap(self):
+        text = "The quick brown fox jumps over the lazy dog. " * 10
+        first, second = _chunks(text, 100, 30)[:2]
+        assert merge_text(first, second, overlap=30) == text[:170]
+
+    def test_overlap_found_without_record(self):
+        text = "Alpha beta gamma delta epsilon zeta eta theta iota kappa lambda mu"
+        assert merge_text(text[:40], text[15:]) == text
+
+    def test_no_overlap(self):
+        assert merge_text("First part. ", " Second part.") == "First part.\nSecond part."
+
+
+class TestTruncateText:
+    """Test cutting a chunk to a length."""
+
+    def test_cuts_at_sentence(self):
+        text = "One sentence here. Another sentence follows. A third one that is long."
+        assert truncate_text(text, 50) == "One sentence here. Another sentence follows."
+
+    def test_hard_cut_without_boundary(self):
+        assert truncate_text("A" * 100, 10) == "A" * 10
+
+    def test_short_text_unchanged(self):
+        assert truncate_text("short", 10) == "short"
+
+
+class TestMMROrder:
+    """Test maximal marginal relevance ordering."""
+
+    def test_duplicates_dropped(self):
+        candidates = [_result("restart the server to apply cache settings"),
+                      _result("restart the server to apply cache settings"),
+                      _result("tokens expire after one hour")]
+        assert list(mmr_order(candidates)) == [0, 2]
+
+    def test_diverse_chunk_promoted(self):
+        candidates = [_result("cache settings control eviction and size limits"),
+                      _result("cache settings control eviction and size limits for disk"),
+                      _result("login tokens expire after one hour")]
+        assert list(mmr_order(candidates, mmr_lambda=0.5, duplicate_threshold=1.1)) == [0, 2, 1]
+
+    def test_lambda_one_keeps_ranking(self):
+        candidates = [_result("same words here"), _result("same words here too"), _result("other")]
+        assert list(mmr_order(candidates, mmr_lambda=1.0, duplicate_threshold=1.1)) == [0, 1, 2]
+
+    def test_adjacent_chunks_not_penalized(self):
+        candidates = [_result("alpha beta gamma delta", id=4, chunk_index=1),
+                      _result("alpha beta gamma delta", id=5, chunk_index=2)]
+        assert list(mmr_order(candidates)) == [0, 1]
+
+
+class TestPackContext:
+    """Test packing chunks into a token budget."""
+
+    def test_adjacent_chunks_merged(self):
+        text = "Configure the cache before starting the server. " * 8
+        first, second, third = _chunks(text, 150, 40)[:3]
+        candidates = [_result(second, id=11, chunk_index=1, chunk_overlap=40, score=0.9),
+                      _result("Unrelated chunk about login tokens", id=3, chunk_index=0),
+                      _result(first, id=10, chunk_index=0, chunk_overlap=40, score=0.7),
+                      _result(third, id=12, chunk_index=2, chunk_overlap=40)]
+
+        passages = pack_context(candidates, 1000, _format)
+
+        assert len(passages) == 2
+        assert passages[0]['text'] == text[:370]
+        assert passages[0]['score'] == 0.9
+        assert passages[1]['text'] == "Unrelated chunk about login tokens"
+
+    def test_merge_disabled(self):
+        candidates = [_result("first half of the record", id=0, chunk_index=0),
+                      _result("second half of the record", id=1, chunk_index=1)]
+        assert len(pack_context(candidates, 1000, _format, merge_adjacent=False)) == 2
+
+    def test_budget_skips_chunks_that_do_not_fit(self):
+        candidates = [_result("short answer"), _result("long " * 200), _result("another short one")]
+
+        passages = pack_context(candidates, 40, _format)
+
+        assert [p['text'] for p in passages] == ["short answer", "another short one"]
+        assert estimate_tokens(_format(passages)) <= 40
+
+    def test_max_results_backfilled_after_duplicates(self):
+        candidates = [_result("cache eviction policy"), _result("cache eviction policy"),
+                      _result("login tokens"), _result("backup schedule")]
+
+        passages = pack_context(candidates, 1000, _format, max_results=3)
+
+        assert [p['text'] for p in passages] == ["cache eviction policy", "login tokens", "backup schedule"]
+
+    def test_oversized_best_chunk_truncated(self):
+        text = "First sentence of the chunk. " * 40
+        passages = pack_context([_result(text)], 50, _format)
+
+        assert len(passages) == 1
+        assert passages[0]['text'].endswith(TRUNCATION_MARKER)
+        assert passages[0]['text'].startswith("First sentence of the chunk.")
+        assert estimate_tokens(_format(passages)) <= 50
+
+    def test_neighbor_chunks_added_within_budget(self):
+        text = "Step one: stop the service. Step two: clear the cache. Step three: restart it. " * 2
+        chunks = _chunks(text, 40, 10)[:5]  # The last piece is shorter than the overlap
+        record = {i: _result(chunk, id=20 + i, chunk_index=i, chunk_overlap=10) for i, chunk in enumerate(chunks)}
+
+        def neighbors(result, step):
+            return record.get(result['chunk_index'] + step)
+
+        candidates = [record[2], _result("Unrelated chunk about login tokens", id=3, chunk_index=0)]
+        passages = pack_context(candidates, 1000, _format, max_results=2, neighbors=neighbors, neighbor_chunks=1)
+
+        assert passages[0]['text'] == text[30:130]
+        assert passages[1]['text'] == "Unrelated chunk about login tokens"
+
+        wide = pack_context(candidates, 1000, _format, neighbors=neighbors, neighbor_chunks=len(chunks))
+        assert wide[0]['text'] == text
+
+        # Too small a budget for both neighbours: the earlier one is taken first
+        budget = estimate_tokens(_format([dict(record[2], text=text[30:100])] + candidates[1:]))
+        narrow = pack_context(candidates, budget, _format, neighbors=neighbors, neighbor_chunks=1)
+        assert narrow[0]['text'] == text[30:100]
+
+    def test_neighbor_chunks_off(self):
+        neighbors = Mock()
+        pack_context([_result("text", id=1, chunk_index=1)], 100, _format, neighbors=neighbors)
+        neighbors.assert_not_called()
+
+    def test_empty(self):
+        assert pack_context([], 100, _format) == []
+        assert pack_context([_result("text")], 0, _format) == []
+        assert pack_context([_result("   ")], 100, _format) == []
+
+
+class TestBuildMessagesContextTokens:
+    """Test the RAG budget passed from build_messages."""
+
+    def test_prompt_tokens_subtracted(self, tmp_path):
+        prompt_config = PromptConfig(config_file=tmp_path / "missing.json")
+        prompt_config.system_prompt = "x" * 400  # 100 tokens
+        retriever = Mock()
+        retriever.has_attached_stores.return_value = True
+        retriever.query_all_stores.return_value = None
+        prompt_config._rag_retriever = retriever
+
+        prompt_config.build_messages("y" * 40, conversation_history=[{'role': 'user', 'content': 'z' * 80}],
+                                     context_tokens=1000)
+
+        retriever.query_all_stores.assert_called_once_with("y" * 40, context_tokens=1000 - 100 - 10 - 20)
+
+    def test_unknown_context(self, tmp_path):
+        prompt_config = PromptConfig(config_file=tmp_path / "missing.json")
+        retriever = Mock()
+        retriever.has_attached_stores.return_value = True
+        retriever.query_all_stores.return_value = None
+        prompt_config._rag_retriever = retriever
+
+        prompt_config.build_messages("Hello")
+
+        retriever.query_all_stores.assert_called_once_with("Hello")
@@ -0,0 +1,166 @@
+"""
+Unit tests for deadline module and turn deadline propagation.
+"""
+
+import math
+import time
+import types
+
+import pytest
+from unittest.mock import Mock, patch
+
+from llf.config import Config
+from llf.deadline import Deadline
+from llf.llm_runtime import LLMRuntime, DEADLINE_EXCEEDED_MESSAGE
+from llf.mock_llm_server import MockLLMServer, MockServerSettings
+from llf.model_manager import ModelManager
+from llf.prompt_config import PromptConfig
+
+
+class FakeClock:
+    """Manually advanced clock."""
+
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestDeadline:
+    """Test Deadline arithmetic."""
+
+    def test_unlimited(self):
+        deadline = Deadline()
+        assert not deadline.has_budget
+        assert deadline.remaining() == math.inf
+        assert not deadline.expired()
+        assert deadline.clamp_timeout(30) == 30
+        assert deadline.clamp_max_tokens(512, 20.0) == 512
+
+    def test_invalid_budget(self):
+        with pytest.raises(ValueError):
+            Deadline(0)
+
+    def test_remaining_and_expiry(self):
+        clock = FakeClock()
+        deadline = Deadline(10, clock=clock)
+        clock.now += 4
+        assert deadline.remaining() == 6
+        clock.now += 7
+        assert deadline.remaining() == 0
+        assert deadline.expired()
+
+    def test_clamp_timeout(self):
+        clock = FakeClock()
+        deadline = Deadline(10, clock=clock)
+        assert deadline.clamp_timeout(300) == 10
+        assert deadline.clamp_timeout(5) == 5
+        clock.now += 9.8
+        assert deadline.clamp_timeout(30) == 1.0  # Minimum
+
+    def test_clamp_max_tokens(self):
+        clock = FakeClock()
+        deadline = Deadline(10, clock=clock)
+        assert deadline.clamp_max_tokens(2048, None) == 2048  # No rate known yet
+        assert deadline.clamp_max_tokens(2048, 20.0) == 200
+        assert deadline.clamp_max_tokens(100, 20.0) == 100
+        assert deadline.clamp_max_tokens(None, 20.0) == 200
+        clock.now += 10
+        assert deadline.clamp_max_tokens(2048, 20.0) == 16  # Minimum
+
+
+class TestBuildMessagesDeadline:
+    """Test RAG is skipped once the deadline has expired."""
+
+    def test_expired_deadline_skips_rag(self, tmp_path):
+        prompt_config = PromptConfig(config_file=tmp_path / "missing.json")
+        retriever = Mock()
+        retriever.has_attached_stores.return_value = True
+        prompt_config._rag_retriever = retriever
+
+        clock = FakeClock()
+        deadline = Deadline(1, clock=clock)
+        clock.now += 2
+
+        messages = prompt_config.build_messages("Hello", deadline=deadline)
+
+        retriever.query_all_stores.assert_not_called()
+        assert messages[-1] == {'role': 'user', 'content': 'Hello'}
+
+
+class TestExecuteToolDeadline:
+    """Test tool execution under a deadline."""
+
+    @pytest.fixture
+    def runtime(self):
+        config = Config()
+        config.default_local_server = None
+        return LLMRuntime(config, ModelManager(config))
+
+    def test_expired_deadline_skips_tool(self, runtime):
+        clock = FakeClock()
+        deadline = Deadline(1, clock=clock)
+        clock.now += 2
+
+        result = runtime._execute_tool('command_exec', {'command': 'ls'}, None, deadline=deadline)
+        assert result['success'] is False
+        assert 'time budget' in result['error'].lower()
+
+    def test_timeout_argument_shrunk(self, runtime):
+        calls = []
+        module = types.SimpleNamespace(
+            TOOL_DEFINITION={'function': {'parameters': {'properties': {'timeout': {'type': 'integer', 'default': 30}}}}},
+            execute=lambda args: calls.append(args) or {'success': True},
+        )
+        with patch('llf.tools_manager.ToolsManager.load_tool_module', return_value=module):
+            result = runtime._execute_tool('slow_tool', {'command': 'ls'}, None, deadline=Deadline(5))
+
+        assert result == {'success': True}
+        assert calls[0]['timeout'] <= 5
+
+    def test_overrunning_tool_abandoned(self, runtime):
+        module = types.SimpleNamespace(execute=lambda args: time.sleep(3) or {'success': True})
+        with patch('llf.tools_manager.ToolsManager.load_tool_module', return_value=module):
+            start = time.monotonic()
+            result = runtime._execute_tool('slow_tool', {}, None, deadline=Deadline(0.2))
+
+        assert result['success'] is False
+        assert time.monotonic() - start < 2.5
+
+
+class TestChatDeadline:
+    """Test the tool loop stops at the turn deadline against the mock server."""
+
+    @pytest.fixture
+    def runtime(self, tmp_path):
+        settings = MockServerSettings(latency_ms=150, response_tokens=4, tool_rounds=10)
+        with MockLLMServer(settings) as server:
+            config = Config()
+            config.model_dir = tmp_path / "models"
+            config.cache_dir = tmp_path / ".cache"
+            config.api_base_url = server.api_base_url
+            config.default_local_server = None
+            runtime = LLMRuntime(config, ModelManager(config))
+            with patch.object(runtime, 'is_server_running', return_value=True):
+                yield runtime
+
+    def test_tool_loop_bounded(self, runtime):
+        """Test a long tool loop returns a partial answer near the deadline."""
+        runtime.config.turn_timeout = 0.5
+        start = time.monotonic()
+        reply = runtime.chat([{'role': 'user', 'content': 'Hi'}], use_prompt_config=False, max_tool_iterations=12)
+        elapsed = time.monotonic() - start
+
+        assert reply == DEADLINE_EXCEEDED_MESSAGE
+        assert elapsed < 1.5
+
+    def test_no_deadline_unchanged(self, runtime):
+        """Test the loop runs to completion without a budget."""
+        reply = runtime.chat([{'role': 'user', 'content': 'Hi'}], use_prompt_config=False, max_tool_iterations=12)
+        assert reply == "tok0 tok1 tok2 tok3"
+
+    def test_decode_rate_recorded(self, runtime):
+        """Test decode rate is observed from completed responses."""
+        runtime.chat([{'role': 'user', 'content': 'Hi'}], use_prompt_config=False, max_tool_iterations=12)
+        assert runtime.decode_rate is not None and runtime.decode_rate > 0
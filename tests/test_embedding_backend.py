@@ -0,0 +1,178 @@
+"""
+Unit tests for embedding_backend module.
+"""
+
+from unittest.mock import Mock, patch
+
+import numpy as np
+import pytest
+
+from llf import embedding_backend
+from llf.embedding_backend import (
+    apply_thread_settings, compare_backends, format_parity_report, load_embedding_model, model_key,
+    resolve_thread_counts, validate_backend
+)
+
+
+class FakeModel:
+    """Embeds a text as a fixed normalized vector, optionally with noise added."""
+
+    def __init__(self, noise=0.0):
+        self.noise = noise
+        self.encoded = 0
+
+    def encode(self, texts, batch_size=32, convert_to_numpy=True, normalize_embeddings=True,
+               show_progress_bar=False):
+        self.encoded += len(texts)
+        vectors = np.array([[len(text), 1.0, 2.0] for text in texts], dtype=np.float32)
+        vectors[:, 1] += self.noise
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+class TestModelKey:
+    """Test cache keys of model variants."""
+
+    def test_torch_keeps_model_name(self):
+        assert model_key("mini") == "mini"
+        assert model_key("mini", "torch") == "mini"
+
+    def test_other_backends(self):
+        assert model_key("mini", "onnx") == "mini@onnx"
+        assert model_key("mini", "onnx", "int8") == "mini@onnx-int8"
+        assert model_key("mini", "openvino") == "mini@openvino"
+
+    def test_llama_server_keyed_by_server(self):
+        assert model_key("nomic", "llama-server", server="embeddings") == "nomic@llama-server:embeddings"
+
+
+class TestValidateBackend:
+    """Test backend and quantization checks."""
+
+    def test_default(self):
+        assert validate_backend(None) == "torch"
+
+    def test_unknown_backend(self):
+        with pytest.raises(ValueError, match="Unknown embedding backend"):
+            validate_backend("tensorrt")
+
+    def test_quantization_needs_onnx(self):
+        assert validate_backend("onnx", "int8") == "onnx"
+        with pytest.raises(ValueError, match="not supported by the torch backend"):
+            validate_backend("torch", "int8")
+        with pytest.raises(ValueError, match="not supported by the openvino backend"):
+            validate_backend("openvino", "int8")
+
+
+class TestLoadEmbeddingModel:
+    """Test loading models on each backend."""
+
+    def test_torch(self):
+        with patch('llf.embedding_backend.SentenceTransformer') as st:
+            load_embedding_model("mini", cache_folder="cache", device="cpu")
+        st.assert_called_once_with("mini", device="cpu", cache_folder="cache")
+
+    def test_onnx(self):
+        with patch('llf.embedding_backend.SentenceTransformer') as st:
+            load_embedding_model("mini", cache_folder="cache", backend="onnx")
+        assert st.call_args.kwargs['backend'] == "onnx"
+        assert st.call_args.kwargs['device'] == "cpu"
+
+    def test_int8_exported_once(self, tmp_path):
+        export_dir = tmp_path / "org__mini-onnx-qint8"
+
+        def export(model_name, target_dir, cache_folder):
+            (target_dir / "onnx").mkdir(parents=True)
+            (target_dir / "onnx" / "model_qint8.onnx").touch()
+
+        with patch('llf.embedding_backend.SentenceTransformer') as st, \
+                patch('llf.embedding_backend._export_int8_onnx', side_effect=export) as exporter:
+            load_embedding_model("org/mini", cache_folder=str(tmp_path), backend="onnx", quantization="int8")
+            load_embedding_model("org/mini", cache_folder=str(tmp_path), backend="onnx", quantization="int8")
+
+        exporter.assert_called_once()
+        assert st.call_args.args == (str(export_dir),)
+        assert st.call_args.kwargs['model_kwargs'] == {'file_name': "onnx/model_qint8.onnx"}
+
+    def test_old_sentence_transformers(self):
+        with patch('llf.embedding_backend.SentenceTransformer', side_effect=TypeError("unexpected 'backend'")):
+            with pytest.raises(ImportError, match="sentence-transformers\\[onnx\\]"):
+                load_embedding_model("mini", backend="onnx")
+
+    def test_missing_dependency(self):
+        with patch('llf.embedding_backend.SentenceTransformer', None):
+            with pytest.raises(ImportError, match="sentence-transformers is required"):
+                load_embedding_model("mini")
+
+    def test_llama_server_needs_no_sentence_transformers(self):
+        with patch('llf.embedding_backend.SentenceTransformer', None):
+            model = load_embedding_model("nomic", backend="llama-server", server="http://127.0.0.1:8090/v1")
+        assert model.base_url == "http://127.0.0.1:8090"
+        assert model.model_name == "nomic"
+
+    def test_llama_server_needs_server(self):
+        with pytest.raises(ValueError, match="needs an embedding_server"):
+            load_embedding_model("nomic", backend="llama-server")
+
+
+class TestCompareBackends:
+    """Test the parity and throughput report."""
+
+    def test_identical_models(self):
+        report = compare_backends(FakeModel(), FakeModel(), ["a", "bb", "ccc"])
+
+        assert report['samples'] == 3
+        assert report['mean_cosine'] == pytest.approx(1.0)
+        assert report['degraded'] is False
+        assert report['texts_per_second'] > 0
+
+    def test_degraded_model(self):
+        report = compare_backends(FakeModel(), FakeModel(noise=3.0), ["a", "bb", "ccc"])
+
+        assert report['min_cosine'] <= report['mean_cosine'] < embedding_backend.MIN_PARITY_COSINE
+        assert report['degraded'] is True
+        assert "WARNING" in format_parity_report(report, "onnx int8")
+
+    def test_sample_size(self):
+        model = FakeModel()
+        report = compare_backends(FakeModel(), model, [str(i) for i in range(100)], sample_size=10)
+
+        assert report['samples'] == 10
+        assert model.encoded == 11  # One warm-up text, then the sample
+
+    def test_no_texts(self):
+        with pytest.raises(ValueError):
+            compare_backends(FakeModel(), FakeModel(), [])
+
+
+class TestThreadSettings:
+    """Test the embedding thread policy."""
+
+    def test_defaults_use_all_cores(self):
+        with patch('llf.embedding_backend.os.cpu_count', return_value=32), \
+                patch('llf.embedding_backend.sys.platform', 'linux'):
+            assert resolve_thread_counts() == (32, 1, 1)
+            assert resolve_thread_counts({'workers': 4}) == (8, 1, 4)
+
+    def test_single_thread_on_macos(self):
+        with patch('llf.embedding_backend.sys.platform', 'darwin'):
+            assert resolve_thread_counts()[0] == 1
+
+    def test_explicit_values(self):
+        assert resolve_thread_counts({'intra_op_threads': 6, 'inter_op_threads': 2, 'workers': 2}) == (6, 2, 2)
+
+    def test_apply(self):
+        fake_torch = Mock()
+        with patch('llf.embedding_backend.torch', fake_torch), \
+                patch.dict(embedding_backend._applied_threads, {'intra_op_threads': None, 'inter_op_threads': None}):
+            applied = apply_thread_settings(8, 2)
+        fake_torch.set_num_threads.assert_called_once_with(8)
+        fake_torch.set_num_interop_threads.assert_called_once_with(2)
+        assert applied == {'intra_op_threads': 8, 'inter_op_threads': 2}
+
+    def test_inter_op_set_only_once(self):
+        fake_torch = Mock()
+        fake_torch.set_num_interop_threads.side_effect = RuntimeError("cannot set after parallel work")
+        with patch('llf.embedding_backend.torch', fake_torch), \
+                patch.dict(embedding_backend._applied_threads, {'intra_op_threads': None, 'inter_op_threads': 1}):
+            applied = apply_thread_settings(4, 2)
+        assert applied == {'intra_op_threads': 4, 'inter_op_threads': 1}
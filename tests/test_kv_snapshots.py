@@ -0,0 +1,203 @@
+"""
+Unit tests for kv_snapshots module.
+"""
+
+import json
+import os
+import time
+
+import pytest
+from unittest.mock import patch
+
+from llf.config import Config
+from llf.kv_snapshots import DEFAULT_MAX_AGE_DAYS, DEFAULT_MAX_TOTAL_BYTES, KVSnapshotStore, snapshot_name
+from llf.llm_runtime import LLMRuntime
+from llf.mock_llm_server import MockLLMServer, MockServerSettings
+from llf.model_manager import ModelManager
+
+
+def _write_snapshot(store, session_id, size, age_days=0.0):
+    path = store.path_for(session_id)
+    path.write_bytes(b"x" * size)
+    mtime = time.time() - age_days * 86400
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+class TestSnapshotName:
+    """Test snapshot naming."""
+
+    def test_from_session_id(self):
+        assert snapshot_name("20250101_120000_000000") == "chat_20250101_120000_000000.kv"
+
+    def test_from_history_filename(self):
+        assert snapshot_name("chat_20250101_120000_000000.json") == "chat_20250101_120000_000000.kv"
+        assert snapshot_name("chat_20250101_120000_000000") == "chat_20250101_120000_000000.kv"
+
+
+class TestKVSnapshotStore:
+    """Test snapshot lookup and garbage collection."""
+
+    @pytest.fixture
+    def history_dir(self, tmp_path):
+        path = tmp_path / "chat_history"
+        path.mkdir()
+        return path
+
+    def _history(self, history_dir, session_id):
+        (history_dir / f"chat_{session_id}.json").write_text("{}")
+
+    def test_exists_and_touch(self, tmp_path):
+        """Test snapshot lookup and last-used tracking."""
+        store = KVSnapshotStore(tmp_path / "kv")
+        assert not store.exists("a")
+
+        path = _write_snapshot(store, "a", 10, age_days=5)
+        assert store.exists("a")
+        store.touch("a")
+        assert time.time() - path.stat().st_mtime < 60
+
+    def test_orphans_removed(self, tmp_path, history_dir):
+        """Test snapshots of deleted chat sessions are removed."""
+        store = KVSnapshotStore(tmp_path / "kv")
+        self._history(history_dir, "kept")
+        _write_snapshot(store, "kept", 10)
+        orphan = _write_snapshot(store, "gone", 10)
+
+        removed = store.collect_garbage(history_dir=history_dir)
+
+        assert removed == [orphan]
+        assert store.exists("kept")
+
+    def test_expired_removed(self, tmp_path, history_dir):
+        """Test snapshots unused for max_age_days are removed."""
+        store = KVSnapshotStore(tmp_path / "kv", max_age_days=7)
+        for session_id in ["old", "new"]:
+            self._history(history_dir, session_id)
+        _write_snapshot(store, "old", 10, age_days=10)
+        _write_snapshot(store, "new", 10, age_days=1)
+
+        store.collect_garbage(history_dir=history_dir)
+
+        assert not store.exists("old")
+        assert store.exists("new")
+
+    def test_size_cap_removes_least_recently_used(self, tmp_path):
+        """Test the size cap evicts oldest snapshots first but honours keep."""
+        store = KVSnapshotStore(tmp_path / "kv", max_total_bytes=250, max_age_days=None)
+        _write_snapshot(store, "a", 100, age_days=3)
+        _write_snapshot(store, "b", 100, age_days=2)
+        _write_snapshot(store, "c", 100, age_days=1)
+
+        store.collect_garbage(keep=["a"])
+
+        assert store.exists("a")
+        assert not store.exists("b")
+        assert store.exists("c")
+        assert store.get_total_size() == 200
+
+
+class TestRuntimeSnapshots:
+    """Test LLMRuntime save/restore against the mock server."""
+
+    @pytest.fixture
+    def server(self, tmp_path):
+        settings = MockServerSettings(response_tokens=4, slot_save_path=str(tmp_path / "kv"))
+        with MockLLMServer(settings) as srv:
+            yield srv
+
+    def _runtime(self, server, tmp_path):
+        config = Config()
+        config.model_dir = tmp_path / "models"
+        config.cache_dir = tmp_path / ".cache"
+        config.api_base_url = server.api_base_url
+        config.server_host = server.host
+        config.server_port = server.port
+        config.default_local_server = None
+        config.server_params = {'slot-save-path': str(tmp_path / "kv")}
+        return LLMRuntime(config, ModelManager(config))
+
+    def test_save_and_restore(self, server, tmp_path):
+        """Test a restored session's first turn reuses the saved prefix."""
+        history_dir = tmp_path / "chat_history"
+        history_dir.mkdir()
+        (history_dir / "chat_s1.json").write_text("{}")
+        messages = [{'role': 'user', 'content': 'Tell me a long story about llamas ' * 10}]
+
+        runtime = self._runtime(server, tmp_path)
+        with patch.object(runtime, 'is_server_running', return_value=True):
+            messages.append({'role': 'assistant', 'content': runtime.chat(messages, use_prompt_config=False, session_id='a')})
+            path = runtime.save_session_snapshot('a', 'chat_s1', history_dir)
+        assert path is not None and path.exists()
+
+        # Another conversation overwrites the slot's cache
+        other = self._runtime(server, tmp_path)
+        with patch.object(other, 'is_server_running', return_value=True):
+            other.chat([{'role': 'user', 'content': 'Unrelated'}], use_prompt_config=False, session_id='b')
+
+        resumed = self._runtime(server, tmp_path)
+        with patch.object(resumed, 'is_server_running', return_value=True):
+            assert resumed.restore_session_snapshot('c', 's1') > 0
+            resumed.chat(messages + [{'role': 'user', 'content': 'Continue'}], use_prompt_config=False, session_id='c')
+
+        stats = resumed.get_slot_stats()
+        assert stats['cached_prompt_tokens'] > stats['evaluated_prompt_tokens']
+
+    def test_no_snapshot(self, server, tmp_path):
+        """Test restoring a session without a snapshot is a no-op."""
+        runtime = self._runtime(server, tmp_path)
+        assert runtime.restore_session_snapshot('a', 'missing') is None
+        assert runtime.save_session_snapshot('a', 'missing') is None  # Session never used a slot
+
+    def test_not_configured(self, tmp_path):
+        """Test snapshots are disabled without slot-save-path."""
+        config = Config()
+        config.default_local_server = None
+        config.server_params = {}
+        runtime = LLMRuntime(config, ModelManager(config))
+        assert runtime.get_snapshot_store() is None
+        assert runtime.restore_session_snapshot('a', 's1') is None
+
+
+class TestSnapshotLimitsConfig:
+    """Test the kv_snapshots limits in config.json."""
+
+    def _config(self, tmp_path, kv_snapshots):
+        config_file = tmp_path / "config.json"
+        config_file.write_text(json.dumps({'kv_snapshots': kv_snapshots}))
+        return Config(config_file)
+
+    def test_defaults(self):
+        config = Config()
+        assert config.kv_snapshot_max_bytes == DEFAULT_MAX_TOTAL_BYTES
+        assert config.kv_snapshot_max_age_days == DEFAULT_MAX_AGE_DAYS
+        assert 'kv_snapshots' not in config.to_dict()
+
+    def test_load_and_save(self, tmp_path):
+        config = self._config(tmp_path, {'max_size_gb': 0.5, 'max_age_days': None})
+
+        assert config.kv_snapshot_max_bytes == 512 * 1024 ** 2
+        assert config.kv_snapshot_max_age_days is None
+        assert config.to_dict()['kv_snapshots'] == {'max_size_gb': 0.5, 'max_age_days': None}
+
+    @pytest.mark.parametrize("kv_snapshots, message", [
+        ({'max_size_gb': 0}, "max_size_gb"),
+        ({'max_size_gb': '4'}, "max_size_gb"),
+        ({'max_age_days': 0}, "max_age_days"),
+        ({'max_age_days': 1.5}, "max_age_days"),
+        ([], "kv_snapshots"),
+    ])
+    def test_invalid(self, tmp_path, kv_snapshots, message):
+        with pytest.raises(ValueError, match=message):
+            self._config(tmp_path, kv_snapshots)
+
+    def test_runtime_store_uses_limits(self, tmp_path):
+        config = self._config(tmp_path, {'max_size_gb': 1, 'max_age_days': 7})
+        config.api_base_url = "http://127.0.0.1:8000/v1"
+        config.default_local_server = None
+        config.server_params = {'slot-save-path': str(tmp_path / "kv")}
+
+        store = LLMRuntime(config, ModelManager(config)).get_snapshot_store()
+
+        assert store.max_total_bytes == 1024 ** 3
+        assert store.max_age_days == 7
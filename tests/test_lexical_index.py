@@ -0,0 +1,131 @@
+"""
+Unit tests for lexical_index module.
+"""
+
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from llf.lexical_index import BM25Index, reciprocal_rank_fusion, term_counts, tokenize
+
+
+DOCS = [
+    "Connection refused with error ERR-1042 when the server restarts",
+    "Call os.path.join to build the cache path",
+    "The cache stores recent results for faster lookups",
+    "Order SKU_77-A ships within two days",
+    "Restart the server after changing the cache settings",
+]
+
+
+class TestTokenize:
+    """Test the BM25 tokenizer."""
+
+    def test_lowercases_words(self):
+        assert tokenize("Hello, World!") == ["hello", "world"]
+
+    def test_identifiers_kept_whole_and_split(self):
+        assert tokenize("ERR-1042") == ["err-1042", "err", "1042"]
+        assert tokenize("os.path.join()") == ["os.path.join", "os", "path", "join"]
+        assert tokenize("snake_case") == ["snake_case", "snake", "case"]
+
+    def test_trailing_punctuation_not_part_of_token(self):
+        assert tokenize("see ERR-1042.") == ["see", "err-1042", "err", "1042"]
+
+    def test_term_counts_match_tokenize(self):
+        text = "Use _private and os.path.join; ERR-1042 != err 1042 " + "x" * 80 + "-y __ Ünïcode_wörd"
+        assert term_counts(text) == Counter(tokenize(text))
+
+
+class TestBM25Index:
+    """Test building and searching a BM25 index."""
+
+    def test_exact_identifier_ranks_first(self):
+        index = BM25Index.build(DOCS)
+        _, ids = index.search("what does ERR-1042 mean", 3)
+        assert ids[0] == 0
+
+        _, ids = index.search("how do I use os.path.join", 3)
+        assert ids[0] == 1
+
+    def test_only_matching_docs_returned(self):
+        index = BM25Index.build(DOCS)
+        scores, ids = index.search("SKU_77-A", 10)
+        assert ids.tolist() == [3]
+        assert scores[0] > 0
+
+    def test_no_match(self):
+        index = BM25Index.build(DOCS)
+        scores, ids = index.search("kubernetes", 5)
+        assert len(scores) == len(ids) == 0
+
+    def test_scores_sorted_and_limited(self):
+        index = BM25Index.build(DOCS)
+        scores, ids = index.search("cache server", 2)
+        assert len(ids) == 2
+        assert scores[0] >= scores[1]
+
+    def test_rare_term_outweighs_common_term(self):
+        index = BM25Index.build(DOCS)
+        _, ids = index.search("the lookups", 1)
+        assert ids[0] == 2
+
+    def test_custom_ids(self):
+        index = BM25Index.build(["alpha beta", "gamma"], ids=[10, 42])
+        _, ids = index.search("gamma", 5)
+        assert ids.tolist() == [42]
+        assert len(index) == 2
+
+    def test_ids_must_match_texts(self):
+        with pytest.raises(ValueError, match="ids"):
+            BM25Index.build(["a", "b"], ids=[0])
+
+    def test_save_and_load(self, tmp_path):
+        index = BM25Index.build(DOCS, k1=1.5, b=0.5)
+        index.save(tmp_path / "bm25.npz")
+        loaded = BM25Index.load(tmp_path / "bm25.npz")
+
+        assert (loaded.k1, loaded.b) == (1.5, 0.5)
+        for query in ["ERR-1042", "cache restart", "os.path.join"]:
+            np.testing.assert_array_equal(loaded.search(query, 5)[1], index.search(query, 5)[1])
+
+    def test_allowed_mask_excludes_ids(self):
+        index = BM25Index.build(DOCS)
+        allowed = np.array([False, True, True, False])  # Ids past the mask are not eligible
+
+        _, ids = index.search("cache server", 5, allowed=allowed)
+
+        assert sorted(ids.tolist()) == [1, 2]
+        assert index.search("ERR-1042", 5, allowed=allowed)[1].tolist() == []
+
+    def test_update_removes_and_adds(self):
+        index = BM25Index.build(DOCS)
+        updated = index.update([0], ["ERR-1042 is now ERR-2001"], [5])
+
+        _, ids = updated.search("ERR-1042", 5)
+        assert ids.tolist() == [5]
+        assert len(updated) == len(DOCS)
+        # The original index is unchanged
+        assert index.search("ERR-1042", 5)[1][0] == 0
+
+    def test_update_matches_fresh_build(self):
+        updated = BM25Index.build(DOCS).update([1, 3], ["new cache text"], [5])
+        fresh = BM25Index.build([DOCS[0], DOCS[2], DOCS[4], "new cache text"], ids=[0, 2, 4, 5])
+
+        for query in ["cache", "server restart", "os.path.join"]:
+            np.testing.assert_allclose(updated.search(query, 5)[0], fresh.search(query, 5)[0], rtol=1e-6)
+            np.testing.assert_array_equal(updated.search(query, 5)[1], fresh.search(query, 5)[1])
+
+
+class TestReciprocalRankFusion:
+    """Test reciprocal rank fusion."""
+
+    def test_agreement_wins(self):
+        fused = reciprocal_rank_fusion([[1, 2, 3], [3, 1, 4]], k=60)
+        assert [doc_id for doc_id, _ in fused][:2] == [1, 3]
+        assert fused[0][1] == pytest.approx(1 / 61 + 1 / 62)
+
+    def test_single_list_keeps_order(self):
+        fused = reciprocal_rank_fusion([[7, 3, 9], []])
+        assert [doc_id for doc_id, _ in fused] == [7, 3, 9]
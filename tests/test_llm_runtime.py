@@ -554,6 +554,16 @@ class TestLLMRuntime:
             if arg == "--server-arg":
                 assert i + 2 < len(cmd), "server-arg should be followed by key and value"
 
+    def test_get_server_command_with_flag_param(self, runtime, temp_dir):
+        """Test a true server_params value is passed as a flag (empty value)."""
+        model_file = temp_dir / "model.gguf"
+        runtime.config.server_params = {"embedding": True, "pooling": "mean"}
+
+        cmd = runtime._get_server_command(model_file)
+
+        assert cmd[cmd.index("embedding") + 1] == ""
+        assert cmd[cmd.index("pooling") + 1] == "mean"
+
     def test_get_server_command_with_empty_params(self, runtime, temp_dir):
         """Test _get_server_command with empty server_params."""
         model_file = temp_dir / "model.gguf"
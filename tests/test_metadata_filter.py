@@ -0,0 +1,143 @@
+"""
+Unit tests for metadata_filter module.
+"""
+
+import json
+import os
+
+import numpy as np
+import pytest
+
+from llf.metadata_filter import (
+    FILTERS_FILENAME, MetadataFilterIndex, describe_filters, load_filter_index, normalize_filters,
+    parse_date, parse_filter_expressions, write_filter_index
+)
+from llf.metadata_store import MetadataIndex
+
+
+ROWS = [
+    {"text": "install", "source_file": "Manual.pdf", "tags": ["setup", "API"], "date": "2024-01-15"},
+    {"text": "rotate keys", "source_file": "manual.pdf", "tags": "security", "created": "D:20240320101500"},
+    {"text": "release notes", "source_file": "notes/CHANGELOG.md", "modified": "2023-12-01T08:00:00"},
+    {"text": "web page", "domain": "docs.example.com", "tags": ["api"]},
+    {"text": "no metadata"},
+]
+
+
+def _ids(mask):
+    return np.flatnonzero(mask).tolist()
+
+
+@pytest.fixture
+def metadata_path(tmp_path):
+    """Create a metadata.jsonl with the test rows."""
+    path = tmp_path / "metadata.jsonl"
+    path.write_text(''.join(json.dumps(row) + '\n' for row in ROWS), encoding='utf-8')
+    return path
+
+
+class TestFilters:
+    """Test filter parsing and normalization."""
+
+    def test_parse_date(self):
+        assert parse_date("2024-03-01") == 20240301
+        assert parse_date("2024-03-01T10:00:00Z") == 20240301
+        assert parse_date("D:20240301120000") == 20240301
+        assert parse_date("March 2024") == 0
+        assert parse_date(None) == 0
+
+    def test_normalize(self):
+        filters = normalize_filters({"source_file": "B.pdf, a.pdf", "tags": ["API"], "date_from": "2024-01-01",
+                                     "date_to": ""})
+        assert filters == {"source_file": ["a.pdf", "b.pdf"], "tags": ["api"], "date_from": 20240101}
+        assert normalize_filters(filters) == filters
+        assert normalize_filters({"tags": []}) is None
+        assert normalize_filters(None) is None
+
+    def test_normalize_rejects_bad_input(self):
+        with pytest.raises(ValueError, match="Unknown filter"):
+            normalize_filters({"author": "me"})
+        with pytest.raises(ValueError, match="date_from"):
+            normalize_filters({"date_from": "last week"})
+
+    def test_parse_expressions(self):
+        filters = parse_filter_expressions(["source=manual.pdf", "tag=api,setup", "tags=security",
+                                            "date_to=2024-02-01", " "])
+        assert filters == {"source_file": ["manual.pdf"], "tags": ["api", "security", "setup"],
+                           "date_to": 20240201}
+        assert describe_filters(filters) == ("source_file=manual.pdf; tags=api,security,setup; "
+                                             "date_to=2024-02-01")
+        assert parse_filter_expressions([]) is None
+
+    def test_parse_expressions_rejects_malformed(self):
+        with pytest.raises(ValueError, match="KEY=VALUE"):
+            parse_filter_expressions(["manual.pdf"])
+
+
+class TestMetadataFilterIndex:
+    """Test compiling filters into id masks."""
+
+    def test_source_file(self):
+        index = MetadataFilterIndex.build(ROWS)
+        assert len(index) == len(ROWS)
+        assert _ids(index.select(normalize_filters({"source_file": "MANUAL.PDF"}))) == [0, 1]
+        assert _ids(index.select(normalize_filters({"source_file": "*.md"}))) == [2]
+        assert _ids(index.select(normalize_filters({"source_file": "docs.example.com"}))) == [3]
+        assert _ids(index.select(normalize_filters({"source_file": "missing.pdf"}))) == []
+
+    def test_tags_match_any(self):
+        index = MetadataFilterIndex.build(ROWS)
+        assert _ids(index.select(normalize_filters({"tags": "api"}))) == [0, 3]
+        assert _ids(index.select(normalize_filters({"tags": "security,setup"}))) == [0, 1]
+
+    def test_dates(self):
+        index = MetadataFilterIndex.build(ROWS)
+        assert _ids(index.select(normalize_filters({"date_from": "2024-01-01"}))) == [0, 1]
+        assert _ids(index.select(normalize_filters({"date_to": "2024-01-31"}))) == [0, 2]
+
+    def test_keys_combine(self):
+        index = MetadataFilterIndex.build(ROWS)
+        filters = normalize_filters({"source_file": "manual.pdf", "tags": "security"})
+        assert _ids(index.select(filters)) == [1]
+
+    def test_extend_matches_build(self):
+        extended = MetadataFilterIndex.build(ROWS[:2]).extend(ROWS[2:])
+        fresh = MetadataFilterIndex.build(ROWS)
+
+        for filters in ({"source_file": "manual.pdf"}, {"tags": "api"}, {"date_to": "2024-12-31"}):
+            filters = normalize_filters(filters)
+            np.testing.assert_array_equal(extended.select(filters), fresh.select(filters))
+
+    def test_save_and_load(self, tmp_path):
+        index = MetadataFilterIndex.build(ROWS)
+        index.save(tmp_path / FILTERS_FILENAME)
+        loaded = MetadataFilterIndex.load(tmp_path / FILTERS_FILENAME)
+
+        filters = normalize_filters({"tags": "api", "date_from": "2024-01-01"})
+        np.testing.assert_array_equal(loaded.select(filters), index.select(filters))
+
+
+class TestLoadFilterIndex:
+    """Test the metadata.filters.npz sidecar."""
+
+    def test_built_and_saved_when_missing(self, metadata_path):
+        index = load_filter_index(metadata_path, MetadataIndex(metadata_path))
+
+        assert len(index) == len(ROWS)
+        assert (metadata_path.parent / FILTERS_FILENAME).exists()
+
+    def test_current_sidecar_is_used(self, metadata_path):
+        write_filter_index(metadata_path, ROWS[:1] + [{}] * (len(ROWS) - 1))
+
+        index = load_filter_index(metadata_path, MetadataIndex(metadata_path))
+        assert _ids(index.select(normalize_filters({"tags": "api"}))) == [0]
+
+    def test_stale_sidecar_is_rebuilt(self, metadata_path):
+        sidecar = write_filter_index(metadata_path, ROWS[:2])  # Fewer rows than metadata.jsonl
+        assert len(load_filter_index(metadata_path, MetadataIndex(metadata_path))) == len(ROWS)
+
+        write_filter_index(metadata_path, [{}] * len(ROWS))
+        stat = metadata_path.stat()
+        os.utime(sidecar, ns=(stat.st_atime_ns, stat.st_mtime_ns - 10**9))  # Older than metadata.jsonl
+        index = load_filter_index(metadata_path, MetadataIndex(metadata_path), save=False)
+        assert _ids(index.select(normalize_filters({"tags": "api"}))) == [0, 3]
@@ -0,0 +1,120 @@
+"""
+Unit tests for metadata_store module.
+"""
+
+import json
+import os
+
+import numpy as np
+import pytest
+
+from llf.metadata_store import (
+    MetadataIndex, OFFSETS_FILENAME, build_offsets, load_offsets, offsets_path_for, write_offsets
+)
+
+
+@pytest.fixture
+def metadata_path(tmp_path):
+    """Create a metadata.jsonl with three records."""
+    path = tmp_path / "metadata.jsonl"
+    records = [
+        {"text": "first chunk", "chunk_id": 0},
+        {"text": "zweiter Abschnitt – ü", "chunk_id": 1},
+        {"text": "third chunk", "chunk_id": 2, "source_file": "notes.md"},
+    ]
+    path.write_text(''.join(json.dumps(r, ensure_ascii=False) + '\n' for r in records), encoding='utf-8')
+    return path
+
+
+class TestOffsets:
+    """Test offset table building and staleness checks."""
+
+    def test_build_offsets(self, metadata_path):
+        offsets = build_offsets(metadata_path)
+        assert offsets.shape == (4, 2)
+        assert int(offsets[0, 0]) == metadata_path.stat().st_size
+        assert int(offsets[0, 1]) == 3
+        assert int(offsets[1, 0]) == 0
+
+    def test_blank_lines_skipped(self, tmp_path):
+        path = tmp_path / "metadata.jsonl"
+        path.write_text('{"text": "a"}\n\n{"text": "b"}\n   \n')
+        offsets = build_offsets(path)
+        assert int(offsets[0, 1]) == 2
+
+    def test_load_written_offsets(self, metadata_path):
+        write_offsets(metadata_path)
+        assert offsets_path_for(metadata_path).name == OFFSETS_FILENAME
+        np.testing.assert_array_equal(load_offsets(metadata_path), build_offsets(metadata_path))
+
+    def test_missing_offsets(self, metadata_path):
+        assert load_offsets(metadata_path) is None
+
+    def test_stale_offsets_ignored(self, metadata_path):
+        write_offsets(metadata_path)
+        with open(metadata_path, 'a') as f:
+            f.write('{"text": "appended"}\n')
+        assert load_offsets(metadata_path) is None
+
+    def test_older_offsets_ignored(self, metadata_path):
+        path = write_offsets(metadata_path)
+        stat = metadata_path.stat()
+        os.utime(path, (stat.st_atime, stat.st_mtime - 10))
+        assert load_offsets(metadata_path) is None
+
+
+class TestMetadataIndex:
+    """Test random access to metadata records."""
+
+    def test_len_and_getitem(self, metadata_path):
+        metadata = MetadataIndex(metadata_path)
+        assert len(metadata) == 3
+        assert metadata[0] == {"text": "first chunk", "chunk_id": 0}
+        assert metadata[1]['text'] == "zweiter Abschnitt – ü"
+        assert metadata[-1]['source_file'] == "notes.md"
+        metadata.close()
+
+    def test_numpy_index(self, metadata_path):
+        """Test FAISS result indices (numpy int64) work directly."""
+        metadata = MetadataIndex(metadata_path)
+        assert metadata[np.int64(2)]['chunk_id'] == 2
+        assert [m['chunk_id'] for m in metadata.rows(np.array([2, 0]))] == [2, 0]
+
+    def test_out_of_range(self, metadata_path):
+        metadata = MetadataIndex(metadata_path)
+        with pytest.raises(IndexError):
+            metadata[3]
+        with pytest.raises(IndexError):
+            metadata[-4]
+
+    def test_saves_offsets(self, metadata_path):
+        MetadataIndex(metadata_path)
+        assert load_offsets(metadata_path) is not None
+
+    def test_save_offsets_disabled(self, metadata_path):
+        MetadataIndex(metadata_path, save_offsets=False)
+        assert not offsets_path_for(metadata_path).exists()
+
+    def test_rebuilds_after_change(self, metadata_path):
+        MetadataIndex(metadata_path)
+        with open(metadata_path, 'a') as f:
+            f.write('{"text": "appended"}\n')
+
+        metadata = MetadataIndex(metadata_path)
+        assert len(metadata) == 4
+        assert metadata[3]['text'] == "appended"
+
+    def test_iteration(self, metadata_path):
+        assert [m['chunk_id'] for m in MetadataIndex(metadata_path)] == [0, 1, 2]
+
+    def test_empty_file(self, tmp_path):
+        path = tmp_path / "metadata.jsonl"
+        path.write_text('')
+        metadata = MetadataIndex(path)
+        assert len(metadata) == 0
+        metadata.close()
+
+    def test_context_manager_closes(self, metadata_path):
+        with MetadataIndex(metadata_path) as metadata:
+            assert metadata[0]['chunk_id'] == 0
+        assert metadata._file.closed
@@ -0,0 +1,133 @@
+"""
+Unit tests for micro_batch module.
+"""
+
+import threading
+import time
+
+import pytest
+
+from llf.micro_batch import MicroBatcher
+
+
+class Recorder:
+    """Batch function that records its batches; the first batch can be held open."""
+
+    def __init__(self, hold_first=False):
+        self.batches = []
+        self.gate = threading.Event()
+        self.started = threading.Event()
+        if not hold_first:
+            self.gate.set()
+
+    def __call__(self, items):
+        self.batches.append(list(items))
+        self.started.set()
+        self.gate.wait(5)
+        return [item * 10 for item in items]
+
+
+def _run_threads(batcher, recorder, items, results, item_keys=None):
+    threads = []
+    for position, item in enumerate(items):
+        item_key = item_keys[position] if item_keys else None
+
+        def target(item=item, item_key=item_key):
+            results.append(batcher.run('model', item, recorder, item_key=item_key))
+        thread = threading.Thread(target=target)
+        thread.start()
+        threads.append(thread)
+    return threads
+
+
+def _wait_for_active(batcher, count):
+    deadline = time.monotonic() + 5
+    while batcher._active.get('model', 0) < count and time.monotonic() < deadline:
+        time.sleep(0.001)
+
+
+class TestMicroBatcher:
+    """Test grouping concurrent calls."""
+
+    def test_idle_call_runs_at_once(self):
+        batcher = MicroBatcher(max_wait_ms=5000)
+        started = time.monotonic()
+
+        assert batcher.run('model', 4, Recorder()) == 40
+        assert time.monotonic() - started < 1.0
+
+    def test_calls_during_a_batch_are_grouped(self):
+        batcher = MicroBatcher(max_wait_ms=5000, max_batch_size=3)
+        recorder = Recorder(hold_first=True)
+        results = []
+
+        first = _run_threads(batcher, recorder, [1], results)
+        recorder.started.wait(5)
+        others = _run_threads(batcher, recorder, [2, 3, 4], results)
+        _wait_for_active(batcher, 4)
+        recorder.gate.set()
+        for thread in first + others:
+            thread.join(5)
+
+        assert recorder.batches[0] == [1]
+        assert sorted(recorder.batches[1]) == [2, 3, 4]
+        assert sorted(results) == [10, 20, 30, 40]
+        assert batcher.stats()['batched_calls'] == 3
+
+    def test_batch_runs_after_max_wait(self):
+        batcher = MicroBatcher(max_wait_ms=20, max_batch_size=10)
+        recorder = Recorder(hold_first=True)
+        results = []
+
+        first = _run_threads(batcher, recorder, [1], results)
+        recorder.started.wait(5)
+        second = _run_threads(batcher, recorder, [2], results)
+        _wait_for_active(batcher, 2)
+        time.sleep(0.1)
+
+        # The second batch ran on its own once max_wait_ms passed
+        assert len(recorder.batches) == 2
+        recorder.gate.set()
+        for thread in first + second:
+            thread.join(5)
+        assert sorted(results) == [10, 20]
+
+    def test_equal_items_share_a_result(self):
+        batcher = MicroBatcher()
+        recorder = Recorder(hold_first=True)
+        results = []
+
+        first = _run_threads(batcher, recorder, [7], results, item_keys=['q'])
+        recorder.started.wait(5)
+        second = _run_threads(batcher, recorder, [7], results, item_keys=['q'])
+        deadline = time.monotonic() + 5
+        while batcher.stats()['shared'] < 1 and time.monotonic() < deadline:
+            time.sleep(0.001)
+        recorder.gate.set()
+        for thread in first + second:
+            thread.join(5)
+
+        assert recorder.batches == [[7]]
+        assert results == [70, 70]
+
+    def test_keys_are_batched_separately(self):
+        batcher = MicroBatcher()
+        assert batcher.run('a', 1, Recorder()) == 10
+        assert batcher.run('b', 2, Recorder()) == 20
+        assert batcher.stats()['batches'] == 2
+
+    def test_error_raised_in_caller(self):
+        batcher = MicroBatcher()
+
+        def fail(items):
+            raise RuntimeError("encoder failed")
+
+        with pytest.raises(RuntimeError, match="encoder failed"):
+            batcher.run('model', 1, fail)
+        # Nothing is left in flight
+        assert batcher._inflight == {} and batcher._active == {}
+
+    def test_result_count_checked(self):
+        batcher = MicroBatcher()
+        with pytest.raises(ValueError, match="returned 0 results"):
+            batcher.run('model', 1, lambda items: [])
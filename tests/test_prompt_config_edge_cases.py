@@ -12,6 +12,7 @@ Tests cover:
 """
 
 import json
+import time
 import pytest
 from pathlib import Path
 from unittest.mock import Mock, patch, MagicMock, mock_open
@@ -60,6 +61,60 @@ class TestRAGRetrieverInitialization:
         # Should still be the same mock
         assert config._rag_retriever is mock_retriever
 
+    def test_rag_init_with_preload_starts_warm_up(self):
+        """Test that preload=True starts the retriever's warm-up."""
+        config = PromptConfig()
+        mock_retriever = Mock()
+        config._rag_retriever = mock_retriever
+
+        config._init_rag_retriever(preload=True)
+
+        mock_retriever.start_preload.assert_called_once()
+
+    @pytest.mark.parametrize("registry, started", [
+        ({"preload": True, "data_stores": [{"name": "docs", "attached": True}]}, True),
+        ({"preload": True, "data_stores": [{"name": "docs", "attached": False}]}, False),
+        ({"data_stores": [{"name": "docs", "attached": True}]}, False),
+    ])
+    def test_start_rag_preload_is_opt_in(self, tmp_path, registry, started):
+        """Test that the warm-up only starts when the registry asks for it."""
+        registry_file = tmp_path / "data_store_registry.json"
+        registry_file.write_text(json.dumps(registry))
+        config = PromptConfig(tmp_path / "missing.json")
+        config.DATA_STORE_REGISTRY_FILE = registry_file
+
+        with patch.object(config, '_init_rag_retriever') as mock_init:
+            assert config.start_rag_preload() is started
+            for _ in range(100):
+                if mock_init.called or not started:
+                    break
+                time.sleep(0.01)
+
+        if started:
+            mock_init.assert_called_once_with(preload=True)
+        else:
+            mock_init.assert_not_called()
+
+    def test_build_messages_refreshes_stores(self, tmp_path):
+        """Test that registry changes are picked up before each RAG query."""
+        config = PromptConfig(tmp_path / "missing.json")
+        mock_retriever = Mock()
+        mock_retriever.has_attached_stores.return_value = False
+        config._rag_retriever = mock_retriever
+
+        config.build_messages("Hello")
+
+        mock_retriever.refresh.assert_called_once()
+        mock_retriever.query_all_stores.assert_not_called()
+
+    def test_start_rag_preload_without_registry(self, tmp_path):
+        """Test that a missing registry starts nothing."""
+        config = PromptConfig(tmp_path / "missing.json")
+        config.DATA_STORE_REGISTRY_FILE = tmp_path / "missing_registry.json"
+
+        assert config.start_rag_preload() is False
+        assert config.get_rag_preload_status() is None
+
 
 class TestMemoryManagerInitialization:
     """Test Memory manager lazy initialization."""
@@ -285,6 +340,69 @@ class TestGetAllTools:
                 # Should return None
                 assert result is None
 
+    def test_get_all_tools_with_knowledge_base_tool(self, tmp_path):
+        """Test that search_knowledge_base is added when retrieval is a tool."""
+        config = PromptConfig(tmp_path / "missing.json")
+        mock_retriever = Mock()
+        mock_retriever.uses_retrieval_tool.return_value = True
+        mock_retriever.attached_stores = {'docs': {'display_name': 'Docs', 'description': 'Product manual'}}
+        config._rag_retriever = mock_retriever
+
+        with patch.object(config, 'get_memory_tools', return_value=None):
+            with patch.object(config, 'get_llm_invokable_tools', return_value=None):
+                assert config.get_all_tools() is None
+                result = config.get_all_tools(retrieval_tool=True)
+
+        assert [tool['function']['name'] for tool in result] == ['search_knowledge_base']
+        assert 'Docs (Product manual)' in result[0]['function']['description']
+
+
+class TestRetrievalTool:
+    """Test building messages when retrieval is a tool."""
+
+    def _config(self, tmp_path, tool_mode):
+        config = PromptConfig(tmp_path / "missing.json")
+        mock_retriever = Mock()
+        mock_retriever.has_attached_stores.return_value = True
+        mock_retriever.uses_retrieval_tool.return_value = tool_mode
+        mock_retriever.query_all_stores.return_value = "Keys rotate every 90 days"
+        config._rag_retriever = mock_retriever
+        config._memory_manager = Mock(has_enabled_memories=Mock(return_value=False))
+        return config, mock_retriever
+
+    def test_tool_mode_leaves_search_to_the_model(self, tmp_path):
+        config, mock_retriever = self._config(tmp_path, tool_mode=True)
+
+        messages = config.build_messages("Thanks!", retrieval_tool=True)
+
+        mock_retriever.query_all_stores.assert_not_called()
+        mock_retriever.record_retrieval.assert_not_called()
+        assert "search_knowledge_base" in messages[0]['content']
+
+    def test_always_mode_searches_every_message(self, tmp_path):
+        config, mock_retriever = self._config(tmp_path, tool_mode=False)
+
+        messages = config.build_messages("How do keys rotate?", retrieval_tool=True)
+
+        mock_retriever.query_all_stores.assert_called_once()
+        mock_retriever.record_retrieval.assert_called_once_with(searched=True)
+        assert "Keys rotate every 90 days" in messages[0]['content']
+
+    def test_tool_mode_without_tool_calls_searches(self, tmp_path):
+        """Callers that cannot run tools (streaming) keep always-on retrieval."""
+        config, mock_retriever = self._config(tmp_path, tool_mode=True)
+
+        config.build_messages("How do keys rotate?")
+
+        mock_retriever.query_all_stores.assert_called_once()
+
+    def test_filters_passed_to_search(self, tmp_path):
+        config, mock_retriever = self._config(tmp_path, tool_mode=False)
+
+        config.build_messages("How do keys rotate?", rag_filters={'source_file': ['manual.pdf']})
+
+        assert mock_retriever.query_all_stores.call_args[1]['filters'] == {'source_file': ['manual.pdf']}
+
 
 class TestBackupConfigEdgeCases:
     """Test backup_config edge cases."""
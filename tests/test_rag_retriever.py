@@ -13,9 +13,12 @@ Tests cover:
 """
 
 import json
+import os
 import pytest
 import tempfile
 import shutil
+import threading
+import time
 from pathlib import Path
 from unittest.mock import Mock, patch, MagicMock
 import numpy as np
@@ -33,6 +36,7 @@ sys.modules['sentence_transformers'] = mock_st
 
 # Import the module under test
 from llf.rag_retriever import RAGRetriever, DEFAULT_CONFIG
+from llf.metadata_store import MetadataIndex
 
 
 class TestRAGRetrieverInit:
@@ -1009,3 +1013,990 @@ class TestMetadataMismatch:
                 assert 'test_store' in warning_message
                 assert 'index=3' in warning_message
                 assert 'metadata=2' in warning_message
+
+
+class TestQueryEmbeddingReuse:
+    """Test the query is embedded once per embedding model."""
+
+    def _retriever(self, tmp_path, stores):
+        registry_path = tmp_path / "registry.json"
+        registry_data = {
+            "data_stores": [
+                {"name": name, "attached": True, "embedding_model": model_name}
+                for name, model_name in stores
+            ]
+        }
+        with open(registry_path, 'w') as f:
+            json.dump(registry_data, f)
+
+        retriever = RAGRetriever(registry_path=registry_path)
+
+        # Preload stores so no files are needed; one model object per model name
+        models = {}
+        for name, model_name in stores:
+            if model_name not in models:
+                model = Mock()
+                model.encode.return_value = np.array([[0.1, 0.2, 0.3]])
+                models[model_name] = model
+            index = Mock()
+            index.search.return_value = (np.array([[0.9]]), np.array([[0]]))
+            retriever._store_cache[name] = {
+                'index': index,
+                'metadata': [{'text': f'{name} text', 'chunk_id': 0}],
+                'model': models[model_name],
+                'model_name': model_name,
+            }
+        return retriever, models
+
+    def test_stores_on_same_model_share_embedding(self, tmp_path):
+        """Test four stores on one model encode the query once."""
+        retriever, models = self._retriever(
+            tmp_path, [("s1", "mini"), ("s2", "mini"), ("s3", "mini"), ("s4", "mini")])
+
+        result = retriever.query_all_stores("test query")
+
+        assert "s4 text" in result
+        assert models["mini"].encode.call_count == 1
+
+    def test_one_encode_per_distinct_model(self, tmp_path):
+        """Test each distinct model encodes the query once."""
+        retriever, models = self._retriever(
+            tmp_path, [("s1", "mini"), ("s2", "mpnet"), ("s3", "mini")])
+
+        retriever.query_all_stores("test query")
+
+        assert models["mini"].encode.call_count == 1
+        assert models["mpnet"].encode.call_count == 1
+
+    def test_repeated_query_uses_cache(self, tmp_path):
+        """Test repeated questions skip the encoder entirely."""
+        retriever, models = self._retriever(tmp_path, [("s1", "mini")])
+
+        retriever.query_all_stores("test query")
+        retriever.query_all_stores("test query")
+        retriever.query_all_stores("other query")
+
+        assert models["mini"].encode.call_count == 2
+        stats = retriever.get_stats()
+        assert stats['query_embedding_hits'] == 1
+        assert stats['query_embedding_misses'] == 2
+
+    def test_cache_is_lru_bounded(self, tmp_path):
+        """Test the least recently used query embedding is evicted."""
+        retriever, models = self._retriever(tmp_path, [("s1", "mini")])
+        retriever._query_embedding_cache_size = 2
+        model = models["mini"]
+
+        retriever._embed_query("q1", model, "mini")
+        retriever._embed_query("q2", model, "mini")
+        retriever._embed_query("q1", model, "mini")  # q1 most recent
+        retriever._embed_query("q3", model, "mini")  # evicts q2
+
+        assert list(retriever._query_embedding_cache) == [("mini", "q1"), ("mini", "q3")]
+
+    def test_cache_sizes_from_registry(self, tmp_path):
+        """Test the registry sets the cache sizes, and invalid values fall back to the defaults."""
+        registry_path = tmp_path / "registry.json"
+        registry_path.write_text(json.dumps(
+            {"data_stores": [], "query_embedding_cache_size": 4, "filter_cache_size": 2}))
+        retriever = RAGRetriever(registry_path=registry_path)
+        assert retriever._query_embedding_cache_size == 4
+        assert retriever._filter_cache_size == 2
+
+        registry_path.write_text(json.dumps({"data_stores": [], "query_embedding_cache_size": -1}))
+        retriever = RAGRetriever(registry_path=registry_path)
+        assert retriever._query_embedding_cache_size == DEFAULT_CONFIG['query_embedding_cache_size']
+        assert retriever._filter_cache_size == DEFAULT_CONFIG['filter_cache_size']
+
+    def test_reload_clears_query_cache(self, tmp_path):
+        """Test reload drops cached query embeddings."""
+        retriever, models = self._retriever(tmp_path, [("s1", "mini")])
+        retriever._embed_query("q1", models["mini"], "mini")
+
+        retriever.reload()
+
+        assert len(retriever._query_embedding_cache) == 0
+
+
+class TestParallelFanOut:
+    """Test parallel store search with per-store timeouts."""
+
+    def _retriever(self, tmp_path, stores):
+        registry_path = tmp_path / "registry.json"
+        registry_data = {"data_stores": [dict(store, attached=True, embedding_model="test") for store in stores]}
+        with open(registry_path, 'w') as f:
+            json.dump(registry_data, f)
+        return RAGRetriever(registry_path=registry_path)
+
+    def _slow_query(self, delays):
+        def query(query_text, store_name, store_config):
+            time.sleep(delays[store_name])
+            return [{'text': f'{store_name} result', 'score': 0.9, 'store_name': store_name}]
+        return query
+
+    def test_stores_searched_concurrently(self, tmp_path):
+        """Test total latency is close to the slowest store, not the sum."""
+        retriever = self._retriever(tmp_path, [{"name": "a"}, {"name": "b"}, {"name": "c"}])
+        delays = {"a": 0.2, "b": 0.2, "c": 0.2}
+
+        with patch.object(retriever, '_query_single_store', side_effect=self._slow_query(delays)):
+            start = time.monotonic()
+            result = retriever.query_all_stores("test query")
+            elapsed = time.monotonic() - start
+
+        assert all(f"{name} result" in result for name in delays)
+        assert elapsed < 0.5
+
+    def test_slow_store_skipped(self, tmp_path):
+        """Test a store over its query_timeout does not hold up the others."""
+        retriever = self._retriever(tmp_path, [{"name": "fast"}, {"name": "slow", "query_timeout": 0.1}])
+        delays = {"fast": 0.0, "slow": 0.5}
+
+        with patch.object(retriever, '_query_single_store', side_effect=self._slow_query(delays)):
+            start = time.monotonic()
+            result = retriever.query_all_stores("test query")
+            elapsed = time.monotonic() - start
+
+        assert "fast result" in result
+        assert "slow result" not in result
+        assert elapsed < 0.4
+        assert retriever.get_store_timings()['slow']['timeouts'] == 1
+
+    def test_overall_timeout(self, tmp_path):
+        """Test the overall timeout caps every store's timeout."""
+        retriever = self._retriever(tmp_path, [{"name": "slow"}])
+
+        with patch.object(retriever, '_query_single_store', side_effect=self._slow_query({"slow": 0.5})):
+            start = time.monotonic()
+            result = retriever.query_all_stores("test query", timeout=0.1)
+
+        assert result is None
+        assert time.monotonic() - start < 0.4
+
+    def test_store_timings_in_stats(self, tmp_path):
+        """Test per-store timing is reported."""
+        retriever = self._retriever(tmp_path, [{"name": "a"}])
+
+        with patch.object(retriever, '_query_single_store', side_effect=self._slow_query({"a": 0.01})):
+            retriever.query_all_stores("test query")
+            retriever.query_all_stores("test query")
+
+        timing = retriever.get_stats()['store_timings']['a']
+        assert timing['queries'] == 2
+        assert timing['timeouts'] == 0
+        assert timing['avg_ms'] >= 10
+
+
+class TestSearchParameters:
+    """Test per-store query-time knobs for approximate indexes."""
+
+    def _store(self, tmp_path, store_extra):
+        store_dir = tmp_path / "ivf_store"
+        store_dir.mkdir()
+        (store_dir / "index.faiss").touch()
+        (store_dir / "metadata.jsonl").write_text('{"text": "chunk", "chunk_id": 0}\n')
+        stored_config = {'embedding_model': 'test-model', 'index_type': 'IndexIVFFlat',
+                         'index_params': {'nlist': 64, 'nprobe': 8}}
+        (store_dir / "config.json").write_text(json.dumps(stored_config))
+        return dict({'vector_store_path': str(store_dir), 'embedding_model': 'test-model'}, **store_extra)
+
+    @patch('llf.rag_retriever.set_search_params', return_value={'nprobe': 32})
+    @patch('llf.rag_retriever.SentenceTransformer')
+    def test_registry_overrides_build_default(self, mock_st_class, mock_set_params, tmp_path):
+        retriever = RAGRetriever(registry_path=tmp_path / "missing.json")
+        retriever._load_vector_store("ivf", self._store(tmp_path, {'nprobe': 32}))
+
+        _, kwargs = mock_set_params.call_args
+        assert kwargs == {'nprobe': 32, 'ef_search': None}
+
+    @patch('llf.rag_retriever.set_search_params', return_value={'nprobe': 8})
+    @patch('llf.rag_retriever.SentenceTransformer')
+    def test_build_default_used(self, mock_st_class, mock_set_params, tmp_path):
+        retriever = RAGRetriever(registry_path=tmp_path / "missing.json")
+        retriever._load_vector_store("ivf", self._store(tmp_path, {}))
+
+        _, kwargs = mock_set_params.call_args
+        assert kwargs == {'nprobe': 8, 'ef_search': None}
+
+    @patch('llf.rag_retriever.set_search_params', return_value={'rescore_factor': 16})
+    @patch('llf.rag_retriever.RescoredBinaryIndex')
+    @patch('llf.rag_retriever.SentenceTransformer')
+    def test_binary_store_rescore_factor(self, mock_st_class, mock_binary_class, mock_set_params, tmp_path):
+        store_config = self._store(tmp_path, {'rescore_factor': 16})
+        config_path = Path(store_config['vector_store_path']) / "config.json"
+        config_path.write_text(json.dumps({'embedding_model': 'test-model', 'index_type': 'IndexFlatIP',
+                                           'storage': 'binary', 'index_params': {'rescore_factor': 8}}))
+        mock_binary_class.load.return_value = Mock(ntotal=1)
+
+        retriever = RAGRetriever(registry_path=tmp_path / "missing.json")
+        store_data = retriever._load_vector_store("binary", store_config)
+
+        assert store_data['index'] is mock_binary_class.load.return_value
+        mock_binary_class.load.assert_called_once_with(Path(store_config['vector_store_path']) / "index.faiss",
+                                                       mmap=True)
+        _, kwargs = mock_set_params.call_args
+        assert kwargs == {'nprobe': None, 'ef_search': None, 'rescore_factor': 16}
+
+    @patch('llf.rag_retriever.SentenceTransformer')
+    def test_sharded_store_reads_each_shard(self, mock_st_class, tmp_path):
+        store_config = self._store(tmp_path, {})
+        store_dir = Path(store_config['vector_store_path'])
+        (store_dir / "index.faiss").unlink()
+        (store_dir / "index.shards.json").write_text(json.dumps(
+            {'shards': [{'file': 'index.000.faiss'}, {'file': 'index.001.faiss'}]}))
+        (store_dir / "config.json").write_text(json.dumps({'embedding_model': 'test-model', 'shards': 2}))
+
+        retriever = RAGRetriever(registry_path=tmp_path / "missing.json")
+        with patch.object(retriever, '_read_faiss_index', return_value=Mock(ntotal=1)) as mock_read:
+            store_data = retriever._load_vector_store("sharded", store_config)
+
+        assert store_data['index'].ntotal == 2
+        assert [call.args[0].name for call in mock_read.call_args_list] == ['index.000.faiss', 'index.001.faiss']
+        assert all(call.args[1:] == (True, 'float32') for call in mock_read.call_args_list)
+
+
+class TestHybridSearch:
+    """Test BM25 + dense search merged by reciprocal rank fusion."""
+
+    TEXTS = ["restart the server", "error ERR-1042 in the driver", "cache settings"]
+
+    def _retriever(self, tmp_path, search_mode, dense_ids=(0, 2), dense_scores=(0.8, 0.6)):
+        from llf.lexical_index import BM25Index
+
+        store_config = {"name": "docs", "attached": True, "embedding_model": "mini",
+                        "similarity_threshold": 0.5, "metadata": {"search_mode": search_mode}}
+        registry_path = tmp_path / "registry.json"
+        registry_path.write_text(json.dumps({"data_stores": [store_config]}))
+        retriever = RAGRetriever(registry_path=registry_path)
+
+        model = Mock()
+        model.encode.return_value = np.array([[0.1, 0.2, 0.3]])
+        index = Mock()
+        index.search.return_value = (np.array([dense_scores]), np.array([dense_ids]))
+        retriever._store_cache["docs"] = {
+            'index': index,
+            'metadata': [{'text': text, 'chunk_id': i} for i, text in enumerate(self.TEXTS)],
+            'lexical': BM25Index.build(self.TEXTS),
+            'model': model,
+            'model_name': 'mini',
+        }
+        return retriever, store_config, model
+
+    def test_hybrid_adds_keyword_hit(self, tmp_path):
+        retriever, store_config, _ = self._retriever(tmp_path, "hybrid")
+
+        results = retriever._query_single_store("what is ERR-1042", "docs", store_config)
+
+        matches = {r['text']: r['match'] for r in results}
+        assert matches["error ERR-1042 in the driver"] == "keyword"
+        assert matches["restart the server"] == "semantic"
+        assert all('rrf_score' in r for r in results)
+
+    def test_both_retrievers_agreeing_ranks_first(self, tmp_path):
+        retriever, store_config, _ = self._retriever(tmp_path, "hybrid", dense_ids=(2, 1), dense_scores=(0.7, 0.6))
+
+        results = retriever._query_single_store("ERR-1042", "docs", store_config)
+
+        assert results[0]['text'] == "error ERR-1042 in the driver"
+        assert results[0]['match'] == "both"
+        assert results[0]['score'] == pytest.approx(0.6)
+
+    def test_keyword_hit_survives_threshold(self, tmp_path):
+        retriever, _, _ = self._retriever(tmp_path, "hybrid")
+
+        context = retriever.query_all_stores("ERR-1042")
+
+        assert "[Source: docs | Keyword match]\nerror ERR-1042 in the driver" in context
+        assert "Similarity: 0.80" in context
+        assert "cache settings" in context
+
+    def test_keyword_mode_skips_embedding(self, tmp_path):
+        retriever, store_config, model = self._retriever(tmp_path, "keyword")
+
+        results = retriever._query_single_store("cache", "docs", store_config)
+
+        assert [r['text'] for r in results] == ["cache settings"]
+        model.encode.assert_not_called()
+
+    def test_semantic_mode_ignores_keyword_index(self, tmp_path):
+        retriever, store_config, _ = self._retriever(tmp_path, "semantic")
+
+        results = retriever._query_single_store("ERR-1042", "docs", store_config)
+
+        assert [r['text'] for r in results] == ["restart the server", "cache settings"]
+        assert 'match' not in results[0]
+
+    @patch('llf.rag_retriever.SentenceTransformer')
+    def test_load_keyword_index(self, mock_st_class, tmp_path):
+        from llf.lexical_index import BM25_FILENAME, BM25Index
+
+        store_dir = tmp_path / "store"
+        store_dir.mkdir()
+        (store_dir / "index.faiss").touch()
+        (store_dir / "metadata.jsonl").write_text('{"text": "chunk"}\n')
+        (store_dir / "config.json").write_text(json.dumps({'embedding_model': 'test-model'}))
+        store_config = {'vector_store_path': str(store_dir), 'embedding_model': 'test-model',
+                        'metadata': {'search_mode': 'hybrid'}}
+        retriever = RAGRetriever(registry_path=tmp_path / "missing.json")
+
+        assert retriever._load_vector_store("plain", store_config)['lexical'] is None
+
+        BM25Index.build(["chunk"]).save(store_dir / BM25_FILENAME)
+        assert len(retriever._load_vector_store("hybrid", store_config)['lexical']) == 1
+
+    def test_mixed_stores_ranked_by_store_rank(self, tmp_path):
+        retriever = RAGRetriever(registry_path=tmp_path / "missing.json")
+        semantic = [{'text': 's1', 'score': 0.9}, {'text': 's2', 'score': 0.8}]
+        hybrid = [{'text': 'h1', 'score': 0.0, 'match': 'keyword', 'rrf_score': 0.016},
+                  {'text': 'h2', 'score': 0.5, 'match': 'semantic', 'rrf_score': 0.015}]
+
+        ranked = retriever._rank_results([semantic, hybrid])
+
+        assert [r['text'] for r in ranked] == ['s1', 'h1', 's2', 'h2']
+
+
+class TestReranking:
+    """Test the optional cross-encoder rerank stage."""
+
+    def _retriever(self, tmp_path, reranking):
+        registry_path = tmp_path / "registry.json"
+        registry_path.write_text(json.dumps({
+            "data_stores": [{"name": "docs", "attached": True, "embedding_model": "mini", "top_k_results": 5}],
+            "reranking": reranking
+        }))
+        retriever = RAGRetriever(registry_path=registry_path)
+
+        model = Mock()
+        model.encode.return_value = np.array([[0.1, 0.2, 0.3]])
+        index = Mock()
+        index.search.return_value = (np.array([[0.9, 0.8, 0.7, 0.6]]), np.array([[0, 1, 2, 3]]))
+        retriever._store_cache["docs"] = {
+            'index': index,
+            'metadata': [{'text': f'chunk {i}', 'chunk_id': i} for i in range(4)],
+            'model': model,
+            'model_name': 'mini',
+        }
+        return retriever, index
+
+    def test_disabled_by_default(self, tmp_path):
+        retriever, index = self._retriever(tmp_path, {})
+
+        context = retriever.query_all_stores("question")
+
+        assert context.count("[Source:") == 4
+        assert index.search.call_args[0][1] == 5
+        assert retriever.get_stats()['reranker'] is None
+
+    @patch('llf.reranker.CrossEncoder')
+    def test_rerank_keeps_top_n(self, mock_cross_encoder, tmp_path):
+        # Relevance reverses the retrieval order
+        mock_cross_encoder.return_value.predict.side_effect = \
+            lambda pairs, **kwargs: [float(text.split()[-1]) for _, text in pairs]
+        retriever, index = self._retriever(tmp_path, {"enabled": True, "top_n": 2, "candidate_pool": 10})
+
+        context = retriever.query_all_stores("question")
+
+        assert context.index("chunk 3") < context.index("chunk 2")
+        assert "chunk 0" not in context
+        # Each store is searched for the whole candidate pool
+        assert index.search.call_args[0][1] == 10
+        assert retriever.get_stats()['reranker']['reranks'] == 1
+
+    @patch('llf.reranker.CrossEncoder')
+    def test_rerank_failure_falls_back(self, mock_cross_encoder, tmp_path):
+        mock_cross_encoder.return_value.predict.side_effect = RuntimeError("boom")
+        retriever, _ = self._retriever(tmp_path, {"enabled": True, "top_n": 2})
+
+        context = retriever.query_all_stores("question")
+
+        assert context.count("[Source:") == 4
+
+    @patch('llf.reranker.CrossEncoder')
+    def test_min_score_can_drop_everything(self, mock_cross_encoder, tmp_path):
+        mock_cross_encoder.return_value.predict.side_effect = lambda pairs, **kwargs: [-5.0] * len(pairs)
+        retriever, _ = self._retriever(tmp_path, {"enabled": True, "min_score": 0.0})
+
+        assert retriever.query_all_stores("question") is None
+
+    @patch('llf.rag_retriever.CrossEncoderReranker.rerank', return_value=[])
+    def test_budget_limited_by_query_timeout(self, mock_rerank, tmp_path):
+        retriever, _ = self._retriever(tmp_path, {"enabled": True, "latency_budget_ms": 5000})
+
+        retriever.query_all_stores("question", timeout=1.0)
+
+        assert mock_rerank.call_args.kwargs['budget_seconds'] <= 1.0
+
+
+class TestContextPacking:
+    """Test token-budgeted packing of the final results."""
+
+    def _retriever(self, tmp_path, metadata, store_extra=None, packing=None):
+        registry_path = tmp_path / "registry.json"
+        registry_path.write_text(json.dumps({
+            "data_stores": [dict({"name": "docs", "attached": True, "embedding_model": "mini",
+                                  "top_k_results": 5}, **(store_extra or {}))],
+            "context_packing": packing or {}
+        }))
+        retriever = RAGRetriever(registry_path=registry_path)
+
+        model = Mock()
+        model.encode.return_value = np.array([[0.1, 0.2, 0.3]])
+        index = Mock()
+        count = len(metadata)
+        index.search.return_value = (np.linspace(0.9, 0.5, count)[None, :], np.arange(count)[None, :])
+        retriever._store_cache["docs"] = {'index': index, 'metadata': metadata, 'model': model, 'model_name': 'mini'}
+        return retriever
+
+    def test_overlapping_chunks_merged(self, tmp_path):
+        text = "Step one: stop the service. Step two: clear the cache. Step three: restart."
+        metadata = [
+            {'text': text[:45], '_chunk_index': 0, '_chunk_overlap': 15, 'source_file': 'ops.jsonl'},
+            {'text': text[30:], '_chunk_index': 1, '_chunk_overlap': 15, 'source_file': 'ops.jsonl'},
+        ]
+        retriever = self._retriever(tmp_path, metadata)
+
+        context = retriever.query_all_stores("how do I clear the cache")
+
+        assert context == f"[Source: docs | Similarity: 0.90]\n{text}"
+
+    def test_duplicate_chunks_dropped(self, tmp_path):
+        metadata = [{'text': 'Restart the server after changing the cache settings'},
+                    {'text': 'Restart the server after changing the cache settings'},
+                    {'text': 'Tokens expire after one hour'}]
+        retriever = self._retriever(tmp_path, metadata)
+
+        context = retriever.query_all_stores("question")
+
+        assert context.count("[Source:") == 2
+        assert "Tokens expire" in context
+
+    def test_budget_follows_model_context(self, tmp_path):
+        metadata = [{'text': f'chunk {i} ' + 'word ' * 60} for i in range(4)]
+        retriever = self._retriever(tmp_path, metadata)
+
+        assert retriever.query_all_stores("question").count("[Source:") == 4
+        # context_share (0.5) of 400 tokens leaves room for two chunks
+        context = retriever.query_all_stores("question", context_tokens=400)
+        assert context.count("[Source:") == 2
+        assert len(context) <= 200 * 4
+        assert retriever.query_all_stores("question", context_tokens=0) is None
+
+    def test_max_context_length_caps_budget(self, tmp_path):
+        metadata = [{'text': f'chunk {i} ' + 'word ' * 300} for i in range(4)]
+        retriever = self._retriever(tmp_path, metadata, packing={"context_share": 1.0})
+
+        context = retriever.query_all_stores("question", context_tokens=100000)
+
+        assert context.count("[Source:") == 2
+        assert len(context) <= DEFAULT_CONFIG['max_context_length']
+
+    def test_neighbor_chunks_added(self, tmp_path):
+        metadata = [{'text': f'Part {i} of the upgrade guide.', 'source_file': 'guide.md', '_source_jsonl': 'a.jsonl',
+                     '_chunk_index': i, '_total_chunks': 4} for i in range(4)]
+        retriever = self._retriever(tmp_path, metadata, store_extra={"top_k_results": 1},
+                                    packing={"neighbor_chunks": 1})
+        retriever._store_cache["docs"]['index'].search.return_value = (np.array([[0.9]]), np.array([[2]]))
+        retriever._store_cache["docs"]['store_path'] = tmp_path
+
+        context = retriever.query_all_stores("question")
+
+        assert context == ("[Source: docs | Similarity: 0.90]\n"
+                           "Part 1 of the upgrade guide.\nPart 2 of the upgrade guide.\nPart 3 of the upgrade guide.")
+        assert (tmp_path / "metadata.adjacency.npy").exists()
+
+
+class TestPreload:
+    """Test warming up attached stores in the background."""
+
+    def _retriever(self, tmp_path, preload=True, query_timeout=10.0):
+        registry_path = tmp_path / "registry.json"
+        registry_path.write_text(json.dumps({
+            "preload": preload,
+            "data_stores": [
+                {"name": "docs", "attached": True, "embedding_model": "mini", "query_timeout": query_timeout},
+                {"name": "notes", "attached": True, "embedding_model": "mini", "query_timeout": query_timeout},
+                {"name": "broken", "attached": True, "embedding_model": "other", "query_timeout": query_timeout},
+            ]
+        }))
+        retriever = RAGRetriever(registry_path=registry_path)
+
+        model = Mock()
+        model.encode.return_value = np.array([[0.1, 0.2, 0.3]])
+
+        def read_store(store_name, store_config):
+            if store_name == "broken":
+                raise FileNotFoundError("index.faiss")
+            time.sleep(0.1)
+            index = Mock()
+            index.search.return_value = (np.array([[0.9]]), np.array([[0]]))
+            store_data = {'index': index, 'metadata': [{'text': f'{store_name} chunk'}],
+                          'model': model, 'model_name': 'mini'}
+            retriever._store_cache[store_name] = store_data
+            return store_data
+
+        retriever._read_vector_store = read_store
+        return retriever, model
+
+    def test_registry_flag(self, tmp_path):
+        assert self._retriever(tmp_path)[0].preload_enabled is True
+        assert self._retriever(tmp_path, preload=False)[0].preload_enabled is False
+
+    def test_loads_stores_and_warms_model(self, tmp_path):
+        retriever, model = self._retriever(tmp_path)
+
+        assert retriever.start_preload() is True
+        assert retriever.get_preload_status()['state'] == 'running'
+        assert retriever.wait_for_preload(timeout=5)
+
+        status = retriever.get_stats()['preload']
+        assert status['state'] == 'done'
+        assert status['stores'] == 2
+        assert status['failed'] == ['broken']
+        assert status['seconds'] >= 0.2
+        assert set(retriever._store_cache) == {"docs", "notes"}
+        assert model.encode.call_args[0][0] == ["warm-up"]
+
+    def test_started_once(self, tmp_path):
+        retriever, _ = self._retriever(tmp_path)
+        assert retriever.start_preload() is True
+        assert retriever.start_preload() is False
+        retriever.wait_for_preload(timeout=5)
+
+    def test_nothing_attached(self, tmp_path):
+        retriever = RAGRetriever(registry_path=tmp_path / "missing.json")
+        assert retriever.start_preload() is False
+        assert retriever.get_preload_status()['state'] == 'idle'
+        assert retriever.wait_for_preload()
+
+    def test_first_query_waits_for_warm_up(self, tmp_path):
+        # Loading takes longer than the store timeout: without the wait both stores would be skipped
+        retriever, _ = self._retriever(tmp_path, query_timeout=0.05)
+        retriever.start_preload()
+
+        context = retriever.query_all_stores("question")
+
+        assert "docs chunk" in context
+        assert "notes chunk" in context
+
+
+class TestRefresh:
+    """Test picking up registry and store changes without a full reload."""
+
+    def _write_registry(self, registry_path, stores, mtime_ns):
+        registry_path.write_text(json.dumps({"data_stores": stores}))
+        os.utime(registry_path, ns=(mtime_ns, mtime_ns))
+
+    def _retriever(self, tmp_path, stores):
+        registry_path = tmp_path / "registry.json"
+        self._write_registry(registry_path, stores, 1_000_000_000)
+        retriever = RAGRetriever(registry_path=registry_path)
+
+        models = {}
+        for store in stores:
+            model_name = store["embedding_model"]
+            models.setdefault(model_name, Mock(name=model_name))
+            retriever._model_cache[model_name] = models[model_name]
+            retriever._store_cache[store["name"]] = {
+                'index': Mock(), 'metadata': [], 'model': models[model_name], 'model_name': model_name,
+                'registry_config': store
+            }
+        return retriever, registry_path
+
+    def test_unchanged(self, tmp_path):
+        retriever, _ = self._retriever(tmp_path, [{"name": "docs", "attached": True, "embedding_model": "mini"}])
+        assert retriever.refresh() is False
+
+    def test_attach_keeps_loaded_stores(self, tmp_path):
+        docs = {"name": "docs", "attached": True, "embedding_model": "mini"}
+        retriever, registry_path = self._retriever(tmp_path, [docs])
+        cached = retriever._store_cache["docs"]
+
+        self._write_registry(registry_path, [docs, {"name": "notes", "attached": True, "embedding_model": "mini"}],
+                             2_000_000_000)
+
+        assert retriever.refresh() is True
+        assert set(retriever.attached_stores) == {"docs", "notes"}
+        assert retriever._store_cache["docs"] is cached
+        assert "mini" in retriever._model_cache
+        assert retriever.refresh() is False
+
+    def test_detach_releases_unused_models_only(self, tmp_path):
+        stores = [{"name": "docs", "attached": True, "embedding_model": "mini"},
+                  {"name": "notes", "attached": True, "embedding_model": "mini"},
+                  {"name": "code", "attached": True, "embedding_model": "large"}]
+        retriever, registry_path = self._retriever(tmp_path, stores)
+        retriever._query_embedding_cache[("large", "q")] = np.zeros(3)
+        retriever._query_embedding_cache[("mini", "q")] = np.zeros(3)
+
+        self._write_registry(registry_path, [stores[0], dict(stores[1], attached=False),
+                                             dict(stores[2], attached=False)], 2_000_000_000)
+        retriever.refresh()
+
+        assert set(retriever._store_cache) == {"docs"}
+        # "mini" is still used by docs; "large" is not used by any store
+        assert set(retriever._model_cache) == {"mini"}
+        assert list(retriever._query_embedding_cache) == [("mini", "q")]
+
+    def test_unloaded_stores_keep_their_model_variant(self, tmp_path):
+        # One backend set in the registry, one only in the store's config.json
+        store_dir = tmp_path / "notes"
+        store_dir.mkdir()
+        (store_dir / "config.json").write_text(json.dumps(
+            {"embedding_model": "mini", "embedding_backend": "llama-server", "embedding_server": "embed"}))
+        docs = {"name": "docs", "attached": True, "embedding_model": "mini",
+                "embedding_backend": "onnx", "embedding_quantization": "int8"}
+        notes = {"name": "notes", "attached": True, "embedding_model": "mini", "vector_store_path": str(store_dir)}
+        code = {"name": "code", "attached": True, "embedding_model": "large"}
+        retriever, registry_path = self._retriever(tmp_path, [code])
+        retriever._model_cache["mini@onnx-int8"] = Mock()
+        retriever._model_cache["mini@llama-server:embed"] = Mock()
+        retriever._model_cache["mini@openvino"] = Mock()
+
+        self._write_registry(registry_path, [docs, notes, dict(code, attached=False)], 2_000_000_000)
+        retriever.refresh()
+
+        assert set(retriever._model_cache) == {"mini@onnx-int8", "mini@llama-server:embed"}
+
+    def test_reconfigured_store_reloaded(self, tmp_path):
+        docs = {"name": "docs", "attached": True, "embedding_model": "mini", "top_k_results": 5}
+        notes = {"name": "notes", "attached": True, "embedding_model": "mini"}
+        retriever, registry_path = self._retriever(tmp_path, [docs, notes])
+
+        self._write_registry(registry_path, [dict(docs, vector_store_path="elsewhere"), notes], 2_000_000_000)
+        retriever.refresh()
+
+        assert "docs" not in retriever._store_cache
+        assert "notes" in retriever._store_cache
+        assert retriever.attached_stores["docs"]["vector_store_path"] == "elsewhere"
+
+    def test_store_rebuilt_on_disk(self, tmp_path):
+        retriever, _ = self._retriever(tmp_path, [{"name": "docs", "attached": True, "embedding_model": "mini"}])
+        store_dir = tmp_path / "docs"
+        store_dir.mkdir()
+        (store_dir / "index.faiss").write_bytes(b"v1")
+        (store_dir / "metadata.jsonl").write_text("{}\n")
+        metadata = MetadataIndex(store_dir / "metadata.jsonl")
+        retriever._store_cache["docs"].update(
+            metadata=metadata, store_path=store_dir, file_signature=retriever._store_file_signature(store_dir))
+
+        assert retriever.refresh() is False
+        os.utime(store_dir / "index.faiss", ns=(3_000_000_000, 3_000_000_000))
+
+        assert retriever.refresh() is True
+        assert "docs" not in retriever._store_cache
+        # The dropped copy's memory map and file handle are released
+        assert metadata._data.closed and metadata._file.closed
+        # The model stays: the store is still attached
+        assert "mini" in retriever._model_cache
+
+    def test_unreadable_registry_keeps_stores(self, tmp_path):
+        retriever, registry_path = self._retriever(
+            tmp_path, [{"name": "docs", "attached": True, "embedding_model": "mini"}])
+
+        registry_path.write_text('{"data_stores": [')
+        os.utime(registry_path, ns=(2_000_000_000, 2_000_000_000))
+
+        assert retriever.refresh() is False
+        assert "docs" in retriever._store_cache
+        assert retriever.has_attached_stores()
+
+    def test_rerank_settings_change_resets_reranker(self, tmp_path):
+        docs = {"name": "docs", "attached": True, "embedding_model": "mini"}
+        retriever, registry_path = self._retriever(tmp_path, [docs])
+        retriever._reranker = Mock()
+
+        registry_path.write_text(json.dumps({"data_stores": [docs], "reranking": {"enabled": True}}))
+        os.utime(registry_path, ns=(2_000_000_000, 2_000_000_000))
+        retriever.refresh()
+
+        assert retriever._reranker is None
+        assert retriever.rerank_config['enabled'] is True
+
+
+class TestEmbeddingBackend:
+    """Test loading the embedding model on the store's backend."""
+
+    def _retriever(self, tmp_path):
+        registry_path = tmp_path / "registry.json"
+        registry_path.write_text(json.dumps({"data_stores": []}))
+        return RAGRetriever(registry_path=registry_path)
+
+    def _store(self, tmp_path, **config):
+        store_dir = tmp_path / "store"
+        store_dir.mkdir()
+        (store_dir / "index.faiss").touch()
+        (store_dir / "metadata.jsonl").write_text(json.dumps({"text": "chunk"}) + "\n")
+        (store_dir / "config.json").write_text(json.dumps(dict({"embedding_model": "mini"}, **config)))
+        return store_dir
+
+    def test_onnx_int8_model_cached_separately(self, tmp_path):
+        retriever = self._retriever(tmp_path)
+        retriever._model_cache["mini"] = Mock(name="fp32")
+        quantized = Mock(name="int8")
+
+        with patch('llf.rag_retriever.embedding_backend.load_embedding_model', return_value=quantized) as load:
+            model = retriever._load_embedding_model("mini", backend="onnx", quantization="int8")
+
+        assert model is quantized
+        assert retriever._model_cache["mini@onnx-int8"] is quantized
+        assert load.call_args.kwargs['backend'] == "onnx"
+        assert load.call_args.kwargs['quantization'] == "int8"
+
+    def test_backend_read_from_store_config(self, tmp_path):
+        retriever = self._retriever(tmp_path)
+        store_dir = self._store(tmp_path, embedding_backend="onnx", embedding_quantization="int8")
+
+        with patch.object(retriever, '_load_embedding_model', return_value=Mock()) as load, \
+                patch.object(retriever, '_read_faiss_index', return_value=Mock(ntotal=1)):
+            store_data = retriever._load_vector_store(
+                "docs", {"vector_store_path": str(store_dir), "embedding_model": "mini"})
+
+        assert load.call_args.args[2:] == ("onnx", "int8")
+        # Query embeddings are cached per model variant
+        assert store_data['model_name'] == "mini@onnx-int8"
+
+    def test_registry_overrides_backend(self, tmp_path):
+        retriever = self._retriever(tmp_path)
+        store_dir = self._store(tmp_path, embedding_backend="onnx", embedding_quantization="int8")
+
+        with patch.object(retriever, '_load_embedding_model', return_value=Mock()) as load, \
+                patch.object(retriever, '_read_faiss_index', return_value=Mock(ntotal=1)):
+            store_data = retriever._load_vector_store(
+                "docs", {"vector_store_path": str(store_dir), "embedding_model": "mini",
+                         "embedding_backend": "torch", "embedding_quantization": None})
+
+        assert load.call_args.args[2:] == ("torch", None)
+        assert store_data['model_name'] == "mini"
+
+    def test_llama_server_shared_and_registry_overrides_server(self, tmp_path):
+        retriever = self._retriever(tmp_path)
+        store_dir = self._store(tmp_path, embedding_backend="llama-server", embedding_server="embeddings")
+
+        with patch('llf.rag_retriever.embedding_backend.load_embedding_model', return_value=Mock()) as load, \
+                patch('llf.rag_retriever.embedding_backend.apply_thread_settings') as apply, \
+                patch.object(retriever, '_read_faiss_index', return_value=Mock(ntotal=1)):
+            store_data = retriever._load_vector_store(
+                "docs", {"vector_store_path": str(store_dir), "embedding_model": "mini",
+                         "embedding_server": "http://127.0.0.1:8090"})
+            retriever._load_embedding_model("mini", backend="llama-server", server="http://127.0.0.1:8090")
+
+        assert load.call_count == 1
+        assert load.call_args.kwargs['server'] == "http://127.0.0.1:8090"
+        assert store_data['model_name'] == "mini@llama-server:http://127.0.0.1:8090"
+        # Nothing runs in this process, so PyTorch threads are left alone
+        apply.assert_not_called()
+
+
+class TestEmbeddingThreads:
+    """Test the embedding thread policy and worker pool."""
+
+    def _retriever(self, tmp_path, **registry):
+        registry_path = tmp_path / "registry.json"
+        registry_path.write_text(json.dumps(dict({"data_stores": []}, **registry)))
+        return RAGRetriever(registry_path=registry_path), registry_path
+
+    def test_encoder_runs_on_embedding_pool(self, tmp_path):
+        retriever, _ = self._retriever(tmp_path, embedding_threads={"workers": 2})
+        threads = []
+
+        def encode(*args, **kwargs):
+            threads.append(threading.current_thread().name)
+            return np.ones((1, 3), dtype=np.float32)
+
+        model = Mock()
+        model.encode.side_effect = encode
+
+        retriever._embed_query("q", model, "mini")
+
+        assert threads[0].startswith("rag-embed")
+        assert retriever._get_embedding_executor()._max_workers == 2
+
+    def test_settings_applied_when_model_loads(self, tmp_path):
+        retriever, _ = self._retriever(tmp_path, embedding_threads={"intra_op_threads": 6})
+
+        with patch('llf.rag_retriever.embedding_backend.apply_thread_settings',
+                   return_value={'intra_op_threads': 6, 'inter_op_threads': 1}) as apply, \
+                patch('llf.rag_retriever.SentenceTransformer'):
+            retriever._load_embedding_model("mini")
+
+        apply.assert_called_once_with(6, 1)
+
+    def test_changed_settings_recreate_pool(self, tmp_path):
+        retriever, registry_path = self._retriever(tmp_path)
+        executor = retriever._get_embedding_executor()
+
+        registry_path.write_text(json.dumps({"data_stores": [], "embedding_threads": {"workers": 3}}))
+        os.utime(registry_path, ns=(5_000_000_000, 5_000_000_000))
+        retriever.refresh()
+
+        assert retriever._get_embedding_executor() is not executor
+        assert retriever.get_stats()['embedding_threads']['workers'] == 3
+
+
+class TestMicroBatching:
+    """Test batching concurrent encodes and searches."""
+
+    def _retriever(self, tmp_path, **registry):
+        registry_path = tmp_path / "registry.json"
+        registry_path.write_text(json.dumps(dict({"data_stores": []}, **registry)))
+        return RAGRetriever(registry_path=registry_path)
+
+    def test_concurrent_queries_encoded_together(self, tmp_path):
+        retriever = self._retriever(tmp_path, embedding_threads={"workers": 2})
+        gate = threading.Event()
+        batches = []
+
+        def encode(texts, **kwargs):
+            batches.append(list(texts))
+            if len(batches) == 1:
+                gate.wait(5)
+            return np.ones((len(texts), 3), dtype=np.float32)
+
+        model = Mock()
+        model.encode.side_effect = encode
+
+        threads = [threading.Thread(target=retriever._embed_query, args=(text, model, "mini"))
+                   for text in ("first", "second", "third", "second")]
+        threads[0].start()
+        while not batches:
+            time.sleep(0.001)
+        for thread in threads[1:]:
+            thread.start()
+        while retriever._encode_batcher.stats()['calls'] < 4:
+            time.sleep(0.001)
+        gate.set()
+        for thread in threads:
+            thread.join(5)
+
+        assert batches[0] == ["first"]
+        # Queries that arrived during the first encode share one pass; the repeated one is encoded once
+        assert sorted(batches[1]) == ["second", "third"]
+        assert ("mini", "third") in retriever._query_embedding_cache
+
+    def test_batched_search_keeps_each_k(self, tmp_path):
+        index = Mock()
+        index.search.return_value = (np.array([[0.9, 0.8, 0.7], [0.6, 0.5, -1.0]]),
+                                     np.array([[1, 2, 3], [4, 5, -1]]))
+
+        results = RAGRetriever._search_index(index, [(np.zeros(3, dtype=np.float32), 2),
+                                                     (np.zeros(3, dtype=np.float32), 3)])
+
+        assert index.search.call_args[0][0].shape == (2, 3)
+        assert index.search.call_args[0][1] == 3
+        assert results == [[(1, 0.9), (2, 0.8)], [(4, 0.6), (5, 0.5)]]
+
+    def test_disabled(self, tmp_path):
+        retriever = self._retriever(tmp_path, micro_batching={"enabled": False})
+        assert retriever._encode_batcher.max_batch_size == 1
+        assert retriever._search_batcher.max_wait == 0
+
+
+class TestRetrievalMode:
+    """Test always-on vs on-demand retrieval and the searched/skipped counts."""
+
+    def _retriever(self, tmp_path, **registry):
+        registry_path = tmp_path / "registry.json"
+        registry_path.write_text(json.dumps(dict({"data_stores": [{"name": "docs", "attached": True}]}, **registry)))
+        return RAGRetriever(registry_path=registry_path)
+
+    def test_default_is_always(self, tmp_path):
+        retriever = self._retriever(tmp_path)
+        assert retriever.retrieval_mode == 'always'
+        assert retriever.uses_retrieval_tool() is False
+
+    def test_tool_mode(self, tmp_path):
+        retriever = self._retriever(tmp_path, retrieval_mode="tool")
+        assert retriever.uses_retrieval_tool() is True
+
+        retriever.attached_stores = {}
+        assert retriever.uses_retrieval_tool() is False
+
+    def test_unknown_mode_falls_back(self, tmp_path):
+        assert self._retriever(tmp_path, retrieval_mode="sometimes").retrieval_mode == 'always'
+
+    def test_record_retrieval(self, tmp_path):
+        retriever = self._retriever(tmp_path, retrieval_mode="tool")
+        retriever.record_retrieval(searched=True)
+        retriever.record_retrieval(searched=False)
+        retriever.record_retrieval(searched=False)
+
+        assert retriever.get_stats()['retrieval'] == {'mode': 'tool', 'messages': 3, 'searched': 1, 'skipped': 2}
+
+
+class TestMetadataFilters:
+    """Test searches restricted by source_file, tags and date filters."""
+
+    ROWS = [
+        {'text': 'reset the router', 'source_file': 'router.pdf', 'tags': ['network']},
+        {'text': 'reset the printer', 'source_file': 'printer.pdf', 'date': '2024-05-01'},
+        {'text': 'router firmware update', 'source_file': 'router.pdf', 'date': '2023-01-10'},
+    ]
+
+    def _retriever(self, tmp_path, search_mode="semantic"):
+        from llf.lexical_index import BM25Index
+        from llf.metadata_filter import MetadataFilterIndex
+
+        store_config = {"name": "docs", "attached": True, "embedding_model": "mini",
+                        "similarity_threshold": 0.0, "metadata": {"search_mode": search_mode}}
+        registry_path = tmp_path / "registry.json"
+        registry_path.write_text(json.dumps({"data_stores": [store_config]}))
+        retriever = RAGRetriever(registry_path=registry_path)
+
+        model = Mock()
+        model.encode.return_value = np.array([[0.1, 0.2, 0.3]])
+        index = Mock()
+        index.search.return_value = (np.array([[0.9, 0.8, 0.7]]), np.array([[0, 1, 2]]))
+        retriever._store_cache["docs"] = {
+            'index': index,
+            'metadata': self.ROWS,
+            'lexical': BM25Index.build([row['text'] for row in self.ROWS]),
+            'filter_index': MetadataFilterIndex.build(self.ROWS),
+            'model': model,
+            'model_name': 'mini',
+        }
+        return retriever, store_config, index, model
+
+    def test_dense_search_uses_id_filter(self, tmp_path):
+        retriever, store_config, index, _ = self._retriever(tmp_path)
+
+        with patch('llf.rag_retriever.filtered_search',
+                   return_value=(np.array([[0.8, 0.7]]), np.array([[2, 0]]))) as search:
+            results = retriever._query_single_store("reset", "docs", store_config,
+                                                    filters={'source_file': ['router.pdf']})
+
+        assert [r['text'] for r in results] == ['router firmware update', 'reset the router']
+        assert search.call_args[0][3].ids.tolist() == [0, 2]
+        index.search.assert_not_called()
+
+    def test_keyword_search_respects_filter(self, tmp_path):
+        retriever, store_config, _, _ = self._retriever(tmp_path, search_mode="keyword")
+
+        results = retriever._query_single_store("reset", "docs", store_config,
+                                                filters={'date_from': 20240101})
+
+        assert [r['text'] for r in results] == ['reset the printer']
+
+    def test_no_matching_chunks_skips_search(self, tmp_path):
+        retriever, store_config, index, model = self._retriever(tmp_path)
+
+        assert retriever._query_single_store("reset", "docs", store_config, filters={'tags': ['missing']}) == []
+        model.encode.assert_not_called()
+        index.search.assert_not_called()
+
+    def test_filter_compiled_once(self, tmp_path):
+        retriever, _, _, _ = self._retriever(tmp_path)
+        store_data = retriever._store_cache["docs"]
+
+        first = retriever._id_filter(store_data, {'tags': ['network']})
+        assert retriever._id_filter(store_data, {'tags': ['network']}) is first
+        assert first.ids.tolist() == [0]
+
+    def test_query_all_stores_passes_filters(self, tmp_path):
+        retriever, _, _, _ = self._retriever(tmp_path, search_mode="keyword")
+
+        context = retriever.query_all_stores("reset", filters={'source_file': 'Printer.pdf'})
+
+        assert 'reset the printer' in context
+        assert 'router' not in context
+        with pytest.raises(ValueError):
+            retriever.query_all_stores("reset", filters={'author': 'me'})
@@ -0,0 +1,173 @@
+"""
+Unit tests for rag_tools module.
+"""
+
+from unittest.mock import MagicMock, Mock
+
+import pytest
+
+from llf.config import Config
+from llf.llm_runtime import LLMRuntime
+from llf.model_manager import ModelManager
+from llf.rag_tools import RAG_TOOL_NAMES, execute_rag_tool, get_rag_tool_system_prompt, get_rag_tools
+
+
+class TestGetRagTools:
+    """Test the search_knowledge_base tool definition."""
+
+    def test_definition(self):
+        tools = get_rag_tools({})
+        assert [tool['function']['name'] for tool in tools] == sorted(RAG_TOOL_NAMES)
+        assert tools[0]['function']['parameters']['required'] == ['query']
+
+    def test_description_lists_attached_stores(self):
+        tools = get_rag_tools({
+            'docs': {'display_name': 'Product Docs', 'description': 'User manual'},
+            'faq': {},
+        })
+        assert 'Knowledge bases: Product Docs (User manual); faq.' in tools[0]['function']['description']
+
+    def test_system_prompt(self):
+        assert 'search_knowledge_base' in get_rag_tool_system_prompt()
+
+
+class TestExecuteRagTool:
+    """Test executing a knowledge base search."""
+
+    def test_search(self):
+        retriever = Mock()
+        retriever.query_all_stores.return_value = "[Source 1] Keys rotate every 90 days"
+
+        result = execute_rag_tool('search_knowledge_base', {'query': ' key rotation '}, retriever, timeout=2.5)
+
+        retriever.query_all_stores.assert_called_once_with('key rotation', timeout=2.5)
+        assert result == {"success": True, "found": True, "context": "[Source 1] Keys rotate every 90 days"}
+
+    def test_filters(self):
+        retriever = Mock()
+        retriever.query_all_stores.return_value = "Keys rotate every 90 days"
+
+        execute_rag_tool('search_knowledge_base',
+                         {'query': 'keys', 'source_file': ['guide.pdf'], 'tags': [], 'date_from': '2024-01-01'},
+                         retriever, filters={'source_file': ['manual.pdf']})
+
+        # Session filters override the model's choice for the same key
+        retriever.query_all_stores.assert_called_once_with(
+            'keys', timeout=None, filters={'source_file': ['manual.pdf'], 'date_from': '2024-01-01'})
+
+    def test_invalid_filter(self):
+        retriever = Mock()
+        retriever.query_all_stores.side_effect = ValueError("Invalid date_from 'soon' (expected YYYY-MM-DD)")
+
+        result = execute_rag_tool('search_knowledge_base', {'query': 'keys', 'date_from': 'soon'}, retriever)
+
+        assert result['success'] is False
+        assert 'date_from' in result['error']
+
+    def test_nothing_found(self):
+        retriever = Mock()
+        retriever.query_all_stores.return_value = None
+
+        result = execute_rag_tool('search_knowledge_base', {'query': 'weather'}, retriever)
+
+        assert result['success'] is True
+        assert result['found'] is False
+
+    def test_query_required(self):
+        retriever = Mock()
+        result = execute_rag_tool('search_knowledge_base', {}, retriever)
+
+        assert result['success'] is False
+        retriever.query_all_stores.assert_not_called()
+
+    def test_search_error(self):
+        retriever = Mock()
+        retriever.query_all_stores.side_effect = RuntimeError("index missing")
+
+        result = execute_rag_tool('search_knowledge_base', {'query': 'keys'}, retriever)
+
+        assert result == {"success": False, "error": "index missing"}
+
+    def test_unknown_tool(self):
+        result = execute_rag_tool('search_everything', {'query': 'keys'}, Mock())
+        assert result['success'] is False
+
+
+class TestRuntimeRetrievalTool:
+    """Test LLMRuntime offering, executing and counting knowledge base searches."""
+
+    @pytest.fixture
+    def runtime(self):
+        config = Config()
+        config.default_local_server = None
+        config.tool_routing = False
+        prompt_config = Mock()
+        prompt_config.build_messages.side_effect = lambda user_message, **kwargs: [
+            {'role': 'user', 'content': user_message}]
+        prompt_config.uses_retrieval_tool.return_value = True
+        prompt_config.get_all_tools.return_value = get_rag_tools({})
+        prompt_config.get_rag_retriever.return_value.query_all_stores.return_value = "Keys rotate every 90 days"
+        runtime = LLMRuntime(config, ModelManager(config), prompt_config)
+        runtime.is_server_running = Mock(return_value=True)
+        runtime.client = MagicMock()
+        return runtime
+
+    def _reply(self, content=None, tool_calls=None):
+        response = MagicMock()
+        response.choices[0].message.content = content
+        response.choices[0].message.tool_calls = tool_calls
+        return response
+
+    def test_search_recorded(self, runtime):
+        tool_call = MagicMock()
+        tool_call.id = 'call_1'
+        tool_call.type = 'function'
+        tool_call.function.name = 'search_knowledge_base'
+        tool_call.function.arguments = '{"query": "key rotation"}'
+        runtime.client.chat.completions.create.side_effect = [
+            self._reply(None, [tool_call]),
+            self._reply("Every 90 days"),
+        ]
+
+        assert runtime.chat([{'role': 'user', 'content': 'How often do keys rotate?'}]) == "Every 90 days"
+
+        prompt_config = runtime.prompt_config
+        assert prompt_config.build_messages.call_args[1]['retrieval_tool'] is True
+        prompt_config.get_all_tools.assert_called_once_with(retrieval_tool=True)
+        prompt_config.get_rag_retriever.return_value.query_all_stores.assert_called_once_with('key rotation', timeout=None)
+        prompt_config.record_retrieval.assert_called_once_with(True)
+
+    def test_session_filters_apply_to_tool_calls(self, runtime):
+        tool_call = MagicMock()
+        tool_call.id = 'call_1'
+        tool_call.type = 'function'
+        tool_call.function.name = 'search_knowledge_base'
+        tool_call.function.arguments = '{"query": "key rotation"}'
+        runtime.client.chat.completions.create.side_effect = [
+            self._reply(None, [tool_call]),
+            self._reply("Every 90 days"),
+        ]
+        filters = {'source_file': ['manual.pdf']}
+
+        runtime.chat([{'role': 'user', 'content': 'How often do keys rotate?'}], rag_filters=filters)
+
+        assert runtime.prompt_config.build_messages.call_args[1]['rag_filters'] == filters
+        runtime.prompt_config.get_rag_retriever.return_value.query_all_stores.assert_called_once_with(
+            'key rotation', timeout=None, filters=filters)
+
+    def test_skip_recorded(self, runtime):
+        runtime.client.chat.completions.create.return_value = self._reply("You're welcome!")
+
+        runtime.chat([{'role': 'user', 'content': 'Thanks!'}])
+
+        runtime.prompt_config.record_retrieval.assert_called_once_with(False)
+
+    def test_streaming_keeps_always_on_retrieval(self, runtime):
+        chunk = MagicMock()
+        chunk.choices[0].delta.content = "Hi"
+        runtime.client.chat.completions.create.return_value = iter([chunk])
+
+        assert "".join(runtime.chat([{'role': 'user', 'content': 'Hello'}], stream=True)) == "Hi"
+
+        assert runtime.prompt_config.build_messages.call_args[1]['retrieval_tool'] is False
+        runtime.prompt_config.record_retrieval.assert_not_called()
@@ -0,0 +1,106 @@
+"""
+Unit tests for reranker module.
+"""
+
+import time
+from unittest.mock import patch
+
+import pytest
+
+from llf.reranker import CrossEncoderReranker
+
+
+def _candidates(*texts):
+    return [{'text': text, 'score': 0.5, 'store_name': 'docs'} for text in texts]
+
+
+class FakeCrossEncoder:
+    """Scores a (query, text) pair by the number in the text; counts predicted pairs."""
+
+    def __init__(self, *args, delay=0.0, **kwargs):
+        self.pairs = []
+        self.delay = delay
+
+    def predict(self, pairs, batch_size=32, show_progress_bar=False):
+        time.sleep(self.delay)
+        self.pairs.extend(pairs)
+        return [float(text.split()[-1]) for _, text in pairs]
+
+
+@pytest.fixture
+def reranker():
+    with patch('llf.reranker.CrossEncoder', FakeCrossEncoder):
+        yield CrossEncoderReranker('fake-model', batch_size=2)
+
+
+class TestCrossEncoderReranker:
+    """Test cross-encoder reranking."""
+
+    def test_reorders_and_limits(self, reranker):
+        results = reranker.rerank("q", _candidates("a 1", "b 5", "c 3", "d 4"), top_n=2)
+
+        assert [r['text'] for r in results] == ["b 5", "d 4"]
+        assert results[0]['rerank_score'] == 5.0
+        assert results[0]['score'] == 0.5  # Retrieval score is kept
+
+    def test_candidates_not_modified(self, reranker):
+        candidates = _candidates("a 1", "b 2")
+        reranker.rerank("q", candidates, top_n=2)
+        assert 'rerank_score' not in candidates[0]
+
+    def test_model_loaded_lazily(self, reranker):
+        assert reranker._model is None
+        reranker.rerank("q", [], top_n=3)
+        assert reranker._model is None
+        reranker.rerank("q", _candidates("a 1"), top_n=3)
+        assert reranker._model is not None
+
+    def test_load_eagerly(self, reranker):
+        reranker.load()
+        assert reranker._model is not None
+
+    def test_scores_cached_per_query_and_chunk(self, reranker):
+        reranker.rerank("q", _candidates("a 1", "b 2"), top_n=2)
+        reranker.rerank("q", _candidates("a 1", "b 2", "c 3"), top_n=2)
+        reranker.rerank("other", _candidates("a 1"), top_n=1)
+
+        assert reranker._model.pairs == [("q", "a 1"), ("q", "b 2"), ("q", "c 3"), ("other", "a 1")]
+        assert reranker.stats()['cache_hits'] == 2
+
+    def test_cache_is_lru_bounded(self):
+        with patch('llf.reranker.CrossEncoder', FakeCrossEncoder):
+            reranker = CrossEncoderReranker('fake-model', cache_size=2)
+            reranker.rerank("q", _candidates("a 1", "b 2", "c 3"), top_n=3)
+        assert reranker.stats()['cached_scores'] == 2
+
+    def test_zero_budget_keeps_retrieval_order(self, reranker):
+        results = reranker.rerank("q", _candidates("a 1", "b 5", "c 3"), top_n=2, budget_seconds=0)
+
+        assert [r['text'] for r in results] == ["a 1", "b 5"]
+        assert 'rerank_score' not in results[0]
+        assert reranker.stats()['over_budget'] == 1
+
+    def test_budget_stops_between_batches(self):
+        with patch('llf.reranker.CrossEncoder', lambda *a, **k: FakeCrossEncoder(delay=0.05)):
+            reranker = CrossEncoderReranker('fake-model', batch_size=2)
+            results = reranker.rerank("q", _candidates("a 1", "b 2", "c 9", "d 8"), top_n=4, budget_seconds=0.06)
+
+        # First batch scored and reordered; the second would overrun the budget
+        assert [r['text'] for r in results] == ["b 2", "a 1", "c 9", "d 8"]
+        assert len(reranker._model.pairs) == 2
+
+    def test_min_score(self, reranker):
+        results = reranker.rerank("q", _candidates("a 1", "b 5", "c 3"), top_n=3, min_score=2.5)
+        assert [r['text'] for r in results] == ["b 5", "c 3"]
+
+    def test_stats(self, reranker):
+        reranker.rerank("q", _candidates("a 1", "b 2", "c 3"), top_n=1)
+        stats = reranker.stats()
+        assert stats['model'] == 'fake-model'
+        assert (stats['reranks'], stats['scored']) == (1, 3)
+        assert stats['last_ms'] is not None
+
+    def test_missing_dependency(self):
+        with patch('llf.reranker.CrossEncoder', None):
+            with pytest.raises(ImportError, match="sentence-transformers is required"):
+                CrossEncoderReranker('fake-model')
@@ -0,0 +1,191 @@
+"""
+Unit tests for retrieval_bench module.
+"""
+
+import json
+import threading
+from unittest.mock import patch
+
+import pytest
+
+from llf.metadata_filter import MetadataFilterIndex
+from llf.rag_retriever import RAGRetriever
+from llf.retrieval_bench import (
+    REPORT_VERSION, bench_store, expand_sweep, load_queries, parse_sweep, run_retrieval_bench
+)
+
+
+ROWS = [
+    {"text": "install the driver", "source_file": "manual.pdf"},
+    {"text": "rotate api keys", "source_file": "security.md"},
+    {"text": "release notes", "source_file": "CHANGELOG.md"},
+    {"text": "key rotation schedule", "source_file": "security.md"},
+]
+
+
+class FakeRetriever:
+    """Retriever with canned search results per query (ids ranked by score)."""
+
+    _search_mode = RAGRetriever._search_mode
+    _id_filter = RAGRetriever._id_filter
+
+    def __init__(self, tmp_path, hits, registry=None):
+        self.hits = hits
+        self.registry_path = tmp_path / "registry.json"
+        self.registry_path.write_text(json.dumps({"data_stores": registry or []}))
+        self.store_path = tmp_path / "store"
+        self.store_path.mkdir()
+        (self.store_path / "index.faiss").write_bytes(b"x" * 100)
+        (self.store_path / "metadata.jsonl").write_bytes(b"y" * 20)
+        (self.store_path / "config.json").write_text("{}")
+        self._filter_lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._filter_cache_size = 8
+        self.load_configs = []
+        self.search_configs = []
+        self.cache_clears = 0
+
+    def _load_vector_store(self, store_name, store_config):
+        self.load_configs.append(store_config)
+        return {'index': type('Index', (), {'ntotal': len(ROWS)})(), 'config': {'index_type': 'flat'},
+                'store_path': self.store_path, 'metadata': ROWS, 'lexical': None,
+                'filter_index': MetadataFilterIndex.build(ROWS)}
+
+    def _query_single_store(self, query_text, store_name, store_config):
+        self.search_configs.append(store_config)
+        return [{'id': row_id, 'score': score} for row_id, score in self.hits[query_text]]
+
+    def clear_query_cache(self):
+        self.cache_clears += 1
+
+
+@pytest.fixture
+def queries():
+    return [
+        {'query': 'key rotation', 'expected_ids': [], 'expected_sources': ['security.md']},
+        {'query': 'install', 'expected_ids': [0], 'expected_sources': []},
+    ]
+
+
+class TestQuerySet:
+    """Test reading labelled queries and sweep expressions."""
+
+    def test_load_queries(self, tmp_path):
+        path = tmp_path / "queries.jsonl"
+        path.write_text('{"query": "install", "expected_ids": [0, "3"]}\n\n'
+                        '{"query": "keys", "expected_sources": "security.md"}\n', encoding='utf-8')
+
+        assert load_queries(path) == [
+            {'query': 'install', 'expected_ids': [0, 3], 'expected_sources': []},
+            {'query': 'keys', 'expected_ids': [], 'expected_sources': ['security.md']},
+        ]
+
+    @pytest.mark.parametrize("line, message", [
+        ('not json', 'invalid JSON'),
+        ('{"expected_ids": [1]}', "'query' is missing"),
+        ('{"query": "install"}', 'needs expected_ids'),
+    ])
+    def test_load_queries_rejects_bad_lines(self, tmp_path, line, message):
+        path = tmp_path / "queries.jsonl"
+        path.write_text('{"query": "ok", "expected_ids": [1]}\n' + line + '\n', encoding='utf-8')
+
+        with pytest.raises(ValueError, match=f"queries.jsonl:2: {message}"):
+            load_queries(path)
+
+    def test_load_queries_rejects_empty_file(self, tmp_path):
+        path = tmp_path / "queries.jsonl"
+        path.write_text('\n', encoding='utf-8')
+
+        with pytest.raises(ValueError, match="No queries"):
+            load_queries(path)
+
+    def test_parse_and_expand_sweep(self):
+        sweep = parse_sweep(["top_k_results=3,5", "search_mode=semantic,hybrid", "top_k_results=5,10"])
+
+        assert sweep == {'top_k_results': [3, 5, 10], 'search_mode': ['semantic', 'hybrid']}
+        assert len(expand_sweep(sweep)) == 6
+        assert expand_sweep(sweep)[1] == {'top_k_results': 3, 'search_mode': 'hybrid'}
+        assert expand_sweep({}) == [{}]
+
+    def test_parse_sweep_rejects_bad_expressions(self):
+        with pytest.raises(ValueError, match="KEY=VALUE"):
+            parse_sweep(["chunk_size=500"])
+        with pytest.raises(ValueError, match="Invalid value"):
+            parse_sweep(["top_k_results=many"])
+
+
+class TestBenchStore:
+    """Test recall@k, MRR and latency per configuration."""
+
+    HITS = {'key rotation': [(3, 0.9), (2, 0.4), (1, 0.35)], 'install': [(2, 0.5), (0, 0.45)]}
+
+    @patch('llf.retrieval_bench.set_search_params')
+    def test_recall_and_mrr(self, mock_set_params, tmp_path, queries):
+        retriever = FakeRetriever(tmp_path, self.HITS)
+        configurations = expand_sweep({'top_k_results': [1, 3], 'similarity_threshold': [0.3, 0.42]})
+
+        result = bench_store(retriever, "docs", {'name': 'docs'}, queries, configurations)
+
+        by_settings = {(c['settings']['top_k_results'], c['settings']['similarity_threshold']): c
+                       for c in result['configurations']}
+        # key rotation: the one security.md target is found at rank 1; install: id 0 at rank 2
+        assert by_settings[(3, 0.3)]['recall'] == 1.0
+        assert by_settings[(3, 0.3)]['mrr'] == 0.75
+        assert by_settings[(1, 0.3)]['recall'] == 0.5
+        # At 0.42 only id 3 is kept for the first query, ids 2 and 0 for the second
+        assert by_settings[(3, 0.42)]['recall'] == 1.0
+        assert by_settings[(3, 0.42)]['mrr'] == 0.75
+        assert all(c['p95_ms'] >= c['p50_ms'] >= 0 for c in result['configurations'])
+
+        assert result['num_vectors'] == len(ROWS)
+        assert result['index_type'] == 'flat'
+        assert result['disk_bytes'] == 120
+        assert retriever.cache_clears == len(queries) * len(configurations)
+        assert mock_set_params.call_count == len(configurations)
+
+    @patch('llf.retrieval_bench.set_search_params')
+    def test_index_knobs_are_applied(self, mock_set_params, tmp_path, queries):
+        retriever = FakeRetriever(tmp_path, self.HITS)
+
+        result = bench_store(retriever, "docs", {'name': 'docs', 'nprobe': 4}, queries,
+                             expand_sweep({'efSearch': [32, 64]}))
+
+        assert [call.kwargs for call in mock_set_params.call_args_list] == [
+            {'nprobe': 4, 'ef_search': 32, 'rescore_factor': None},
+            {'nprobe': 4, 'ef_search': 64, 'rescore_factor': None},
+        ]
+        assert result['configurations'][1]['settings']['efSearch'] == 64
+
+    @patch('llf.retrieval_bench.set_search_params')
+    def test_keyword_sweep_loads_lexical_index(self, mock_set_params, tmp_path, queries):
+        retriever = FakeRetriever(tmp_path, self.HITS)
+
+        result = bench_store(retriever, "docs", {'name': 'docs'}, queries,
+                             expand_sweep({'search_mode': ['semantic', 'hybrid']}))
+
+        assert retriever.load_configs[0]['metadata'] == {'search_mode': 'hybrid'}
+        assert retriever.search_configs[-1]['metadata'] == {'search_mode': 'hybrid'}
+        # This store has no keyword index, so every search is semantic
+        assert {c['settings']['search_mode'] for c in result['configurations']} == {'semantic'}
+
+
+class TestRunRetrievalBench:
+    """Test benchmarking stores from the registry."""
+
+    @patch('llf.retrieval_bench.set_search_params')
+    def test_stores_found_by_display_name(self, mock_set_params, tmp_path, queries):
+        registry = [{'name': 'docs_v2', 'display_name': 'Docs'}]
+        retriever = FakeRetriever(tmp_path, TestBenchStore.HITS, registry)
+
+        report = run_retrieval_bench(["Docs"], queries, retriever=retriever)
+
+        assert report['report_version'] == REPORT_VERSION
+        assert report['num_queries'] == 2
+        assert list(report['stores']) == ['docs_v2']
+        assert len(report['stores']['docs_v2']['configurations']) == 1
+
+    def test_unknown_store(self, tmp_path, queries):
+        retriever = FakeRetriever(tmp_path, {})
+
+        with pytest.raises(ValueError, match="'missing' not found"):
+            run_retrieval_bench(["missing"], queries, retriever=retriever)
@@ -0,0 +1,112 @@
+"""
+Unit tests for server_embedding module.
+"""
+
+import socket
+from unittest.mock import Mock
+
+import numpy as np
+import pytest
+
+from llf.mock_llm_server import MockLLMServer, MockServerSettings
+from llf.server_embedding import EMBEDDINGS_PATH, LlamaServerEmbedder, resolve_server_url
+
+
+@pytest.fixture
+def server():
+    with MockLLMServer(MockServerSettings(embedding_dim=16)) as srv:
+        yield srv
+
+
+def _embedding_requests(server):
+    return server.stats()['endpoints'].get(EMBEDDINGS_PATH, {}).get('count', 0)
+
+
+class TestResolveServerUrl:
+    """Test finding the embedding server."""
+
+    def test_url(self):
+        assert resolve_server_url("http://127.0.0.1:8090/") == "http://127.0.0.1:8090"
+        assert resolve_server_url("http://127.0.0.1:8090/v1") == "http://127.0.0.1:8090"
+
+    def test_server_name(self):
+        config = Mock()
+        config.get_server_by_name.return_value = Mock(server_host="127.0.0.1", server_port=8090)
+
+        assert resolve_server_url("embeddings", config) == "http://127.0.0.1:8090"
+        config.get_server_by_name.assert_called_once_with("embeddings")
+
+    def test_unknown_server_name(self):
+        config = Mock()
+        config.get_server_by_name.return_value = None
+
+        with pytest.raises(ValueError, match="'missing' is not in local_llm_servers"):
+            resolve_server_url("missing", config)
+
+    def test_missing_server(self):
+        with pytest.raises(ValueError, match="needs an embedding_server"):
+            resolve_server_url("")
+
+
+class TestLlamaServerEmbedder:
+    """Test encoding on a local stub of llama-server."""
+
+    def test_batches_are_single_requests(self, server):
+        model = LlamaServerEmbedder(server.base_url, "mock-embed")
+        texts = [f"text number {i}" for i in range(10)]
+
+        embeddings = model.encode(texts, batch_size=4)
+
+        assert embeddings.shape == (10, 16)
+        assert embeddings.dtype == np.float32
+        assert _embedding_requests(server) == 3
+
+    def test_same_text_same_vector(self, server):
+        model = LlamaServerEmbedder(server.base_url)
+
+        first, second, other = model.encode(["rotate api keys", "Rotate API keys", "install the driver"])
+
+        np.testing.assert_allclose(first, second)
+        assert not np.allclose(first, other)
+
+    def test_normalize_embeddings(self, server):
+        model = LlamaServerEmbedder(server.base_url)
+
+        embeddings = model.encode(["rotate api keys", "install the driver"], normalize_embeddings=True)
+
+        np.testing.assert_allclose(np.linalg.norm(embeddings, axis=1), 1.0, rtol=1e-5)
+
+    def test_similar_texts_score_higher(self, server):
+        model = LlamaServerEmbedder(server.base_url)
+
+        query, related, unrelated = model.encode(["api key rotation", "rotate api keys often", "install driver"],
+                                                 normalize_embeddings=True)
+
+        assert float(query @ related) > float(query @ unrelated)
+
+    def test_single_text(self, server):
+        model = LlamaServerEmbedder(server.base_url)
+
+        assert model.encode("rotate api keys").shape == (16,)
+
+    def test_empty_input_sends_nothing(self, server):
+        model = LlamaServerEmbedder(server.base_url)
+
+        assert len(model.encode([])) == 0
+        assert _embedding_requests(server) == 0
+
+    def test_dimension_probed_once(self, server):
+        model = LlamaServerEmbedder(server.base_url)
+
+        assert model.get_sentence_embedding_dimension() == 16
+        assert model.get_sentence_embedding_dimension() == 16
+        assert _embedding_requests(server) == 1
+
+    def test_unreachable_server(self):
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        model = LlamaServerEmbedder(f"http://127.0.0.1:{port}", timeout=2)
+
+        with pytest.raises(RuntimeError, match="is llama-server running with --embedding"):
+            model.encode(["rotate api keys"])
@@ -0,0 +1,187 @@
+"""
+Unit tests for slot_affinity module.
+"""
+
+import gc
+import pytest
+from unittest.mock import patch
+
+from llf.config import Config
+from llf.llm_runtime import LLMRuntime
+from llf.mock_llm_server import MockLLMServer, MockServerSettings
+from llf.model_manager import ModelManager
+from llf.slot_affinity import SlotAffinity, get_slot_count
+
+
+class TestGetSlotCount:
+    """Test reading the slot count from server_params."""
+
+    def test_not_configured(self):
+        """Test missing parallel setting disables affinity."""
+        assert get_slot_count({}) == 0
+        assert get_slot_count(None) == 0
+
+    def test_parallel_keys(self):
+        """Test supported server_params keys."""
+        assert get_slot_count({'parallel': '4'}) == 4
+        assert get_slot_count({'np': 2}) == 2
+
+    def test_invalid_value(self):
+        """Test invalid values are ignored."""
+        assert get_slot_count({'parallel': 'many'}) == 0
+
+
+class TestSlotAffinity:
+    """Test slot assignment and statistics."""
+
+    def test_invalid_slot_count(self):
+        """Test at least one slot is required."""
+        with pytest.raises(ValueError):
+            SlotAffinity(0)
+
+    def test_session_keeps_slot(self):
+        """Test a returning session gets the same slot."""
+        affinity = SlotAffinity(2)
+        slot_a = affinity.acquire('a')
+        affinity.release(slot_a)
+        slot_b = affinity.acquire('b')
+        affinity.release(slot_b)
+
+        assert slot_a != slot_b
+        assert affinity.acquire('a') == slot_a
+
+    def test_busy_slot_falls_back(self):
+        """Test a session whose slot is in flight is not pinned."""
+        affinity = SlotAffinity(2)
+        slot = affinity.acquire('a')
+
+        assert affinity.acquire('a') is None
+        assert affinity.stats()['busy_fallbacks'] == 1
+
+        affinity.release(slot)
+        assert affinity.acquire('a') == slot
+
+    def test_lru_eviction(self):
+        """Test the least recently used session loses its slot when slots run out."""
+        affinity = SlotAffinity(2)
+        for session in ['a', 'b']:
+            affinity.release(affinity.acquire(session))
+        affinity.release(affinity.acquire('a'))  # 'b' is now least recently used
+
+        slot_c = affinity.acquire('c')
+        assert affinity.get_slot('b') is None
+        assert affinity.get_slot('c') == slot_c
+        assert affinity.get_slot('a') is not None
+        assert affinity.stats()['evictions'] == 1
+
+    def test_all_slots_busy_falls_back(self):
+        """Test a new session is not pinned to a slot that is in flight."""
+        affinity = SlotAffinity(2)
+        slot_a = affinity.acquire('a')
+        affinity.acquire('b')
+
+        assert affinity.acquire('c') is None
+        assert affinity.get_slot('a') == slot_a
+        assert affinity.get_slot('c') is None
+        assert affinity.stats()['busy_fallbacks'] == 1
+        assert affinity.stats()['evictions'] == 0
+
+        affinity.release(slot_a)
+        assert affinity.acquire('c') == slot_a
+        assert affinity.get_slot('a') is None
+
+    def test_forget(self):
+        """Test forgetting a session frees its slot."""
+        affinity = SlotAffinity(1)
+        affinity.release(affinity.acquire('a'))
+        affinity.forget('a')
+        assert affinity.get_slot('a') is None
+
+    def test_cache_hit_rate(self):
+        """Test hit rate from llama-server timings."""
+        affinity = SlotAffinity(1)
+        affinity.record_timings({'cache_n': 30, 'prompt_n': 10})
+        affinity.record_timings(None)
+        affinity.record_timings({'cache_n': 'bad'})
+
+        stats = affinity.stats()
+        assert stats['cached_prompt_tokens'] == 30
+        assert stats['evaluated_prompt_tokens'] == 10
+        assert stats['cache_hit_rate'] == 0.75
+
+
+class TestRuntimeSlotAffinity:
+    """Test LLMRuntime pins sessions to slots against the mock server."""
+
+    @pytest.fixture
+    def server(self):
+        with MockLLMServer(MockServerSettings(response_tokens=4, slots=2)) as srv:
+            yield srv
+
+    @pytest.fixture
+    def runtime(self, server, tmp_path):
+        config = Config()
+        config.model_dir = tmp_path / "models"
+        config.cache_dir = tmp_path / ".cache"
+        config.api_base_url = server.api_base_url
+        config.default_local_server = None
+        config.server_params = {'parallel': 2}
+        runtime = LLMRuntime(config, ModelManager(config))
+        with patch.object(runtime, 'is_server_running', return_value=True):
+            yield runtime
+
+    def _converse(self, runtime, session_id, turns):
+        messages = []
+        for turn in range(turns):
+            messages.append({'role': 'user', 'content': f"Question {turn} from {session_id}"})
+            reply = runtime.chat(messages, use_prompt_config=False, session_id=session_id)
+            messages.append({'role': 'assistant', 'content': reply})
+
+    def test_interleaved_sessions_reuse_prefix(self, runtime):
+        """Test interleaved conversations keep hitting their own slot's cache."""
+        for _ in range(3):
+            self._converse(runtime, 'alice', 1)
+            self._converse(runtime, 'bob', 1)
+        self._converse(runtime, 'alice', 3)
+
+        stats = runtime.get_slot_stats()
+        assert stats['num_slots'] == 2
+        assert stats['sessions'] == 2
+        assert stats['cache_hit_rate'] > 0.5
+
+    def test_streaming_records_timings(self, runtime):
+        """Test streaming responses release the slot and record timings."""
+        messages = [{'role': 'user', 'content': 'Hello'}]
+        for _ in range(2):
+            "".join(runtime.chat(messages, stream=True, use_prompt_config=False, session_id='s'))
+
+        stats = runtime.get_slot_stats()
+        assert stats['cached_prompt_tokens'] > 0
+        assert runtime.slot_affinity.acquire('s') is not None  # Released after streaming
+
+    def test_dropped_stream_releases_slot(self, runtime):
+        """Test a stream discarded before it is consumed releases its slot."""
+        stream = runtime.chat([{'role': 'user', 'content': 'Hello'}], stream=True,
+                              use_prompt_config=False, session_id='s')
+        assert runtime.slot_affinity._in_flight
+
+        del stream
+        gc.collect()
+
+        assert runtime.slot_affinity._in_flight == {}
+
+    def test_partly_consumed_stream_releases_slot(self, runtime):
+        """Test a stream closed after its first chunk releases its slot once."""
+        stream = runtime.chat([{'role': 'user', 'content': 'Hello'}], stream=True,
+                              use_prompt_config=False, session_id='s')
+        next(stream)
+        stream.close()
+        del stream
+        gc.collect()
+
+        assert runtime.slot_affinity._in_flight == {}
+
+    def test_no_session_no_pinning(self, runtime):
+        """Test requests without a session id are not tracked."""
+        runtime.chat([{'role': 'user', 'content': 'Hello'}], use_prompt_config=False)
+        assert runtime.get_slot_stats() is None
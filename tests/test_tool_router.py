@@ -0,0 +1,221 @@
+"""
+Unit tests for tool_router module.
+"""
+
+import pytest
+from unittest.mock import MagicMock, Mock
+
+from llf.config import Config
+from llf.llm_runtime import LLMRuntime
+from llf.memory_tools import MEMORY_TOOLS
+from llf.model_manager import ModelManager
+from llf.tool_router import ToolRouter, admits_missing_capability, estimate_tool_tokens, tool_name
+
+
+def _tool(name, description="", properties=None):
+    return {
+        "type": "function",
+        "function": {
+            "name": name,
+            "description": description,
+            "parameters": {"type": "object", "properties": properties or {}, "required": []},
+        },
+    }
+
+
+WEB_TOOLS = [
+    _tool("fetch_webpage", "Fetch and read the content of any web page from a URL."),
+    _tool("search_internet_duckduckgo", "Search the internet using DuckDuckGo."),
+    _tool("command_exec", "Execute shell commands with whitelist validation."),
+    _tool("file_access", "Read or write files with whitelist validation."),
+]
+ALL_TOOLS = MEMORY_TOOLS + WEB_TOOLS
+
+
+def _names(tools):
+    return sorted(tool_name(t) for t in tools or [])
+
+
+def _user(text):
+    return [{'role': 'user', 'content': text}]
+
+
+class TestToolRouter:
+    """Test tool selection rules."""
+
+    @pytest.fixture
+    def router(self):
+        return ToolRouter()
+
+    def test_general_message_gets_no_tools(self, router):
+        assert router.select(_user("Tell me a joke"), ALL_TOOLS) is None
+
+    def test_memory_read(self, router):
+        selected = _names(router.select(_user("What's my favorite color?"), ALL_TOOLS))
+        assert 'search_memories' in selected
+        assert 'add_memory' not in selected
+
+    def test_memory_write(self, router):
+        selected = _names(router.select(_user("I prefer tea over coffee"), ALL_TOOLS))
+        assert 'add_memory' in selected
+        assert 'fetch_webpage' not in selected
+
+    def test_url_selects_fetcher(self, router):
+        selected = _names(router.select(_user("Summarize https://example.com/post"), ALL_TOOLS))
+        assert 'fetch_webpage' in selected
+
+    def test_web_search(self, router):
+        selected = _names(router.select(_user("What is the latest news on Mars missions?"), ALL_TOOLS))
+        assert 'search_internet_duckduckgo' in selected
+        assert 'command_exec' not in selected
+
+    def test_files_and_commands(self, router):
+        assert 'file_access' in _names(router.select(_user("Open notes.txt for me"), ALL_TOOLS))
+        assert 'command_exec' in _names(router.select(_user("Run df to check disk space"), ALL_TOOLS))
+
+    def test_unknown_tool_matches_description(self, router):
+        tools = [_tool("get_stock_quote", "Get a stock quote for a ticker symbol")]
+        assert _names(router.select(_user("What is the ticker for Apple?"), tools)) == ['get_stock_quote']
+        assert router.select(_user("Write a haiku"), tools) is None
+
+    def test_knowledge_base_tool_skipped_for_small_talk(self, router):
+        tools = [_tool("search_knowledge_base", "Search the attached knowledge bases.")]
+        assert _names(router.select(_user("How do I rotate the API keys?"), tools)) == ['search_knowledge_base']
+        assert router.select(_user("Thanks, great!"), tools) is None
+
+    def test_follow_up_keeps_previous_tools(self, router):
+        messages = _user("Search the web for flights to Rome") + [
+            {'role': 'assistant', 'content': 'Here are some flights.'},
+            {'role': 'user', 'content': 'And to Paris?'},
+        ]
+        assert 'search_internet_duckduckgo' in _names(router.select(messages, ALL_TOOLS))
+
+    def test_no_tools(self, router):
+        assert router.select(_user("Hello"), None) is None
+        assert router.select(_user("Hello"), []) == []
+
+    def test_stats(self, router):
+        router.select(_user("Tell me a joke"), ALL_TOOLS)
+        router.select(_user("Summarize https://example.com"), ALL_TOOLS)
+        router.record_miss(['add_memory'])
+        router.record_unoffered_call('add_memory')
+
+        stats = router.stats()
+        assert stats['requests'] == 2
+        assert stats['tools_available'] == 2 * len(ALL_TOOLS)
+        assert 0 < stats['tools_offered'] < len(ALL_TOOLS)
+        assert stats['tokens_saved'] > estimate_tool_tokens(ALL_TOOLS)
+        assert stats['misses'] == 1
+        assert stats['unoffered_calls_by_tool'] == {'add_memory': 1}
+
+    @pytest.mark.parametrize("reply, expected", [
+        ("I don't have access to your files or system.", True),
+        ("I'm sorry, but I cannot run commands on your machine.", True),
+        ("As an AI, I do not have the ability to remember that.", True),
+        ("I am unable to check which version is installed.", True),
+        ("Python 3.12 is the latest release.", False),
+        ("I cannot stress this enough: use a virtualenv.", False),
+        ("", False),
+        (None, False),
+    ])
+    def test_admits_missing_capability(self, reply, expected):
+        assert admits_missing_capability(reply) is expected
+
+
+class TestRuntimeToolRouting:
+    """Test LLMRuntime sends routed tools and records misses."""
+
+    @pytest.fixture
+    def runtime(self):
+        config = Config()
+        config.default_local_server = None
+        config.tool_routing = True
+        prompt_config = Mock()
+        prompt_config.build_messages.side_effect = lambda user_message, conversation_history=None, deadline=None, context_tokens=None, retrieval_tool=False, rag_filters=None: [
+            {'role': 'user', 'content': user_message}]
+        prompt_config.get_all_tools.return_value = ALL_TOOLS
+        prompt_config.get_memory_manager.return_value = Mock()
+        runtime = LLMRuntime(config, ModelManager(config), prompt_config)
+        runtime.is_server_running = Mock(return_value=True)
+        runtime.client = MagicMock()
+        return runtime
+
+    def _reply(self, content=None, tool_calls=None):
+        response = MagicMock()
+        response.choices[0].message.content = content
+        response.choices[0].message.tool_calls = tool_calls
+        return response
+
+    def test_general_message_sends_no_tools(self, runtime):
+        runtime.client.chat.completions.create.return_value = self._reply("Why did the chicken...")
+        runtime.chat(_user("Tell me a joke"))
+
+        params = runtime.client.chat.completions.create.call_args[1]
+        assert 'tools' not in params
+
+    def test_routing_disabled(self, runtime):
+        runtime.config.tool_routing = False
+        runtime.client.chat.completions.create.return_value = self._reply("Why did the chicken...")
+        runtime.chat(_user("Tell me a joke"))
+
+        params = runtime.client.chat.completions.create.call_args[1]
+        assert len(params['tools']) == len(ALL_TOOLS)
+
+    def test_routing_is_opt_in(self):
+        assert Config().tool_routing is False
+
+    @pytest.mark.parametrize("message, dropped", [
+        ("I live in Berlin now", 'add_memory'),
+        ("Which python version is installed?", 'command_exec'),
+    ])
+    def test_miss_reoffers_all_tools(self, runtime, message, dropped):
+        tool_call = MagicMock()
+        tool_call.id = 'call_1'
+        tool_call.type = 'function'
+        tool_call.function.name = dropped
+        tool_call.function.arguments = '{}'
+        runtime.client.chat.completions.create.side_effect = [
+            self._reply("Sorry, I don't have access to that."),
+            self._reply(None, [tool_call]),
+            self._reply("Done"),
+        ]
+        runtime._execute_tool = Mock(return_value={'success': True})
+
+        assert runtime.chat(_user(message)) == "Done"
+
+        calls = runtime.client.chat.completions.create.call_args_list
+        assert dropped not in _names(calls[0][1].get('tools'))
+        assert len(calls[1][1]['tools']) == len(ALL_TOOLS)
+        stats = runtime.tool_router.stats()
+        assert stats['misses'] == 1
+        assert stats['unoffered_calls_by_tool'] == {dropped: 1}
+
+    def test_miss_reoffers_only_once(self, runtime):
+        runtime.client.chat.completions.create.return_value = self._reply("I can't access your files.")
+
+        assert runtime.chat(_user("I live in Berlin now")) == "I can't access your files."
+        assert runtime.client.chat.completions.create.call_count == 2
+        assert runtime.tool_router.stats()['misses'] == 1
+
+    def test_plain_answer_is_not_a_miss(self, runtime):
+        runtime.client.chat.completions.create.return_value = self._reply("Why did the chicken...")
+
+        runtime.chat(_user("Tell me a joke"))
+
+        assert runtime.client.chat.completions.create.call_count == 1
+        assert runtime.tool_router.stats()['misses'] == 0
+
+    def test_unoffered_call_recorded(self, runtime):
+        tool_call = MagicMock()
+        tool_call.id = 'call_1'
+        tool_call.type = 'function'
+        tool_call.function.name = 'search_memories'
+        tool_call.function.arguments = '{}'
+        runtime.client.chat.completions.create.side_effect = [
+            self._reply(None, [tool_call]),
+            self._reply("Done"),
+        ]
+        runtime._execute_tool = Mock(return_value={'success': True})
+
+        assert runtime.chat(_user("Tell me a joke")) == "Done"
+        assert runtime.tool_router.stats()['unoffered_calls_by_tool'] == {'search_memories': 1}
@@ -0,0 +1,419 @@
+"""
+Unit tests for vector_index module.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from llf import vector_index
+from llf.vector_index import (
+    EXACT_FILTER_LIMIT, INDEX_TYPES, SHARDS_FILENAME, VECTORS_FILENAME, IdFilter, RescoredBinaryIndex,
+    ShardedIndex, add_with_ids, base_index, build_index, build_sharded_index, default_nlist, default_pq_m,
+    ensure_id_map, filtered_search, format_recall_report, format_storage_report, index_files, index_memory_bytes,
+    recall_report, remove_ids, select_training_sample, set_search_params, storage_report, write_index
+)
+
+
+@pytest.fixture
+def embeddings():
+    """Normalized vectors grouped around 20 topics, like real document embeddings."""
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(20, 32))
+    vectors = centers[rng.integers(0, 20, size=4000)] + 0.3 * rng.normal(size=(4000, 32))
+    vectors = vectors.astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+class TestDefaults:
+    """Test parameter defaults."""
+
+    def test_default_nlist(self):
+        assert default_nlist(10000) == 256  # 4 * sqrt(n) and 39 points per cluster
+        assert default_nlist(1000) == 25    # Capped so every cluster can be trained
+        assert default_nlist(10) == 1
+
+    def test_default_pq_m(self):
+        assert default_pq_m(384) == 48
+        assert default_pq_m(768) == 96
+        assert 30 % default_pq_m(30) == 0
+
+    def test_training_sample(self, embeddings):
+        sample = select_training_sample(embeddings, 100)
+        assert sample.shape == (100, 32)
+        np.testing.assert_array_equal(sample, select_training_sample(embeddings, 100))  # Reproducible
+        assert select_training_sample(embeddings, None) is embeddings
+
+
+class TestBuildIndex:
+    """Test index construction."""
+
+    @pytest.mark.parametrize("index_type", INDEX_TYPES)
+    def test_build_all_types(self, real_faiss, embeddings, index_type):
+        index, params = build_index(embeddings, index_type, pq_bits=6)
+        assert index.ntotal == len(embeddings)
+        assert type(real_faiss.downcast_index(index)).__name__ == index_type
+
+        # PQ scores are approximate, so only require the vector near the top
+        _, ids = index.search(embeddings[:1], 10)
+        assert 0 in ids[0]
+
+    def test_ivf_params(self, real_faiss, embeddings):
+        _, params = build_index(embeddings, 'IndexIVFFlat', nlist=16, train_size=800)
+        assert params == {'nlist': 16, 'train_size': 800, 'nprobe': 8}
+
+    def test_hnsw_params(self, real_faiss, embeddings):
+        _, params = build_index(embeddings, 'IndexHNSWFlat', hnsw_m=16)
+        assert params['M'] == 16
+        assert params['efSearch'] == 64
+
+    def test_invalid_type(self, real_faiss, embeddings):
+        with pytest.raises(ValueError, match="Unknown index type"):
+            build_index(embeddings, 'IndexLSH')
+
+    def test_pq_m_must_divide_dimension(self, real_faiss, embeddings):
+        with pytest.raises(ValueError, match="must divide"):
+            build_index(embeddings, 'IndexIVFPQ', pq_m=5)
+
+    def test_pq_needs_enough_vectors(self, real_faiss, embeddings):
+        with pytest.raises(ValueError, match="needs at least"):
+            build_index(embeddings[:100], 'IndexIVFPQ')
+
+    def test_training_sample_too_small(self, real_faiss, embeddings):
+        with pytest.raises(ValueError, match="smaller than"):
+            build_index(embeddings, 'IndexIVFFlat', nlist=64, train_size=10)
+
+
+class TestSearchParams:
+    """Test query-time knobs."""
+
+    def test_nprobe(self, real_faiss, embeddings):
+        index, _ = build_index(embeddings, 'IndexIVFFlat', nlist=16)
+        assert set_search_params(index, nprobe=4, ef_search=100) == {'nprobe': 4}
+        assert real_faiss.extract_index_ivf(index).nprobe == 4
+
+    def test_ef_search(self, real_faiss, embeddings):
+        index, _ = build_index(embeddings, 'IndexHNSWFlat')
+        assert set_search_params(index, nprobe=4, ef_search=100) == {'efSearch': 100}
+        assert index.hnsw.efSearch == 100
+
+    def test_flat_ignores_knobs(self, real_faiss, embeddings):
+        index, _ = build_index(embeddings)
+        assert set_search_params(index, nprobe=4, ef_search=100) == {}
+
+    def test_applies_after_reload(self, real_faiss, embeddings, tmp_path):
+        """Test knobs apply to a memory-mapped index read back from disk."""
+        index, _ = build_index(embeddings, 'IndexIVFFlat', nlist=16)
+        real_faiss.write_index(index, str(tmp_path / "index.faiss"))
+        flags = getattr(real_faiss, 'IO_FLAG_MMAP_IFC', None) or real_faiss.IO_FLAG_MMAP
+        loaded = real_faiss.read_index(str(tmp_path / "index.faiss"), flags | real_faiss.IO_FLAG_READ_ONLY)
+
+        assert set_search_params(loaded, nprobe=16) == {'nprobe': 16}
+
+
+class TestRecallReport:
+    """Test recall@k vs latency report."""
+
+    def test_exact_index_has_full_recall(self, real_faiss, embeddings):
+        index, _ = build_index(embeddings)
+        report = recall_report(index, embeddings, k=5, num_queries=50)
+        assert report['knob'] is None
+        assert report['rows'][0]['recall'] == 1.0
+
+    def test_ivf_sweep(self, real_faiss, embeddings):
+        index, _ = build_index(embeddings, 'IndexIVFFlat', nlist=16)
+        report = recall_report(index, embeddings, k=5, num_queries=50)
+
+        assert report['index_type'] == 'IndexIVFFlat'
+        assert [row['nprobe'] for row in report['rows']] == [1, 2, 4, 8, 16]
+        recalls = [row['recall'] for row in report['rows']]
+        assert recalls[-1] == 1.0  # Visiting every cluster is exact
+        assert recalls == sorted(recalls)
+        assert real_faiss.extract_index_ivf(index).nprobe == 8  # Restored
+
+    def test_hnsw_sweep(self, real_faiss, embeddings):
+        index, _ = build_index(embeddings, 'IndexHNSWFlat')
+        report = recall_report(index, embeddings, k=5, num_queries=50)
+        assert report['knob'] == 'efSearch'
+        assert report['rows'][-1]['recall'] > 0.9
+
+    def test_format(self, real_faiss, embeddings):
+        index, _ = build_index(embeddings, 'IndexIVFFlat', nlist=16)
+        text = format_recall_report(recall_report(index, embeddings, k=5, num_queries=20))
+        assert "Recall@5" in text
+        assert "nprobe" in text
+
+
+class TestIdMappedIndexes:
+    """Test id-addressable indexes used by incremental updates."""
+
+    @pytest.mark.parametrize("index_type", INDEX_TYPES)
+    def test_build_with_ids(self, real_faiss, embeddings, index_type):
+        ids = np.arange(len(embeddings), dtype=np.int64) + 1000
+        index, _ = build_index(embeddings, index_type, ids=ids, pq_bits=6)
+        assert type(base_index(index)).__name__ == index_type
+
+        _, found = index.search(embeddings[:1], 10)
+        assert 1000 in found[0]
+
+    @pytest.mark.parametrize("index_type", ['IndexFlatIP', 'IndexHNSWFlat', 'IndexIVFFlat'])
+    def test_remove_and_add(self, real_faiss, embeddings, index_type):
+        index, _ = build_index(embeddings[:3000], index_type, ids=np.arange(3000))
+        index = remove_ids(index, np.arange(0, 100))
+        add_with_ids(index, embeddings[3000:3100], np.arange(5000, 5100))
+
+        assert index.ntotal == 3000
+        set_search_params(index, nprobe=64)
+        _, found = index.search(embeddings[[0, 3000]], 1)
+        assert found[0][0] != 0           # Removed
+        assert found[1][0] == 5000        # Added under its id
+
+    def test_hnsw_rebuild_keeps_settings(self, real_faiss, embeddings):
+        index, _ = build_index(embeddings[:500], 'IndexHNSWFlat', hnsw_m=8, ids=np.arange(500))
+        rebuilt = remove_ids(index, np.array([1, 2]))
+        assert rebuilt.ntotal == 498
+        assert base_index(rebuilt).hnsw.nb_neighbors(1) == 8
+
+    @pytest.mark.parametrize("index_type", ['IndexFlatIP', 'IndexHNSWFlat'])
+    def test_ensure_id_map_converts_positional_index(self, real_faiss, embeddings, index_type):
+        """Test stores built without ids keep position == id after conversion."""
+        index, _ = build_index(embeddings[:500], index_type)
+        converted = ensure_id_map(index)
+
+        assert isinstance(converted, real_faiss.IndexIDMap2)
+        _, found = converted.search(embeddings[7:8], 1)
+        assert found[0][0] == 7
+
+    def test_ensure_id_map_keeps_ivf(self, real_faiss, embeddings):
+        index, _ = build_index(embeddings, 'IndexIVFFlat', nlist=16)
+        assert ensure_id_map(index) is index
+
+
+class TestFilteredSearch:
+    """Test searches restricted to an id filter."""
+
+    @staticmethod
+    def _mask(size, ids):
+        mask = np.zeros(size, dtype=bool)
+        mask[ids] = True
+        return mask
+
+    @pytest.mark.parametrize("index_type", ['IndexFlatIP', 'IndexHNSWFlat', 'IndexIVFFlat'])
+    @pytest.mark.parametrize("eligible", [50, EXACT_FILTER_LIMIT + 1])
+    def test_only_eligible_ids_returned(self, real_faiss, index_type, eligible):
+        rng = np.random.default_rng(1)
+        vectors = rng.normal(size=(2 * EXACT_FILTER_LIMIT, 32)).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        index, _ = build_index(vectors, index_type, ids=np.arange(len(vectors)), nlist=16)
+        allowed_ids = np.sort(rng.choice(len(vectors), eligible, replace=False))
+        id_filter = IdFilter(self._mask(len(vectors), allowed_ids))
+
+        _, found = filtered_search(index, vectors[allowed_ids[:3]], 10, id_filter)
+
+        assert set(found.ravel().tolist()) <= set(allowed_ids.tolist())
+        assert found[:, 0].tolist() == allowed_ids[:3].tolist()
+
+    def test_small_filter_is_exact(self, real_faiss, embeddings):
+        index, _ = build_index(embeddings, 'IndexFlatIP', ids=np.arange(len(embeddings)))
+        allowed_ids = np.arange(100, 400)
+        id_filter = IdFilter(self._mask(len(embeddings), allowed_ids))
+
+        scores, found = filtered_search(index, embeddings[:5], 10, id_filter)
+
+        expected = embeddings[:5] @ embeddings[allowed_ids].T
+        np.testing.assert_array_equal(found, allowed_ids[np.argsort(-expected, axis=1, kind='stable')[:, :10]])
+        np.testing.assert_allclose(scores, -np.sort(-expected, axis=1)[:, :10], rtol=1e-5)
+
+    def test_fewer_eligible_than_k(self, real_faiss, embeddings):
+        index, _ = build_index(embeddings, 'IndexFlatIP', ids=np.arange(len(embeddings)))
+
+        _, found = filtered_search(index, embeddings[:1], 5, IdFilter(self._mask(len(embeddings), [3, 9])))
+        assert sorted(found[0][:2].tolist()) == [3, 9]
+        assert found[0][2:].tolist() == [-1, -1, -1]
+
+        _, found = filtered_search(index, embeddings[:1], 5, IdFilter(np.zeros(len(embeddings), dtype=bool)))
+        assert found[0].tolist() == [-1] * 5
+
+    def test_selective_filter_widens_search(self, real_faiss, embeddings):
+        index, _ = build_index(embeddings, 'IndexIVFFlat', nlist=32)
+        set_search_params(index, nprobe=2)
+        params = IdFilter(self._mask(len(embeddings), np.arange(400))).search_params(index)
+        assert params.nprobe == 20
+
+        index, _ = build_index(embeddings, 'IndexHNSWFlat')
+        set_search_params(index, ef_search=32)
+        params = IdFilter(self._mask(len(embeddings), np.arange(2000))).search_params(index)
+        assert params.efSearch == 64
+
+
+class TestCompactStorage:
+    """Test float16 and binary vector storage."""
+
+    @pytest.mark.parametrize("index_type", ['IndexFlatIP', 'IndexHNSWFlat', 'IndexIVFFlat'])
+    def test_float16_halves_vector_memory(self, real_faiss, embeddings, index_type):
+        index, _ = build_index(embeddings, index_type, ids=np.arange(len(embeddings)), storage='float16')
+        full, _ = build_index(embeddings, index_type, ids=np.arange(len(embeddings)))
+
+        report = storage_report(index, embeddings, 'float16')
+        assert report['saved'] > (0.45 if index_type != 'IndexHNSWFlat' else 0.1)  # HNSW graph is not compressed
+        assert abs(report['float32_bytes'] - index_memory_bytes(full)) < 100  # Quantizer header only
+        assert report['recall'] >= storage_report(full, embeddings, 'float32')['recall'] - 0.01
+
+    def test_float16_hnsw_rebuild_keeps_storage(self, real_faiss, embeddings):
+        index, _ = build_index(embeddings, 'IndexHNSWFlat', ids=np.arange(len(embeddings)), storage='float16')
+        index = remove_ids(index, np.arange(10))
+        assert isinstance(base_index(index), real_faiss.IndexHNSWSQ)
+        assert index.ntotal == len(embeddings) - 10
+
+    def test_invalid_storage(self, real_faiss, embeddings):
+        with pytest.raises(ValueError, match="Unknown storage"):
+            build_index(embeddings, storage='int4')
+        with pytest.raises(ValueError, match="already compresses"):
+            build_index(embeddings, 'IndexIVFPQ', storage='float16')
+        with pytest.raises(ValueError, match="IndexFlatIP"):
+            build_index(embeddings, 'IndexHNSWFlat', storage='binary')
+        with pytest.raises(ValueError, match="divisible by 8"):
+            build_index(embeddings[:, :30], storage='binary')
+
+    def test_binary_rescoring(self, real_faiss, embeddings):
+        index, params = build_index(embeddings, storage='binary')
+        assert isinstance(index, RescoredBinaryIndex)
+        assert params == {'rescore_factor': 8}
+
+        # Rescored scores are exact inner products (to float16 precision)
+        scores, ids = index.search(embeddings[:5], 5)
+        expected = np.einsum('ij,ij->i', np.repeat(embeddings[:5], 5, axis=0), embeddings[ids.ravel()])
+        np.testing.assert_allclose(scores.ravel(), expected, atol=1e-3)
+        assert ids[:, 0].tolist() == [0, 1, 2, 3, 4]
+        assert (np.diff(scores, axis=1) <= 0).all()
+
+        report = storage_report(index, embeddings, 'binary')
+        assert report['saved'] > 0.9
+        assert report['recall'] > 0.5  # 32 bits per vector here; grows with rescore_factor
+        assert 'binary storage' in format_storage_report(report)
+
+    def test_binary_rescore_factor(self, real_faiss, embeddings):
+        index, _ = build_index(embeddings, storage='binary')
+        assert set_search_params(index, nprobe=4, rescore_factor=1) == {'rescore_factor': 1}
+        low = storage_report(index, embeddings, 'binary')['recall']
+        set_search_params(index, rescore_factor=32)
+        assert storage_report(index, embeddings, 'binary')['recall'] > low
+
+        report = recall_report(index, embeddings, num_queries=20)
+        assert report['knob'] == 'rescore_factor'
+        assert index.rescore_factor == 32  # Restored
+
+    def test_binary_add_remove_and_filter(self, real_faiss, embeddings):
+        index, _ = build_index(embeddings[:100], storage='binary')
+        assert remove_ids(index, np.array([0, 1])) is index
+        add_with_ids(index, embeddings[100:102], np.array([100, 101]))
+        with pytest.raises(ValueError, match="next row ids"):
+            add_with_ids(index, embeddings[102:103], np.array([5]))
+
+        _, ids = index.search(embeddings[[0, 100]], 3)
+        assert 0 not in ids[0]
+        assert ids[1][0] == 100
+        np.testing.assert_allclose(index.reconstruct_batch(np.array([100])), embeddings[100:101], atol=1e-3)
+
+        mask = np.zeros(102, dtype=bool)
+        mask[50:60] = True
+        _, ids = filtered_search(index, embeddings[50:51], 5, IdFilter(mask))
+        assert ids[0][0] == 50
+        assert set(ids[0].tolist()) <= set(range(50, 60))
+
+    def test_binary_save_and_load(self, real_faiss, embeddings, tmp_path):
+        index, _ = build_index(embeddings, storage='binary')
+        write_index(index, tmp_path / "index.faiss")
+        assert (tmp_path / VECTORS_FILENAME).exists()
+
+        for mmap in (False, True):
+            loaded = RescoredBinaryIndex.load(tmp_path / "index.faiss", mmap=mmap)
+            assert loaded.ntotal == len(embeddings)
+            np.testing.assert_array_equal(loaded.search(embeddings[:5], 5)[1], index.search(embeddings[:5], 5)[1])
+
+
+class TestShardedIndex:
+    """Test stores split across shard indexes."""
+
+    def test_flat_shards_match_single_index(self, real_faiss, embeddings):
+        sharded, _ = build_sharded_index(embeddings, 4)
+        single, _ = build_index(embeddings, ids=np.arange(len(embeddings)))
+
+        assert [shard.ntotal for shard in sharded.shards] == [1000] * 4
+        scores, ids = sharded.search(embeddings[:10], 5)
+        expected_scores, expected_ids = single.search(embeddings[:10], 5)
+        np.testing.assert_array_equal(ids, expected_ids)
+        np.testing.assert_allclose(scores, expected_scores, rtol=1e-5)
+
+    @pytest.mark.parametrize("index_type", ['IndexHNSWFlat', 'IndexIVFFlat'])
+    def test_approximate_shards(self, real_faiss, embeddings, index_type):
+        index, params = build_sharded_index(embeddings, 3, index_type=index_type, storage='float16')
+        assert type(base_index(index)).__name__ in ('IndexHNSWSQ', 'IndexIVFScalarQuantizer')
+
+        assert set_search_params(index, nprobe=4, ef_search=32)
+        report = recall_report(index, embeddings, num_queries=50)
+        assert report['knob'] in ('nprobe', 'efSearch')
+        assert report['rows'][-1]['recall'] > 0.9
+
+    def test_invalid_shards(self, real_faiss, embeddings):
+        with pytest.raises(ValueError, match="cannot be sharded"):
+            build_sharded_index(embeddings, 2, storage='binary')
+        with pytest.raises(ValueError, match="Shard count"):
+            build_sharded_index(embeddings[:3], 4)
+
+    @pytest.mark.parametrize("eligible", [50, EXACT_FILTER_LIMIT + 1])
+    def test_filtered_search(self, real_faiss, eligible):
+        rng = np.random.default_rng(2)
+        vectors = rng.normal(size=(2 * EXACT_FILTER_LIMIT, 32)).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        index, _ = build_sharded_index(vectors, 4, index_type='IndexHNSWFlat')
+        allowed = np.zeros(len(vectors), dtype=bool)
+        allowed[rng.choice(len(vectors), eligible, replace=False)] = True
+        query_ids = np.flatnonzero(allowed)[:3]
+
+        _, found = filtered_search(index, vectors[query_ids], 10, IdFilter(allowed))
+
+        assert allowed[found.ravel()].all()
+        assert found[:, 0].tolist() == query_ids.tolist()
+
+    def test_add_and_remove_route_to_shards(self, real_faiss, embeddings):
+        index, _ = build_sharded_index(embeddings[:1000], 4)
+        assert remove_ids(index, np.array([0, 1, 2, 7])) is index
+        add_with_ids(index, embeddings[1000:1002], np.array([1000, 1001]))
+
+        assert [shard.ntotal for shard in index.shards] == [250, 250, 249, 249]
+        _, ids = index.search(embeddings[[0, 1001]], 1)
+        assert ids[0][0] != 0
+        assert ids[1][0] == 1001
+        np.testing.assert_allclose(index.reconstruct_batch(np.array([1001, 5])), embeddings[[1001, 5]])
+
+    def test_save_and_load(self, real_faiss, embeddings, tmp_path):
+        index, _ = build_sharded_index(embeddings, 3)
+        write_index(index, tmp_path / "index.faiss", suffix='.tmp')
+        paths = index_files(index, tmp_path / "index.faiss")
+        assert [path.name for path in paths] == ['index.000.faiss', 'index.001.faiss', 'index.002.faiss',
+                                                 SHARDS_FILENAME]
+        assert all(path.with_name(path.name + '.tmp').exists() for path in paths)
+
+        write_index(index, tmp_path / "index.faiss")
+        assert not (tmp_path / "index.faiss").exists()
+        loaded = ShardedIndex.load(tmp_path / "index.faiss")
+        assert loaded.ntotal == len(embeddings)
+        assert index_memory_bytes(loaded) == index_memory_bytes(index)
+        np.testing.assert_array_equal(loaded.search(embeddings[:5], 5)[1], index.search(embeddings[:5], 5)[1])
+
+    def test_shard_executor_created_once(self, monkeypatch):
+        monkeypatch.setattr(vector_index, '_shard_executor', None)
+        barrier = threading.Barrier(8)
+
+        def get_executor():
+            barrier.wait()
+            return vector_index._get_shard_executor()
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            executors = list(pool.map(lambda _: get_executor(), range(8)))
+
+        assert all(executor is executors[0] for executor in executors)
+        executors[0].shutdown()
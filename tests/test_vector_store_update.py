@@ -0,0 +1,283 @@
+"""
+Unit tests for vector_store_update module.
+"""
+
+import hashlib
+import json
+
+import numpy as np
+import pytest
+
+from llf.chunk_adjacency import ADJACENCY_FILENAME, ChunkAdjacency, write_adjacency
+from llf.lexical_index import BM25_FILENAME, BM25Index
+from llf.metadata_filter import FILTERS_FILENAME, MetadataFilterIndex, write_filter_index
+from llf.metadata_store import MetadataIndex, write_offsets
+from llf.vector_index import RescoredBinaryIndex, ShardedIndex, build_index, build_sharded_index, write_index
+from llf.vector_store_update import (
+    MANIFEST_FILENAME, build_manifest, group_records_by_source, hash_source,
+    load_manifest, plan_update, update_vector_store
+)
+
+
+DIMENSION = 16
+
+
+def embed_texts(texts):
+    """Deterministic fake embedder: one normalized vector per text."""
+    vectors = np.array([
+        np.random.default_rng(int(hashlib.md5(t.encode()).hexdigest()[:8], 16)).normal(size=DIMENSION)
+        for t in texts
+    ], dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def chunk_records(records):
+    """One chunk per record, like Create_VectorStore.prepare_chunks without --chunk-size."""
+    return [r['text'] for r in records], [dict(r) for r in records]
+
+
+def _records(source, *texts):
+    return [{'text': text, '_source_jsonl': source} for text in texts]
+
+
+@pytest.fixture
+def store(tmp_path, real_faiss):
+    """Create a store from two sources, as Create_VectorStore.py does."""
+    records = _records('a.jsonl', 'alpha one', 'alpha two') + _records('b.jsonl', 'beta one')
+    texts, metadata = chunk_records(records)
+    index, params = build_index(embed_texts(texts), ids=np.arange(len(texts)))
+
+    real_faiss.write_index(index, str(tmp_path / 'index.faiss'))
+    with open(tmp_path / 'metadata.jsonl', 'w') as f:
+        for meta in metadata:
+            f.write(json.dumps(meta) + '\n')
+    write_offsets(tmp_path / 'metadata.jsonl')
+    config = {'embedding_model': 'fake', 'index_type': 'IndexFlatIP', 'index_params': params,
+              'num_vectors': index.ntotal, 'metadata_records': len(metadata)}
+    (tmp_path / 'config.json').write_text(json.dumps(config))
+    (tmp_path / MANIFEST_FILENAME).write_text(json.dumps(build_manifest(records, metadata, {})))
+    return tmp_path, records
+
+
+def _search(real_faiss, store_dir, text):
+    """Return the metadata text of the top hit for text."""
+    index = real_faiss.read_index(str(store_dir / 'index.faiss'))
+    _, ids = index.search(embed_texts([text]), 1)
+    return MetadataIndex(store_dir / 'metadata.jsonl')[ids[0][0]]['text']
+
+
+class TestPlan:
+    """Test update planning."""
+
+    def test_hash_is_content_based(self):
+        assert hash_source(_records('a', 'x')) == hash_source(_records('a', 'x'))
+        assert hash_source(_records('a', 'x')) != hash_source(_records('a', 'y'))
+
+    def test_plan(self):
+        records = _records('a', 'x') + _records('b', 'y')
+        manifest = build_manifest(records, chunk_records(records)[1], {})
+
+        current = group_records_by_source(_records('a', 'x') + _records('b', 'changed') + _records('c', 'z'))
+        plan = plan_update(manifest, current)
+        assert (plan.added, plan.changed, plan.unchanged) == (['c'], ['b'], ['a'])
+        assert plan.has_changes
+
+        plan = plan_update(manifest, group_records_by_source(_records('a', 'x')))
+        assert plan.removed == ['b']
+
+    def test_manifest_ids(self):
+        records = _records('a', 'x', 'y') + _records('b', 'z')
+        manifest = build_manifest(records, chunk_records(records)[1], {'chunk_size': None})
+        assert manifest['next_id'] == 3
+        assert manifest['sources']['a']['ids'] == [0, 1]
+        assert manifest['sources']['b']['ids'] == [2]
+
+
+class TestUpdateVectorStore:
+    """Test applying updates to a store on disk."""
+
+    def test_no_changes_embeds_nothing(self, store):
+        store_dir, records = store
+        calls = []
+
+        summary = update_vector_store(store_dir, records, chunk_records,
+                                      lambda texts: calls.append(texts) or embed_texts(texts))
+
+        assert calls == []
+        assert summary['unchanged'] == 2
+        assert summary['num_vectors'] == 3
+
+    def test_add_source_embeds_only_new_chunks(self, store, real_faiss):
+        store_dir, records = store
+        embedded = []
+
+        summary = update_vector_store(store_dir, records + _records('c.jsonl', 'gamma one'), chunk_records,
+                                      lambda texts: embedded.extend(texts) or embed_texts(texts))
+
+        assert embedded == ['gamma one']
+        assert summary['added'] == ['c.jsonl']
+        assert summary['num_vectors'] == 4
+        assert _search(real_faiss, store_dir, 'gamma one') == 'gamma one'
+        assert load_manifest(store_dir)['sources']['c.jsonl']['ids'] == [3]
+
+    def test_changed_source_replaced(self, store, real_faiss):
+        store_dir, records = store
+        new_records = _records('a.jsonl', 'alpha one', 'alpha two') + _records('b.jsonl', 'beta revised')
+
+        summary = update_vector_store(store_dir, new_records, chunk_records, embed_texts)
+
+        assert summary['changed'] == ['b.jsonl']
+        assert (summary['vectors_added'], summary['vectors_removed'], summary['num_vectors']) == (1, 1, 3)
+        assert _search(real_faiss, store_dir, 'beta revised') == 'beta revised'
+        assert _search(real_faiss, store_dir, 'beta one') != 'beta one'
+
+    def test_removed_source(self, store, real_faiss):
+        store_dir, records = store
+
+        summary = update_vector_store(store_dir, _records('a.jsonl', 'alpha one', 'alpha two'),
+                                      chunk_records, embed_texts)
+
+        assert summary['removed'] == ['b.jsonl']
+        assert summary['num_vectors'] == 2
+        assert 'b.jsonl' not in load_manifest(store_dir)['sources']
+        # Metadata is append-only: the orphan row stays, ids of other rows are unchanged
+        assert len(MetadataIndex(store_dir / 'metadata.jsonl')) == 3
+        assert json.loads((store_dir / 'config.json').read_text())['metadata_records'] == 3
+
+    def test_offsets_stay_current(self, store):
+        store_dir, records = store
+        update_vector_store(store_dir, records + _records('c.jsonl', 'gamma one'), chunk_records, embed_texts)
+
+        metadata = MetadataIndex(store_dir / 'metadata.jsonl', save_offsets=False)
+        assert [m['text'] for m in metadata] == ['alpha one', 'alpha two', 'beta one', 'gamma one']
+        assert not list(store_dir.glob('*.tmp'))
+
+    def test_keyword_index_updated(self, store):
+        store_dir, records = store
+        BM25Index.build(['alpha one', 'alpha two', 'beta one']).save(store_dir / BM25_FILENAME)
+        new_records = _records('a.jsonl', 'alpha one', 'alpha two') + _records('b.jsonl', 'beta revised')
+
+        update_vector_store(store_dir, new_records, chunk_records, embed_texts)
+
+        bm25 = BM25Index.load(store_dir / BM25_FILENAME)
+        assert bm25.search('revised', 5)[1].tolist() == [3]
+        assert bm25.search('beta', 5)[1].tolist() == [3]
+        assert len(bm25) == 3
+
+    def test_filter_index_extended(self, store):
+        store_dir, records = store
+        write_filter_index(store_dir / 'metadata.jsonl', MetadataIndex(store_dir / 'metadata.jsonl'))
+
+        update_vector_store(store_dir, records + _records('c.jsonl', 'gamma one'), chunk_records, embed_texts)
+
+        filter_index = MetadataFilterIndex.load(store_dir / FILTERS_FILENAME)
+        assert len(filter_index) == 4
+        assert np.flatnonzero(filter_index.select({'source_file': ['c.jsonl']})).tolist() == [3]
+        assert not list(store_dir.glob('*.tmp'))
+
+    def test_metadata_closed_before_swap(self, store, monkeypatch):
+        store_dir, records = store
+        with MetadataIndex(store_dir / 'metadata.jsonl') as metadata:
+            write_filter_index(store_dir / 'metadata.jsonl', metadata)
+            write_adjacency(store_dir / 'metadata.jsonl', metadata)
+        opened = []
+
+        class TrackedMetadataIndex(MetadataIndex):
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                opened.append(self)
+
+        monkeypatch.setattr('llf.vector_store_update.MetadataIndex', TrackedMetadataIndex)
+        update_vector_store(store_dir, records + _records('c.jsonl', 'gamma one'), chunk_records, embed_texts)
+
+        # The filter and adjacency refresh share one view of the old rows
+        assert len(opened) == 1
+        assert opened[0]._file.closed
+
+    def test_adjacency_extended(self, store):
+        store_dir, records = store
+        write_adjacency(store_dir / 'metadata.jsonl', MetadataIndex(store_dir / 'metadata.jsonl'))
+
+        def two_chunks(new_records):
+            chunks = [dict(r, text=f"{r['text']} {half}", _chunk_index=i, _total_chunks=2)
+                      for r in new_records for i, half in enumerate(('start', 'end'))]
+            return [c['text'] for c in chunks], chunks
+
+        update_vector_store(store_dir, records + _records('c.jsonl', 'gamma one'), two_chunks, embed_texts)
+
+        adjacency = ChunkAdjacency.load(store_dir / ADJACENCY_FILENAME)
+        assert len(adjacency) == 5
+        assert [adjacency.neighbor(3, 1), adjacency.neighbor(4, -1), adjacency.neighbor(2, 1)] == [4, 3, None]
+        assert not list(store_dir.glob('*.tmp'))
+
+    def test_dry_run(self, store):
+        store_dir, records = store
+        before = (store_dir / 'metadata.jsonl').read_bytes()
+
+        summary = update_vector_store(store_dir, records + _records('c.jsonl', 'gamma'), chunk_records,
+                                      embed_texts, dry_run=True)
+
+        assert summary['added'] == ['c.jsonl']
+        assert (store_dir / 'metadata.jsonl').read_bytes() == before
+
+    def test_store_without_manifest(self, store, real_faiss):
+        """Test a store built before manifests re-embeds once and gains a manifest."""
+        store_dir, records = store
+        (store_dir / MANIFEST_FILENAME).unlink()
+
+        summary = update_vector_store(store_dir, records, chunk_records, embed_texts)
+
+        assert sorted(summary['changed']) == ['a.jsonl', 'b.jsonl']
+        assert summary['num_vectors'] == 3
+        assert load_manifest(store_dir)['next_id'] == 6
+
+        summary = update_vector_store(store_dir, records, chunk_records, embed_texts)
+        assert summary['unchanged'] == 2
+
+    def test_dimension_mismatch(self, store):
+        store_dir, records = store
+        with pytest.raises(ValueError, match="dimension"):
+            update_vector_store(store_dir, records + _records('c.jsonl', 'x'), chunk_records,
+                                lambda texts: np.ones((len(texts), 4), dtype=np.float32))
+
+    def test_missing_store(self, tmp_path, real_faiss):
+        with pytest.raises(FileNotFoundError):
+            update_vector_store(tmp_path, [], chunk_records, embed_texts)
+
+    def test_binary_store(self, store, real_faiss):
+        store_dir, records = store
+        texts, _ = chunk_records(records)
+        index, params = build_index(embed_texts(texts), storage='binary')
+        write_index(index, store_dir / 'index.faiss')
+        config = json.loads((store_dir / 'config.json').read_text())
+        config.update({'storage': 'binary', 'index_params': params})
+        (store_dir / 'config.json').write_text(json.dumps(config))
+
+        new_records = _records('a.jsonl', 'alpha one', 'alpha two') + _records('b.jsonl', 'beta revised')
+        summary = update_vector_store(store_dir, new_records, chunk_records, embed_texts)
+
+        updated = RescoredBinaryIndex.load(store_dir / 'index.faiss')
+        assert summary['num_vectors'] == updated.ntotal == 3
+        assert updated.vectors.shape == (4, DIMENSION)  # The replaced row stays as an orphan
+        _, ids = updated.search(embed_texts(['beta revised']), 1)
+        assert MetadataIndex(store_dir / 'metadata.jsonl')[ids[0][0]]['text'] == 'beta revised'
+
+    def test_sharded_store(self, store, real_faiss):
+        store_dir, records = store
+        texts, _ = chunk_records(records)
+        index, params = build_sharded_index(embed_texts(texts), 2)
+        (store_dir / 'index.faiss').unlink()
+        write_index(index, store_dir / 'index.faiss')
+        config = json.loads((store_dir / 'config.json').read_text())
+        config.update({'shards': 2, 'index_params': params})
+        (store_dir / 'config.json').write_text(json.dumps(config))
+
+        new_records = _records('a.jsonl', 'alpha one', 'alpha two') + _records('b.jsonl', 'beta revised')
+        summary = update_vector_store(store_dir, new_records, chunk_records, embed_texts)
+
+        updated = ShardedIndex.load(store_dir / 'index.faiss')
+        assert [shard.ntotal for shard in updated.shards] == [1, 2]  # Id 2 removed, id 3 added
+        assert summary['num_vectors'] == 3
+        assert not list(store_dir.glob('*.tmp'))
+        _, ids = updated.search(embed_texts(['beta revised']), 1)
+        assert ids[0][0] == 3
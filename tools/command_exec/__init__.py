@@ -40,6 +40,7 @@ TOOL_DEFINITION = {
                 "timeout": {
                     "type": "integer",
                     "description": "Timeout in seconds (default: 30, max: 300)",
+                    "default": 30,
                     "minimum": 1,
                     "maximum": 300
                 }